@@ -0,0 +1,90 @@
+import io
+from collections.abc import AsyncIterator, Callable
+from typing import Any
+
+from app.shared.models import RawMetricColumns
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    ARROW_AVAILABLE = True
+except ImportError:  # The optional `arrow` extra is not installed
+    ARROW_AVAILABLE = False
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last drain.
+
+    Writers ask for the position to record offsets in their footers, so it counts every byte ever written rather
+    than what is currently buffered.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _metric_schema() -> Any:
+    return pyarrow.schema(
+        [
+            ("sensor_id", pyarrow.dictionary(pyarrow.int32(), pyarrow.string())),
+            ("metric_type", pyarrow.dictionary(pyarrow.int32(), pyarrow.string())),
+            ("timestamp", pyarrow.timestamp("us", tz="UTC")),
+            ("value", pyarrow.float64()),
+        ]
+    )
+
+
+def _record_batch(columns: RawMetricColumns, schema: Any) -> Any:
+    return pyarrow.record_batch(
+        [
+            pyarrow.array(columns.sensor_ids, pyarrow.string()).dictionary_encode(),
+            pyarrow.array(columns.metric_types, pyarrow.string()).dictionary_encode(),
+            pyarrow.array(columns.timestamps, pyarrow.timestamp("us", tz="UTC")),
+            pyarrow.array(columns.values, pyarrow.float64()),
+        ],
+        schema=schema,
+    )
+
+
+async def _encode(
+    batches: AsyncIterator[RawMetricColumns], open_writer: Callable[[Any, Any], Any]
+) -> AsyncIterator[bytes]:
+    # Each column batch is encoded and sent before the next one is read, so memory is bounded by the batch size
+    schema = _metric_schema()
+    sink = _DrainableSink()
+    writer = open_writer(sink, schema)
+    async for columns in batches:
+        writer.write_batch(_record_batch(columns, schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def arrow_stream_chunks(batches: AsyncIterator[RawMetricColumns]) -> AsyncIterator[bytes]:
+    """Encode column batches as an Arrow IPC stream, one record batch each."""
+    return _encode(batches, pyarrow.ipc.new_stream)
+
+
+def parquet_chunks(batches: AsyncIterator[RawMetricColumns]) -> AsyncIterator[bytes]:
+    """Encode column batches as a Parquet file, one row group each."""
+    return _encode(batches, pyarrow.parquet.ParquetWriter)
@@ -0,0 +1,34 @@
+from collections.abc import Mapping
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from fastapi import Response
+
+NO_CACHE = "no-cache"
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header with an ETag, as used for GET requests."""
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+def http_date(timestamp: datetime) -> str:
+    return format_datetime(timestamp.astimezone(timezone.utc), usegmt=True)
+
+
+def range_cache_control(end_date: datetime | None, final_after_seconds: float, max_age_seconds: int) -> str:
+    """Let clients keep results of ranges that ended long enough ago for no more readings to arrive."""
+    if end_date is None or end_date.tzinfo is None:
+        return NO_CACHE
+    if end_date > datetime.now(timezone.utc) - timedelta(seconds=final_after_seconds):
+        return NO_CACHE
+    return f"public, max-age={max_age_seconds}"
+
+
+def not_modified(headers: Mapping[str, str]) -> Response:
+    return Response(status_code=304, headers=dict(headers))
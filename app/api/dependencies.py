@@ -1,15 +1,52 @@
-from collections.abc import AsyncGenerator
+from collections.abc import AsyncGenerator, AsyncIterator
+from contextlib import asynccontextmanager
 
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.services.group_commit_writer import GroupCommitMetricWriter, GroupCommitWriterManager
+from app.services.hot_tier import HotTier, HotTierManager, HotTierMetricRepository
+from app.services.metric_maintenance import MetricMaintenanceManager, MetricMaintenanceTask
 from app.services.metrics_manager import MetricManager
+from app.services.query_result_cache import (
+    MetricWriteVersions,
+    MetricWriteVersionsManager,
+    QueryResultCache,
+    QueryResultCacheManager,
+)
+from app.services.rollup_refresher import RollupRefreshTask, RollupRefreshTaskManager
+from app.services.sensor_registry_cache import (
+    CachedSensorRepository,
+    SensorRegistryCache,
+    SensorRegistryCacheManager,
+)
 from app.services.sensors_manager import SensorManager
+from app.shared.models import StorageBackend
+from app.shared.settings import get_settings
 from app.storage.database_config import get_db_config
+from app.storage.implementations.in_memory_metric_repository import InMemoryMetricRepository
+from app.storage.implementations.in_memory_sensor_repository import InMemorySensorRepository
 from app.storage.implementations.postgresql_metric_repository import PostgreSQLMetricRepository
 from app.storage.implementations.postgresql_sensor_repository import PostgreSQLSensorRepository
+from app.storage.in_memory_store import InMemoryStore
 from app.storage.interfaces.metric_repository import MetricRepository
 from app.storage.interfaces.sensor_repository import SensorRepository
+from app.storage.partition_manager import MetricPartitionManager
+from app.storage.retention_manager import MetricRetentionManager, RetentionPolicy
+from app.storage.rollup_manager import MetricRollupManager
+
+_group_commit_manager = GroupCommitWriterManager()
+_sensor_cache_manager = SensorRegistryCacheManager()
+_maintenance_manager = MetricMaintenanceManager()
+_rollup_refresh_manager = RollupRefreshTaskManager()
+_hot_tier_manager = HotTierManager()
+_query_cache_manager = QueryResultCacheManager()
+_write_versions_manager = MetricWriteVersionsManager()
+_in_memory_store = InMemoryStore()
+
+
+def _uses_postgresql() -> bool:
+    return get_settings().storage_backend is StorageBackend.POSTGRESQL
 
 
 async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
@@ -18,16 +55,81 @@ async def get_db_session() -> AsyncGenerator[AsyncSession, None]:
         yield session
 
 
+async def get_storage_session() -> AsyncGenerator[AsyncSession | None, None]:
+    """A database session, or None with the in-memory backend, which needs no database at all."""
+    if not _uses_postgresql():
+        yield None
+        return
+    async for session in get_db_session():
+        yield session
+
+
+def get_sensor_cache() -> SensorRegistryCache | None:
+    settings = get_settings()
+    if not settings.sensor_cache_enabled:
+        return None
+    return _sensor_cache_manager.get_cache(
+        max_entries=settings.sensor_cache_max_entries,
+        ttl_seconds=settings.sensor_cache_ttl_seconds,
+        negative_ttl_seconds=settings.sensor_cache_negative_ttl_seconds,
+    )
+
+
+def get_query_cache() -> QueryResultCache | None:
+    settings = get_settings()
+    if not settings.query_cache_enabled:
+        return None
+    return _query_cache_manager.get_cache(max_entries=settings.query_cache_max_entries)
+
+
+def get_write_versions() -> MetricWriteVersions | None:
+    if not get_settings().query_versions_enabled:
+        return None
+    return _write_versions_manager.get_versions()
+
+
+def _create_sensor_repository(session: AsyncSession | None) -> SensorRepository:
+    if session is None:
+        # Already a dictionary lookup, which a cache in front would only make stale
+        return InMemorySensorRepository(store=_in_memory_store)
+    sensor_repository: SensorRepository = PostgreSQLSensorRepository(session=session)
+    sensor_cache = get_sensor_cache()
+    if sensor_cache is not None:
+        sensor_repository = CachedSensorRepository(sensor_repository=sensor_repository, cache=sensor_cache)
+    return sensor_repository
+
+
 async def get_sensor_repository(
-    session: AsyncSession = Depends(get_db_session),
+    session: AsyncSession | None = Depends(get_storage_session),
 ) -> SensorRepository:
-    return PostgreSQLSensorRepository(session=session)
+    return _create_sensor_repository(session=session)
+
+
+def get_hot_tier() -> HotTier | None:
+    return _hot_tier_manager.get_tier()
+
+
+def _create_metric_repository(session: AsyncSession | None) -> MetricRepository:
+    settings = get_settings()
+    if session is None:
+        return InMemoryMetricRepository(store=_in_memory_store, duplicate_policy=settings.duplicate_policy)
+    metric_repository: MetricRepository = PostgreSQLMetricRepository(
+        session=session,
+        duplicate_policy=settings.duplicate_policy,
+        rollups_enabled=settings.rollups_enabled,
+        sensor_latest_enabled=settings.sensor_latest_enabled,
+        stream_fetch_size=settings.stream_fetch_size,
+    )
+    hot_tier = get_hot_tier()
+    if hot_tier is not None:
+        metric_repository = HotTierMetricRepository(metric_repository=metric_repository, hot_tier=hot_tier)
+    return metric_repository
 
 
 async def get_metric_repository(
-    session: AsyncSession = Depends(get_db_session),
+    session: AsyncSession | None = Depends(get_storage_session),
 ) -> MetricRepository:
-    return PostgreSQLMetricRepository(session=session)
+    return _create_metric_repository(session=session)
 
 
 async def get_sensor_manager(
@@ -36,8 +138,124 @@ async def get_sensor_manager(
     return SensorManager(sensor_repository=sensor_repository)
 
 
+def get_group_commit_writer() -> GroupCommitMetricWriter | None:
+    return _group_commit_manager.get_writer()
+
+
 async def get_metric_manager(
     metric_repository: MetricRepository = Depends(get_metric_repository),
     sensor_repository: SensorRepository = Depends(get_sensor_repository),
+    metric_writer: GroupCommitMetricWriter | None = Depends(get_group_commit_writer),
+    query_cache: QueryResultCache | None = Depends(get_query_cache),
+    write_versions: MetricWriteVersions | None = Depends(get_write_versions),
 ) -> MetricManager:
-    return MetricManager(metric_repository=metric_repository, sensor_repository=sensor_repository)
+    settings = get_settings()
+    return MetricManager(
+        metric_repository=metric_repository,
+        sensor_repository=sensor_repository,
+        metric_writer=metric_writer,
+        ingest_mode=settings.ingest_mode,
+        query_cache=query_cache,
+        write_versions=write_versions,
+        max_buckets_per_series=settings.downsample_max_buckets,
+        export_batch_size=settings.export_batch_size,
+    )
+
+
+@asynccontextmanager
+async def _writer_repository_scope() -> AsyncIterator[tuple[MetricRepository, SensorRepository]]:
+    if not _uses_postgresql():
+        yield _create_metric_repository(session=None), _create_sensor_repository(session=None)
+        return
+    async with get_db_config().async_session_maker() as session:
+        yield (
+            _create_metric_repository(session=session),
+            _create_sensor_repository(session=session),
+        )
+
+
+def start_group_commit_writer() -> None:
+    settings = get_settings()
+    if settings.group_commit_enabled:
+        _group_commit_manager.start(
+            repository_scope=_writer_repository_scope,
+            max_batch_size=settings.group_commit_max_batch_size,
+            max_delay_ms=settings.group_commit_max_delay_ms,
+            ingest_mode=settings.ingest_mode,
+        )
+
+
+async def stop_group_commit_writer() -> None:
+    await _group_commit_manager.stop()
+
+
+def get_metric_maintenance() -> MetricMaintenanceTask | None:
+    return _maintenance_manager.get_task()
+
+
+def _create_rollup_manager() -> MetricRollupManager:
+    return MetricRollupManager(engine=get_db_config().engine, batch_size=get_settings().rollup_refresh_batch_size)
+
+
+def start_metric_maintenance() -> None:
+    settings = get_settings()
+    # Partitions, retention and rollups are PostgreSQL tables; the in-memory backend has none of them
+    if settings.maintenance_enabled and _uses_postgresql():
+        engine = get_db_config().engine
+        partition_manager = MetricPartitionManager(
+            engine=engine, interval=settings.partition_interval, premake=settings.partition_premake
+        )
+        _maintenance_manager.start(
+            partition_manager=partition_manager,
+            retention_manager=MetricRetentionManager(
+                engine=engine,
+                partition_manager=partition_manager,
+                delete_batch_size=settings.retention_delete_batch_size,
+                rollup_manager=_create_rollup_manager() if settings.rollups_enabled else None,
+                sensor_latest_enabled=settings.sensor_latest_enabled,
+            ),
+            retention_policy=RetentionPolicy(
+                default_days=settings.retention_days, days_by_metric=settings.retention_days_by_metric
+            ),
+            interval_seconds=settings.maintenance_interval_seconds,
+            query_cache=get_query_cache(),
+            write_versions=get_write_versions(),
+        )
+
+
+async def stop_metric_maintenance() -> None:
+    await _maintenance_manager.stop()
+
+
+def get_rollup_refresher() -> RollupRefreshTask | None:
+    return _rollup_refresh_manager.get_task()
+
+
+def start_rollup_refresher() -> None:
+    settings = get_settings()
+    if settings.rollups_enabled and _uses_postgresql():
+        _rollup_refresh_manager.start(
+            rollup_manager=_create_rollup_manager(), interval_seconds=settings.rollup_refresh_interval_seconds
+        )
+
+
+async def stop_rollup_refresher() -> None:
+    await _rollup_refresh_manager.stop()
+
+
+async def start_hot_tier() -> None:
+    settings = get_settings()
+    # The in-memory backend holds every reading in memory already
+    if settings.hot_tier_enabled and _uses_postgresql():
+        async with get_db_config().async_session_maker() as session:
+            await _hot_tier_manager.start(
+                metric_repository=PostgreSQLMetricRepository(session=session),
+                window_seconds=settings.hot_tier_window_seconds,
+                max_series=settings.hot_tier_max_series,
+                max_points_per_series=settings.hot_tier_max_points_per_series,
+                duplicate_policy=settings.duplicate_policy,
+            )
+
+
+def stop_hot_tier() -> None:
+    _hot_tier_manager.reset()
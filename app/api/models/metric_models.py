@@ -1,8 +1,11 @@
 from datetime import datetime
+from enum import Enum
 
 from pydantic import BaseModel, Field
 
-from app.shared.models import MetricType, StatisticType
+from app.shared.models import BucketWidth, MetricType, RawMetricKey, StatisticType, WriteStatus
+
+MAX_METRIC_BATCH_SIZE = 5000
 
 
 class MetricCreateRequest(BaseModel):
@@ -11,29 +14,101 @@ class MetricCreateRequest(BaseModel):
     value: float = Field(..., ge=-1000, le=1000, description="Metric value")
 
 
+class MetricBatchCreateRequest(BaseModel):
+    metrics: list[MetricCreateRequest] = Field(
+        ..., min_length=1, max_length=MAX_METRIC_BATCH_SIZE, description="Metric measurements to record"
+    )
+
+
 class MetricQueryRequest(BaseModel):
     sensor_ids: list[str] | None = None
     metrics: list[MetricType]
-    statistic: StatisticType
+    statistics: list[StatisticType] = Field(..., min_length=1, description="Statistics computed together per series")
+    start_date: datetime | None = None
+    end_date: datetime | None = None
+
+
+class MetricDownsampleRequest(BaseModel):
+    sensor_ids: list[str] | None = None
+    metrics: list[MetricType]
+    statistics: list[StatisticType] = Field(..., min_length=1, description="Statistics computed per bucket")
+    bucket: BucketWidth
+    time_zone: str = Field("UTC", description="IANA time zone whose midnight and calendar days buckets align to")
+    start_date: datetime | None = None
+    end_date: datetime | None = None
+
+
+class ExportFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+    # Columnar formats, encoded from column batches; need the optional `arrow` extra
+    ARROW = "arrow"
+    PARQUET = "parquet"
+
+
+class MetricExportRequest(BaseModel):
+    sensor_ids: list[str] | None = None
+    metrics: list[MetricType] | None = None
     start_date: datetime | None = None
     end_date: datetime | None = None
+    export_format: ExportFormat = Field(ExportFormat.NDJSON, description="Encoding of the streamed readings")
+    after: RawMetricKey | None = Field(None, description="Key of the last reading of the previous page")
+    limit: int | None = Field(None, ge=1, description="Most readings returned; all when omitted")
+
+
+class MetricQueryVersion(BaseModel):
+    """What is known about a query's result before running it."""
+
+    end_date: datetime | None = Field(None, description="End of the completed date range; none for latest values")
+    etag: str | None = Field(None, description="ETag of the result when it is known without running the query")
+    last_modified: datetime | None = Field(None, description="Time of the last write that changed the result")
 
 
 class StatisticResult(BaseModel):
     statistic_type: StatisticType
-    value: float
+    value: float | None = Field(..., description="None when undefined, e.g. the spread of a single reading")
 
 
 class MetricQueryResult(BaseModel):
     sensor_id: str
     metric: MetricType
-    stat: StatisticResult
+    stats: list[StatisticResult] = Field(..., description="One entry per requested statistic, in request order")
+
+
+class MetricSeriesBucket(BaseModel):
+    sensor_id: str
+    metric: MetricType
+    bucket: datetime = Field(..., description="Start of the bucket")
+    stats: list[StatisticResult]
 
 
 class MetricCreateResponse(BaseModel):
     sensor_id: str
     status: str
     timestamp: datetime
+    write_status: WriteStatus | None = Field(None, description="Outcome of the write; not reported by group commit")
+
+
+class MetricBatchCreateResponse(BaseModel):
+    sensor_id: str
+    status: str
+    accepted: int
+    duplicates: int
+
+
+class MetricIngestRejection(BaseModel):
+    line: int
+    reason: str
+
+
+class MetricIngestSummary(BaseModel):
+    lines: int = 0
+    accepted: int = 0
+    duplicates: int = 0
+    rejected: int = 0
+    rejections: list[MetricIngestRejection] = Field(
+        default_factory=list, description="First rejected lines with the reason they were skipped"
+    )
 
 
 class MetricQueryResponse(BaseModel):
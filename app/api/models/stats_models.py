@@ -0,0 +1,74 @@
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class GroupCommitStats(BaseModel):
+    flushes: int
+    failed_flushes: int
+    rows: int
+    queue_depth: int
+    average_batch_size: float
+    max_batch_size: int
+    average_flush_latency_ms: float
+    max_flush_latency_ms: float
+
+
+class SensorCacheStats(BaseModel):
+    hits: int
+    negative_hits: int
+    misses: int
+    evictions: int
+    size: int
+    negative_size: int
+    hit_rate: float
+
+
+class MaintenanceStats(BaseModel):
+    runs: int
+    failed_runs: int
+    partitions_created: int
+    partitions_dropped: int
+    rows_deleted: int
+    rows_dropped_estimate: int
+    bytes_reclaimed: int
+    last_run_at: datetime | None
+    last_error: str | None
+
+
+class RollupStats(BaseModel):
+    runs: int
+    failed_runs: int
+    buckets_refreshed: int
+    last_run_at: datetime | None
+    last_error: str | None
+
+
+class HotTierStats(BaseModel):
+    series: int
+    points: int
+    hits: int
+    partial_hits: int
+    misses: int
+    evicted_points: int
+    hit_rate: float
+    window_start: datetime | None
+
+
+class QueryCacheStats(BaseModel):
+    hits: int
+    misses: int
+    invalidations: int
+    evictions: int
+    size: int
+    estimated_bytes: int
+    hit_rate: float
+
+
+class StatsResponse(BaseModel):
+    group_commit: GroupCommitStats | None = None
+    sensor_cache: SensorCacheStats | None = None
+    maintenance: MaintenanceStats | None = None
+    rollups: RollupStats | None = None
+    hot_tier: HotTierStats | None = None
+    query_cache: QueryCacheStats | None = None
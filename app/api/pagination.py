@@ -0,0 +1,64 @@
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+
+from starlette.datastructures import URL
+
+from app.shared.exceptions import InvalidQueryError
+from app.shared.models import MetricType, RawMetricColumns, RawMetricKey
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Most entries a single page may ask for
+MAX_PAGE_SIZE = 10_000
+
+
+def _encode(key: list[str | int]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def _decode(cursor: str) -> list[str | int]:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError as e:
+        raise InvalidQueryError("Malformed page cursor") from e
+    if not isinstance(key, list):
+        raise InvalidQueryError("Malformed page cursor")
+    return key
+
+
+def sensor_cursor(sensor_id: str) -> str:
+    return _encode([sensor_id])
+
+
+def decode_sensor_cursor(cursor: str) -> str:
+    key = _decode(cursor)
+    if len(key) != 1 or not isinstance(key[0], str):
+        raise InvalidQueryError("Malformed page cursor")
+    return key[0]
+
+
+def raw_metric_cursor(key: RawMetricKey) -> str:
+    """Cursor after a reading; its timestamp is kept as integer microseconds, so it round-trips exactly."""
+    return _encode([(key.timestamp - EPOCH) // timedelta(microseconds=1), key.sensor_id, key.metric_type.value])
+
+
+def raw_columns_cursor(columns: RawMetricColumns) -> str:
+    """Cursor after the last reading of a column batch, whose timestamps already are microseconds."""
+    return _encode([columns.timestamps[-1], columns.sensor_ids[-1], columns.metric_types[-1]])
+
+
+def decode_raw_metric_cursor(cursor: str) -> RawMetricKey:
+    key = _decode(cursor)
+    if len(key) != 3 or not isinstance(key[0], int) or not isinstance(key[1], str) or not isinstance(key[2], str):
+        raise InvalidQueryError("Malformed page cursor")
+    try:
+        return RawMetricKey(
+            sensor_id=key[1], metric_type=MetricType(key[2]), timestamp=EPOCH + timedelta(microseconds=key[0])
+        )
+    except (ValueError, OverflowError) as e:
+        raise InvalidQueryError("Malformed page cursor") from e
+
+
+def next_page_link(url: URL, cursor: str) -> str:
+    """`Link` header value pointing at the page after `cursor`, with every other query parameter kept."""
+    return f'<{url.include_query_params(after=cursor)}>; rel="next"'
@@ -5,7 +5,7 @@ from pydantic import BaseModel
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.dependencies import get_db_session
+from app.api.dependencies import get_storage_session
 
 router = APIRouter()
 
@@ -16,7 +16,9 @@ class HealthResponse(BaseModel):
     timestamp: str
 
 
-async def _check_database_health(db_session: AsyncSession) -> tuple[str, str]:
+async def _check_database_health(db_session: AsyncSession | None) -> tuple[str, str]:
+    if db_session is None:
+        return "ok", "in-memory"
     try:
         await db_session.execute(text("SELECT 1"))
         return "ok", "connected"
@@ -25,7 +27,7 @@ async def _check_database_health(db_session: AsyncSession) -> tuple[str, str]:
 
 
 @router.get("", response_model=HealthResponse)
-async def health_check(db_session: AsyncSession = Depends(get_db_session)) -> HealthResponse:
+async def health_check(db_session: AsyncSession | None = Depends(get_storage_session)) -> HealthResponse:
     status, database_status = await _check_database_health(db_session)
 
     return HealthResponse(status=status, database=database_status, timestamp=datetime.now().isoformat() + "Z")
@@ -1,20 +1,58 @@
+import csv
+import io
+from collections.abc import AsyncIterator
 from datetime import datetime
+from typing import TypeVar
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import ValidationError
 
+from app.api import columnar_export
+from app.api.conditional_requests import etag_matches, http_date, not_modified, range_cache_control
 from app.api.dependencies import get_metric_manager
 from app.api.models.metric_models import (
+    ExportFormat,
+    MetricBatchCreateRequest,
+    MetricBatchCreateResponse,
     MetricCreateRequest,
     MetricCreateResponse,
+    MetricDownsampleRequest,
+    MetricExportRequest,
+    MetricIngestSummary,
     MetricQueryResponse,
+    MetricSeriesBucket,
+)
+from app.api.pagination import (
+    MAX_PAGE_SIZE,
+    decode_raw_metric_cursor,
+    next_page_link,
+    raw_columns_cursor,
+    raw_metric_cursor,
 )
 from app.services.metrics_manager import MetricManager
-from app.shared.exceptions import SensorNotFoundError
-from app.shared.models import MetricType, StatisticType
+from app.services.query_result_cache import results_etag
+from app.shared.exceptions import DuplicateMetricError, InvalidQueryError, SensorNotFoundError
+from app.shared.models import BucketWidth, Metric, MetricType, RawMetricColumns, RawMetricKey, StatisticType
+from app.shared.settings import get_settings
 
 router = APIRouter()
 
+T = TypeVar("T")
+
+# Exported readings are encoded and sent this many at a time
+EXPORT_CHUNK_ROWS = 1000
+EXPORT_MEDIA_TYPES = {
+    ExportFormat.NDJSON: "application/x-ndjson",
+    ExportFormat.CSV: "text/csv",
+    ExportFormat.ARROW: "application/vnd.apache.arrow.stream",
+    ExportFormat.PARQUET: "application/vnd.apache.parquet",
+}
+COLUMNAR_ENCODERS = {
+    ExportFormat.ARROW: columnar_export.arrow_stream_chunks,
+    ExportFormat.PARQUET: columnar_export.parquet_chunks,
+}
+
 
 @router.post("/{sensor_id}/metrics", response_model=MetricCreateResponse, status_code=201)
 async def add_sensor_metrics(
@@ -26,33 +64,256 @@ async def add_sensor_metrics(
         return await metric_manager.record_metric(sensor_id=sensor_id, metric_request=metric)
     except SensorNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except DuplicateMetricError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except ValidationError as e:
         raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to record metric: {str(e)}")
 
 
+@router.post("/{sensor_id}/metrics/batch", response_model=MetricBatchCreateResponse, status_code=201)
+async def add_sensor_metrics_batch(
+    sensor_id: str,
+    batch: MetricBatchCreateRequest,
+    metric_manager: MetricManager = Depends(get_metric_manager),
+) -> MetricBatchCreateResponse:
+    try:
+        return await metric_manager.record_metrics(sensor_id=sensor_id, metric_requests=batch.metrics)
+    except SensorNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except DuplicateMetricError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to record metrics: {str(e)}")
+
+
+@router.post(
+    "/ingest",
+    response_model=MetricIngestSummary,
+    openapi_extra={"requestBody": {"content": {"application/x-ndjson": {"schema": {"type": "string"}}}}},
+)
+async def ingest_metrics_stream(
+    request: Request,
+    metric_manager: MetricManager = Depends(get_metric_manager),
+) -> MetricIngestSummary:
+    """Ingest newline-delimited JSON records of any number of sensors from a streamed request body."""
+    try:
+        return await metric_manager.ingest_stream(chunks=request.stream())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to ingest metrics: {str(e)}")
+
+
 @router.get("/query", response_model=MetricQueryResponse)
 async def query_metrics(
+    response: Response,
     sensor_ids: list[str] | None = Query(None, description="IDs of sensors to include"),
     metrics: list[MetricType] = Query(..., description="Metrics to query (temperature, humidity)"),
-    statistic: StatisticType = Query(..., description="Statistic to calculate"),
+    statistic: list[StatisticType] = Query(
+        ..., description="Statistics to calculate; repeat to compute several at once"
+    ),
     start_date: datetime | None = Query(None, description="Start date (ISO format)"),
     end_date: datetime | None = Query(None, description="End date (ISO format)"),
+    if_none_match: str | None = Header(None),
     metric_manager: MetricManager = Depends(get_metric_manager),
-) -> MetricQueryResponse:
+) -> MetricQueryResponse | Response:
+    """Aggregate metrics; 304 when the result still matches the given ETag.
+
+    A cached result is compared without running the query, otherwise only the serialization is saved. With write
+    versions enabled for a single writer, the ETag follows them and is compared without running the query at all.
+    """
     try:
         from app.api.models.metric_models import MetricQueryRequest
 
         query_request = MetricQueryRequest(
             sensor_ids=sensor_ids,
             metrics=metrics,
-            statistic=statistic,
+            statistics=statistic,
             start_date=start_date,
             end_date=end_date,
         )
-        return await metric_manager.query_metrics_api(query_request=query_request)
+        settings = get_settings()
+        version = await metric_manager.get_query_version(query_request=query_request)
+        headers = {
+            "Cache-Control": range_cache_control(
+                version.end_date, settings.query_final_after_seconds, settings.query_final_max_age_seconds
+            )
+        }
+        if version.last_modified is not None:
+            headers["Last-Modified"] = http_date(version.last_modified)
+        if version.etag is not None and etag_matches(if_none_match, version.etag):
+            return not_modified({**headers, "ETag": version.etag})
+
+        result = await metric_manager.query_metrics_api(query_request=query_request)
+        # A tag derived from write versions was taken before the query ran, so it stays valid for this result
+        if version.last_modified is not None and version.etag is not None:
+            headers["ETag"] = version.etag
+        else:
+            headers["ETag"] = results_etag(
+                (entry.sensor_id, entry.metric, stat.statistic_type, stat.value)
+                for entry in result.results
+                for stat in entry.stats
+            )
+            if etag_matches(if_none_match, headers["ETag"]):
+                return not_modified(headers)
+
+        response.headers.update(headers)
+        return result
     except ValidationError as e:
         raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to query metrics: {str(e)}")
+
+
+@router.get(
+    "/series",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {"schema": {"type": "string"}}}}},
+)
+async def downsample_metrics(
+    sensor_ids: list[str] | None = Query(None, description="IDs of sensors to include"),
+    metrics: list[MetricType] = Query(..., description="Metrics to query (temperature, humidity)"),
+    statistic: list[StatisticType] = Query(..., description="Statistics to calculate per bucket"),
+    bucket: BucketWidth = Query(..., description="Bucket width (1m, 5m, 1h, 1d)"),
+    time_zone: str = Query("UTC", description="IANA time zone buckets are aligned to"),
+    start_date: datetime | None = Query(None, description="Start date (ISO format)"),
+    end_date: datetime | None = Query(None, description="End date (ISO format)"),
+    metric_manager: MetricManager = Depends(get_metric_manager),
+) -> StreamingResponse:
+    """Stream one aggregate per sensor, metric and time bucket as newline-delimited JSON, in time order per series."""
+    try:
+        downsample_request = MetricDownsampleRequest(
+            sensor_ids=sensor_ids,
+            metrics=metrics,
+            statistics=statistic,
+            bucket=bucket,
+            time_zone=time_zone,
+            start_date=start_date,
+            end_date=end_date,
+        )
+        buckets = await metric_manager.downsample_metrics_api(downsample_request=downsample_request)
+    except (ValidationError, InvalidQueryError) as e:
+        raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to downsample metrics: {str(e)}")
+
+    return StreamingResponse(_ndjson_lines(buckets), media_type="application/x-ndjson")
+
+
+async def _ndjson_lines(buckets: AsyncIterator[MetricSeriesBucket]) -> AsyncIterator[str]:
+    # Rows are read from a server-side cursor while the response is sent, so long series are never held in memory
+    async for bucket in buckets:
+        yield bucket.model_dump_json() + "\n"
+
+
+@router.get(
+    "/raw",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {media_type: {"schema": {"type": "string"}} for media_type in EXPORT_MEDIA_TYPES.values()}}
+    },
+)
+async def export_metrics(
+    request: Request,
+    sensor_ids: list[str] | None = Query(None, description="IDs of sensors to include; all when omitted"),
+    metrics: list[MetricType] | None = Query(None, description="Metrics to include; all when omitted"),
+    start_date: datetime | None = Query(None, description="Start date (ISO format)"),
+    end_date: datetime | None = Query(None, description="End date (ISO format)"),
+    export_format: ExportFormat = Query(
+        ExportFormat.NDJSON, alias="format", description="ndjson, csv, arrow or parquet"
+    ),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Most readings returned; all when omitted"),
+    after: str | None = Query(None, description="Cursor from the `Link` header of the previous page"),
+    metric_manager: MetricManager = Depends(get_metric_manager),
+) -> StreamingResponse:
+    """Stream raw readings in (sensor_id, metric_type, timestamp) order; memory use does not grow with the row count.
+
+    With `limit`, a full page carries a `Link` header to the next one.
+    """
+    if export_format in COLUMNAR_ENCODERS and not columnar_export.ARROW_AVAILABLE:
+        raise HTTPException(
+            status_code=501, detail=f"{export_format.value} export requires the 'arrow' extra (pyarrow)"
+        )
+
+    try:
+        export_request = MetricExportRequest(
+            sensor_ids=sensor_ids,
+            metrics=metrics,
+            start_date=start_date,
+            end_date=end_date,
+            export_format=export_format,
+            after=decode_raw_metric_cursor(after) if after is not None else None,
+            limit=limit,
+        )
+        cursor = None
+        chunks: AsyncIterator[str] | AsyncIterator[bytes]
+        if export_format in COLUMNAR_ENCODERS:
+            batches = await metric_manager.export_metric_columns_api(export_request=export_request)
+            if limit is not None:
+                batches, cursor = await _read_columns_page(batches, limit)
+            chunks = COLUMNAR_ENCODERS[export_format](batches)
+        else:
+            readings = await metric_manager.export_metrics_api(export_request=export_request)
+            if limit is not None:
+                readings, cursor = await _read_readings_page(readings, limit)
+            chunks = _csv_chunks(readings) if export_format is ExportFormat.CSV else _ndjson_chunks(readings)
+    except (ValidationError, InvalidQueryError) as e:
+        raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to export metrics: {str(e)}")
+
+    headers = {"Link": next_page_link(request.url, cursor)} if cursor is not None else None
+    return StreamingResponse(chunks, media_type=EXPORT_MEDIA_TYPES[export_format], headers=headers)
+
+
+async def _read_readings_page(readings: AsyncIterator[Metric], limit: int) -> tuple[AsyncIterator[Metric], str | None]:
+    # A page is at most MAX_PAGE_SIZE readings, so it is read whole to learn the cursor of its last reading
+    page = [reading async for reading in readings]
+    if len(page) < limit:
+        return _replay(page), None
+    last = page[-1]
+    return _replay(page), raw_metric_cursor(RawMetricKey(last.sensor_id, last.metric_type, last.timestamp))
+
+
+async def _read_columns_page(
+    batches: AsyncIterator[RawMetricColumns], limit: int
+) -> tuple[AsyncIterator[RawMetricColumns], str | None]:
+    page = [batch async for batch in batches]
+    if sum(len(batch.values) for batch in page) < limit:
+        return _replay(page), None
+    return _replay(page), raw_columns_cursor(page[-1])
+
+
+async def _replay(items: list[T]) -> AsyncIterator[T]:
+    for item in items:
+        yield item
+
+
+async def _ndjson_chunks(readings: AsyncIterator[Metric]) -> AsyncIterator[str]:
+    # NDJSON records of the same shape POST /metrics/ingest reads, so an export can be loaded back
+    lines = []
+    async for reading in readings:
+        lines.append(reading.model_dump_json() + "\n")
+        if len(lines) >= EXPORT_CHUNK_ROWS:
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+async def _csv_chunks(readings: AsyncIterator[Metric]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(["sensor_id", "metric_type", "timestamp", "value"])
+    rows = 0
+    async for reading in readings:
+        writer.writerow([reading.sensor_id, reading.metric_type.value, reading.timestamp.isoformat(), reading.value])
+        rows += 1
+        if rows >= EXPORT_CHUNK_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    yield buffer.getvalue()
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+import hashlib
 
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+
+from app.api.conditional_requests import NO_CACHE, etag_matches, http_date, not_modified
 from app.api.dependencies import get_sensor_manager
 from app.api.models.sensor_models import SensorCreateRequest, SensorCreateResponse, SensorListResponse
+from app.api.pagination import MAX_PAGE_SIZE, decode_sensor_cursor, next_page_link, sensor_cursor
 from app.services.sensors_manager import SensorManager
-from app.shared.exceptions import DatabaseError, ValidationError
+from app.shared.exceptions import DatabaseError, InvalidQueryError, ValidationError
+from app.shared.models import SensorRegistryVersion
 
 router = APIRouter()
 
@@ -24,11 +29,51 @@ async def create_sensor(
 
 
 @router.get("", response_model=list[SensorListResponse])
-async def list_sensors(sensor_manager: SensorManager = Depends(get_sensor_manager)) -> list[SensorListResponse]:
-    """Retrieve all registered sensors."""
+async def list_sensors(
+    request: Request,
+    response: Response,
+    sensor_type: str | None = Query(None, description="Only sensors of this type"),
+    limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Most sensors returned; all when omitted"),
+    after: str | None = Query(None, description="Cursor from the `Link` header of the previous page"),
+    if_none_match: str | None = Header(None),
+    sensor_manager: SensorManager = Depends(get_sensor_manager),
+) -> list[SensorListResponse] | Response:
+    """Retrieve registered sensors in sensor_id order; 304 when the sensor table has not changed since the given ETag.
+
+    With `limit`, a full page carries a `Link` header to the next one. The ETag covers the filter and page, so a tag
+    of one page never validates another.
+    """
+    try:
+        after_sensor_id = decode_sensor_cursor(after) if after is not None else None
+    except InvalidQueryError as e:
+        raise HTTPException(status_code=400, detail=f"Validation error: {str(e)}")
+
     try:
-        return await sensor_manager.list_sensors()
+        version = await sensor_manager.get_sensors_version()
+        headers = {
+            "ETag": _sensors_etag(version, sensor_type=sensor_type, limit=limit, after_sensor_id=after_sensor_id),
+            "Cache-Control": NO_CACHE,
+        }
+        if version.last_created_at is not None:
+            headers["Last-Modified"] = http_date(version.last_created_at)
+        if etag_matches(if_none_match, headers["ETag"]):
+            return not_modified(headers)
+
+        sensors = await sensor_manager.list_sensors(sensor_type=sensor_type, after=after_sensor_id, limit=limit)
+        if limit is not None and len(sensors) == limit:
+            headers["Link"] = next_page_link(request.url, sensor_cursor(sensors[-1].sensor_id))
+        response.headers.update(headers)
+        return sensors
     except DatabaseError as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve sensors: {str(e)}")
+
+
+def _sensors_etag(
+    version: SensorRegistryVersion, sensor_type: str | None, limit: int | None, after_sensor_id: str | None
+) -> str:
+    last_created_at = version.last_created_at.isoformat() if version.last_created_at is not None else "none"
+    # The decoded cursor rather than its encoding, so equal pages share a tag however the cursor was written
+    query = hashlib.blake2b(f"{sensor_type!r}\x1f{limit!r}\x1f{after_sensor_id!r}".encode(), digest_size=8)
+    return f'"sensors-{version.sensor_count}-{last_created_at}-{query.hexdigest()}"'
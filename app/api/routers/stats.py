@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends
+
+from app.api.dependencies import (
+    get_group_commit_writer,
+    get_hot_tier,
+    get_metric_maintenance,
+    get_query_cache,
+    get_rollup_refresher,
+    get_sensor_cache,
+)
+from app.api.models.stats_models import StatsResponse
+from app.services.group_commit_writer import GroupCommitMetricWriter
+from app.services.hot_tier import HotTier
+from app.services.metric_maintenance import MetricMaintenanceTask
+from app.services.query_result_cache import QueryResultCache
+from app.services.rollup_refresher import RollupRefreshTask
+from app.services.sensor_registry_cache import SensorRegistryCache
+
+router = APIRouter()
+
+
+@router.get("", response_model=StatsResponse)
+async def get_stats(
+    metric_writer: GroupCommitMetricWriter | None = Depends(get_group_commit_writer),
+    sensor_cache: SensorRegistryCache | None = Depends(get_sensor_cache),
+    maintenance: MetricMaintenanceTask | None = Depends(get_metric_maintenance),
+    rollup_refresher: RollupRefreshTask | None = Depends(get_rollup_refresher),
+    hot_tier: HotTier | None = Depends(get_hot_tier),
+    query_cache: QueryResultCache | None = Depends(get_query_cache),
+) -> StatsResponse:
+    """Report runtime statistics of the optional in-process components."""
+    return StatsResponse(
+        group_commit=metric_writer.get_stats() if metric_writer is not None else None,
+        sensor_cache=sensor_cache.get_stats() if sensor_cache is not None else None,
+        maintenance=maintenance.get_stats() if maintenance is not None else None,
+        rollups=rollup_refresher.get_stats() if rollup_refresher is not None else None,
+        hot_tier=hot_tier.get_stats() if hot_tier is not None else None,
+        query_cache=query_cache.get_stats() if query_cache is not None else None,
+    )
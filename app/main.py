@@ -1,13 +1,45 @@
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
-from app.api.routers import health, metrics, sensors
+from app.api.dependencies import (
+    start_group_commit_writer,
+    start_hot_tier,
+    start_metric_maintenance,
+    start_rollup_refresher,
+    stop_group_commit_writer,
+    stop_hot_tier,
+    stop_metric_maintenance,
+    stop_rollup_refresher,
+)
+from app.api.routers import health, metrics, sensors, stats
+from app.storage.database_config import close_db_config
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Loaded before any writer starts, so no reading lands between the load and the first write through the tier
+    await start_hot_tier()
+    start_group_commit_writer()
+    start_metric_maintenance()
+    start_rollup_refresher()
+    yield
+    await stop_rollup_refresher()
+    await stop_metric_maintenance()
+    await stop_group_commit_writer()
+    stop_hot_tier()
+    await close_db_config()
+
 
 app = FastAPI(
     title="Weather Sensor API",
     description="API for managing weather sensors and their recorded metrics",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.include_router(sensors.router, prefix="/sensors", tags=["sensors"])
 app.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
 app.include_router(health.router, prefix="/health", tags=["health"])
+app.include_router(stats.router, prefix="/stats", tags=["stats"])
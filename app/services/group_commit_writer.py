@@ -0,0 +1,211 @@
+import asyncio
+import time
+from collections.abc import Callable
+from contextlib import AbstractAsyncContextManager
+
+from app.api.models.stats_models import GroupCommitStats
+from app.shared.exceptions import DuplicateMetricError, SensorNotFoundError
+from app.shared.models import IngestMode, Metric
+from app.storage.interfaces.metric_repository import MetricRepository
+from app.storage.interfaces.sensor_repository import SensorRepository
+
+RepositoryScope = Callable[[], AbstractAsyncContextManager[tuple[MetricRepository, SensorRepository]]]
+
+_PendingMetric = tuple[Metric, asyncio.Future[None]]
+
+
+def _resolve(future: asyncio.Future[None], error: Exception | None = None) -> None:
+    # A submitter that was cancelled while waiting has nothing left to be told
+    if future.done():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
+
+
+class GroupCommitMetricWriter:
+    """Collects concurrently submitted metrics and writes them with one transaction per batch.
+
+    Every submitter waits until the transaction containing its metric has committed, so a successful
+    `submit` carries the same durability guarantee as a direct insert.
+    """
+
+    def __init__(
+        self,
+        repository_scope: RepositoryScope,
+        max_batch_size: int = 500,
+        max_delay_ms: float = 5.0,
+        ingest_mode: IngestMode = IngestMode.PRECHECK,
+    ) -> None:
+        self._repository_scope = repository_scope
+        self._ingest_mode = ingest_mode
+        self._max_batch_size = max_batch_size
+        self._max_delay = max_delay_ms / 1000
+        self._queue: asyncio.Queue[_PendingMetric | None] = asyncio.Queue()
+        self._flusher: asyncio.Task[None] | None = None
+
+        self._flushes = 0
+        self._failed_flushes = 0
+        self._rows = 0
+        self._max_batch_size_seen = 0
+        self._total_flush_latency = 0.0
+        self._max_flush_latency = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._flusher is not None and not self._flusher.done()
+
+    def start(self) -> None:
+        if not self.running:
+            self._flusher = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush everything already submitted, then stop the flusher."""
+        if self._flusher is None:
+            return
+        await self._queue.put(None)
+        await self._flusher
+        self._flusher = None
+
+    async def submit(self, metric: Metric) -> None:
+        if not self.running:
+            raise RuntimeError("Group commit writer is not running")
+
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        await self._queue.put((metric, future))
+        await future
+
+    def get_stats(self) -> GroupCommitStats:
+        return GroupCommitStats(
+            flushes=self._flushes,
+            failed_flushes=self._failed_flushes,
+            rows=self._rows,
+            queue_depth=self._queue.qsize(),
+            average_batch_size=self._rows / self._flushes if self._flushes else 0.0,
+            max_batch_size=self._max_batch_size_seen,
+            average_flush_latency_ms=self._total_flush_latency * 1000 / self._flushes if self._flushes else 0.0,
+            max_flush_latency_ms=self._max_flush_latency * 1000,
+        )
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                return
+
+            batch, stopping = await self._collect_batch(first)
+            await self._flush(batch)
+
+    async def _collect_batch(self, first: _PendingMetric) -> tuple[list[_PendingMetric], bool]:
+        """Gather up to max_batch_size metrics, waiting at most max_delay after the first one arrived."""
+        batch = [first]
+        deadline = asyncio.get_running_loop().time() + self._max_delay
+
+        while len(batch) < self._max_batch_size:
+            if self._queue.empty():
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                except TimeoutError:
+                    break
+            else:
+                item = self._queue.get_nowait()
+
+            if item is None:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    async def _flush(self, batch: list[_PendingMetric]) -> None:
+        started = time.perf_counter()
+        try:
+            async with self._repository_scope() as (metric_repository, sensor_repository):
+                accepted = await self._reject_unknown_sensors(sensor_repository, batch)
+                if accepted:
+                    try:
+                        await metric_repository.add_metrics(metrics=[metric for metric, _ in accepted])
+                    except (DuplicateMetricError, SensorNotFoundError):
+                        # Under the reject policy one conflicting metric, and in foreign key mode one unknown
+                        # sensor, must not fail its neighbours
+                        await self._write_individually(metric_repository, accepted)
+                    else:
+                        for _, future in accepted:
+                            _resolve(future)
+        except Exception as e:
+            # Submissions already resolved have been committed or rejected on their own; only the rest failed
+            self._failed_flushes += 1
+            for _, future in batch:
+                _resolve(future, e)
+            return
+
+        self._record_flush(batch_size=len(batch), latency=time.perf_counter() - started)
+
+    async def _reject_unknown_sensors(
+        self, sensor_repository: SensorRepository, batch: list[_PendingMetric]
+    ) -> list[_PendingMetric]:
+        """Fail the submissions for unknown sensors and return the others."""
+        # In foreign key mode the insert itself fails with SensorNotFoundError for an unknown sensor
+        if self._ingest_mode is IngestMode.FOREIGN_KEY:
+            return batch
+
+        known_sensor_ids = await sensor_repository.get_existing_sensor_ids(
+            sensor_ids=sorted({metric.sensor_id for metric, _ in batch})
+        )
+        accepted = []
+        for metric, future in batch:
+            if metric.sensor_id in known_sensor_ids:
+                accepted.append((metric, future))
+            else:
+                _resolve(future, SensorNotFoundError(f"Sensor with ID '{metric.sensor_id}' not found"))
+        return accepted
+
+    async def _write_individually(self, metric_repository: MetricRepository, batch: list[_PendingMetric]) -> None:
+        # Each metric is committed on its own, so its submitter is answered right away
+        for metric, future in batch:
+            try:
+                await metric_repository.add_metric(metric=metric)
+            except (DuplicateMetricError, SensorNotFoundError) as e:
+                _resolve(future, e)
+            else:
+                _resolve(future)
+
+    def _record_flush(self, batch_size: int, latency: float) -> None:
+        self._flushes += 1
+        self._rows += batch_size
+        self._max_batch_size_seen = max(self._max_batch_size_seen, batch_size)
+        self._total_flush_latency += latency
+        self._max_flush_latency = max(self._max_flush_latency, latency)
+
+
+class GroupCommitWriterManager:
+    def __init__(self) -> None:
+        self._writer: GroupCommitMetricWriter | None = None
+
+    def get_writer(self) -> GroupCommitMetricWriter | None:
+        return self._writer
+
+    def start(
+        self,
+        repository_scope: RepositoryScope,
+        max_batch_size: int,
+        max_delay_ms: float,
+        ingest_mode: IngestMode = IngestMode.PRECHECK,
+    ) -> None:
+        if self._writer is None:
+            self._writer = GroupCommitMetricWriter(
+                repository_scope=repository_scope,
+                max_batch_size=max_batch_size,
+                max_delay_ms=max_delay_ms,
+                ingest_mode=ingest_mode,
+            )
+        self._writer.start()
+
+    async def stop(self) -> None:
+        if self._writer is not None:
+            await self._writer.stop()
+            self._writer = None
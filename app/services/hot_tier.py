@@ -0,0 +1,470 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import AsyncIterator, Callable, Iterable, Sequence
+from datetime import datetime, timedelta, timezone
+
+from app.api.models.stats_models import HotTierStats
+from app.shared.models import (
+    SUMMARY_STATISTICS,
+    AggregatedMetricResult,
+    BucketWidth,
+    DuplicatePolicy,
+    Metric,
+    MetricBucket,
+    MetricSummary,
+    MetricType,
+    RawMetricColumns,
+    RawMetricKey,
+    StatisticType,
+    WriteStatus,
+)
+from app.storage.interfaces.metric_repository import MetricRepository
+from app.storage.metric_batch import MetricBatch
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Timestamps are kept as integer microseconds, the precision PostgreSQL stores
+TIMESTAMP_RESOLUTION = timedelta(microseconds=1)
+
+SeriesKey = tuple[str, MetricType]
+
+
+def _to_micros(timestamp: datetime) -> int:
+    return (timestamp - EPOCH) // TIMESTAMP_RESOLUTION
+
+
+def _from_micros(micros: int) -> datetime:
+    return EPOCH + micros * TIMESTAMP_RESOLUTION
+
+
+def merge_summaries(first: MetricSummary, second: MetricSummary) -> MetricSummary:
+    return first.model_copy(
+        update={
+            "value_count": first.value_count + second.value_count,
+            "value_sum": first.value_sum + second.value_sum,
+            "value_min": min(first.value_min, second.value_min),
+            "value_max": max(first.value_max, second.value_max),
+        }
+    )
+
+
+def summary_value(summary: MetricSummary, statistic: StatisticType) -> float:
+    match statistic:
+        case StatisticType.MIN:
+            return summary.value_min
+        case StatisticType.MAX:
+            return summary.value_max
+        case StatisticType.SUM:
+            return summary.value_sum
+        case StatisticType.AVG:
+            return summary.value_sum / summary.value_count
+        case StatisticType.COUNT:
+            return summary.value_count
+        case _:
+            raise ValueError(f"Unsupported statistic type: {statistic}")
+
+    raise ValueError(f"Unsupported statistic type: {statistic}")
+
+
+class _SeriesBuffer:
+    """Readings of one series in timestamp order, as two parallel arrays of 8 bytes per element."""
+
+    __slots__ = ("timestamps", "values", "complete_from")
+
+    def __init__(self, complete_from: int) -> None:
+        self.timestamps = array("q")
+        self.values = array("d")
+        # Every reading of the series at or after this timestamp is held
+        self.complete_from = complete_from
+
+    def drop_before(self, micros: int) -> int:
+        count = bisect_left(self.timestamps, micros)
+        if count:
+            del self.timestamps[:count]
+            del self.values[:count]
+        return count
+
+
+class HotTier:
+    """Process-wide copy of the most recent `window_seconds` of readings, for answering recent ranges from memory.
+
+    Each series keeps at most `max_points_per_series` readings; when a busy series overflows, its oldest readings
+    are dropped and the series is only complete from the oldest one left. At most `max_series` series are held.
+    Once a series has been refused or dropped, series the tier has not seen can no longer be told apart from
+    series without readings, and lookups involving them go to the database.
+
+    The tier only sees writes made through this process, so every writer of recent data has to go through the
+    application. It is empty, and answers nothing, until `warm` has loaded the window from the database.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = 21600.0,
+        max_series: int = 10_000,
+        max_points_per_series: int = 1440,
+        duplicate_policy: DuplicatePolicy = DuplicatePolicy.KEEP_FIRST,
+        clock: Callable[[], datetime] = lambda: datetime.now(timezone.utc),
+    ) -> None:
+        self._window = timedelta(seconds=window_seconds)
+        self._max_series = max_series
+        self._max_points = max_points_per_series
+        self._duplicate_policy = duplicate_policy
+        self._clock = clock
+        self._series: dict[SeriesKey, _SeriesBuffer] = {}
+        # Start of the window the tier holds; None until warmed
+        self._horizon: int | None = None
+        self._all_series_held = False
+
+        self._hits = 0
+        self._partial_hits = 0
+        self._misses = 0
+        self._evicted_points = 0
+
+    async def warm(self, metric_repository: MetricRepository) -> int:
+        """Replace the contents with the readings of the current window. Returns the number of readings loaded."""
+        since = self._clock() - self._window
+        self._series.clear()
+        self._horizon = _to_micros(since)
+        self._all_series_held = True
+
+        loaded = 0
+        async for metric in metric_repository.iter_raw_metrics(start_date=since):
+            self.record(metric, overwrite=True)
+            loaded += 1
+        return loaded
+
+    def record(self, metric: Metric, overwrite: bool) -> None:
+        """Apply a reading that was written to the database; `overwrite` replaces a held reading of the same key."""
+        horizon = self._advance_horizon()
+        if horizon is None:
+            return
+        key = (metric.sensor_id, metric.metric_type)
+        if metric.timestamp.tzinfo is None:
+            # Placed by the session time zone in the database, the tier cannot tell where it belongs
+            self._drop_series(key)
+            return
+
+        micros = _to_micros(metric.timestamp)
+        buffer = self._series.get(key)
+        if buffer is None:
+            if len(self._series) >= self._max_series:
+                self._drop_series(key)
+                return
+            # An unseen series had no readings in the window, unless the tier has lost track of some series
+            buffer = _SeriesBuffer(complete_from=horizon if self._all_series_held else micros)
+            self._series[key] = buffer
+        if micros < max(horizon, buffer.complete_from):
+            return
+
+        position = bisect_left(buffer.timestamps, micros)
+        if position < len(buffer.timestamps) and buffer.timestamps[position] == micros:
+            if overwrite:
+                buffer.values[position] = metric.value
+            return
+        buffer.timestamps.insert(position, micros)
+        buffer.values.insert(position, metric.value)
+
+        overflow = len(buffer.timestamps) - self._max_points
+        if overflow > 0:
+            buffer.complete_from = buffer.timestamps[overflow - 1] + 1
+            del buffer.timestamps[:overflow]
+            del buffer.values[:overflow]
+            self._evicted_points += overflow
+
+    def record_batch(self, metrics: Iterable[Metric]) -> None:
+        """Apply a batch written with the tier's duplicate policy, the first or last reading of a key winning."""
+        overwrite = self._duplicate_policy is DuplicatePolicy.KEEP_LAST
+        for metric in metrics:
+            self.record(metric, overwrite=overwrite)
+
+    def plan(self, keys: Sequence[SeriesKey], start: datetime, end: datetime) -> datetime | None:
+        """The timestamp from which the tier can answer [start, end] for every series, or None when it cannot.
+
+        Counts the lookup as a hit when that is `start` or earlier, as a partial hit when the database has to
+        answer the older part, and as a miss otherwise.
+        """
+        horizon = self._advance_horizon()
+        boundary = horizon
+        if boundary is not None:
+            for key in keys:
+                buffer = self._series.get(key)
+                if buffer is not None:
+                    boundary = max(boundary, buffer.complete_from)
+                elif not self._all_series_held:
+                    boundary = None
+                    break
+
+        if boundary is None or _to_micros(end) < boundary:
+            self._misses += 1
+            return None
+        if boundary <= _to_micros(start):
+            self._hits += 1
+            return start
+        self._partial_hits += 1
+        return _from_micros(boundary)
+
+    def summarize(self, keys: Sequence[SeriesKey], start: datetime, end: datetime) -> dict[SeriesKey, MetricSummary]:
+        """Summaries of the held readings in [start, end], for series with readings in it."""
+        first, last = _to_micros(start), _to_micros(end)
+        summaries = {}
+        for key in keys:
+            buffer = self._series.get(key)
+            if buffer is None:
+                continue
+            lower, upper = bisect_left(buffer.timestamps, first), bisect_right(buffer.timestamps, last)
+            if lower >= upper:
+                continue
+            values = buffer.values[lower:upper]
+            summaries[key] = MetricSummary(
+                sensor_id=key[0],
+                metric_type=key[1],
+                value_count=len(values),
+                value_sum=sum(values),
+                value_min=min(values),
+                value_max=max(values),
+            )
+        return summaries
+
+    def get_stats(self) -> HotTierStats:
+        lookups = self._hits + self._partial_hits + self._misses
+        return HotTierStats(
+            series=len(self._series),
+            points=sum(len(buffer.timestamps) for buffer in self._series.values()),
+            hits=self._hits,
+            partial_hits=self._partial_hits,
+            misses=self._misses,
+            evicted_points=self._evicted_points,
+            hit_rate=(self._hits + self._partial_hits) / lookups if lookups else 0.0,
+            window_start=_from_micros(self._horizon) if self._horizon is not None else None,
+        )
+
+    def _advance_horizon(self) -> int | None:
+        if self._horizon is None:
+            return None
+        horizon = max(self._horizon, _to_micros(self._clock() - self._window))
+        if horizon != self._horizon:
+            self._horizon = horizon
+            # Expired readings are dropped in one pass whenever the window has moved noticeably
+            for key, buffer in list(self._series.items()):
+                buffer.drop_before(horizon)
+                if not buffer.timestamps and buffer.complete_from <= horizon:
+                    del self._series[key]
+        return horizon
+
+    def _drop_series(self, key: SeriesKey) -> None:
+        self._series.pop(key, None)
+        self._all_series_held = False
+
+
+class HotTierMetricRepository(MetricRepository):
+    """MetricRepository decorator keeping a shared HotTier in step with writes and answering recent ranges from it.
+
+    A range the tier holds only partly is split: the tier summarizes the recent part, the wrapped repository the
+    older part, and the summaries are merged.
+    """
+
+    def __init__(self, metric_repository: MetricRepository, hot_tier: HotTier) -> None:
+        self._metric_repository = metric_repository
+        self._hot_tier = hot_tier
+
+    async def add_metric(self, metric: Metric) -> WriteStatus:
+        status = await self._metric_repository.add_metric(metric=metric)
+        if status is not WriteStatus.DEDUPLICATED:
+            self._hot_tier.record(metric, overwrite=True)
+        return status
+
+    async def add_metrics(self, metrics: list[Metric]) -> int:
+        accepted = await self._metric_repository.add_metrics(metrics=metrics)
+        self._hot_tier.record_batch(metrics)
+        return accepted
+
+    async def bulk_add_metrics(self, metrics: Sequence[Metric]) -> int:
+        accepted = await self._metric_repository.bulk_add_metrics(metrics=metrics)
+        self._hot_tier.record_batch(metrics)
+        return accepted
+
+    async def query_metrics(
+        self,
+        statistics: Sequence[StatisticType],
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+    ) -> list[AggregatedMetricResult]:
+        # Spread and first/last readings cannot be merged from summaries, so they always scan the repository
+        summaries = None
+        if SUMMARY_STATISTICS.issuperset(statistics):
+            summaries = await self._summarize_from_tier(sensor_ids, metrics, start_date, end_date)
+        if summaries is None:
+            return await self._metric_repository.query_metrics(
+                statistics=statistics, sensor_ids=sensor_ids, metrics=metrics, start_date=start_date, end_date=end_date
+            )
+        return [
+            AggregatedMetricResult(
+                sensor_id=summary.sensor_id,
+                metric_type=summary.metric_type,
+                statistic=statistic,
+                value=summary_value(summary, statistic),
+            )
+            for summary in summaries
+            for statistic in statistics
+        ]
+
+    def iter_bucketed_metrics(
+        self,
+        statistics: Sequence[StatisticType],
+        bucket_width: BucketWidth,
+        time_zone: str,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+    ) -> AsyncIterator[MetricBucket]:
+        return self._metric_repository.iter_bucketed_metrics(
+            statistics=statistics,
+            bucket_width=bucket_width,
+            time_zone=time_zone,
+            sensor_ids=sensor_ids,
+            metrics=metrics,
+            start_date=start_date,
+            end_date=end_date,
+        )
+
+    async def summarize_metrics(
+        self,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+    ) -> list[MetricSummary]:
+        summaries = await self._summarize_from_tier(sensor_ids, metrics, start_date, end_date)
+        if summaries is None:
+            return await self._metric_repository.summarize_metrics(
+                sensor_ids=sensor_ids, metrics=metrics, start_date=start_date, end_date=end_date
+            )
+        return summaries
+
+    async def get_raw_metrics(
+        self,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+    ) -> list[Metric]:
+        return await self._metric_repository.get_raw_metrics(
+            sensor_ids=sensor_ids, metrics=metrics, start_date=start_date, end_date=end_date
+        )
+
+    async def get_metric_batch(
+        self,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+    ) -> MetricBatch:
+        return await self._metric_repository.get_metric_batch(
+            sensor_ids=sensor_ids, metrics=metrics, start_date=start_date, end_date=end_date
+        )
+
+    def iter_raw_metrics(
+        self,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+        after: RawMetricKey | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[Metric]:
+        return self._metric_repository.iter_raw_metrics(
+            sensor_ids=sensor_ids, metrics=metrics, start_date=start_date, end_date=end_date, after=after, limit=limit
+        )
+
+    def iter_raw_metric_columns(
+        self,
+        batch_size: int,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+        after: RawMetricKey | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[RawMetricColumns]:
+        return self._metric_repository.iter_raw_metric_columns(
+            batch_size=batch_size,
+            sensor_ids=sensor_ids,
+            metrics=metrics,
+            start_date=start_date,
+            end_date=end_date,
+            after=after,
+            limit=limit,
+        )
+
+    async def get_metrics_by_sensor(self, sensor_id: str) -> list[Metric]:
+        return await self._metric_repository.get_metrics_by_sensor(sensor_id=sensor_id)
+
+    async def get_metrics_by_type(self, metric_type: MetricType) -> list[Metric]:
+        return await self._metric_repository.get_metrics_by_type(metric_type=metric_type)
+
+    async def get_latest_metrics(self, sensor_ids: list[str] | None, metrics: list[MetricType]) -> list[Metric]:
+        return await self._metric_repository.get_latest_metrics(sensor_ids=sensor_ids, metrics=metrics)
+
+    async def _summarize_from_tier(
+        self,
+        sensor_ids: list[str] | None,
+        metrics: list[MetricType] | None,
+        start_date: datetime | None,
+        end_date: datetime | None,
+    ) -> list[MetricSummary] | None:
+        """Summaries of the range with the tier's help, or None when the wrapped repository has to answer it."""
+        # "All sensors" and naive dates cannot be resolved without the database
+        if sensor_ids is None or start_date is None or end_date is None:
+            return None
+        if start_date.tzinfo is None or end_date.tzinfo is None:
+            return None
+
+        # Repeated sensor IDs or metric types give each series once, as the database does
+        metric_types = metrics or list(MetricType)
+        keys = list(dict.fromkeys((sensor_id, metric_type) for sensor_id in sensor_ids for metric_type in metric_types))
+        boundary = self._hot_tier.plan(keys, start_date, end_date)
+        if boundary is None:
+            return None
+
+        summaries = self._hot_tier.summarize(keys, boundary, end_date)
+        if boundary > start_date:
+            for summary in await self._metric_repository.summarize_metrics(
+                sensor_ids=sensor_ids,
+                metrics=metrics,
+                start_date=start_date,
+                end_date=boundary - TIMESTAMP_RESOLUTION,
+            ):
+                key = (summary.sensor_id, summary.metric_type)
+                summaries[key] = merge_summaries(summary, summaries[key]) if key in summaries else summary
+        return [summaries[key] for key in keys if key in summaries]
+
+
+class HotTierManager:
+    def __init__(self) -> None:
+        self._tier: HotTier | None = None
+
+    def get_tier(self) -> HotTier | None:
+        return self._tier
+
+    async def start(
+        self,
+        metric_repository: MetricRepository,
+        window_seconds: float,
+        max_series: int,
+        max_points_per_series: int,
+        duplicate_policy: DuplicatePolicy,
+    ) -> None:
+        if self._tier is None:
+            tier = HotTier(
+                window_seconds=window_seconds,
+                max_series=max_series,
+                max_points_per_series=max_points_per_series,
+                duplicate_policy=duplicate_policy,
+            )
+            await tier.warm(metric_repository)
+            self._tier = tier
+
+    def reset(self) -> None:
+        self._tier = None
@@ -0,0 +1,138 @@
+import asyncio
+import contextlib
+from datetime import datetime, timezone
+
+from app.api.models.stats_models import MaintenanceStats
+from app.services.query_result_cache import MetricWriteVersions, QueryResultCache
+from app.storage.partition_manager import MetricPartitionManager
+from app.storage.retention_manager import MetricRetentionManager, RetentionPolicy, RetentionReport
+
+
+class MetricMaintenanceTask:
+    """Periodically pre-creates upcoming metric partitions and applies the retention policy.
+
+    A failed run is recorded and retried at the next interval; it never stops the task. A run that expired
+    readings clears the query result cache and changes every query ETag.
+    """
+
+    def __init__(
+        self,
+        partition_manager: MetricPartitionManager,
+        retention_manager: MetricRetentionManager,
+        retention_policy: RetentionPolicy,
+        interval_seconds: float = 3600.0,
+        query_cache: QueryResultCache | None = None,
+        write_versions: MetricWriteVersions | None = None,
+    ) -> None:
+        self._partition_manager = partition_manager
+        self._retention_manager = retention_manager
+        self._retention_policy = retention_policy
+        self._interval_seconds = interval_seconds
+        self._query_cache = query_cache
+        self._write_versions = write_versions
+        self._runner: asyncio.Task[None] | None = None
+
+        self._runs = 0
+        self._failed_runs = 0
+        self._partitions_created = 0
+        self._partitions_dropped = 0
+        self._rows_deleted = 0
+        self._rows_dropped_estimate = 0
+        self._bytes_reclaimed = 0
+        self._last_run_at: datetime | None = None
+        self._last_error: str | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._runner is not None and not self._runner.done()
+
+    def start(self) -> None:
+        if not self.running:
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Cancel the task; a run in progress is abandoned, its completed statements stay committed."""
+        if self._runner is None:
+            return
+        self._runner.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._runner
+        self._runner = None
+
+    async def run_once(self) -> RetentionReport:
+        self._last_run_at = datetime.now(timezone.utc)
+        try:
+            created = await self._partition_manager.ensure_partitions()
+            report = await self._retention_manager.apply(self._retention_policy)
+        except Exception as e:
+            self._failed_runs += 1
+            self._last_error = str(e)
+            raise
+
+        expired = bool(report.rows_deleted or report.dropped_partitions)
+        if self._query_cache is not None and expired:
+            self._query_cache.clear()
+        if self._write_versions is not None and expired:
+            self._write_versions.expire()
+
+        self._runs += 1
+        self._last_error = None
+        self._partitions_created += len(created)
+        self._partitions_dropped += len(report.dropped_partitions)
+        self._rows_deleted += report.rows_deleted
+        self._rows_dropped_estimate += report.rows_dropped_estimate
+        self._bytes_reclaimed += report.bytes_reclaimed
+        return report
+
+    def get_stats(self) -> MaintenanceStats:
+        return MaintenanceStats(
+            runs=self._runs,
+            failed_runs=self._failed_runs,
+            partitions_created=self._partitions_created,
+            partitions_dropped=self._partitions_dropped,
+            rows_deleted=self._rows_deleted,
+            rows_dropped_estimate=self._rows_dropped_estimate,
+            bytes_reclaimed=self._bytes_reclaimed,
+            last_run_at=self._last_run_at,
+            last_error=self._last_error,
+        )
+
+    async def _run(self) -> None:
+        while True:
+            # A failure is recorded in the stats by run_once
+            with contextlib.suppress(Exception):
+                await self.run_once()
+            await asyncio.sleep(self._interval_seconds)
+
+
+class MetricMaintenanceManager:
+    def __init__(self) -> None:
+        self._task: MetricMaintenanceTask | None = None
+
+    def get_task(self) -> MetricMaintenanceTask | None:
+        return self._task
+
+    def start(
+        self,
+        partition_manager: MetricPartitionManager,
+        retention_manager: MetricRetentionManager,
+        retention_policy: RetentionPolicy,
+        interval_seconds: float,
+        query_cache: QueryResultCache | None = None,
+        write_versions: MetricWriteVersions | None = None,
+    ) -> None:
+        if self._task is None:
+            self._task = MetricMaintenanceTask(
+                partition_manager=partition_manager,
+                retention_manager=retention_manager,
+                retention_policy=retention_policy,
+                interval_seconds=interval_seconds,
+                query_cache=query_cache,
+                write_versions=write_versions,
+            )
+        self._task.start()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            await self._task.stop()
+            self._task = None
@@ -1,37 +1,140 @@
-from datetime import datetime, timedelta
+from collections.abc import AsyncIterable, AsyncIterator
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from pydantic import ValidationError
 
 from app.api.models.metric_models import (
+    MetricBatchCreateResponse,
     MetricCreateRequest,
     MetricCreateResponse,
+    MetricDownsampleRequest,
+    MetricExportRequest,
+    MetricIngestRejection,
+    MetricIngestSummary,
     MetricQueryRequest,
     MetricQueryResponse,
     MetricQueryResult,
+    MetricQueryVersion,
+    MetricSeriesBucket,
     StatisticResult,
 )
-from app.shared.exceptions import SensorNotFoundError
-from app.shared.models import AggregatedMetricResult, Metric, MetricType, StatisticType
+from app.services.group_commit_writer import GroupCommitMetricWriter
+from app.services.query_result_cache import MetricWriteVersions, QueryResultCache, query_key
+from app.shared.exceptions import DuplicateMetricError, InvalidQueryError, SensorNotFoundError
+from app.shared.models import (
+    BUCKET_INTERVALS,
+    AggregatedMetricResult,
+    IngestMode,
+    Metric,
+    MetricType,
+    RawMetricColumns,
+    StatisticType,
+    WriteStatus,
+)
 from app.storage.interfaces.metric_repository import MetricRepository
 from app.storage.interfaces.sensor_repository import SensorRepository
 
+# Streamed records are validated one line at a time and written in chunks of this size
+INGEST_FLUSH_SIZE = 1000
+MAX_INGEST_LINE_BYTES = 64 * 1024
+MAX_REPORTED_REJECTIONS = 100
+# Writes of at least this many rows go through the COPY-based bulk load path
+BULK_LOAD_THRESHOLD = 1000
+MAX_BUCKETS_PER_SERIES = 10_000
+# Readings per column batch of columnar exports
+EXPORT_BATCH_SIZE = 65_536
+
 
 class MetricManager:
-    def __init__(self, metric_repository: MetricRepository, sensor_repository: SensorRepository) -> None:
+    def __init__(
+        self,
+        metric_repository: MetricRepository,
+        sensor_repository: SensorRepository,
+        metric_writer: GroupCommitMetricWriter | None = None,
+        ingest_mode: IngestMode = IngestMode.PRECHECK,
+        query_cache: QueryResultCache | None = None,
+        write_versions: MetricWriteVersions | None = None,
+        max_buckets_per_series: int = MAX_BUCKETS_PER_SERIES,
+        export_batch_size: int = EXPORT_BATCH_SIZE,
+    ) -> None:
         self._metric_repository = metric_repository
         self._sensor_repository = sensor_repository
+        self._metric_writer = metric_writer
+        self._ingest_mode = ingest_mode
+        self._query_cache = query_cache
+        self._write_versions = write_versions
+        self._max_buckets_per_series = max_buckets_per_series
+        self._export_batch_size = export_batch_size
 
     async def record_metric(self, sensor_id: str, metric_request: MetricCreateRequest) -> MetricCreateResponse:
-        if not await self._sensor_repository.sensor_exists(sensor_id=sensor_id):
-            raise SensorNotFoundError(f"Sensor with ID '{sensor_id}' not found")
-
         metric = Metric(
             sensor_id=sensor_id,
             metric_type=metric_request.metric_type,
             timestamp=metric_request.timestamp,
             value=metric_request.value,
         )
-        await self._metric_repository.add_metric(metric=metric)
 
-        return MetricCreateResponse(sensor_id=sensor_id, status="data_recorded", timestamp=metric_request.timestamp)
+        write_status: WriteStatus | None = None
+        if self._metric_writer is not None and self._metric_writer.running:
+            # The writer validates sensors for the whole batch, so the request never touches the pool
+            await self._metric_writer.submit(metric=metric)
+        else:
+            await self._ensure_sensor_exists(sensor_id=sensor_id)
+            write_status = await self._metric_repository.add_metric(metric=metric)
+        if write_status is not WriteStatus.DEDUPLICATED:
+            self._record_writes([metric])
+
+        return MetricCreateResponse(
+            sensor_id=sensor_id, status="data_recorded", timestamp=metric_request.timestamp, write_status=write_status
+        )
+
+    async def record_metrics(
+        self, sensor_id: str, metric_requests: list[MetricCreateRequest]
+    ) -> MetricBatchCreateResponse:
+        await self._ensure_sensor_exists(sensor_id=sensor_id)
+
+        metrics = [
+            Metric(
+                sensor_id=sensor_id,
+                metric_type=metric_request.metric_type,
+                timestamp=metric_request.timestamp,
+                value=metric_request.value,
+            )
+            for metric_request in metric_requests
+        ]
+        accepted = await self._write_metrics(metrics=metrics)
+
+        return MetricBatchCreateResponse(
+            sensor_id=sensor_id, status="data_recorded", accepted=accepted, duplicates=len(metrics) - accepted
+        )
+
+    async def ingest_stream(self, chunks: AsyncIterable[bytes], flush_size: int | None = None) -> MetricIngestSummary:
+        """Ingest newline-delimited JSON metric records, flushing them to storage in bounded chunks."""
+        flush_size = flush_size or INGEST_FLUSH_SIZE
+        summary = MetricIngestSummary()
+        pending: list[tuple[int, Metric]] = []
+
+        async for line_number, line in self._iter_ndjson_lines(chunks):
+            summary.lines = line_number
+            if line is None:
+                self._reject_ingest_line(summary, line_number, f"Line exceeds {MAX_INGEST_LINE_BYTES} bytes")
+                continue
+            if not line.strip():
+                continue
+
+            try:
+                pending.append((line_number, Metric.model_validate_json(line)))
+            except ValidationError as e:
+                self._reject_ingest_line(summary, line_number, self._format_validation_error(e))
+                continue
+
+            if len(pending) >= flush_size:
+                await self._flush_ingest_chunk(pending=pending, summary=summary)
+                pending = []
+
+        await self._flush_ingest_chunk(pending=pending, summary=summary)
+        return summary
 
     async def query_metrics_api(self, query_request: MetricQueryRequest) -> MetricQueryResponse:
         # Auto-complete single dates to create a 31-day window
@@ -39,10 +142,11 @@ class MetricManager:
             start_date=query_request.start_date, end_date=query_request.end_date
         )
 
-        aggregates = await self.query_metrics(
+        statistics = self._distinct_statistics(query_request.statistics)
+        aggregates = await self._query_metrics_cached(
             sensor_ids=query_request.sensor_ids,
             metrics=query_request.metrics,
-            statistic=query_request.statistic,
+            statistics=statistics,
             start_date=start_date,
             end_date=end_date,
         )
@@ -51,75 +155,313 @@ class MetricManager:
         completed_query = MetricQueryRequest(
             sensor_ids=query_request.sensor_ids,
             metrics=query_request.metrics,
-            statistic=query_request.statistic,
+            statistics=statistics,
             start_date=start_date,
             end_date=end_date,
         )
 
-        results = [
-            MetricQueryResult(
-                sensor_id=agg.sensor_id,
-                metric=agg.metric_type,
-                stat=StatisticResult(statistic_type=query_request.statistic, value=agg.value),
+        # Aggregates arrive one per series and statistic; group them per series, keeping the order of both
+        results: dict[tuple[str, MetricType], MetricQueryResult] = {}
+        for agg in aggregates:
+            result = results.get((agg.sensor_id, agg.metric_type))
+            if result is None:
+                result = results[(agg.sensor_id, agg.metric_type)] = MetricQueryResult(
+                    sensor_id=agg.sensor_id, metric=agg.metric_type, stats=[]
+                )
+            result.stats.append(StatisticResult(statistic_type=agg.statistic, value=agg.value))
+
+        return MetricQueryResponse(query=completed_query, results=list(results.values()))
+
+    async def downsample_metrics_api(
+        self, downsample_request: MetricDownsampleRequest
+    ) -> AsyncIterator[MetricSeriesBucket]:
+        """Validate a downsampling request and return its buckets, read from the repository as they are consumed."""
+        try:
+            ZoneInfo(downsample_request.time_zone)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise InvalidQueryError(f"Unknown time zone '{downsample_request.time_zone}'")
+
+        start_date, end_date = self._complete_date_range(
+            start_date=downsample_request.start_date, end_date=downsample_request.end_date
+        )
+        if start_date is None or end_date is None:
+            end_date = datetime.now(timezone.utc)
+            start_date = end_date - timedelta(days=31)
+
+        # An unaligned range touches one bucket more than it spans
+        buckets_per_series = (end_date - start_date) // BUCKET_INTERVALS[downsample_request.bucket] + 1
+        if buckets_per_series > self._max_buckets_per_series:
+            raise InvalidQueryError(
+                f"The range spans {buckets_per_series} buckets of {downsample_request.bucket.value} per series, "
+                f"at most {self._max_buckets_per_series} are allowed; use wider buckets or a shorter range"
             )
-            for agg in aggregates
-        ]
 
-        return MetricQueryResponse(query=completed_query, results=results)
+        return self._iter_series_buckets(
+            downsample_request=downsample_request,
+            statistics=self._distinct_statistics(downsample_request.statistics),
+            start_date=start_date,
+            end_date=end_date,
+        )
+
+    async def export_metrics_api(self, export_request: MetricExportRequest) -> AsyncIterator[Metric]:
+        """Raw readings in (sensor_id, metric_type, timestamp) order, read from the repository as they are consumed.
+
+        Unlike aggregations, no date range is filled in: without dates the whole history is exported.
+        """
+        return self._metric_repository.iter_raw_metrics(
+            sensor_ids=export_request.sensor_ids,
+            metrics=export_request.metrics,
+            start_date=export_request.start_date,
+            end_date=export_request.end_date,
+            after=export_request.after,
+            limit=export_request.limit,
+        )
+
+    async def export_metric_columns_api(self, export_request: MetricExportRequest) -> AsyncIterator[RawMetricColumns]:
+        """Readings of `export_metrics_api` in column batches, for columnar formats."""
+        return self._metric_repository.iter_raw_metric_columns(
+            batch_size=self._export_batch_size,
+            sensor_ids=export_request.sensor_ids,
+            metrics=export_request.metrics,
+            start_date=export_request.start_date,
+            end_date=export_request.end_date,
+            after=export_request.after,
+            limit=export_request.limit,
+        )
+
+    async def get_query_version(self, query_request: MetricQueryRequest) -> MetricQueryVersion:
+        """Validators of a query's result that are known without running it."""
+        start_date, end_date = self._complete_date_range(
+            start_date=query_request.start_date, end_date=query_request.end_date
+        )
+        key = query_key(
+            query_request.sensor_ids,
+            query_request.metrics,
+            self._distinct_statistics(query_request.statistics),
+            start_date,
+            end_date,
+        )
+        if self._write_versions is not None:
+            etag, last_modified = self._write_versions.validators(key)
+            return MetricQueryVersion(end_date=end_date, etag=etag, last_modified=last_modified)
+        cached_etag = self._query_cache.lookup_etag(key) if self._query_cache is not None else None
+        return MetricQueryVersion(end_date=end_date, etag=cached_etag, last_modified=None)
 
     async def query_metrics(
         self,
         sensor_ids: list[str] | None = None,
         metrics: list[MetricType] | None = None,
-        statistic: StatisticType | None = None,
+        statistics: list[StatisticType] | None = None,
         start_date: datetime | None = None,
         end_date: datetime | None = None,
     ) -> list[AggregatedMetricResult]:
-        target_sensor_ids = await self._get_target_sensor_ids(sensor_ids=sensor_ids)
-
+        # Without sensor IDs every sensor is queried; the repository omits the sensor predicate rather than being sent
+        # the whole registry, which every stored reading belongs to
         if start_date is None and end_date is None:
-            if metrics is None or statistic is None:
-                raise ValueError("Metrics and statistic are required for latest metrics query")
+            if not metrics or not statistics:
+                raise ValueError("Metrics and statistics are required for latest metrics query")
             return await self._query_latest_metrics(
-                sensor_ids=target_sensor_ids,
+                sensor_ids=sensor_ids,
                 metrics=metrics,
-                statistic=statistic,
+                statistics=statistics,
             )
 
-        if metrics is None or statistic is None:
-            raise ValueError("Metrics and statistic are required for date range query")
+        if not metrics or not statistics:
+            raise ValueError("Metrics and statistics are required for date range query")
         return await self._metric_repository.query_metrics(
-            statistic=statistic,
-            sensor_ids=target_sensor_ids,
+            statistics=statistics,
+            sensor_ids=sensor_ids,
             metrics=metrics,
             start_date=start_date,
             end_date=end_date,
         )
 
+    async def _query_metrics_cached(
+        self,
+        sensor_ids: list[str] | None,
+        metrics: list[MetricType],
+        statistics: list[StatisticType],
+        start_date: datetime | None,
+        end_date: datetime | None,
+    ) -> list[AggregatedMetricResult]:
+        if self._query_cache is None:
+            return await self.query_metrics(
+                sensor_ids=sensor_ids, metrics=metrics, statistics=statistics, start_date=start_date, end_date=end_date
+            )
+
+        key = query_key(sensor_ids, metrics, statistics, start_date, end_date)
+        cached = self._query_cache.lookup(key)
+        if cached is not None:
+            return cached
+
+        # Versions from before the query, so a write committed while it runs invalidates the result
+        versions = self._query_cache.snapshot(sensor_ids)
+        aggregates = await self.query_metrics(
+            sensor_ids=sensor_ids, metrics=metrics, statistics=statistics, start_date=start_date, end_date=end_date
+        )
+        self._query_cache.store(key, aggregates, versions)
+        return aggregates
+
+    async def _iter_series_buckets(
+        self,
+        downsample_request: MetricDownsampleRequest,
+        statistics: list[StatisticType],
+        start_date: datetime,
+        end_date: datetime,
+    ) -> AsyncIterator[MetricSeriesBucket]:
+        buckets = self._metric_repository.iter_bucketed_metrics(
+            statistics=statistics,
+            bucket_width=downsample_request.bucket,
+            time_zone=downsample_request.time_zone,
+            sensor_ids=downsample_request.sensor_ids,
+            metrics=downsample_request.metrics,
+            start_date=start_date,
+            end_date=end_date,
+        )
+        async for bucket in buckets:
+            yield MetricSeriesBucket(
+                sensor_id=bucket.sensor_id,
+                metric=bucket.metric_type,
+                bucket=bucket.bucket,
+                stats=[
+                    StatisticResult(statistic_type=statistic, value=bucket.values[statistic])
+                    for statistic in statistics
+                ],
+            )
+
     async def _query_latest_metrics(
         self,
-        sensor_ids: list[str],
+        sensor_ids: list[str] | None,
         metrics: list[MetricType],
-        statistic: StatisticType,
+        statistics: list[StatisticType],
     ) -> list[AggregatedMetricResult]:
-        latest_timestamps = await self._metric_repository.get_latest_timestamps(sensor_ids=sensor_ids, metrics=metrics)
+        latest_metrics = await self._metric_repository.get_latest_metrics(sensor_ids=sensor_ids, metrics=metrics)
+        latest_by_series = {(metric.sensor_id, metric.metric_type): metric for metric in latest_metrics}
+        if sensor_ids is None:
+            sensor_ids = sorted({metric.sensor_id for metric in latest_metrics})
 
-        results = []
+        results: list[AggregatedMetricResult] = []
         for sensor_id in sensor_ids:
-            for metric in metrics:
-                latest_timestamp = latest_timestamps.get((sensor_id, metric))
-                if latest_timestamp is not None:
-                    latest_metrics = await self._metric_repository.query_metrics(
+            for metric_type in metrics:
+                latest_metric = latest_by_series.get((sensor_id, metric_type))
+                if latest_metric is None:
+                    continue
+                results.extend(
+                    AggregatedMetricResult(
+                        sensor_id=sensor_id,
+                        metric_type=metric_type,
                         statistic=statistic,
-                        sensor_ids=[sensor_id],
-                        metrics=[metric],
-                        start_date=latest_timestamp,
-                        end_date=latest_timestamp,
+                        value=self._latest_statistic(statistic, latest_metric.value),
                     )
-                    results.extend(latest_metrics)
+                    for statistic in statistics
+                )
 
         return results
 
+    @staticmethod
+    def _latest_statistic(statistic: StatisticType, value: float) -> float | None:
+        # The latest reading is a sample of one: its spread is undefined, every other statistic is the value itself
+        match statistic:
+            case StatisticType.COUNT:
+                return 1.0
+            case StatisticType.STDDEV | StatisticType.VARIANCE:
+                return None
+            case _:
+                return value
+
+        return value
+
+    @staticmethod
+    def _distinct_statistics(statistics: list[StatisticType]) -> list[StatisticType]:
+        return list(dict.fromkeys(statistics))
+
+    async def _ensure_sensor_exists(self, sensor_id: str) -> None:
+        # In foreign key mode the insert itself fails with SensorNotFoundError for an unknown sensor
+        if self._ingest_mode is IngestMode.FOREIGN_KEY:
+            return
+        if not await self._sensor_repository.sensor_exists(sensor_id=sensor_id):
+            raise SensorNotFoundError(f"Sensor with ID '{sensor_id}' not found")
+
+    async def _write_metrics(self, metrics: list[Metric]) -> int:
+        if len(metrics) >= BULK_LOAD_THRESHOLD:
+            accepted = await self._metric_repository.bulk_add_metrics(metrics=metrics)
+        else:
+            accepted = await self._metric_repository.add_metrics(metrics=metrics)
+        if accepted:
+            self._record_writes(metrics)
+        return accepted
+
+    def _record_writes(self, metrics: list[Metric]) -> None:
+        if self._write_versions is not None:
+            self._write_versions.record_writes(metrics)
+        if self._query_cache is not None:
+            self._query_cache.record_writes(metrics)
+
+    async def _iter_ndjson_lines(self, chunks: AsyncIterable[bytes]) -> AsyncIterator[tuple[int, bytes | None]]:
+        """Split a byte stream into numbered lines; lines longer than MAX_INGEST_LINE_BYTES are yielded as None."""
+        buffer = bytearray()
+        line_number = 0
+        oversized = False
+
+        async for chunk in chunks:
+            buffer.extend(chunk)
+            start = 0
+            while (newline := buffer.find(b"\n", start)) != -1:
+                line_number += 1
+                # Complete lines are checked too, so the outcome does not depend on where chunks are split
+                oversized = oversized or newline - start > MAX_INGEST_LINE_BYTES
+                yield line_number, None if oversized else bytes(buffer[start:newline])
+                oversized = False
+                start = newline + 1
+            del buffer[:start]
+
+            # Drop the partial line instead of buffering it without bound
+            if len(buffer) > MAX_INGEST_LINE_BYTES:
+                oversized = True
+                buffer.clear()
+
+        if buffer or oversized:
+            yield line_number + 1, None if oversized else bytes(buffer)
+
+    async def _flush_ingest_chunk(self, pending: list[tuple[int, Metric]], summary: MetricIngestSummary) -> None:
+        if not pending:
+            return
+
+        known_sensor_ids = await self._sensor_repository.get_existing_sensor_ids(
+            sensor_ids=sorted({metric.sensor_id for _, metric in pending})
+        )
+
+        metrics = []
+        for line_number, metric in pending:
+            if metric.sensor_id in known_sensor_ids:
+                metrics.append(metric)
+            else:
+                self._reject_ingest_line(summary, line_number, f"Sensor with ID '{metric.sensor_id}' not found")
+
+        if not metrics:
+            return
+
+        try:
+            accepted = await self._write_metrics(metrics=metrics)
+        except DuplicateMetricError as e:
+            # The chunk was rolled back as a whole, so every line of it is reported
+            for line_number, metric in pending:
+                if metric.sensor_id in known_sensor_ids:
+                    self._reject_ingest_line(summary, line_number, str(e))
+            return
+        summary.accepted += accepted
+        summary.duplicates += len(metrics) - accepted
+
+    def _reject_ingest_line(self, summary: MetricIngestSummary, line_number: int, reason: str) -> None:
+        summary.rejected += 1
+        if len(summary.rejections) < MAX_REPORTED_REJECTIONS:
+            summary.rejections.append(MetricIngestRejection(line=line_number, reason=reason))
+
+    def _format_validation_error(self, error: ValidationError) -> str:
+        return "; ".join(
+            f"{'.'.join(str(part) for part in detail['loc']) or 'record'}: {detail['msg']}" for detail in error.errors()
+        )
+
     def _complete_date_range(
         self, start_date: datetime | None, end_date: datetime | None
     ) -> tuple[datetime | None, datetime | None]:
@@ -149,9 +491,3 @@ class MetricManager:
 
         # This should never happen, but return as-is
         return start_date, end_date
-
-    async def _get_target_sensor_ids(self, sensor_ids: list[str] | None) -> list[str]:
-        if sensor_ids is None:
-            all_sensors = await self._sensor_repository.list_sensors()
-            return [sensor.sensor_id for sensor in all_sensors]
-        return sensor_ids
@@ -0,0 +1,302 @@
+import hashlib
+import secrets
+import sys
+from collections import OrderedDict, deque
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from app.api.models.stats_models import QueryCacheStats
+from app.shared.models import AggregatedMetricResult, Metric, MetricType, StatisticType
+
+# Writes remembered per sensor; an entry older than that many writes to one of its sensors is recomputed
+WRITE_HISTORY = 16
+# Version key of queries over all sensors, bumped by every write
+ALL_SENSORS = None
+
+QueryKey = tuple[
+    tuple[str, ...] | None, tuple[MetricType, ...], tuple[StatisticType, ...], datetime | None, datetime | None
+]
+CachedResult = tuple[str, MetricType, StatisticType, float | None]
+
+
+def _normalize(timestamp: datetime | None) -> datetime | None:
+    if timestamp is None or timestamp.tzinfo is None:
+        return timestamp
+    return timestamp.astimezone(timezone.utc)
+
+
+def query_key(
+    sensor_ids: Sequence[str] | None,
+    metrics: Sequence[MetricType],
+    statistics: Sequence[StatisticType],
+    start_date: datetime | None,
+    end_date: datetime | None,
+) -> QueryKey:
+    """Cache key of a query whose date range has been completed; equal instants in any time zone share a key."""
+    return (
+        tuple(sensor_ids) if sensor_ids is not None else None,
+        tuple(metrics),
+        tuple(statistics),
+        _normalize(start_date),
+        _normalize(end_date),
+    )
+
+
+def results_etag(results: Iterable[CachedResult]) -> str:
+    """Strong ETag of query results; equal results give equal tags, however often they are recomputed."""
+    digest = hashlib.blake2b(digest_size=16)
+    for sensor_id, metric_type, statistic, value in results:
+        digest.update(f"{sensor_id}\x1f{metric_type.value}\x1f{statistic.value}\x1f{value!r}\x1e".encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def _touches(earliest: datetime | None, end_date: datetime | None) -> bool:
+    """Whether a write whose earliest reading is `earliest` can change a result ending at `end_date`."""
+    if earliest is None or end_date is None:
+        return True
+    if (earliest.tzinfo is None) != (end_date.tzinfo is None):
+        return True
+    return earliest <= end_date
+
+
+class _SensorWrites:
+    __slots__ = ("version", "recent")
+
+    def __init__(self) -> None:
+        self.version = 0
+        # (version, earliest timestamp written, time of the write) of the last writes; the earliest timestamp is
+        # None when the write could not be placed in time
+        self.recent: deque[tuple[int, datetime | None, datetime]] = deque(maxlen=WRITE_HISTORY)
+
+
+class MetricWriteVersions:
+    """Version counters of the readings written through this process, per sensor.
+
+    Every write bumps the version of its sensor, remembering the earliest timestamp it wrote, so a query's
+    validators only change when a write reaches into its date range. They are known without running the query,
+    which lets a matching `If-None-Match` be answered before touching the database.
+
+    Tags include a token drawn when the process starts and a generation bumped by `expire`, so tags of an earlier
+    run never match. Writes made by another process are not seen.
+    """
+
+    def __init__(self) -> None:
+        self._writes: dict[str | None, _SensorWrites] = {}
+        self._token = secrets.token_hex(8)
+        self._generation = 0
+        # Nothing is known about changes made before this
+        self._expired_at = datetime.now(timezone.utc)
+
+    def snapshot(self, sensor_ids: Sequence[str] | None) -> dict[str | None, int]:
+        """Current versions of the sensors of a query; take it before running the query whose result is kept."""
+        keys: Iterable[str | None] = sensor_ids if sensor_ids is not None else [ALL_SENSORS]
+        return {key: self._writes[key].version if key in self._writes else 0 for key in keys}
+
+    def unchanged_since(self, versions: dict[str | None, int], end_date: datetime | None) -> bool:
+        """Whether no write since `versions` reached a range ending at `end_date`; if so `versions` is advanced."""
+        for key, version in versions.items():
+            writes = self._writes.get(key)
+            if writes is None or writes.version == version:
+                continue
+            # Writes older than the remembered history cannot be placed in time
+            if writes.recent[0][0] > version + 1:
+                return False
+            if any(_touches(earliest, end_date) for written, earliest, _ in writes.recent if written > version):
+                return False
+            versions[key] = writes.version
+        return True
+
+    def validators(self, key: QueryKey) -> tuple[str, datetime]:
+        """ETag and Last-Modified of the result of a query whose date range has been completed."""
+        sensor_keys: Iterable[str | None] = key[0] if key[0] is not None else [ALL_SENSORS]
+        last_modified = self._expired_at
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{self._token}\x1f{self._generation}\x1f{key!r}\x1e".encode())
+        for sensor_key in sensor_keys:
+            version, written_at = self._last_change(sensor_key, end_date=key[4])
+            digest.update(f"{version}\x1e".encode())
+            if written_at is not None:
+                last_modified = max(last_modified, written_at)
+        return f'"{digest.hexdigest()}"', last_modified
+
+    def record_writes(self, metrics: Iterable[Metric]) -> None:
+        """Bump the versions of the sensors written to, after the write has committed."""
+        earliest: dict[str, datetime | None] = {}
+        for metric in metrics:
+            timestamp = metric.timestamp if metric.timestamp.tzinfo is not None else None
+            if metric.sensor_id not in earliest:
+                earliest[metric.sensor_id] = timestamp
+            else:
+                current = earliest[metric.sensor_id]
+                earliest[metric.sensor_id] = None if current is None or timestamp is None else min(current, timestamp)
+        if not earliest:
+            return
+
+        written_at = datetime.now(timezone.utc)
+        for sensor_id, timestamp in earliest.items():
+            self._bump(sensor_id, timestamp, written_at)
+        timestamps = list(earliest.values())
+        self._bump(ALL_SENSORS, None if None in timestamps else min(t for t in timestamps if t is not None), written_at)
+
+    def expire(self) -> None:
+        """Change every tag, e.g. after expired readings were deleted."""
+        self._generation += 1
+        self._expired_at = datetime.now(timezone.utc)
+
+    def _bump(self, key: str | None, earliest: datetime | None, written_at: datetime) -> None:
+        writes = self._writes.get(key)
+        if writes is None:
+            writes = self._writes[key] = _SensorWrites()
+        writes.version += 1
+        writes.recent.append((writes.version, earliest, written_at))
+
+    def _last_change(self, key: str | None, end_date: datetime | None) -> tuple[int, datetime | None]:
+        """Version and time of the last write that reached a range ending at `end_date`.
+
+        Once that write has left the history, the version just before the oldest remembered write stands in for
+        it; it only ever grows, so the tag still changes with every write that reaches the range.
+        """
+        writes = self._writes.get(key)
+        if writes is None:
+            return 0, None
+        for version, earliest, written_at in reversed(writes.recent):
+            if _touches(earliest, end_date):
+                return version, written_at
+        oldest_version, _, oldest_written_at = writes.recent[0]
+        if oldest_version == 1:
+            return 0, None
+        return oldest_version - 1, oldest_written_at
+
+
+@dataclass
+class _CacheEntry:
+    results: tuple[CachedResult, ...]
+    versions: dict[str | None, int]
+    size: int
+    etag: str
+
+
+class QueryResultCache:
+    """Process-wide LRU cache of aggregation query results, at most `max_entries` of them.
+
+    Writes are tracked by versions of its own, like `MetricWriteVersions` does for the query validators. A cached
+    result is served as long as no write since it was computed reached into its date range, so historical ranges
+    stay cached while live data keeps arriving, and a range touched by a write is recomputed.
+
+    Only writes made through this process are seen; readings imported by another process, or expired by
+    `scripts/apply_retention.py`, are not.
+    """
+
+    def __init__(self, max_entries: int = 1000) -> None:
+        self._max_entries = max_entries
+        self._entries: OrderedDict[QueryKey, _CacheEntry] = OrderedDict()
+        self._writes = MetricWriteVersions()
+        self._size = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._evictions = 0
+
+    def snapshot(self, sensor_ids: Sequence[str] | None) -> dict[str | None, int]:
+        """Current versions of the sensors of a query; take it before running the query whose result is stored."""
+        return self._writes.snapshot(sensor_ids)
+
+    def lookup(self, key: QueryKey) -> list[AggregatedMetricResult] | None:
+        entry = self._current_entry(key)
+        if entry is None:
+            return None
+        return [
+            AggregatedMetricResult(sensor_id=sensor_id, metric_type=metric_type, statistic=statistic, value=value)
+            for sensor_id, metric_type, statistic, value in entry.results
+        ]
+
+    def lookup_etag(self, key: QueryKey) -> str | None:
+        """ETag of the cached result of a query, without building the result."""
+        entry = self._current_entry(key)
+        return entry.etag if entry is not None else None
+
+    def store(self, key: QueryKey, results: Sequence[AggregatedMetricResult], versions: dict[str | None, int]) -> None:
+        cached = tuple((result.sensor_id, result.metric_type, result.statistic, result.value) for result in results)
+        size = (
+            sys.getsizeof(cached)
+            + sum(sys.getsizeof(result) + sys.getsizeof(result[0]) + sys.getsizeof(result[3]) for result in cached)
+            + sum(sys.getsizeof(sensor_id) for sensor_id in key[0] or ())
+        )
+        self._discard(key)
+        self._entries[key] = _CacheEntry(results=cached, versions=dict(versions), size=size, etag=results_etag(cached))
+        self._size += size
+
+        while len(self._entries) > self._max_entries:
+            oldest = next(iter(self._entries))
+            self._discard(oldest)
+            self._evictions += 1
+
+    def record_writes(self, metrics: Iterable[Metric]) -> None:
+        """Bump the versions of the sensors written to, after the write has committed."""
+        self._writes.record_writes(metrics)
+
+    def clear(self) -> None:
+        """Drop every entry, e.g. after expired readings were deleted."""
+        self._invalidations += len(self._entries)
+        self._entries.clear()
+        self._size = 0
+
+    def get_stats(self) -> QueryCacheStats:
+        lookups = self._hits + self._misses
+        return QueryCacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            invalidations=self._invalidations,
+            evictions=self._evictions,
+            size=len(self._entries),
+            estimated_bytes=self._size,
+            hit_rate=self._hits / lookups if lookups else 0.0,
+        )
+
+    def _current_entry(self, key: QueryKey) -> _CacheEntry | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+        if not self._writes.unchanged_since(entry.versions, end_date=key[4]):
+            self._discard(key)
+            self._invalidations += 1
+            self._misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return entry
+
+    def _discard(self, key: QueryKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry.size
+
+
+class MetricWriteVersionsManager:
+    def __init__(self) -> None:
+        self._versions: MetricWriteVersions | None = None
+
+    def get_versions(self) -> MetricWriteVersions:
+        if self._versions is None:
+            self._versions = MetricWriteVersions()
+        return self._versions
+
+    def reset(self) -> None:
+        self._versions = None
+
+
+class QueryResultCacheManager:
+    def __init__(self) -> None:
+        self._cache: QueryResultCache | None = None
+
+    def get_cache(self, max_entries: int) -> QueryResultCache:
+        if self._cache is None:
+            self._cache = QueryResultCache(max_entries=max_entries)
+        return self._cache
+
+    def reset(self) -> None:
+        self._cache = None
@@ -0,0 +1,157 @@
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+
+from app.api.models.stats_models import SensorCacheStats
+from app.shared.models import Sensor, SensorRegistryVersion
+from app.storage.interfaces.sensor_repository import SensorRepository
+
+
+class SensorRegistryCache:
+    """Process-wide record of which sensor IDs exist.
+
+    Known sensors are kept for `ttl_seconds` with LRU eviction beyond `max_entries`. Unknown IDs are remembered
+    for the much shorter `negative_ttl_seconds`, so a sensor registered by another process is picked up quickly.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        ttl_seconds: float = 300.0,
+        negative_ttl_seconds: float = 5.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._max_entries = max_entries
+        self._ttl = ttl_seconds
+        self._negative_ttl = negative_ttl_seconds
+        self._clock = clock
+        self._present: OrderedDict[str, float] = OrderedDict()
+        self._missing: OrderedDict[str, float] = OrderedDict()
+
+        self._hits = 0
+        self._negative_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def lookup(self, sensor_id: str) -> bool | None:
+        """Return whether the sensor exists, or None when the cache cannot tell."""
+        now = self._clock()
+        for entries, exists in ((self._present, True), (self._missing, False)):
+            expires_at = entries.get(sensor_id)
+            if expires_at is None:
+                continue
+            if expires_at <= now:
+                del entries[sensor_id]
+                continue
+
+            entries.move_to_end(sensor_id)
+            if exists:
+                self._hits += 1
+            else:
+                self._negative_hits += 1
+            return exists
+
+        self._misses += 1
+        return None
+
+    def store(self, sensor_ids: set[str], exists: bool) -> None:
+        entries, stale, ttl = (
+            (self._present, self._missing, self._ttl) if exists else (self._missing, self._present, self._negative_ttl)
+        )
+        expires_at = self._clock() + ttl
+        for sensor_id in sensor_ids:
+            stale.pop(sensor_id, None)
+            entries[sensor_id] = expires_at
+            entries.move_to_end(sensor_id)
+
+        while len(entries) > self._max_entries:
+            entries.popitem(last=False)
+            self._evictions += 1
+
+    def invalidate(self, sensor_id: str) -> None:
+        self._present.pop(sensor_id, None)
+        self._missing.pop(sensor_id, None)
+
+    def clear(self) -> None:
+        self._present.clear()
+        self._missing.clear()
+
+    def get_stats(self) -> SensorCacheStats:
+        lookups = self._hits + self._negative_hits + self._misses
+        return SensorCacheStats(
+            hits=self._hits,
+            negative_hits=self._negative_hits,
+            misses=self._misses,
+            evictions=self._evictions,
+            size=len(self._present),
+            negative_size=len(self._missing),
+            hit_rate=(self._hits + self._negative_hits) / lookups if lookups else 0.0,
+        )
+
+
+class CachedSensorRepository(SensorRepository):
+    """SensorRepository decorator answering existence checks from a shared SensorRegistryCache."""
+
+    def __init__(self, sensor_repository: SensorRepository, cache: SensorRegistryCache) -> None:
+        self._sensor_repository = sensor_repository
+        self._cache = cache
+
+    async def add_sensor(self, sensor: Sensor) -> Sensor:
+        # Drop a cached "unknown" verdict even if the insert fails, the next lookup goes to the database
+        self._cache.invalidate(sensor.sensor_id)
+        created_sensor = await self._sensor_repository.add_sensor(sensor=sensor)
+        self._cache.store({created_sensor.sensor_id}, exists=True)
+        return created_sensor
+
+    async def list_sensors(
+        self, sensor_type: str | None = None, after: str | None = None, limit: int | None = None
+    ) -> list[Sensor]:
+        return await self._sensor_repository.list_sensors(sensor_type=sensor_type, after=after, limit=limit)
+
+    async def sensor_exists(self, sensor_id: str) -> bool:
+        cached = self._cache.lookup(sensor_id)
+        if cached is not None:
+            return cached
+
+        exists = await self._sensor_repository.sensor_exists(sensor_id=sensor_id)
+        self._cache.store({sensor_id}, exists=exists)
+        return exists
+
+    async def get_sensor(self, sensor_id: str) -> Sensor | None:
+        return await self._sensor_repository.get_sensor(sensor_id=sensor_id)
+
+    async def get_existing_sensor_ids(self, sensor_ids: list[str]) -> set[str]:
+        existing: set[str] = set()
+        unresolved: list[str] = []
+        for sensor_id in sensor_ids:
+            cached = self._cache.lookup(sensor_id)
+            if cached is None:
+                unresolved.append(sensor_id)
+            elif cached:
+                existing.add(sensor_id)
+
+        if unresolved:
+            found = await self._sensor_repository.get_existing_sensor_ids(sensor_ids=unresolved)
+            self._cache.store(found, exists=True)
+            self._cache.store(set(unresolved) - found, exists=False)
+            existing |= found
+
+        return existing
+
+    async def get_sensors_version(self) -> SensorRegistryVersion:
+        return await self._sensor_repository.get_sensors_version()
+
+
+class SensorRegistryCacheManager:
+    def __init__(self) -> None:
+        self._cache: SensorRegistryCache | None = None
+
+    def get_cache(self, max_entries: int, ttl_seconds: float, negative_ttl_seconds: float) -> SensorRegistryCache:
+        if self._cache is None:
+            self._cache = SensorRegistryCache(
+                max_entries=max_entries, ttl_seconds=ttl_seconds, negative_ttl_seconds=negative_ttl_seconds
+            )
+        return self._cache
+
+    def reset(self) -> None:
+        self._cache = None
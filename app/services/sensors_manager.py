@@ -2,7 +2,7 @@ import uuid
 from datetime import datetime, timezone
 
 from app.api.models.sensor_models import SensorCreateRequest, SensorCreateResponse, SensorListResponse
-from app.shared.models import Sensor
+from app.shared.models import Sensor, SensorRegistryVersion
 from app.storage.interfaces.sensor_repository import SensorRepository
 
 
@@ -23,8 +23,10 @@ class SensorManager:
             created_at=created_sensor.created_at,
         )
 
-    async def list_sensors(self) -> list[SensorListResponse]:
-        business_sensors = await self._sensor_repository.list_sensors()
+    async def list_sensors(
+        self, sensor_type: str | None = None, after: str | None = None, limit: int | None = None
+    ) -> list[SensorListResponse]:
+        business_sensors = await self._sensor_repository.list_sensors(sensor_type=sensor_type, after=after, limit=limit)
         return [
             SensorListResponse(
                 sensor_id=sensor.sensor_id,
@@ -39,3 +41,6 @@ class SensorManager:
 
     async def get_sensor(self, sensor_id: str) -> Sensor | None:
         return await self._sensor_repository.get_sensor(sensor_id=sensor_id)
+
+    async def get_sensors_version(self) -> SensorRegistryVersion:
+        return await self._sensor_repository.get_sensors_version()
@@ -6,9 +6,17 @@ class SensorNotFoundError(SensorMetricsError):
     pass
 
 
+class DuplicateMetricError(SensorMetricsError):
+    pass
+
+
 class DatabaseError(SensorMetricsError):
     pass
 
 
 class ValidationError(SensorMetricsError):
     pass
+
+
+class InvalidQueryError(ValidationError):
+    pass
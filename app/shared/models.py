@@ -1,5 +1,7 @@
-from datetime import datetime
+from collections.abc import Sequence
+from datetime import datetime, timedelta
 from enum import Enum
+from typing import NamedTuple
 
 from pydantic import BaseModel, Field
 
@@ -14,6 +16,69 @@ class StatisticType(str, Enum):
     MAX = "max"
     AVG = "avg"
     SUM = "sum"
+    COUNT = "count"
+    # Sample statistics, undefined for a single reading
+    STDDEV = "stddev"
+    VARIANCE = "variance"
+    # Values of the earliest and latest reading
+    FIRST = "first"
+    LAST = "last"
+    # Quantiles, estimated from mergeable sketches
+    P50 = "p50"
+    P90 = "p90"
+    P95 = "p95"
+    P99 = "p99"
+
+
+class BucketWidth(str, Enum):
+    """Width of the time buckets of a downsampled series."""
+
+    ONE_MINUTE = "1m"
+    FIVE_MINUTES = "5m"
+    ONE_HOUR = "1h"
+    ONE_DAY = "1d"
+
+
+# Nominal bucket lengths; a local day is 23 or 25 hours long across a daylight saving change
+BUCKET_INTERVALS = {
+    BucketWidth.ONE_MINUTE: timedelta(minutes=1),
+    BucketWidth.FIVE_MINUTES: timedelta(minutes=5),
+    BucketWidth.ONE_HOUR: timedelta(hours=1),
+    BucketWidth.ONE_DAY: timedelta(days=1),
+}
+
+
+class DuplicatePolicy(str, Enum):
+    """How a reading whose (sensor_id, metric_type, timestamp) is already stored is handled."""
+
+    KEEP_FIRST = "keep_first"
+    KEEP_LAST = "keep_last"
+    REJECT = "reject"
+
+
+class IngestMode(str, Enum):
+    """How the existence of a metric's sensor is validated on write."""
+
+    PRECHECK = "precheck"
+    FOREIGN_KEY = "foreign_key"
+
+
+class PartitionInterval(str, Enum):
+    DAY = "day"
+    MONTH = "month"
+
+
+class StorageBackend(str, Enum):
+    """Where sensors and metrics are stored; the in-memory engine keeps nothing across restarts."""
+
+    POSTGRESQL = "postgresql"
+    MEMORY = "memory"
+
+
+class WriteStatus(str, Enum):
+    INSERTED = "inserted"
+    DEDUPLICATED = "deduplicated"
+    OVERWRITTEN = "overwritten"
 
 
 class Sensor(BaseModel):
@@ -22,6 +87,13 @@ class Sensor(BaseModel):
     created_at: datetime
 
 
+class SensorRegistryVersion(BaseModel):
+    """Validator of the sensor table; sensors are never updated or deleted, so count and newest creation suffice."""
+
+    sensor_count: int
+    last_created_at: datetime | None
+
+
 class Metric(BaseModel):
     sensor_id: str = Field(..., min_length=1, max_length=255, description="Sensor identifier")
     metric_type: MetricType
@@ -33,4 +105,55 @@ class AggregatedMetricResult(BaseModel):
     sensor_id: str = Field(..., min_length=1, max_length=255, description="Sensor identifier")
     metric_type: MetricType
     statistic: StatisticType
-    value: float = Field(..., description="Aggregated metric value")
+    value: float | None = Field(..., description="Aggregated metric value; none when undefined for the readings")
+
+
+# Statistics that follow from count, sum, min and max, and so from merged summaries and rollups
+SUMMARY_STATISTICS = frozenset(
+    {StatisticType.MIN, StatisticType.MAX, StatisticType.AVG, StatisticType.SUM, StatisticType.COUNT}
+)
+
+
+class MetricBucket(BaseModel):
+    """Statistics of one series over one time bucket."""
+
+    sensor_id: str
+    metric_type: MetricType
+    bucket: datetime = Field(..., description="Start of the bucket, in the time zone the buckets are aligned to")
+    values: dict[StatisticType, float | None]
+
+
+class RawMetricKey(NamedTuple):
+    """Key of a stored reading; raw listings are ordered, and paged, by it."""
+
+    sensor_id: str
+    metric_type: MetricType
+    timestamp: datetime
+
+
+class RawMetricColumns(NamedTuple):
+    """A batch of raw readings as parallel columns, read without building a model per reading."""
+
+    sensor_ids: Sequence[str]
+    metric_types: Sequence[str]
+    timestamps: Sequence[int]  # Microseconds since the Unix epoch
+    values: Sequence[float]
+
+
+QUANTILE_STATISTICS = {
+    StatisticType.P50: 0.5,
+    StatisticType.P90: 0.9,
+    StatisticType.P95: 0.95,
+    StatisticType.P99: 0.99,
+}
+
+
+class MetricSummary(BaseModel):
+    """Count, sum, min and max of a series over a time range; summaries of adjacent ranges can be merged."""
+
+    sensor_id: str
+    metric_type: MetricType
+    value_count: int
+    value_sum: float
+    value_min: float
+    value_max: float
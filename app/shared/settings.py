@@ -0,0 +1,135 @@
+import os
+
+from pydantic import BaseModel
+
+from app.shared.models import DuplicatePolicy, IngestMode, MetricType, PartitionInterval, StorageBackend
+
+
+def _get_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _get_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return default if value is None else int(value)
+
+
+def _get_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return default if value is None else float(value)
+
+
+def _get_optional_int(name: str) -> int | None:
+    value = os.getenv(name)
+    return None if value is None or not value.strip() else int(value)
+
+
+def _get_days_by_metric(name: str) -> dict[MetricType, int]:
+    # e.g. "humidity=30,temperature=365"
+    value = os.getenv(name, "")
+    days_by_metric = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        metric_type, days = entry.split("=")
+        days_by_metric[MetricType(metric_type.strip())] = int(days)
+    return days_by_metric
+
+
+class Settings(BaseModel):
+    storage_backend: StorageBackend = StorageBackend.POSTGRESQL
+    group_commit_enabled: bool = False
+    group_commit_max_batch_size: int = 500
+    group_commit_max_delay_ms: float = 5.0
+    duplicate_policy: DuplicatePolicy = DuplicatePolicy.KEEP_FIRST
+    ingest_mode: IngestMode = IngestMode.PRECHECK
+    partition_interval: PartitionInterval = PartitionInterval.MONTH
+    partition_premake: int = 3
+    retention_days: int | None = None
+    retention_days_by_metric: dict[MetricType, int] = {}
+    retention_delete_batch_size: int = 10_000
+    maintenance_enabled: bool = False
+    maintenance_interval_seconds: float = 3600.0
+    rollups_enabled: bool = False
+    rollup_refresh_interval_seconds: float = 10.0
+    rollup_refresh_batch_size: int = 10_000
+    sensor_latest_enabled: bool = False
+    hot_tier_enabled: bool = False
+    hot_tier_window_seconds: float = 21600.0
+    hot_tier_max_series: int = 10_000
+    hot_tier_max_points_per_series: int = 1440
+    query_cache_enabled: bool = False
+    query_cache_max_entries: int = 1000
+    query_versions_enabled: bool = False
+    query_final_after_seconds: float = 86400.0
+    query_final_max_age_seconds: int = 86400
+    downsample_max_buckets: int = 10_000
+    stream_fetch_size: int = 5000
+    export_batch_size: int = 65_536
+    sensor_cache_enabled: bool = True
+    sensor_cache_max_entries: int = 10_000
+    sensor_cache_ttl_seconds: float = 300.0
+    sensor_cache_negative_ttl_seconds: float = 5.0
+
+
+def load_settings() -> Settings:
+    return Settings(
+        storage_backend=StorageBackend(os.getenv("STORAGE_BACKEND", StorageBackend.POSTGRESQL.value)),
+        group_commit_enabled=_get_bool("METRIC_GROUP_COMMIT_ENABLED", False),
+        group_commit_max_batch_size=_get_int("METRIC_GROUP_COMMIT_MAX_BATCH_SIZE", 500),
+        group_commit_max_delay_ms=_get_float("METRIC_GROUP_COMMIT_MAX_DELAY_MS", 5.0),
+        duplicate_policy=DuplicatePolicy(os.getenv("METRIC_DUPLICATE_POLICY", DuplicatePolicy.KEEP_FIRST.value)),
+        ingest_mode=IngestMode(os.getenv("METRIC_INGEST_MODE", IngestMode.PRECHECK.value)),
+        partition_interval=PartitionInterval(os.getenv("METRIC_PARTITION_INTERVAL", PartitionInterval.MONTH.value)),
+        partition_premake=_get_int("METRIC_PARTITION_PREMAKE", 3),
+        retention_days=_get_optional_int("METRIC_RETENTION_DAYS"),
+        retention_days_by_metric=_get_days_by_metric("METRIC_RETENTION_DAYS_BY_METRIC"),
+        retention_delete_batch_size=_get_int("METRIC_RETENTION_DELETE_BATCH_SIZE", 10_000),
+        maintenance_enabled=_get_bool("METRIC_MAINTENANCE_ENABLED", False),
+        maintenance_interval_seconds=_get_float("METRIC_MAINTENANCE_INTERVAL_SECONDS", 3600.0),
+        rollups_enabled=_get_bool("METRIC_ROLLUPS_ENABLED", False),
+        rollup_refresh_interval_seconds=_get_float("METRIC_ROLLUP_REFRESH_INTERVAL_SECONDS", 10.0),
+        rollup_refresh_batch_size=_get_int("METRIC_ROLLUP_REFRESH_BATCH_SIZE", 10_000),
+        sensor_latest_enabled=_get_bool("METRIC_SENSOR_LATEST_ENABLED", False),
+        hot_tier_enabled=_get_bool("METRIC_HOT_TIER_ENABLED", False),
+        hot_tier_window_seconds=_get_float("METRIC_HOT_TIER_WINDOW_SECONDS", 21600.0),
+        hot_tier_max_series=_get_int("METRIC_HOT_TIER_MAX_SERIES", 10_000),
+        hot_tier_max_points_per_series=_get_int("METRIC_HOT_TIER_MAX_POINTS_PER_SERIES", 1440),
+        query_cache_enabled=_get_bool("METRIC_QUERY_CACHE_ENABLED", False),
+        query_cache_max_entries=_get_int("METRIC_QUERY_CACHE_MAX_ENTRIES", 1000),
+        query_versions_enabled=_get_bool("METRIC_QUERY_VERSIONS_ENABLED", False),
+        query_final_after_seconds=_get_float("METRIC_QUERY_FINAL_AFTER_SECONDS", 86400.0),
+        query_final_max_age_seconds=_get_int("METRIC_QUERY_FINAL_MAX_AGE_SECONDS", 86400),
+        downsample_max_buckets=_get_int("METRIC_DOWNSAMPLE_MAX_BUCKETS", 10_000),
+        stream_fetch_size=_get_int("METRIC_STREAM_FETCH_SIZE", 5000),
+        export_batch_size=_get_int("METRIC_EXPORT_BATCH_SIZE", 65_536),
+        sensor_cache_enabled=_get_bool("SENSOR_CACHE_ENABLED", True),
+        sensor_cache_max_entries=_get_int("SENSOR_CACHE_MAX_ENTRIES", 10_000),
+        sensor_cache_ttl_seconds=_get_float("SENSOR_CACHE_TTL_SECONDS", 300.0),
+        sensor_cache_negative_ttl_seconds=_get_float("SENSOR_CACHE_NEGATIVE_TTL_SECONDS", 5.0),
+    )
+
+
+class SettingsManager:
+    def __init__(self) -> None:
+        self._settings: Settings | None = None
+
+    def get_settings(self) -> Settings:
+        if self._settings is None:
+            self._settings = load_settings()
+        return self._settings
+
+    def reset(self) -> None:
+        self._settings = None
+
+
+_settings_manager = SettingsManager()
+
+
+def get_settings() -> Settings:
+    return _settings_manager.get_settings()
+
+
+def reset_settings() -> None:
+    _settings_manager.reset()
@@ -1,7 +1,20 @@
 from datetime import datetime, timezone
 
-from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, PrimaryKeyConstraint, String
-from sqlalchemy.dialects.postgresql import ENUM
+from sqlalchemy import (
+    DDL,
+    BigInteger,
+    CheckConstraint,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    PrimaryKeyConstraint,
+    SmallInteger,
+    String,
+    event,
+)
+from sqlalchemy.dialects.postgresql import ENUM, JSONB
 from sqlalchemy.orm import relationship
 
 from app.storage.database_config import Base
@@ -14,10 +27,32 @@ class SensorModel(Base):
     sensor_type = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
 
+    # Pages of one sensor type are read in sensor_id order, like unfiltered pages are from the primary key
+    __table_args__ = (Index("idx_sensors_type_id", "sensor_type", "sensor_id"),)
+
     # Relationship to metrics
     metrics = relationship("MetricModel", back_populates="sensor")
 
 
+class SensorRegistryVersionModel(Base):
+    """Single row validating the sensors table, bumped in the transaction of every sensor registration."""
+
+    __tablename__ = "sensor_registry_version"
+
+    singleton = Column(SmallInteger, primary_key=True, default=1)
+    sensor_count = Column(BigInteger, nullable=False)
+    last_created_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (CheckConstraint("singleton = 1", name="sensor_registry_version_single_row"),)
+
+
+event.listen(
+    SensorRegistryVersionModel.__table__,
+    "after_create",
+    DDL("INSERT INTO sensor_registry_version (singleton, sensor_count) VALUES (1, 0)"),  # type: ignore[no-untyped-call]
+)
+
+
 class MetricModel(Base):
     __tablename__ = "metrics"
 
@@ -26,19 +61,69 @@ class MetricModel(Base):
     timestamp = Column(DateTime(timezone=True), nullable=False)
     value = Column(Float, nullable=False)
 
-    # Composite primary key
     __table_args__ = (
-        PrimaryKeyConstraint("sensor_id", "metric_type", "timestamp"),
-        # Indexes for common query patterns
-        Index("idx_metrics_sensor_id", "sensor_id"),
-        Index("idx_metrics_metric_type", "metric_type"),
-        Index("idx_metrics_timestamp", "timestamp"),
-        Index("idx_metrics_sensor_metric", "sensor_id", "metric_type"),
-        Index("idx_metrics_sensor_timestamp", "sensor_id", "timestamp"),
-        Index("idx_metrics_metric_timestamp", "metric_type", "timestamp"),
-        # Composite index for common aggregation queries
-        Index("idx_metrics_aggregation", "sensor_id", "metric_type", "timestamp"),
+        # The primary key carries the value, so per-sensor aggregations are answered by index-only scans
+        PrimaryKeyConstraint("sensor_id", "metric_type", "timestamp", postgresql_include=["value"]),
+        # Rows arrive roughly in time order, a BRIN index serves cross-sensor time ranges at a fraction of a B-tree
+        Index("idx_metrics_timestamp_brin", "timestamp", postgresql_using="brin"),
+        # Time ranges are created ahead by MetricPartitionManager, the default partition catches everything else
+        {"postgresql_partition_by": "RANGE (timestamp)"},
     )
 
     # Relationship to sensor
     sensor = relationship("SensorModel", back_populates="metrics")
+
+
+event.listen(
+    MetricModel.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS metrics_default PARTITION OF metrics DEFAULT"),  # type: ignore[no-untyped-call]
+)
+
+
+class _MetricRollupColumns:
+    sensor_id = Column(String, primary_key=True)
+    metric_type = Column(ENUM("temperature", "humidity", name="metric_type_enum"), primary_key=True)  # type: ignore
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    value_count = Column(BigInteger, nullable=False)
+    value_sum = Column(Float, nullable=False)
+    value_min = Column(Float, nullable=False)
+    value_max = Column(Float, nullable=False)
+    # Reading counts per quantile sketch bin, see app/storage/quantile_sketch.py
+    value_sketch = Column(JSONB, nullable=False, server_default="{}")
+
+
+class MetricRollup1mModel(_MetricRollupColumns, Base):
+    __tablename__ = "metric_rollups_1m"
+    __table_args__ = (Index("idx_metric_rollups_1m_bucket_brin", "bucket", postgresql_using="brin"),)
+
+
+class MetricRollup1hModel(_MetricRollupColumns, Base):
+    __tablename__ = "metric_rollups_1h"
+    __table_args__ = (Index("idx_metric_rollups_1h_bucket_brin", "bucket", postgresql_using="brin"),)
+
+
+class MetricRollup1dModel(_MetricRollupColumns, Base):
+    __tablename__ = "metric_rollups_1d"
+    __table_args__ = (Index("idx_metric_rollups_1d_bucket_brin", "bucket", postgresql_using="brin"),)
+
+
+class MetricRollupDirtyModel(Base):
+    """Minute buckets whose rollups are out of date with the metrics table."""
+
+    __tablename__ = "metric_rollup_dirty"
+
+    sensor_id = Column(String, primary_key=True)
+    metric_type = Column(ENUM("temperature", "humidity", name="metric_type_enum"), primary_key=True)  # type: ignore
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+
+
+class SensorLatestModel(Base):
+    """The newest reading of each series, kept up to date by the metric writes."""
+
+    __tablename__ = "sensor_latest"
+
+    sensor_id = Column(String, primary_key=True)
+    metric_type = Column(ENUM("temperature", "humidity", name="metric_type_enum"), primary_key=True)  # type: ignore
+    timestamp = Column(DateTime(timezone=True), nullable=False)
+    value = Column(Float, nullable=False)
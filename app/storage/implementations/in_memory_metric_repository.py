@@ -0,0 +1,333 @@
+from collections.abc import AsyncIterator, Iterator, Sequence
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import numpy.typing as npt
+
+from app.shared.exceptions import DuplicateMetricError, SensorNotFoundError
+from app.shared.models import (
+    BUCKET_INTERVALS,
+    AggregatedMetricResult,
+    BucketWidth,
+    DuplicatePolicy,
+    Metric,
+    MetricBucket,
+    MetricSummary,
+    MetricType,
+    RawMetricColumns,
+    RawMetricKey,
+    StatisticType,
+    WriteStatus,
+)
+from app.storage.in_memory_store import (
+    TIMESTAMP_RESOLUTION,
+    InMemoryStore,
+    MetricSeries,
+    SeriesKey,
+    from_micros,
+    to_micros,
+)
+from app.storage.interfaces.metric_repository import MetricRepository
+from app.storage.metric_batch import MetricBatch, ReadingGroups
+
+# Declaration order, which is also the order of the PostgreSQL enum and so of the metrics primary key
+METRIC_CODES = {metric_type: code for code, metric_type in enumerate(MetricType)}
+# Origin of fixed-width buckets, as in the PostgreSQL repository: a local midnight
+BUCKET_ORIGIN = datetime(2000, 1, 1)
+
+SeriesSlice = tuple[SeriesKey, npt.NDArray[np.int64], npt.NDArray[np.float64]]
+
+
+def _concatenate(pieces: list[npt.NDArray], dtype: type) -> npt.NDArray:
+    return np.concatenate(pieces) if pieces else np.zeros(0, dtype=dtype)
+
+
+class InMemoryMetricRepository(MetricRepository):
+    """Metrics held in an `InMemoryStore`, with the duplicate and unknown-sensor semantics of the PostgreSQL version.
+
+    Readings are listed in (sensor_id, metric_type, timestamp) order. Statistics are computed with vectorized
+    operations over the selected ranges; percentiles are exact rather than estimated from sketches.
+    """
+
+    def __init__(self, store: InMemoryStore, duplicate_policy: DuplicatePolicy = DuplicatePolicy.KEEP_FIRST) -> None:
+        self._store = store
+        self._duplicate_policy = duplicate_policy
+
+    async def add_metric(self, metric: Metric) -> WriteStatus:
+        if metric.sensor_id not in self._store.sensors:
+            raise SensorNotFoundError(f"Sensor with ID '{metric.sensor_id}' not found")
+
+        key = (metric.sensor_id, metric.metric_type)
+        micros = to_micros(metric.timestamp)
+        if self._duplicate_policy is DuplicatePolicy.REJECT:
+            series = self._store.get_series(key)
+            if series is not None and series.contains(micros):
+                raise DuplicateMetricError(
+                    f"Metric '{metric.metric_type.value}' of sensor '{metric.sensor_id}' at {metric.timestamp} "
+                    "already exists"
+                )
+        return self._store.get_or_create_series(key).write(micros, metric.value, self._duplicate_policy)
+
+    async def add_metrics(self, metrics: list[Metric]) -> int:
+        return self._write_batch(metrics)
+
+    async def bulk_add_metrics(self, metrics: Sequence[Metric]) -> int:
+        # Nothing to gain from a separate load path in memory
+        return self._write_batch(metrics)
+
+    async def query_metrics(
+        self,
+        statistics: Sequence[StatisticType],
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+    ) -> list[AggregatedMetricResult]:
+        return self._build_batch(self._iter_slices(sensor_ids, metrics, start_date, end_date)).aggregate(statistics)
+
+    async def iter_bucketed_metrics(
+        self,
+        statistics: Sequence[StatisticType],
+        bucket_width: BucketWidth,
+        time_zone: str,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+    ) -> AsyncIterator[MetricBucket]:
+        zone = ZoneInfo(time_zone)
+        for (sensor_id, metric_type), timestamps, values in self._iter_slices(
+            sensor_ids, metrics, start_date, end_date
+        ):
+            groups = ReadingGroups(self._bucket_starts(timestamps, bucket_width, zone), timestamps, values)
+            columns = groups.statistic_lists(statistics)
+            for index, bucket in enumerate(groups.codes.tolist()):
+                yield MetricBucket(
+                    sensor_id=sensor_id,
+                    metric_type=metric_type,
+                    bucket=from_micros(bucket).astimezone(zone),
+                    values={statistic: column[index] for statistic, column in zip(statistics, columns)},
+                )
+
+    async def summarize_metrics(
+        self,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+    ) -> list[MetricSummary]:
+        batch = self._build_batch(self._iter_slices(sensor_ids, metrics, start_date, end_date))
+        counts, sums, minimums, maximums = (
+            batch.statistic_values(statistic).tolist()
+            for statistic in (StatisticType.COUNT, StatisticType.SUM, StatisticType.MIN, StatisticType.MAX)
+        )
+        return [
+            MetricSummary(
+                sensor_id=sensor_id,
+                metric_type=metric_type,
+                value_count=int(counts[index]),
+                value_sum=sums[index],
+                value_min=minimums[index],
+                value_max=maximums[index],
+            )
+            for index, (sensor_id, metric_type) in enumerate(batch.series_keys)
+        ]
+
+    async def get_raw_metrics(
+        self,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+    ) -> list[Metric]:
+        return self._build_batch(self._iter_slices(sensor_ids, metrics, start_date, end_date)).to_metrics()
+
+    async def get_metric_batch(
+        self,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+    ) -> MetricBatch:
+        return self._build_batch(self._iter_slices(sensor_ids, metrics, start_date, end_date))
+
+    async def iter_raw_metrics(
+        self,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+        after: RawMetricKey | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[Metric]:
+        slices = self._iter_slices(sensor_ids, metrics, start_date, end_date, after, limit)
+        for (sensor_id, metric_type), timestamps, values in slices:
+            for micros, value in zip(timestamps.tolist(), values.tolist()):
+                yield Metric(sensor_id=sensor_id, metric_type=metric_type, timestamp=from_micros(micros), value=value)
+
+    async def iter_raw_metric_columns(
+        self,
+        batch_size: int,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+        after: RawMetricKey | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[RawMetricColumns]:
+        sensor_column: list[str] = []
+        metric_type_column: list[str] = []
+        timestamp_column: list[int] = []
+        value_column: list[float] = []
+        slices = self._iter_slices(sensor_ids, metrics, start_date, end_date, after, limit)
+        for (sensor_id, metric_type), timestamps, values in slices:
+            sensor_column.extend([sensor_id] * len(values))
+            metric_type_column.extend([metric_type.value] * len(values))
+            timestamp_column.extend(timestamps.tolist())
+            value_column.extend(values.tolist())
+            # Batches span series, like partitions of the PostgreSQL cursor
+            while len(value_column) >= batch_size:
+                yield RawMetricColumns(
+                    sensor_ids=sensor_column[:batch_size],
+                    metric_types=metric_type_column[:batch_size],
+                    timestamps=timestamp_column[:batch_size],
+                    values=value_column[:batch_size],
+                )
+                for column in (sensor_column, metric_type_column, timestamp_column, value_column):
+                    del column[:batch_size]
+        if value_column:
+            yield RawMetricColumns(
+                sensor_ids=sensor_column,
+                metric_types=metric_type_column,
+                timestamps=timestamp_column,
+                values=value_column,
+            )
+
+    async def get_metrics_by_sensor(self, sensor_id: str) -> list[Metric]:
+        return self._build_batch(self._iter_slices([sensor_id], None, None, None)).to_metrics()
+
+    async def get_metrics_by_type(self, metric_type: MetricType) -> list[Metric]:
+        return self._build_batch(self._iter_slices(None, [metric_type], None, None)).to_metrics()
+
+    async def get_latest_metrics(self, sensor_ids: list[str] | None, metrics: list[MetricType]) -> list[Metric]:
+        if sensor_ids == [] or not metrics:
+            return []
+
+        latest = []
+        for (sensor_id, metric_type), series in self._select_series(sensor_ids, metrics):
+            last = series.last()
+            if last is not None:
+                micros, value = last
+                latest.append(
+                    Metric(sensor_id=sensor_id, metric_type=metric_type, timestamp=from_micros(micros), value=value)
+                )
+        return latest
+
+    def _write_batch(self, metrics: Sequence[Metric]) -> int:
+        # Checked before anything is written, so a failing batch leaves the store untouched like a rolled back
+        # transaction does
+        unknown = sorted({metric.sensor_id for metric in metrics} - self._store.sensors.keys())
+        if unknown:
+            raise SensorNotFoundError(f"A metric of the batch references an unknown sensor: '{unknown[0]}'")
+
+        rows = [
+            ((metric.sensor_id, metric.metric_type), to_micros(metric.timestamp), metric.value) for metric in metrics
+        ]
+        if self._duplicate_policy is DuplicatePolicy.REJECT:
+            batch_keys: set[tuple[SeriesKey, int]] = set()
+            for key, micros, _ in rows:
+                series = self._store.get_series(key)
+                if (key, micros) in batch_keys or (series is not None and series.contains(micros)):
+                    raise DuplicateMetricError("A metric of the batch already exists")
+                batch_keys.add((key, micros))
+
+        # Within the batch, the first reading of a key wins under KEEP_FIRST and the last under KEEP_LAST
+        return sum(
+            self._store.get_or_create_series(key).write(micros, value, self._duplicate_policy) is WriteStatus.INSERTED
+            for key, micros, value in rows
+        )
+
+    def _select_series(
+        self, sensor_ids: list[str] | None, metrics: list[MetricType] | None
+    ) -> list[tuple[SeriesKey, MetricSeries]]:
+        """Stored series matching the filters, in primary key order."""
+        selected_sensor_ids = sorted(set(sensor_ids)) if sensor_ids else sorted(self._store.series)
+        metric_types = [metric_type for metric_type in MetricType if not metrics or metric_type in metrics]
+        return [
+            ((sensor_id, metric_type), series)
+            for sensor_id in selected_sensor_ids
+            for metric_type in metric_types
+            if (series := self._store.get_series((sensor_id, metric_type))) is not None
+        ]
+
+    def _iter_slices(
+        self,
+        sensor_ids: list[str] | None,
+        metrics: list[MetricType] | None,
+        start_date: datetime | None,
+        end_date: datetime | None,
+        after: RawMetricKey | None = None,
+        limit: int | None = None,
+    ) -> Iterator[SeriesSlice]:
+        """The readings of each selected series in the range, from after `after` on and `limit` in total."""
+        start = None if start_date is None else to_micros(start_date)
+        end = None if end_date is None else to_micros(end_date)
+        after_key = None if after is None else (after.sensor_id, METRIC_CODES[after.metric_type])
+        remaining = limit
+
+        for key, series in self._select_series(sensor_ids, metrics):
+            series_key = (key[0], METRIC_CODES[key[1]])
+            if after_key is not None and series_key < after_key:
+                continue
+            lower, upper = series.span(start, end)
+            if after is not None and series_key == after_key:
+                lower = max(lower, series.after(to_micros(after.timestamp)))
+            if remaining is not None:
+                upper = min(upper, lower + remaining)
+            if lower >= upper:
+                continue
+            yield (key, *series.columns(lower, upper))
+            if remaining is not None:
+                remaining -= upper - lower
+                if remaining == 0:
+                    return
+
+    def _build_batch(self, slices: Iterator[SeriesSlice]) -> MetricBatch:
+        sensor_index: dict[str, int] = {}
+        sensor_codes, metric_codes, timestamp_pieces, value_pieces = [], [], [], []
+        for (sensor_id, metric_type), timestamps, values in slices:
+            sensor_codes.append(np.full(len(values), sensor_index.setdefault(sensor_id, len(sensor_index)), np.int32))
+            metric_codes.append(np.full(len(values), METRIC_CODES[metric_type], np.int32))
+            timestamp_pieces.append(timestamps)
+            value_pieces.append(values)
+        return MetricBatch(
+            sensor_ids=list(sensor_index),
+            sensor_codes=_concatenate(sensor_codes, np.int32),
+            metric_types=list(MetricType),
+            metric_codes=_concatenate(metric_codes, np.int32),
+            timestamps=_concatenate(timestamp_pieces, np.int64),
+            values=_concatenate(value_pieces, np.float64),
+        )
+
+    @staticmethod
+    def _bucket_starts(
+        timestamps: npt.NDArray[np.int64], bucket_width: BucketWidth, zone: ZoneInfo
+    ) -> npt.NDArray[np.int64]:
+        # Days follow the local calendar, 23 to 25 hours long; shorter buckets are fixed-length bins counted from a
+        # local midnight, like the PostgreSQL repository's date_trunc and date_bin
+        if bucket_width is BucketWidth.ONE_DAY:
+            first_day = from_micros(int(timestamps[0])).astimezone(zone).date()
+            last_day = from_micros(int(timestamps[-1])).astimezone(zone).date()
+            midnights = np.array(
+                [
+                    to_micros(datetime.combine(first_day + timedelta(days=days), time(), tzinfo=zone))
+                    for days in range((last_day - first_day).days + 1)
+                ],
+                dtype=np.int64,
+            )
+            return midnights[np.searchsorted(midnights, timestamps, side="right") - 1]
+
+        origin = to_micros(BUCKET_ORIGIN.replace(tzinfo=zone))
+        width = BUCKET_INTERVALS[bucket_width] // TIMESTAMP_RESOLUTION
+        return origin + (timestamps - origin) // width * width
@@ -0,0 +1,40 @@
+from bisect import bisect_right
+from itertools import islice
+
+from app.shared.exceptions import DatabaseError
+from app.shared.models import Sensor, SensorRegistryVersion
+from app.storage.in_memory_store import InMemoryStore
+from app.storage.interfaces.sensor_repository import SensorRepository
+
+
+class InMemorySensorRepository(SensorRepository):
+    def __init__(self, store: InMemoryStore) -> None:
+        self._store = store
+
+    async def add_sensor(self, sensor: Sensor) -> Sensor:
+        if sensor.sensor_id in self._store.sensors:
+            raise DatabaseError(f"Failed to create sensor: sensor with ID '{sensor.sensor_id}' may already exist")
+        self._store.add_sensor(sensor)
+        return sensor
+
+    async def list_sensors(
+        self, sensor_type: str | None = None, after: str | None = None, limit: int | None = None
+    ) -> list[Sensor]:
+        sensor_ids = self._store.sorted_sensor_ids
+        start = 0 if after is None else bisect_right(sensor_ids, after)
+        sensors = (self._store.sensors[sensor_id] for sensor_id in islice(sensor_ids, start, None))
+        if sensor_type is not None:
+            sensors = (sensor for sensor in sensors if sensor.sensor_type == sensor_type)
+        return list(islice(sensors, limit))
+
+    async def sensor_exists(self, sensor_id: str) -> bool:
+        return sensor_id in self._store.sensors
+
+    async def get_sensor(self, sensor_id: str) -> Sensor | None:
+        return self._store.sensors.get(sensor_id)
+
+    async def get_existing_sensor_ids(self, sensor_ids: list[str]) -> set[str]:
+        return {sensor_id for sensor_id in sensor_ids if sensor_id in self._store.sensors}
+
+    async def get_sensors_version(self) -> SensorRegistryVersion:
+        return SensorRegistryVersion(sensor_count=len(self._store.sensors), last_created_at=self._store.last_created_at)
@@ -1,52 +1,362 @@
-from collections.abc import Sequence
+from collections.abc import AsyncIterator, Sequence
 from datetime import datetime
+from itertools import groupby
 from typing import Any
-
-from sqlalchemy import and_, func, select
+from zoneinfo import ZoneInfo
+
+import psycopg
+from sqlalchemy import (
+    ARRAY,
+    BigInteger,
+    Boolean,
+    Float,
+    String,
+    and_,
+    cast,
+    func,
+    literal,
+    literal_column,
+    or_,
+    select,
+    true,
+    tuple_,
+)
+from sqlalchemy.dialects.postgresql import array, insert
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
-
-from app.shared.exceptions import DatabaseError
-from app.shared.models import AggregatedMetricResult, Metric, MetricType, StatisticType
-from app.storage.database_models import MetricModel
+from sqlalchemy.sql.dml import ReturningInsert
+
+from app.shared.exceptions import DatabaseError, DuplicateMetricError, SensorNotFoundError
+from app.shared.models import (
+    BUCKET_INTERVALS,
+    QUANTILE_STATISTICS,
+    SUMMARY_STATISTICS,
+    AggregatedMetricResult,
+    BucketWidth,
+    DuplicatePolicy,
+    Metric,
+    MetricBucket,
+    MetricSummary,
+    MetricType,
+    RawMetricColumns,
+    RawMetricKey,
+    StatisticType,
+    WriteStatus,
+)
+from app.storage.database_models import MetricModel, MetricRollupDirtyModel, SensorLatestModel, SensorModel
 from app.storage.interfaces.metric_repository import MetricRepository
+from app.storage.metric_batch import MetricBatch, MetricBatchBuilder
+from app.storage.metric_rollups import (
+    DIRTY_GRAIN,
+    ROLLUP_ORIGIN,
+    TIMESTAMP_RESOLUTION,
+    RollupSegment,
+    build_rollup_aggregation_query,
+    build_rollup_sketch_query,
+    build_rollup_summary_query,
+    plan_rollup_segments,
+)
+from app.storage.quantile_sketch import sketch_quantile
+
+METRIC_PRIMARY_KEY = ["sensor_id", "metric_type", "timestamp"]
+ROLLUP_DIRTY_KEY = ["sensor_id", "metric_type", "bucket"]
+# Rows fetched per round trip when streaming raw metrics or buckets
+STREAM_FETCH_SIZE = 5000
+SENSOR_LATEST_KEY = ["sensor_id", "metric_type"]
+
+# Sub-selects run on the statement's snapshot, so they see the table as it was before the upsert. This
+# tells inserted from overwritten rows, also on partitioned tables where RETURNING cannot read xmax.
+_KEY_WAS_ABSENT = """NOT EXISTS (
+    SELECT 1 FROM metrics AS prior
+    WHERE prior.sensor_id = metrics.sensor_id AND prior.metric_type = metrics.metric_type
+      AND prior.timestamp = metrics.timestamp
+)"""
+
+# Session-local staging table for COPY; it lives as long as the pooled connection and is emptied on commit
+_CREATE_STAGING_TABLE = """
+    CREATE TEMP TABLE IF NOT EXISTS metrics_staging (
+        seq BIGINT GENERATED ALWAYS AS IDENTITY,
+        sensor_id TEXT NOT NULL,
+        metric_type TEXT NOT NULL,
+        timestamp TIMESTAMPTZ NOT NULL,
+        value DOUBLE PRECISION NOT NULL
+    ) ON COMMIT DELETE ROWS
+"""
+_COPY_INTO_STAGING = "COPY metrics_staging (sensor_id, metric_type, timestamp, value) FROM STDIN (FORMAT BINARY)"
+_MERGE_STAGING = {
+    DuplicatePolicy.KEEP_FIRST: """
+        WITH merged AS (
+            INSERT INTO metrics (sensor_id, metric_type, timestamp, value)
+            SELECT sensor_id, metric_type::metric_type_enum, timestamp, value FROM metrics_staging ORDER BY seq
+            ON CONFLICT (sensor_id, metric_type, timestamp) DO NOTHING
+            RETURNING 1
+        )
+        SELECT count(*) FROM merged
+    """,
+    DuplicatePolicy.KEEP_LAST: f"""
+        WITH merged AS (
+            INSERT INTO metrics (sensor_id, metric_type, timestamp, value)
+            SELECT DISTINCT ON (sensor_id, metric_type, timestamp)
+                sensor_id, metric_type::metric_type_enum, timestamp, value
+            FROM metrics_staging
+            ORDER BY sensor_id, metric_type, timestamp, seq DESC
+            ON CONFLICT (sensor_id, metric_type, timestamp) DO UPDATE SET value = EXCLUDED.value
+            WHERE metrics.value IS DISTINCT FROM EXCLUDED.value
+            RETURNING {_KEY_WAS_ABSENT} AS inserted
+        )
+        SELECT count(*) FILTER (WHERE inserted) FROM merged
+    """,
+    DuplicatePolicy.REJECT: """
+        WITH merged AS (
+            INSERT INTO metrics (sensor_id, metric_type, timestamp, value)
+            SELECT sensor_id, metric_type::metric_type_enum, timestamp, value FROM metrics_staging
+            RETURNING 1
+        )
+        SELECT count(*) FROM merged
+    """,
+}
+
+
+# The no-op update locks a marker that already exists, so a running refresh cannot claim it before this commits
+_MARK_STAGING_DIRTY = f"""
+    INSERT INTO metric_rollup_dirty (sensor_id, metric_type, bucket)
+    SELECT DISTINCT sensor_id, metric_type::metric_type_enum, date_bin(%(grain)s, timestamp, %(origin)s)
+    FROM metrics_staging
+    ORDER BY 1, 2, 3
+    ON CONFLICT ({", ".join(ROLLUP_DIRTY_KEY)}) DO UPDATE SET bucket = EXCLUDED.bucket
+"""
+
+# The newest staged reading of each series, with the value the merge left in the table
+_UPSERT_STAGING_LATEST = f"""
+    INSERT INTO sensor_latest (sensor_id, metric_type, timestamp, value)
+    SELECT m.sensor_id, m.metric_type, m.timestamp, m.value
+    FROM (
+        SELECT DISTINCT ON (sensor_id, metric_type) sensor_id, metric_type::metric_type_enum, timestamp
+        FROM metrics_staging
+        ORDER BY sensor_id, metric_type, timestamp DESC
+    ) AS s
+    JOIN metrics AS m ON m.sensor_id = s.sensor_id AND m.metric_type = s.metric_type AND m.timestamp = s.timestamp
+    ORDER BY 1, 2
+    ON CONFLICT ({", ".join(SENSOR_LATEST_KEY)}) DO UPDATE SET timestamp = EXCLUDED.timestamp, value = EXCLUDED.value
+    WHERE sensor_latest.timestamp < EXCLUDED.timestamp
+       OR (sensor_latest.timestamp = EXCLUDED.timestamp AND sensor_latest.value <> EXCLUDED.value)
+"""
 
 
 class PostgreSQLMetricRepository(MetricRepository):
-    def __init__(self, session: AsyncSession) -> None:
+    def __init__(
+        self,
+        session: AsyncSession,
+        duplicate_policy: DuplicatePolicy = DuplicatePolicy.KEEP_FIRST,
+        rollups_enabled: bool = False,
+        sensor_latest_enabled: bool = False,
+        stream_fetch_size: int = STREAM_FETCH_SIZE,
+    ) -> None:
         self._session = session
+        self._duplicate_policy = duplicate_policy
+        # Writes mark the rollup buckets they touch, range aggregations are answered from the rollups
+        self._rollups_enabled = rollups_enabled
+        # Writes keep sensor_latest current, latest-value lookups read it instead of the metrics table
+        self._sensor_latest_enabled = sensor_latest_enabled
+        self._stream_fetch_size = stream_fetch_size
 
-    async def add_metric(self, metric: Metric) -> Metric:
-        metric_model = self._create_metric_model(metric)
+    async def add_metric(self, metric: Metric) -> WriteStatus:
+        statement = self._build_insert_statement().values(self._create_metric_rows([metric]))
 
         try:
-            self._session.add(metric_model)
+            result = await self._session.execute(statement)
+            row = result.first()
+            if row is not None:
+                await self._mark_rollups_dirty([metric])
+                await self._update_sensor_latest([metric])
             await self._session.commit()
-            return metric
         except IntegrityError as e:
             await self._session.rollback()
-            return await self._handle_duplicate_metric(metric, e)
+            raise self._translate_integrity_error(
+                e.orig,
+                f"Metric '{metric.metric_type.value}' of sensor '{metric.sensor_id}' at {metric.timestamp}",
+                sensor_id=metric.sensor_id,
+            ) from e
         except SQLAlchemyError as e:
             await self._session.rollback()
             raise DatabaseError(f"Database error while adding metric: {str(e)}") from e
 
+        if row is None:
+            return WriteStatus.DEDUPLICATED
+        return WriteStatus.INSERTED if row.inserted else WriteStatus.OVERWRITTEN
+
+    async def add_metrics(self, metrics: list[Metric]) -> int:
+        if not metrics:
+            return 0
+
+        rows = self._create_metric_rows(metrics)
+        if self._duplicate_policy is DuplicatePolicy.KEEP_LAST:
+            # A single statement may not update the same row twice, so the last reading of a key wins up front
+            rows = list({(row["sensor_id"], row["metric_type"], row["timestamp"]): row for row in rows}.values())
+
+        try:
+            # Sent as a few cached multi-row INSERTs; only inserted or overwritten rows are returned
+            result = await self._session.execute(self._build_insert_statement(), rows)
+            written = result.all()
+            await self._mark_rollups_dirty(metrics)
+            if self._sensor_latest_enabled:
+                # Rows the duplicate policy left untouched are not returned and cannot move the latest reading
+                await self._update_sensor_latest(
+                    [
+                        Metric(
+                            sensor_id=row.sensor_id,
+                            metric_type=MetricType(row.metric_type),
+                            timestamp=row.timestamp,
+                            value=row.value,
+                        )
+                        for row in written
+                    ]
+                )
+            await self._session.commit()
+            return sum(1 for row in written if row.inserted)
+        except IntegrityError as e:
+            await self._session.rollback()
+            raise self._translate_integrity_error(e.orig, "A metric of the batch") from e
+        except SQLAlchemyError as e:
+            await self._session.rollback()
+            raise DatabaseError(f"Database error while adding metrics: {str(e)}") from e
+
+    async def bulk_add_metrics(self, metrics: Sequence[Metric]) -> int:
+        if not metrics:
+            return 0
+
+        try:
+            connection = await self._session.connection()
+            raw_connection = await connection.get_raw_connection()
+            driver_connection: psycopg.AsyncConnection[Any] = raw_connection.driver_connection  # type: ignore
+
+            async with driver_connection.cursor() as cursor:
+                await cursor.execute(_CREATE_STAGING_TABLE)
+                async with cursor.copy(_COPY_INTO_STAGING) as copy:
+                    copy.set_types(["text", "text", "timestamptz", "float8"])
+                    for metric in metrics:
+                        await copy.write_row(
+                            (metric.sensor_id, metric.metric_type.value, metric.timestamp, metric.value)
+                        )
+                await cursor.execute(_MERGE_STAGING[self._duplicate_policy])
+                merged = await cursor.fetchone()
+                if self._rollups_enabled:
+                    await cursor.execute(_MARK_STAGING_DIRTY, {"grain": DIRTY_GRAIN, "origin": ROLLUP_ORIGIN})
+                if self._sensor_latest_enabled:
+                    await cursor.execute(_UPSERT_STAGING_LATEST)
+
+            await self._session.commit()
+            return int(merged[0]) if merged else 0
+        except psycopg.IntegrityError as e:
+            await self._session.rollback()
+            raise self._translate_integrity_error(e, "A metric of the batch") from e
+        except (SQLAlchemyError, psycopg.Error) as e:
+            await self._session.rollback()
+            raise DatabaseError(f"Database error while bulk loading metrics: {str(e)}") from e
+
     async def query_metrics(
         self,
-        statistic: StatisticType,
+        statistics: Sequence[StatisticType],
         sensor_ids: list[str] | None = None,
         metrics: list[MetricType] | None = None,
         start_date: datetime | None = None,
         end_date: datetime | None = None,
     ) -> list[AggregatedMetricResult]:
-        query = self._build_aggregation_query(statistic, sensor_ids, metrics, start_date, end_date)
+        # Quantiles of ranges answered from rollups are estimated from their sketches, merged in a statement of their
+        # own; over raw readings alone percentile_cont computes them exactly next to the other statistics
+        segments = self._plan_rollup_segments(start_date, end_date)
+        quantiles = [statistic for statistic in statistics if statistic in QUANTILE_STATISTICS and segments is not None]
+        aggregates = [statistic for statistic in statistics if statistic not in quantiles]
+        values: dict[tuple[str, MetricType], dict[StatisticType, float | None]] = {}
 
         try:
-            result = await self._session.execute(query)
-            rows = result.all()
-            return self._convert_rows_to_aggregated_results(rows, statistic)
+            if aggregates:
+                query = self._build_range_aggregation_query(aggregates, sensor_ids, metrics, start_date, end_date)
+                result = await self._session.execute(query)
+                for row in result.all():
+                    values[(row.sensor_id, MetricType(row.metric_type))] = {
+                        statistic: self._statistic_value(row, index) for index, statistic in enumerate(aggregates)
+                    }
+            if quantiles and segments is not None:
+                query = build_rollup_sketch_query(segments, sensor_ids, metrics)
+                result = await self._session.execute(query)
+                for (sensor_id, metric_type), rows in groupby(result.all(), key=lambda row: row[:2]):
+                    bins = [(int(row.bin), int(row.value_count)) for row in rows]
+                    values.setdefault((sensor_id, MetricType(metric_type)), {}).update(
+                        {statistic: sketch_quantile(bins, QUANTILE_STATISTICS[statistic]) for statistic in quantiles}
+                    )
         except SQLAlchemyError as e:
             raise DatabaseError(f"Database error while querying metrics: {str(e)}") from e
 
+        # Each statement reads a snapshot of its own: a series committed or expired in between is missing from one of
+        # them and left out, as if the query had run before or after that write
+        return [
+            AggregatedMetricResult(
+                sensor_id=sensor_id, metric_type=metric_type, statistic=statistic, value=series_values[statistic]
+            )
+            for (sensor_id, metric_type), series_values in values.items()
+            if all(statistic in series_values for statistic in statistics)
+            for statistic in statistics
+        ]
+
+    async def iter_bucketed_metrics(
+        self,
+        statistics: Sequence[StatisticType],
+        bucket_width: BucketWidth,
+        time_zone: str,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+    ) -> AsyncIterator[MetricBucket]:
+        zone = ZoneInfo(time_zone)
+        bucket = self._bucket_expression(bucket_width, time_zone).label("bucket")
+        query = select(
+            MetricModel.sensor_id, MetricModel.metric_type, bucket, *self._statistic_columns(statistics)
+        ).group_by(MetricModel.sensor_id, MetricModel.metric_type, bucket)
+        query = (
+            self._apply_filters(query, sensor_ids, metrics, start_date, end_date)
+            .order_by(MetricModel.sensor_id, MetricModel.metric_type, bucket)
+            .execution_options(yield_per=self._stream_fetch_size)
+        )
+
+        try:
+            result = await self._session.stream(query)
+            async for row in result:
+                yield MetricBucket(
+                    sensor_id=row.sensor_id,
+                    metric_type=MetricType(row.metric_type),
+                    bucket=row.bucket.astimezone(zone),
+                    values={statistic: self._statistic_value(row, index) for index, statistic in enumerate(statistics)},
+                )
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Database error while streaming bucketed metrics: {str(e)}") from e
+
+    async def summarize_metrics(
+        self,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+    ) -> list[MetricSummary]:
+        query = self._build_range_summary_query(sensor_ids, metrics, start_date, end_date)
+
+        try:
+            result = await self._session.execute(query)
+            return [
+                MetricSummary(
+                    sensor_id=str(row.sensor_id),
+                    metric_type=MetricType(row.metric_type),
+                    value_count=int(row.value_count),
+                    value_sum=float(row.value_sum),
+                    value_min=float(row.value_min),
+                    value_max=float(row.value_max),
+                )
+                for row in result.all()
+            ]
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Database error while summarizing metrics: {str(e)}") from e
+
     async def get_raw_metrics(
         self,
         sensor_ids: list[str] | None = None,
@@ -63,6 +373,84 @@ class PostgreSQLMetricRepository(MetricRepository):
         except SQLAlchemyError as e:
             raise DatabaseError(f"Database error while getting raw metrics: {str(e)}") from e
 
+    async def get_metric_batch(
+        self,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+    ) -> MetricBatch:
+        # Each cursor partition is encoded into arrays before the next is fetched, so no model is built per reading
+        builder = MetricBatchBuilder()
+        columns = self.iter_raw_metric_columns(
+            batch_size=self._stream_fetch_size,
+            sensor_ids=sensor_ids,
+            metrics=metrics,
+            start_date=start_date,
+            end_date=end_date,
+        )
+        async for batch in columns:
+            builder.append(batch.sensor_ids, batch.metric_types, batch.timestamps, batch.values)
+        return builder.build()
+
+    async def iter_raw_metrics(
+        self,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+        after: RawMetricKey | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[Metric]:
+        # Plain columns rather than ORM entities, so rows skip the identity map and are converted only once
+        query = select(MetricModel.sensor_id, MetricModel.metric_type, MetricModel.timestamp, MetricModel.value)
+        query = self._apply_raw_page(
+            self._apply_filters(query, sensor_ids, metrics, start_date, end_date), after, limit
+        ).execution_options(yield_per=self._stream_fetch_size)
+
+        try:
+            # A server-side cursor, so only one batch of rows is held at a time
+            result = await self._session.stream(query)
+            async for row in result:
+                yield Metric(
+                    sensor_id=row.sensor_id,
+                    metric_type=MetricType(row.metric_type),
+                    timestamp=row.timestamp,
+                    value=row.value,
+                )
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Database error while streaming raw metrics: {str(e)}") from e
+
+    async def iter_raw_metric_columns(
+        self,
+        batch_size: int,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+        after: RawMetricKey | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[RawMetricColumns]:
+        # Epoch microseconds are computed by the database, so no datetime object is built per reading
+        timestamp = cast(func.extract("epoch", MetricModel.timestamp) * 1_000_000, BigInteger)
+        query = select(MetricModel.sensor_id, MetricModel.metric_type, timestamp, MetricModel.value)
+        query = self._apply_raw_page(
+            self._apply_filters(query, sensor_ids, metrics, start_date, end_date), after, limit
+        ).execution_options(yield_per=self._stream_fetch_size)
+
+        try:
+            result = await self._session.stream(query)
+            async for rows in result.partitions(batch_size):
+                sensor_id_column, metric_type_column, timestamp_column, value_column = zip(*rows)
+                yield RawMetricColumns(
+                    sensor_ids=sensor_id_column,
+                    metric_types=metric_type_column,
+                    timestamps=timestamp_column,
+                    values=value_column,
+                )
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Database error while streaming raw metric columns: {str(e)}") from e
+
     async def get_metrics_by_sensor(self, sensor_id: str) -> list[Metric]:
         try:
             result = await self._session.execute(select(MetricModel).where(MetricModel.sensor_id == sensor_id))
@@ -81,47 +469,167 @@ class PostgreSQLMetricRepository(MetricRepository):
         except SQLAlchemyError as e:
             raise DatabaseError(f"Database error while getting metrics by type: {str(e)}") from e
 
-    async def get_latest_timestamps(
-        self, sensor_ids: list[str], metrics: list[MetricType]
-    ) -> dict[tuple[str, MetricType], datetime]:
-        try:
-            metric_values = [metric.value for metric in metrics]
-            query = (
-                select(
-                    MetricModel.sensor_id,
-                    MetricModel.metric_type,
-                    func.max(MetricModel.timestamp).label("latest_timestamp"),
-                )
-                .where(
-                    and_(
-                        MetricModel.sensor_id.in_(sensor_ids),
-                        MetricModel.metric_type.in_(metric_values),
-                    )
-                )
-                .group_by(MetricModel.sensor_id, MetricModel.metric_type)
+    async def get_latest_metrics(self, sensor_ids: list[str] | None, metrics: list[MetricType]) -> list[Metric]:
+        if sensor_ids == [] or not metrics:
+            return []
+        if self._sensor_latest_enabled:
+            return await self._get_sensor_latest(sensor_ids, metrics)
+
+        # One backward primary-key probe per series instead of reading every row of the requested sensors. All
+        # sensors are probed straight from the registry, so their IDs never make a round trip through the application.
+        requested_sensors: Any
+        if sensor_ids is None:
+            requested_sensors = select(SensorModel.sensor_id).subquery("requested_sensors")
+        else:
+            requested_sensors = (
+                func.unnest(literal(sensor_ids, ARRAY(String))).table_valued("sensor_id").render_derived()
             )
+        requested_metrics = (
+            func.unnest(literal([metric.value for metric in metrics], ARRAY(String)))
+            .table_valued("metric_type")
+            .render_derived()
+        )
+        latest = (
+            select(MetricModel.sensor_id, MetricModel.metric_type, MetricModel.timestamp, MetricModel.value)
+            .where(
+                MetricModel.sensor_id == requested_sensors.c.sensor_id,
+                MetricModel.metric_type == cast(requested_metrics.c.metric_type, MetricModel.metric_type.type),
+            )
+            .order_by(MetricModel.timestamp.desc())
+            .limit(1)
+            .lateral("latest")
+        )
+        query = select(latest).select_from(requested_sensors.join(requested_metrics, true()).join(latest, true()))
 
+        try:
             result = await self._session.execute(query)
-            rows = result.all()
+            return [
+                Metric(
+                    sensor_id=row.sensor_id,
+                    metric_type=MetricType(row.metric_type),
+                    timestamp=row.timestamp,
+                    value=float(row.value),
+                )
+                for row in result.all()
+            ]
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Database error while getting latest metrics: {str(e)}") from e
+
+    def _build_insert_statement(self) -> ReturningInsert[Any]:
+        statement = insert(MetricModel)
+        match self._duplicate_policy:
+            case DuplicatePolicy.KEEP_FIRST:
+                statement = statement.on_conflict_do_nothing(index_elements=METRIC_PRIMARY_KEY)
+            case DuplicatePolicy.KEEP_LAST:
+                statement = statement.on_conflict_do_update(
+                    index_elements=METRIC_PRIMARY_KEY,
+                    set_={"value": statement.excluded.value},
+                    where=MetricModel.value.is_distinct_from(statement.excluded.value),
+                )
+                return statement.returning(
+                    *self._written_columns(), literal_column(_KEY_WAS_ABSENT, Boolean).label("inserted")
+                )
+        # Without an update clause every returned row was inserted by this statement
+        return statement.returning(*self._written_columns(), true().label("inserted"))
+
+    def _written_columns(self) -> list[Any]:
+        # Only sensor_latest needs the written rows back, otherwise the flag alone keeps the result small
+        if not self._sensor_latest_enabled:
+            return []
+        return [MetricModel.sensor_id, MetricModel.metric_type, MetricModel.timestamp, MetricModel.value]
+
+    async def _mark_rollups_dirty(self, metrics: Sequence[Metric]) -> None:
+        if not self._rollups_enabled:
+            return
+
+        # Sorted, so concurrent writers lock shared markers in the same order
+        buckets = sorted(
+            {
+                (metric.sensor_id, metric.metric_type.value, metric.timestamp.replace(second=0, microsecond=0))
+                for metric in metrics
+            },
+            key=lambda bucket: (bucket[0], bucket[1], bucket[2].timestamp()),
+        )
+        rows = [
+            {"sensor_id": sensor_id, "metric_type": metric_type, "bucket": bucket}
+            for sensor_id, metric_type, bucket in buckets
+        ]
+        statement = insert(MetricRollupDirtyModel)
+        statement = statement.on_conflict_do_update(
+            index_elements=ROLLUP_DIRTY_KEY, set_={"bucket": statement.excluded.bucket}
+        )
+        await self._session.execute(statement, rows)
+
+    async def _update_sensor_latest(self, metrics: Sequence[Metric]) -> None:
+        if not self._sensor_latest_enabled or not metrics:
+            return
+
+        latest: dict[tuple[str, str], Metric] = {}
+        for metric in metrics:
+            key = (metric.sensor_id, metric.metric_type.value)
+            if key not in latest or latest[key].timestamp < metric.timestamp:
+                latest[key] = metric
+        # Sorted, so concurrent writers lock shared series in the same order
+        rows = self._create_metric_rows([latest[key] for key in sorted(latest)])
+
+        statement = insert(SensorLatestModel)
+        # An older, out-of-order reading never replaces a newer one
+        statement = statement.on_conflict_do_update(
+            index_elements=SENSOR_LATEST_KEY,
+            set_={"timestamp": statement.excluded.timestamp, "value": statement.excluded.value},
+            where=or_(
+                SensorLatestModel.timestamp < statement.excluded.timestamp,
+                and_(
+                    SensorLatestModel.timestamp == statement.excluded.timestamp,
+                    SensorLatestModel.value != statement.excluded.value,
+                ),
+            ),
+        )
+        await self._session.execute(statement, rows)
 
-            latest_timestamps = {}
-            for row in rows:
-                sensor_id = str(row.sensor_id)
-                metric_type = MetricType(row.metric_type)
-                latest_timestamp = row.latest_timestamp
-                latest_timestamps[(sensor_id, metric_type)] = latest_timestamp
+    async def _get_sensor_latest(self, sensor_ids: list[str] | None, metrics: list[MetricType]) -> list[Metric]:
+        query = select(SensorLatestModel).where(SensorLatestModel.metric_type.in_([metric.value for metric in metrics]))
+        if sensor_ids is not None:
+            query = query.where(SensorLatestModel.sensor_id.in_(sensor_ids))
 
-            return latest_timestamps
+        try:
+            result = await self._session.execute(query)
+            return [
+                Metric(
+                    sensor_id=str(model.sensor_id),
+                    metric_type=MetricType(model.metric_type),
+                    timestamp=model.timestamp,  # type: ignore[arg-type]
+                    value=float(model.value),
+                )
+                for model in result.scalars().all()
+            ]
         except SQLAlchemyError as e:
-            raise DatabaseError(f"Database error while getting latest timestamps: {str(e)}") from e
-
-    def _create_metric_model(self, metric: Metric) -> MetricModel:
-        return MetricModel(
-            sensor_id=metric.sensor_id,
-            metric_type=metric.metric_type.value,
-            timestamp=metric.timestamp,
-            value=metric.value,
-        )
+            raise DatabaseError(f"Database error while getting latest metrics: {str(e)}") from e
+
+    def _translate_integrity_error(
+        self, error: BaseException | None, subject: str, sensor_id: str | None = None
+    ) -> Exception:
+        """Tell a primary key conflict from a missing sensor using the driver's SQLSTATE."""
+        match getattr(error, "sqlstate", None):
+            case "23505":  # unique_violation
+                return DuplicateMetricError(f"{subject} already exists")
+            case "23503":  # foreign_key_violation
+                if sensor_id is not None:
+                    return SensorNotFoundError(f"Sensor with ID '{sensor_id}' not found")
+                detail = getattr(getattr(error, "diag", None), "message_detail", None)
+                return SensorNotFoundError(f"{subject} references an unknown sensor: {detail or error}")
+        return DatabaseError(f"Failed to add metric due to constraint violation: {str(error)}")
+
+    def _create_metric_rows(self, metrics: Sequence[Metric]) -> list[dict[str, Any]]:
+        return [
+            {
+                "sensor_id": metric.sensor_id,
+                "metric_type": metric.metric_type.value,
+                "timestamp": metric.timestamp,
+                "value": metric.value,
+            }
+            for metric in metrics
+        ]
 
     def _convert_models_to_metrics(self, metric_models: Sequence[MetricModel]) -> list[Metric]:
         return [
@@ -134,36 +642,82 @@ class PostgreSQLMetricRepository(MetricRepository):
             for model in metric_models
         ]
 
-    def _convert_rows_to_aggregated_results(
-        self, rows: Sequence[Any], statistic: StatisticType
-    ) -> list[AggregatedMetricResult]:
-        return [
-            AggregatedMetricResult(
-                sensor_id=row.sensor_id,
-                metric_type=MetricType(row.metric_type),
-                statistic=statistic,
-                value=float(row.aggregated_value),
-            )
-            for row in rows
-        ]
-
-    def _build_aggregation_query(
+    def _build_range_aggregation_query(
         self,
-        statistic: StatisticType,
+        statistics: Sequence[StatisticType],
         sensor_ids: list[str] | None = None,
         metrics: list[MetricType] | None = None,
         start_date: datetime | None = None,
         end_date: datetime | None = None,
     ) -> Any:
-        aggregation_func = self._get_aggregation_function(statistic)
+        # Rollups only hold count, sum, min and max
+        if SUMMARY_STATISTICS.issuperset(statistics):
+            segments = self._plan_rollup_segments(start_date, end_date)
+            if segments is not None:
+                return build_rollup_aggregation_query(statistics, segments, sensor_ids, metrics)
+        return self._build_aggregation_query(statistics, sensor_ids, metrics, start_date, end_date)
+
+    def _build_range_summary_query(
+        self,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+    ) -> Any:
+        segments = self._plan_rollup_segments(start_date, end_date)
+        if segments is not None:
+            return build_rollup_summary_query(segments, sensor_ids, metrics)
+
         query = select(
             MetricModel.sensor_id,
             MetricModel.metric_type,
-            aggregation_func.label("aggregated_value"),
+            func.count().label("value_count"),
+            func.sum(MetricModel.value).label("value_sum"),
+            func.min(MetricModel.value).label("value_min"),
+            func.max(MetricModel.value).label("value_max"),
         ).group_by(MetricModel.sensor_id, MetricModel.metric_type)
+        return self._apply_filters(query, sensor_ids, metrics, start_date, end_date)
+
+    def _plan_rollup_segments(
+        self, start_date: datetime | None, end_date: datetime | None
+    ) -> list[RollupSegment] | None:
+        """The segments to read from the rollups, or None when the range is answered from raw rows alone."""
+        # Naive dates are interpreted in the session time zone, those ranges stay on the raw table
+        if (
+            not self._rollups_enabled
+            or start_date is None
+            or end_date is None
+            or start_date.tzinfo is None
+            or end_date.tzinfo is None
+        ):
+            return None
+        segments = plan_rollup_segments(start_date, end_date + TIMESTAMP_RESOLUTION)
+        if not any(segment.grain is not None for segment in segments):
+            return None
+        return segments
+
+    def _build_aggregation_query(
+        self,
+        statistics: Sequence[StatisticType],
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+    ) -> Any:
+        query = select(MetricModel.sensor_id, MetricModel.metric_type, *self._statistic_columns(statistics)).group_by(
+            MetricModel.sensor_id, MetricModel.metric_type
+        )
 
         return self._apply_filters(query, sensor_ids, metrics, start_date, end_date)
 
+    def _bucket_expression(self, bucket_width: BucketWidth, time_zone: str) -> Any:
+        # Days follow the local calendar across daylight saving changes. Shorter buckets are fixed-length bins counted
+        # from a local midnight, so they stay on local hour boundaries in zones with a fractional offset too.
+        if bucket_width is BucketWidth.ONE_DAY:
+            return func.date_trunc("day", MetricModel.timestamp, time_zone)
+        origin = datetime(2000, 1, 1, tzinfo=ZoneInfo(time_zone))
+        return func.date_bin(BUCKET_INTERVALS[bucket_width], MetricModel.timestamp, origin)
+
     def _build_filtered_query(
         self,
         sensor_ids: list[str] | None = None,
@@ -174,6 +728,15 @@ class PostgreSQLMetricRepository(MetricRepository):
         query = select(MetricModel)
         return self._apply_filters(query, sensor_ids, metrics, start_date, end_date)
 
+    def _apply_raw_page(self, query: Any, after: RawMetricKey | None, limit: int | None) -> Any:
+        # Primary key order, so a page resumes with an index seek rather than skipping the rows before it
+        key = tuple_(MetricModel.sensor_id, MetricModel.metric_type, MetricModel.timestamp)
+        if after is not None:
+            query = query.where(key > (after.sensor_id, after.metric_type.value, after.timestamp))
+        if limit is not None:
+            query = query.limit(limit)
+        return query.order_by(MetricModel.sensor_id, MetricModel.metric_type, MetricModel.timestamp)
+
     def _apply_filters(
         self,
         query: Any,
@@ -202,6 +765,17 @@ class PostgreSQLMetricRepository(MetricRepository):
 
         return query
 
+    def _statistic_columns(self, statistics: Sequence[StatisticType]) -> list[Any]:
+        # Every statistic is computed in the same scan, one stat_<n> column each
+        return [
+            self._get_aggregation_function(statistic).label(f"stat_{index}")
+            for index, statistic in enumerate(statistics)
+        ]
+
+    def _statistic_value(self, row: Any, index: int) -> float | None:
+        value = row._mapping[f"stat_{index}"]
+        return float(value) if value is not None else None
+
     def _get_aggregation_function(self, statistic: StatisticType) -> Any:
         match statistic:
             case StatisticType.MIN:
@@ -212,43 +786,25 @@ class PostgreSQLMetricRepository(MetricRepository):
                 return func.avg(MetricModel.value)
             case StatisticType.SUM:
                 return func.sum(MetricModel.value)
+            case StatisticType.COUNT:
+                return func.count(MetricModel.value)
+            case StatisticType.STDDEV:
+                return func.stddev_samp(MetricModel.value)
+            case StatisticType.VARIANCE:
+                return func.var_samp(MetricModel.value)
+            case StatisticType.FIRST:
+                return func.min(self._timestamped_value(), type_=ARRAY(Float))[2]
+            case StatisticType.LAST:
+                return func.max(self._timestamped_value(), type_=ARRAY(Float))[2]
+            case StatisticType.P50 | StatisticType.P90 | StatisticType.P95 | StatisticType.P99:
+                # Exact over raw readings; ranges answered from rollups merge sketches instead
+                return func.percentile_cont(QUANTILE_STATISTICS[statistic]).within_group(MetricModel.value)
             case _:
                 raise ValueError(f"Unsupported statistic type: {statistic}")
 
         raise ValueError(f"Unsupported statistic type: {statistic}")
 
-    async def _handle_duplicate_metric(self, metric: Metric, error: IntegrityError) -> Metric:
-        try:
-            existing_metric = await self._get_metric_by_key(
-                sensor_id=metric.sensor_id,
-                metric_type=metric.metric_type,
-                timestamp=metric.timestamp,
-            )
-            return existing_metric if existing_metric else metric
-        except SQLAlchemyError:
-            raise DatabaseError(f"Failed to add metric due to constraint violation: {str(error)}") from error
-
-    async def _get_metric_by_key(self, sensor_id: str, metric_type: MetricType, timestamp: datetime) -> Metric | None:
-        try:
-            result = await self._session.execute(
-                select(MetricModel).where(
-                    and_(
-                        MetricModel.sensor_id == sensor_id,
-                        MetricModel.metric_type == metric_type.value,
-                        MetricModel.timestamp == timestamp,
-                    )
-                )
-            )
-            metric_model = result.scalar_one_or_none()
-
-            if metric_model is None:
-                return None
-
-            return Metric(
-                sensor_id=str(metric_model.sensor_id),
-                metric_type=MetricType(metric_model.metric_type),
-                timestamp=metric_model.timestamp,  # type: ignore
-                value=float(metric_model.value),
-            )
-        except SQLAlchemyError as e:
-            raise DatabaseError(f"Database error while getting metric by key: {str(e)}") from e
+    def _timestamped_value(self) -> Any:
+        # [epoch microseconds, value] pairs compare by timestamp first, so min and max find the earliest and latest
+        # reading in constant memory. Microseconds since 1970 are exact in double precision until the year 2255.
+        return array([cast(func.extract("epoch", MetricModel.timestamp) * 1_000_000, Float), MetricModel.value])
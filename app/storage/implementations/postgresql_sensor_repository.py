@@ -1,10 +1,10 @@
-from sqlalchemy import select
+from sqlalchemy import func, select, update
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.shared.exceptions import DatabaseError
-from app.shared.models import Sensor
-from app.storage.database_models import SensorModel
+from app.shared.models import Sensor, SensorRegistryVersion
+from app.storage.database_models import SensorModel, SensorRegistryVersionModel
 from app.storage.interfaces.sensor_repository import SensorRepository
 
 
@@ -21,6 +21,13 @@ class PostgreSQLSensorRepository(SensorRepository):
 
         try:
             self._session.add(sensor_model)
+            # Bumped in the same transaction, so the version never disagrees with the committed sensors
+            await self._session.execute(
+                update(SensorRegistryVersionModel).values(
+                    sensor_count=SensorRegistryVersionModel.sensor_count + 1,
+                    last_created_at=func.greatest(SensorRegistryVersionModel.last_created_at, sensor.created_at),
+                )
+            )
             await self._session.commit()
             return sensor
         except IntegrityError as e:
@@ -32,29 +39,51 @@ class PostgreSQLSensorRepository(SensorRepository):
             await self._session.rollback()
             raise DatabaseError(f"Database error while creating sensor: {str(e)}") from e
 
-    async def list_sensors(self) -> list[Sensor]:
-        try:
-            result = await self._session.execute(select(SensorModel))
-            sensor_models = result.scalars().all()
+    async def list_sensors(
+        self, sensor_type: str | None = None, after: str | None = None, limit: int | None = None
+    ) -> list[Sensor]:
+        # Plain columns in key order, so a page is an index range scan that stops after `limit` rows
+        query = select(SensorModel.sensor_id, SensorModel.sensor_type, SensorModel.created_at).order_by(
+            SensorModel.sensor_id
+        )
+        if sensor_type is not None:
+            query = query.where(SensorModel.sensor_type == sensor_type)
+        if after is not None:
+            query = query.where(SensorModel.sensor_id > after)
+        if limit is not None:
+            query = query.limit(limit)
 
+        try:
+            result = await self._session.execute(query)
             return [
-                Sensor(
-                    sensor_id=str(model.sensor_id),
-                    sensor_type=str(model.sensor_type),
-                    created_at=model.created_at,  # type: ignore[arg-type]
-                )
-                for model in sensor_models
+                Sensor(sensor_id=row.sensor_id, sensor_type=row.sensor_type, created_at=row.created_at)
+                for row in result
             ]
         except SQLAlchemyError as e:
             raise DatabaseError(f"Database error while listing sensors: {str(e)}") from e
 
     async def sensor_exists(self, sensor_id: str) -> bool:
         try:
-            result = await self._session.execute(select(SensorModel).where(SensorModel.sensor_id == sensor_id))
+            # Only the key is selected, no ORM object is hydrated for an existence check
+            result = await self._session.execute(
+                select(SensorModel.sensor_id).where(SensorModel.sensor_id == sensor_id)
+            )
             return result.scalar_one_or_none() is not None
         except SQLAlchemyError as e:
             raise DatabaseError(f"Database error while checking sensor existence: {str(e)}") from e
 
+    async def get_existing_sensor_ids(self, sensor_ids: list[str]) -> set[str]:
+        if not sensor_ids:
+            return set()
+
+        try:
+            result = await self._session.execute(
+                select(SensorModel.sensor_id).where(SensorModel.sensor_id.in_(sensor_ids))
+            )
+            return {str(sensor_id) for sensor_id in result.scalars().all()}
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Database error while checking sensor existence: {str(e)}") from e
+
     async def get_sensor(self, sensor_id: str) -> Sensor | None:
         try:
             result = await self._session.execute(select(SensorModel).where(SensorModel.sensor_id == sensor_id))
@@ -70,3 +99,18 @@ class PostgreSQLSensorRepository(SensorRepository):
             )
         except SQLAlchemyError as e:
             raise DatabaseError(f"Database error while getting sensor: {str(e)}") from e
+
+    async def get_sensors_version(self) -> SensorRegistryVersion:
+        try:
+            result = await self._session.execute(
+                select(SensorRegistryVersionModel.sensor_count, SensorRegistryVersionModel.last_created_at)
+            )
+            row = result.one_or_none()
+            if row is None:
+                # A database initialized before the version table; scripts/init_database.py creates its row
+                result = await self._session.execute(select(func.count(), func.max(SensorModel.created_at)))
+                row = result.one()
+            sensor_count, last_created_at = row
+            return SensorRegistryVersion(sensor_count=sensor_count, last_created_at=last_created_at)
+        except SQLAlchemyError as e:
+            raise DatabaseError(f"Database error while reading the sensor table version: {str(e)}") from e
@@ -0,0 +1,154 @@
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import numpy.typing as npt
+
+from app.shared.models import DuplicatePolicy, MetricType, Sensor, WriteStatus
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# Timestamps are kept as integer microseconds, the precision PostgreSQL stores
+TIMESTAMP_RESOLUTION = timedelta(microseconds=1)
+
+SeriesKey = tuple[str, MetricType]
+
+
+def to_micros(timestamp: datetime) -> int:
+    # Naive timestamps are taken as UTC, the time zone of the application's database sessions
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return (timestamp - EPOCH) // TIMESTAMP_RESOLUTION
+
+
+def from_micros(micros: int) -> datetime:
+    return EPOCH + micros * TIMESTAMP_RESOLUTION
+
+
+class MetricSeries:
+    """Readings of one series in timestamp order, as two parallel arrays of 8 bytes per element.
+
+    Readings newer than the last one are appended. Older ones wait in `_pending` and are merged into the arrays in
+    one sort when the series is next read, so a backfill costs a merge per read rather than a shift per reading.
+    """
+
+    __slots__ = ("_timestamps", "_values", "_pending")
+
+    def __init__(self) -> None:
+        self._timestamps = array("q")
+        self._values = array("d")
+        self._pending: dict[int, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._timestamps) + len(self._pending)
+
+    def contains(self, micros: int) -> bool:
+        return micros in self._pending or self._find(micros) is not None
+
+    def write(self, micros: int, value: float, duplicate_policy: DuplicatePolicy) -> WriteStatus:
+        """Store a reading, resolving an existing one of the same timestamp like the PostgreSQL repository.
+
+        Rejecting duplicates is up to the caller, which checks `contains` first so a batch can fail as a whole.
+        """
+        if not self._timestamps or micros > self._timestamps[-1]:
+            self._timestamps.append(micros)
+            self._values.append(value)
+            return WriteStatus.INSERTED
+
+        index = self._find(micros)
+        stored = self._values[index] if index is not None else self._pending.get(micros)
+        if stored is None:
+            self._pending[micros] = value
+            return WriteStatus.INSERTED
+        # Like ON CONFLICT ... WHERE value IS DISTINCT FROM, rewriting the stored value is not an overwrite
+        if duplicate_policy is not DuplicatePolicy.KEEP_LAST or stored == value:
+            return WriteStatus.DEDUPLICATED
+        if index is not None:
+            self._values[index] = value
+        else:
+            self._pending[micros] = value
+        return WriteStatus.OVERWRITTEN
+
+    def span(self, start: int | None, end: int | None) -> tuple[int, int]:
+        """Positions of the readings from `start` to `end`, both inclusive, in the merged arrays."""
+        self._merge_pending()
+        lower = 0 if start is None else bisect_left(self._timestamps, start)
+        upper = len(self._timestamps) if end is None else bisect_right(self._timestamps, end)
+        return lower, max(lower, upper)
+
+    def after(self, micros: int) -> int:
+        """Position of the first reading after `micros`."""
+        self._merge_pending()
+        return bisect_right(self._timestamps, micros)
+
+    def last(self) -> tuple[int, float] | None:
+        self._merge_pending()
+        if not self._timestamps:
+            return None
+        return self._timestamps[-1], self._values[-1]
+
+    def columns(self, lower: int, upper: int) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.float64]]:
+        """Copies of the timestamps and values between two positions of `span`.
+
+        Copies, as the arrays cannot grow while a view of them is alive, and callers may hold these across an await.
+        """
+        return (
+            np.frombuffer(self._timestamps, dtype=np.int64)[lower:upper].copy(),
+            np.frombuffer(self._values, dtype=np.float64)[lower:upper].copy(),
+        )
+
+    def _find(self, micros: int) -> int | None:
+        index = bisect_left(self._timestamps, micros)
+        if index < len(self._timestamps) and self._timestamps[index] == micros:
+            return index
+        return None
+
+    def _merge_pending(self) -> None:
+        if not self._pending:
+            return
+        timestamps = np.concatenate(
+            (
+                np.frombuffer(self._timestamps, dtype=np.int64),
+                np.fromiter(self._pending.keys(), dtype=np.int64, count=len(self._pending)),
+            )
+        )
+        values = np.concatenate(
+            (
+                np.frombuffer(self._values, dtype=np.float64),
+                np.fromiter(self._pending.values(), dtype=np.float64, count=len(self._pending)),
+            )
+        )
+        # Pending timestamps are distinct from stored ones, so the order is total
+        order = np.argsort(timestamps, kind="stable")
+        self._timestamps = array("q", timestamps[order].tobytes())
+        self._values = array("d", values[order].tobytes())
+        self._pending.clear()
+
+
+class InMemoryStore:
+    """Sensors and metric series of the in-memory storage engine, shared by its repositories.
+
+    Every operation of the repositories runs without awaiting, so each is atomic within the event loop. Nothing is
+    persisted: the store lives as long as the process.
+    """
+
+    def __init__(self) -> None:
+        self.sensors: dict[str, Sensor] = {}
+        # Registered sensor IDs in order, for keyset listings
+        self.sorted_sensor_ids: list[str] = []
+        self.last_created_at: datetime | None = None
+        self.series: dict[str, dict[MetricType, MetricSeries]] = {}
+
+    def add_sensor(self, sensor: Sensor) -> None:
+        self.sensors[sensor.sensor_id] = sensor
+        insort(self.sorted_sensor_ids, sensor.sensor_id)
+        if self.last_created_at is None or sensor.created_at > self.last_created_at:
+            self.last_created_at = sensor.created_at
+
+    def get_series(self, key: SeriesKey) -> MetricSeries | None:
+        sensor_id, metric_type = key
+        return self.series.get(sensor_id, {}).get(metric_type)
+
+    def get_or_create_series(self, key: SeriesKey) -> MetricSeries:
+        sensor_id, metric_type = key
+        return self.series.setdefault(sensor_id, {}).setdefault(metric_type, MetricSeries())
@@ -1,23 +1,73 @@
 from abc import ABC, abstractmethod
+from collections.abc import AsyncIterator, Sequence
 from datetime import datetime
 
-from app.shared.models import AggregatedMetricResult, Metric, MetricType, StatisticType
+from app.shared.models import (
+    AggregatedMetricResult,
+    BucketWidth,
+    Metric,
+    MetricBucket,
+    MetricSummary,
+    MetricType,
+    RawMetricColumns,
+    RawMetricKey,
+    StatisticType,
+    WriteStatus,
+)
+from app.storage.metric_batch import MetricBatch
 
 
 class MetricRepository(ABC):
     @abstractmethod
-    async def add_metric(self, metric: Metric) -> Metric:
+    async def add_metric(self, metric: Metric) -> WriteStatus:
+        """Store one metric, resolving an existing reading of the same key with the repository's duplicate policy."""
+        pass
+
+    @abstractmethod
+    async def add_metrics(self, metrics: list[Metric]) -> int:
+        """Insert metrics in a single transaction, applying the duplicate policy. Returns the number of new rows."""
+        pass
+
+    @abstractmethod
+    async def bulk_add_metrics(self, metrics: Sequence[Metric]) -> int:
+        """Same contract as add_metrics, optimized for large imports and backfills."""
         pass
 
     @abstractmethod
     async def query_metrics(
         self,
-        statistic: StatisticType,
+        statistics: Sequence[StatisticType],
         sensor_ids: list[str] | None = None,
         metrics: list[MetricType] | None = None,
         start_date: datetime | None = None,
         end_date: datetime | None = None,
     ) -> list[AggregatedMetricResult]:
+        """Every statistic of every series with readings in the range, computed together; one result per pair."""
+        pass
+
+    @abstractmethod
+    def iter_bucketed_metrics(
+        self,
+        statistics: Sequence[StatisticType],
+        bucket_width: BucketWidth,
+        time_zone: str,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+    ) -> AsyncIterator[MetricBucket]:
+        """The statistics of every bucket with readings, aligned to `time_zone`, in (sensor, metric, bucket) order."""
+        pass
+
+    @abstractmethod
+    async def summarize_metrics(
+        self,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+    ) -> list[MetricSummary]:
+        """Count, sum, min and max of every series with readings in the range, to merge with partial aggregates."""
         pass
 
     @abstractmethod
@@ -30,6 +80,47 @@ class MetricRepository(ABC):
     ) -> list[Metric]:
         pass
 
+    @abstractmethod
+    async def get_metric_batch(
+        self,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+    ) -> MetricBatch:
+        """Same selection as get_raw_metrics in (sensor_id, metric_type, timestamp) order, as NumPy columns."""
+        pass
+
+    @abstractmethod
+    def iter_raw_metrics(
+        self,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+        after: RawMetricKey | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[Metric]:
+        """Same selection as get_raw_metrics, streamed in (sensor_id, metric_type, timestamp) order.
+
+        A page of at most `limit` readings starts after the reading keyed `after`.
+        """
+        pass
+
+    @abstractmethod
+    def iter_raw_metric_columns(
+        self,
+        batch_size: int,
+        sensor_ids: list[str] | None = None,
+        metrics: list[MetricType] | None = None,
+        start_date: datetime | None = None,
+        end_date: datetime | None = None,
+        after: RawMetricKey | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[RawMetricColumns]:
+        """Same selection and order as iter_raw_metrics, in column batches of at most batch_size readings."""
+        pass
+
     @abstractmethod
     async def get_metrics_by_sensor(self, sensor_id: str) -> list[Metric]:
         pass
@@ -39,7 +130,9 @@ class MetricRepository(ABC):
         pass
 
     @abstractmethod
-    async def get_latest_timestamps(
-        self, sensor_ids: list[str], metrics: list[MetricType]
-    ) -> dict[tuple[str, MetricType], datetime]:
+    async def get_latest_metrics(self, sensor_ids: list[str] | None, metrics: list[MetricType]) -> list[Metric]:
+        """The most recent reading of every requested sensor and metric type that has one, in a single query.
+
+        With `sensor_ids` None, every registered sensor is requested.
+        """
         pass
@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 
-from app.shared.models import Sensor
+from app.shared.models import Sensor, SensorRegistryVersion
 
 
 class SensorRepository(ABC):
@@ -9,7 +9,10 @@ class SensorRepository(ABC):
         pass
 
     @abstractmethod
-    async def list_sensors(self) -> list[Sensor]:
+    async def list_sensors(
+        self, sensor_type: str | None = None, after: str | None = None, limit: int | None = None
+    ) -> list[Sensor]:
+        """Sensors in sensor_id order, optionally of one type, from the first sensor_id after `after` on."""
         pass
 
     @abstractmethod
@@ -19,3 +22,11 @@ class SensorRepository(ABC):
     @abstractmethod
     async def get_sensor(self, sensor_id: str) -> Sensor | None:
         pass
+
+    @abstractmethod
+    async def get_existing_sensor_ids(self, sensor_ids: list[str]) -> set[str]:
+        pass
+
+    @abstractmethod
+    async def get_sensors_version(self) -> SensorRegistryVersion:
+        pass
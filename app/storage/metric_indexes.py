@@ -0,0 +1,66 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Secondary indexes created by earlier schema versions, all redundant with the primary key or its prefixes
+LEGACY_METRIC_INDEXES = {
+    "idx_metrics_sensor_id": "(sensor_id)",
+    "idx_metrics_metric_type": "(metric_type)",
+    "idx_metrics_timestamp": "(timestamp)",
+    "idx_metrics_sensor_metric": "(sensor_id, metric_type)",
+    "idx_metrics_sensor_timestamp": "(sensor_id, timestamp)",
+    "idx_metrics_metric_timestamp": "(metric_type, timestamp)",
+    "idx_metrics_aggregation": "(sensor_id, metric_type, timestamp)",
+    "idx_metrics_sensor_type_time": "(sensor_id, metric_type, timestamp)",
+}
+
+_IS_PARTITIONED = "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'metrics'::regclass)"
+_PRIMARY_KEY_INCLUDES_VALUE = """
+    SELECT i.indnatts > i.indnkeyatts
+    FROM pg_index i JOIN pg_constraint c ON c.conindid = i.indexrelid
+    WHERE c.conrelid = 'metrics'::regclass AND c.contype = 'p'
+"""
+
+
+async def migrate_metric_indexes(engine: AsyncEngine) -> list[str]:
+    """Bring the metrics table of an existing database to the slim index profile of `MetricModel`.
+
+    On a plain table indexes are built and dropped concurrently, so writes continue during the migration; only the
+    final swap of the primary key constraint takes a short exclusive lock. Partitioned tables do not support
+    concurrent index builds, there the statements lock the table while they run. Safe to re-run. Returns the
+    executed statements.
+    """
+    async with engine.connect() as connection:
+        includes_value = await connection.scalar(text(_PRIMARY_KEY_INCLUDES_VALUE))
+        partitioned = await connection.scalar(text(_IS_PARTITIONED))
+
+    if partitioned:
+        statements = [f"DROP INDEX IF EXISTS {name}" for name in LEGACY_METRIC_INDEXES]
+        if not includes_value:
+            statements.append(
+                "ALTER TABLE metrics DROP CONSTRAINT metrics_pkey, "
+                "ADD CONSTRAINT metrics_pkey PRIMARY KEY (sensor_id, metric_type, timestamp) INCLUDE (value)"
+            )
+        statements.append("CREATE INDEX IF NOT EXISTS idx_metrics_timestamp_brin ON metrics USING brin (timestamp)")
+    else:
+        statements = [f"DROP INDEX CONCURRENTLY IF EXISTS {name}" for name in LEGACY_METRIC_INDEXES]
+        if not includes_value:
+            statements += [
+                # Left over by an interrupted run, a failed concurrent build stays behind as an invalid index
+                "DROP INDEX CONCURRENTLY IF EXISTS metrics_pkey_covering",
+                "CREATE UNIQUE INDEX CONCURRENTLY metrics_pkey_covering "
+                "ON metrics (sensor_id, metric_type, timestamp) INCLUDE (value)",
+                "ALTER TABLE metrics DROP CONSTRAINT metrics_pkey, "
+                "ADD CONSTRAINT metrics_pkey PRIMARY KEY USING INDEX metrics_pkey_covering",
+            ]
+        statements.append(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_metrics_timestamp_brin ON metrics USING brin (timestamp)"
+        )
+    statements.append("ANALYZE metrics")
+
+    # CONCURRENTLY cannot run inside a transaction block
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        for statement in statements:
+            await connection.execute(text(statement))
+
+    return statements
@@ -0,0 +1,278 @@
+from collections.abc import Callable, Sequence
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from pydantic import BaseModel
+from sqlalchemy import (
+    BigInteger,
+    DateTime,
+    Float,
+    Integer,
+    Interval,
+    and_,
+    cast,
+    exists,
+    func,
+    literal,
+    select,
+    true,
+    union_all,
+)
+
+from app.shared.models import MetricType, StatisticType
+from app.storage.database_models import (
+    MetricModel,
+    MetricRollup1dModel,
+    MetricRollup1hModel,
+    MetricRollup1mModel,
+    MetricRollupDirtyModel,
+)
+from app.storage.quantile_sketch import bin_index_expression
+
+# Buckets are aligned to UTC midnight, so day buckets line up with the metrics partitions
+ROLLUP_ORIGIN = datetime(2000, 1, 1, tzinfo=timezone.utc)
+DIRTY_GRAIN = timedelta(minutes=1)
+# Coarsest first
+ROLLUP_MODELS: dict[timedelta, Any] = {
+    timedelta(days=1): MetricRollup1dModel,
+    timedelta(hours=1): MetricRollup1hModel,
+    timedelta(minutes=1): MetricRollup1mModel,
+}
+# Timestamps are stored with microsecond precision, an inclusive end is the exclusive end one tick later
+TIMESTAMP_RESOLUTION = timedelta(microseconds=1)
+
+
+class RollupSegment(BaseModel):
+    """A half-open time range answered from the rollup of `grain`, or from raw metrics when it is None."""
+
+    grain: timedelta | None
+    start: datetime
+    end: datetime
+
+
+def bucket_start(timestamp: datetime, grain: timedelta) -> datetime:
+    return ROLLUP_ORIGIN + (timestamp - ROLLUP_ORIGIN) // grain * grain
+
+
+def plan_rollup_segments(start: datetime, end: datetime) -> list[RollupSegment]:
+    """Split [start, end) into the coarsest whole buckets, leaving raw rows for the unaligned edges."""
+    return _plan(start, end, list(ROLLUP_MODELS))
+
+
+def _plan(start: datetime, end: datetime, grains: list[timedelta]) -> list[RollupSegment]:
+    if start >= end:
+        return []
+    if not grains:
+        return [RollupSegment(grain=None, start=start, end=end)]
+
+    grain, finer = grains[0], grains[1:]
+    first = bucket_start(start, grain)
+    if first < start:
+        first += grain
+    last = bucket_start(end, grain)
+    if first >= last:
+        return _plan(start, end, finer)
+    return [*_plan(start, first, finer), RollupSegment(grain=grain, start=first, end=last), *_plan(last, end, finer)]
+
+
+def build_rollup_aggregation_query(
+    statistics: Sequence[StatisticType],
+    segments: list[RollupSegment],
+    sensor_ids: list[str] | None = None,
+    metrics: list[MetricType] | None = None,
+) -> Any:
+    """Aggregate over the segments, combining per-bucket count, sum, min and max into the `SUMMARY_STATISTICS`.
+
+    Selects one `stat_<n>` column per statistic. Rollup buckets that still have dirty minutes are answered from raw
+    rows instead, so the result always matches the raw table.
+    """
+    combined = _combine_segments(segments, sensor_ids, metrics, _raw_partials, _rollup_partials)
+    return select(
+        combined.c.sensor_id,
+        combined.c.metric_type,
+        *(
+            _combined_statistic(combined, statistic).label(f"stat_{index}")
+            for index, statistic in enumerate(statistics)
+        ),
+    ).group_by(combined.c.sensor_id, combined.c.metric_type)
+
+
+def _combined_statistic(combined: Any, statistic: StatisticType) -> Any:
+    match statistic:
+        case StatisticType.MIN:
+            return func.min(combined.c.value_min)
+        case StatisticType.MAX:
+            return func.max(combined.c.value_max)
+        case StatisticType.SUM:
+            return func.sum(combined.c.value_sum)
+        case StatisticType.AVG:
+            return func.sum(combined.c.value_sum) / cast(func.sum(combined.c.value_count), Float)
+        case StatisticType.COUNT:
+            return func.sum(combined.c.value_count)
+        case _:
+            raise ValueError(f"Statistic cannot be computed from rollups: {statistic}")
+
+    raise ValueError(f"Statistic cannot be computed from rollups: {statistic}")
+
+
+def build_rollup_summary_query(
+    segments: list[RollupSegment],
+    sensor_ids: list[str] | None = None,
+    metrics: list[MetricType] | None = None,
+) -> Any:
+    """Like `build_rollup_aggregation_query`, selecting value_count, value_sum, value_min and value_max instead."""
+    combined = _combine_segments(segments, sensor_ids, metrics, _raw_partials, _rollup_partials)
+    return select(
+        combined.c.sensor_id,
+        combined.c.metric_type,
+        func.sum(combined.c.value_count).label("value_count"),
+        func.sum(combined.c.value_sum).label("value_sum"),
+        func.min(combined.c.value_min).label("value_min"),
+        func.max(combined.c.value_max).label("value_max"),
+    ).group_by(combined.c.sensor_id, combined.c.metric_type)
+
+
+def build_rollup_sketch_query(
+    segments: list[RollupSegment],
+    sensor_ids: list[str] | None = None,
+    metrics: list[MetricType] | None = None,
+) -> Any:
+    """Reading counts per quantile sketch bin of every series over the segments, ordered by series and bin."""
+    combined = _combine_segments(segments, sensor_ids, metrics, _raw_sketch_partials, _rollup_sketch_partials)
+    return (
+        select(
+            combined.c.sensor_id,
+            combined.c.metric_type,
+            combined.c.bin,
+            func.sum(combined.c.value_count).label("value_count"),
+        )
+        .group_by(combined.c.sensor_id, combined.c.metric_type, combined.c.bin)
+        .order_by(combined.c.sensor_id, combined.c.metric_type, combined.c.bin)
+    )
+
+
+def _combine_segments(
+    segments: list[RollupSegment],
+    sensor_ids: list[str] | None,
+    metrics: list[MetricType] | None,
+    raw_partials: Callable[[], Any],
+    rollup_partials: Callable[[Any], Any],
+) -> Any:
+    partials = []
+    for index, segment in enumerate(segments):
+        partials.extend(_segment_partials(index, segment, sensor_ids, metrics, raw_partials, rollup_partials))
+    return union_all(*partials).subquery("partials")
+
+
+def _segment_partials(
+    index: int,
+    segment: RollupSegment,
+    sensor_ids: list[str] | None,
+    metrics: list[MetricType] | None,
+    raw_partials: Callable[[], Any],
+    rollup_partials: Callable[[Any], Any],
+) -> list[Any]:
+    raw_filters = _series_filters(MetricModel, sensor_ids, metrics)
+    if segment.grain is None:
+        return [
+            raw_partials().where(
+                *raw_filters, MetricModel.timestamp >= segment.start, MetricModel.timestamp < segment.end
+            )
+        ]
+
+    rollup = ROLLUP_MODELS[segment.grain]
+    grain = literal(segment.grain, Interval)
+    origin = literal(ROLLUP_ORIGIN, DateTime(timezone=True))
+    dirty = (
+        select(
+            MetricRollupDirtyModel.sensor_id,
+            MetricRollupDirtyModel.metric_type,
+            func.date_bin(grain, MetricRollupDirtyModel.bucket, origin, type_=DateTime(timezone=True)).label("bucket"),
+        )
+        .where(
+            *_series_filters(MetricRollupDirtyModel, sensor_ids, metrics),
+            MetricRollupDirtyModel.bucket >= segment.start,
+            MetricRollupDirtyModel.bucket < segment.end,
+        )
+        .distinct()
+        .cte(f"dirty_{index}")
+    )
+
+    clean = rollup_partials(rollup).where(
+        *_series_filters(rollup, sensor_ids, metrics),
+        rollup.bucket >= segment.start,
+        rollup.bucket < segment.end,
+        ~exists().where(
+            dirty.c.sensor_id == rollup.sensor_id,
+            dirty.c.metric_type == rollup.metric_type,
+            dirty.c.bucket == rollup.bucket,
+        ),
+    )
+    stale = (
+        raw_partials()
+        .join(
+            dirty,
+            and_(
+                dirty.c.sensor_id == MetricModel.sensor_id,
+                dirty.c.metric_type == MetricModel.metric_type,
+                MetricModel.timestamp >= dirty.c.bucket,
+                MetricModel.timestamp < dirty.c.bucket + grain,
+            ),
+        )
+        .where(*raw_filters)
+    )
+    return [clean, stale]
+
+
+def _raw_partials() -> Any:
+    return select(
+        MetricModel.sensor_id,
+        MetricModel.metric_type,
+        func.count().label("value_count"),
+        func.sum(MetricModel.value).label("value_sum"),
+        func.min(MetricModel.value).label("value_min"),
+        func.max(MetricModel.value).label("value_max"),
+    ).group_by(MetricModel.sensor_id, MetricModel.metric_type)
+
+
+def _rollup_partials(rollup: Any) -> Any:
+    return select(
+        rollup.sensor_id,
+        rollup.metric_type,
+        func.sum(rollup.value_count).label("value_count"),
+        func.sum(rollup.value_sum).label("value_sum"),
+        func.min(rollup.value_min).label("value_min"),
+        func.max(rollup.value_max).label("value_max"),
+    ).group_by(rollup.sensor_id, rollup.metric_type)
+
+
+def _raw_sketch_partials() -> Any:
+    bin_index = bin_index_expression(MetricModel.value)
+    return select(
+        MetricModel.sensor_id, MetricModel.metric_type, bin_index.label("bin"), func.count().label("value_count")
+    ).group_by(MetricModel.sensor_id, MetricModel.metric_type, bin_index)
+
+
+def _rollup_sketch_partials(rollup: Any) -> Any:
+    entries = func.jsonb_each_text(rollup.value_sketch).table_valued("key", "value").lateral()
+    bin_index = cast(entries.c.key, Integer)
+    return (
+        select(
+            rollup.sensor_id,
+            rollup.metric_type,
+            bin_index.label("bin"),
+            func.sum(cast(entries.c.value, BigInteger)).label("value_count"),
+        )
+        .select_from(rollup)
+        .join(entries, true())
+        .group_by(rollup.sensor_id, rollup.metric_type, bin_index)
+    )
+
+
+def _series_filters(model: Any, sensor_ids: list[str] | None, metrics: list[MetricType] | None) -> list[Any]:
+    conditions = []
+    if sensor_ids:
+        conditions.append(model.sensor_id.in_(sensor_ids))
+    if metrics:
+        conditions.append(model.metric_type.in_([metric.value for metric in metrics]))
+    return conditions
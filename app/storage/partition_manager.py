@@ -0,0 +1,137 @@
+from datetime import datetime, timedelta, timezone
+
+from pydantic import BaseModel
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.shared.models import PartitionInterval
+
+DEFAULT_PARTITION = "metrics_default"
+
+_IS_PARTITIONED = "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'metrics'::regclass)"
+_LIST_PARTITIONS = """
+    SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+    FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'metrics'::regclass
+"""
+
+
+class MetricPartition(BaseModel):
+    name: str
+    start: datetime
+    end: datetime
+
+
+class MetricPartitionManager:
+    """Maintains the time-range partitions of the metrics table.
+
+    Partitions cover whole UTC days or months and are named after their start (`metrics_p20240131`,
+    `metrics_p202401`). Rows outside every range land in the default partition; creating the partition for
+    their range moves them over. All methods are no-ops on an unpartitioned metrics table.
+    """
+
+    def __init__(
+        self, engine: AsyncEngine, interval: PartitionInterval = PartitionInterval.MONTH, premake: int = 3
+    ) -> None:
+        self._engine = engine
+        self._interval = interval
+        self._premake = premake
+
+    async def is_partitioned(self) -> bool:
+        async with self._engine.connect() as connection:
+            return bool(await connection.scalar(text(_IS_PARTITIONED)))
+
+    async def list_partitions(self) -> list[MetricPartition]:
+        """Attached range partitions, oldest first."""
+        if not await self.is_partitioned():
+            return []
+
+        async with self._engine.begin() as connection:
+            # Partition bounds are rendered in the session time zone
+            await connection.execute(text("SET LOCAL TimeZone = 'UTC'"))
+            rows = (await connection.execute(text(_LIST_PARTITIONS))).all()
+
+        partitions = [self._parse_partition(name, bound) for name, bound in rows if bound != "DEFAULT"]
+        return sorted(partitions, key=lambda partition: partition.start)
+
+    async def ensure_partitions(self, now: datetime | None = None) -> list[MetricPartition]:
+        """Create the partition of `now` and the next `premake` ones if missing. Returns the created partitions."""
+        if not await self.is_partitioned():
+            return []
+
+        existing = {partition.name for partition in await self.list_partitions()}
+        start = self.partition_start(now or datetime.now(timezone.utc))
+        created = []
+        for _ in range(self._premake + 1):
+            partition = self.partition_for(start)
+            if partition.name not in existing:
+                await self.create_partition(partition.start)
+                created.append(partition)
+            start = partition.end
+        return created
+
+    async def create_partition(self, timestamp: datetime) -> MetricPartition:
+        """Create and attach the partition containing `timestamp`, moving its rows out of the default partition."""
+        partition = self.partition_for(timestamp)
+        async with self._engine.begin() as connection:
+            await connection.execute(text(f"CREATE TABLE {partition.name} (LIKE metrics INCLUDING DEFAULTS)"))
+            await connection.execute(
+                text(
+                    f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= :start AND timestamp < :end "
+                    f"RETURNING *) INSERT INTO {partition.name} SELECT * FROM moved"
+                ),
+                {"start": partition.start, "end": partition.end},
+            )
+            await self._attach(connection, partition)
+        return partition
+
+    async def attach_partition(self, timestamp: datetime) -> MetricPartition:
+        """Re-attach a previously detached partition."""
+        partition = self.partition_for(timestamp)
+        async with self._engine.begin() as connection:
+            await self._attach(connection, partition)
+        return partition
+
+    async def detach_partition(self, timestamp: datetime) -> MetricPartition:
+        """Detach the partition containing `timestamp`; its table is kept, but queries no longer see it."""
+        partition = self.partition_for(timestamp)
+        await self._detach(partition.name)
+        return partition
+
+    async def detach_partitions_before(self, cutoff: datetime) -> list[MetricPartition]:
+        """Detach every partition that ends at or before `cutoff`."""
+        # Detached by name, the partitions may predate a change of the configured interval
+        expired = [partition for partition in await self.list_partitions() if partition.end <= cutoff]
+        for partition in expired:
+            await self._detach(partition.name)
+        return expired
+
+    def partition_for(self, timestamp: datetime) -> MetricPartition:
+        start = self.partition_start(timestamp)
+        if self._interval is PartitionInterval.DAY:
+            return MetricPartition(name=f"metrics_p{start:%Y%m%d}", start=start, end=start + timedelta(days=1))
+
+        end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+        return MetricPartition(name=f"metrics_p{start:%Y%m}", start=start, end=end)
+
+    def partition_start(self, timestamp: datetime) -> datetime:
+        start = timestamp.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        return start if self._interval is PartitionInterval.DAY else start.replace(day=1)
+
+    async def _attach(self, connection: AsyncConnection, partition: MetricPartition) -> None:
+        # DDL takes no bind parameters; the bounds are rendered from datetimes, never from user input
+        await connection.execute(
+            text(
+                f"ALTER TABLE metrics ATTACH PARTITION {partition.name} "
+                f"FOR VALUES FROM ('{partition.start.isoformat()}') TO ('{partition.end.isoformat()}')"
+            )
+        )
+
+    async def _detach(self, name: str) -> None:
+        async with self._engine.begin() as connection:
+            await connection.execute(text(f"ALTER TABLE metrics DETACH PARTITION {name}"))
+
+    def _parse_partition(self, name: str, bound: str) -> MetricPartition:
+        # FOR VALUES FROM ('2024-01-01 00:00:00+00') TO ('2024-02-01 00:00:00+00')
+        start, end = bound.split("'")[1::2]
+        return MetricPartition(name=name, start=datetime.fromisoformat(start), end=datetime.fromisoformat(end))
@@ -0,0 +1,62 @@
+import math
+from collections.abc import Sequence
+from typing import Any
+
+from sqlalchemy import Float, Integer, case, cast, func, literal_column
+from sqlalchemy.dialects import postgresql
+
+# Every quantile estimated from a sketch is within 1% of the exact reading at its rank
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+LOG_GAMMA = math.log(GAMMA)
+# Readings closer to zero share bin 0 and are estimated as 0, an absolute error of at most this much
+MIN_MAGNITUDE = 1e-3
+
+SketchBins = Sequence[tuple[int, int]]
+
+
+def bin_index(value: float) -> int:
+    """Signed logarithmic bin of a reading; bins are ordered like the readings they hold.
+
+    Mirrors `bin_index_expression`, which computes the same bins in the database.
+    """
+    magnitude = abs(value)
+    if magnitude <= MIN_MAGNITUDE:
+        return 0
+    index = math.ceil(math.log(magnitude / MIN_MAGNITUDE) / LOG_GAMMA)
+    return index if value > 0 else -index
+
+
+def bin_index_expression(value: Any) -> Any:
+    magnitude = func.abs(value)
+    index = func.ceil(func.ln(magnitude / MIN_MAGNITUDE) / LOG_GAMMA)
+    return case((magnitude <= MIN_MAGNITUDE, 0), else_=cast(func.sign(value) * index, Integer))
+
+
+def bin_index_sql(value: str) -> str:
+    """`bin_index_expression` of a column as SQL text, for statements written as text."""
+    expression = bin_index_expression(literal_column(value, Float))
+    dialect = postgresql.dialect()  # type: ignore[no-untyped-call]
+    return str(expression.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+
+
+def bin_value(index: int) -> float:
+    # Bin i holds magnitudes in (MIN * GAMMA^(i-1), MIN * GAMMA^i]; this estimate is within RELATIVE_ACCURACY of all
+    if index == 0:
+        return 0.0
+    magnitude = MIN_MAGNITUDE * 2 * GAMMA ** abs(index) / (GAMMA + 1)
+    return magnitude if index > 0 else -magnitude
+
+
+def sketch_quantile(bins: SketchBins, quantile: float) -> float | None:
+    """Estimate of the reading at rank quantile * (count - 1) from (bin, count) pairs sorted by bin."""
+    total = sum(count for _, count in bins)
+    if total == 0:
+        return None
+    rank = quantile * (total - 1)
+    seen = 0
+    for index, count in bins:
+        seen += count
+        if seen > rank:
+            return bin_value(index)
+    return bin_value(bins[-1][0])
@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from pydantic import BaseModel, Field
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.shared.models import MetricType
+from app.storage.metric_rollups import DIRTY_GRAIN, ROLLUP_ORIGIN
+from app.storage.partition_manager import MetricPartitionManager
+from app.storage.rollup_manager import MetricRollupManager
+
+_DELETE_EXPIRED_CHUNK = """
+    WITH expired AS (
+        SELECT sensor_id, metric_type, timestamp FROM {table}
+        WHERE metric_type = CAST(:metric_type AS metric_type_enum) AND timestamp < :cutoff
+        LIMIT :batch_size
+    ), deleted AS (
+        DELETE FROM {table} AS m USING expired AS e
+        WHERE m.sensor_id = e.sensor_id AND m.metric_type = e.metric_type AND m.timestamp = e.timestamp
+        RETURNING m.sensor_id, m.metric_type, m.timestamp
+    ){mark_rollups}
+    SELECT count(*) FROM deleted
+"""
+# Marks the rollup buckets of the deleted rows for refresh
+_MARK_ROLLUPS_DIRTY = """, marked AS (
+        INSERT INTO metric_rollup_dirty (sensor_id, metric_type, bucket)
+        SELECT DISTINCT sensor_id, metric_type, date_bin(:grain, timestamp, :origin) FROM deleted
+        ORDER BY 1, 2, 3
+        ON CONFLICT (sensor_id, metric_type, bucket) DO UPDATE SET bucket = EXCLUDED.bucket
+    )"""
+# A series whose newest reading expired has no readings left
+_EXPIRE_SENSOR_LATEST = """
+    DELETE FROM sensor_latest WHERE metric_type = CAST(:metric_type AS metric_type_enum) AND timestamp < :cutoff
+"""
+
+
+class RetentionPolicy(BaseModel):
+    """How long raw readings are kept; `None` keeps them forever."""
+
+    default_days: int | None = None
+    days_by_metric: dict[MetricType, int] = Field(default_factory=dict)
+
+    def cutoffs(self, now: datetime) -> dict[MetricType, datetime | None]:
+        """The timestamp before which readings of each metric type expire."""
+        cutoffs: dict[MetricType, datetime | None] = {}
+        for metric_type in MetricType:
+            days = self.days_by_metric.get(metric_type, self.default_days)
+            cutoffs[metric_type] = None if days is None else now - timedelta(days=days)
+        return cutoffs
+
+
+class RetentionReport(BaseModel):
+    dropped_partitions: list[str] = Field(default_factory=list)
+    # Counted exactly by the chunked deletes
+    rows_deleted: int = 0
+    # Rows of the dropped partitions as estimated by the planner statistics, 0 for a partition never analyzed
+    rows_dropped_estimate: int = 0
+    bytes_reclaimed: int = 0
+
+
+class MetricRetentionManager:
+    """Expires metrics older than a `RetentionPolicy`.
+
+    On a partitioned table, partitions that lie entirely before the cutoff of every metric type are detached and
+    dropped, which returns their space to the operating system at once. Expired readings in the remaining
+    partitions, i.e. the range partition holding a cutoff, readings whose type expires earlier than the others and
+    old readings in the default partition, are removed with chunked deletes. Unpartitioned tables fall back to
+    chunked deletes throughout. Space freed by deletes is reused by later inserts after vacuum but not returned, so
+    only dropped partitions count towards `bytes_reclaimed`. Their rows are not counted, which would scan them, but
+    estimated from `pg_class.reltuples`. With a rollup manager, the rollups of dropped partitions are
+    purged and deleted rows mark their rollup buckets for refresh. With `sensor_latest_enabled`, series whose
+    readings have all expired are removed from `sensor_latest`.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        partition_manager: MetricPartitionManager,
+        delete_batch_size: int = 10_000,
+        rollup_manager: MetricRollupManager | None = None,
+        sensor_latest_enabled: bool = False,
+    ) -> None:
+        self._engine = engine
+        self._partition_manager = partition_manager
+        self._delete_batch_size = delete_batch_size
+        self._rollup_manager = rollup_manager
+        self._sensor_latest_enabled = sensor_latest_enabled
+
+    async def apply(self, policy: RetentionPolicy, now: datetime | None = None) -> RetentionReport:
+        cutoffs = policy.cutoffs(now or datetime.now(timezone.utc))
+        report = RetentionReport()
+
+        # A partition holds every metric type, it can only go once the longest-lived type has expired
+        limits = list(cutoffs.values())
+        partition_cutoff = None if None in limits else min(cutoff for cutoff in limits if cutoff is not None)
+        if partition_cutoff is not None and await self._partition_manager.is_partitioned():
+            for partition in await self._partition_manager.detach_partitions_before(partition_cutoff):
+                rows, size = await self._drop_table(partition.name)
+                if self._rollup_manager is not None:
+                    await self._rollup_manager.purge(partition.start, partition.end)
+                report.dropped_partitions.append(partition.name)
+                report.rows_dropped_estimate += rows
+                report.bytes_reclaimed += size
+
+        # On a partitioned table the deletes are pruned to the partitions still holding expired readings: the one
+        # straddling the cutoff, and the default partition
+        for metric_type, cutoff in cutoffs.items():
+            if cutoff is not None:
+                report.rows_deleted += await self._delete_expired("metrics", metric_type, cutoff)
+        await self._expire_sensor_latest(cutoffs)
+        return report
+
+    async def _expire_sensor_latest(self, cutoffs: dict[MetricType, datetime | None]) -> None:
+        if not self._sensor_latest_enabled:
+            return
+        async with self._engine.begin() as connection:
+            for metric_type, cutoff in cutoffs.items():
+                if cutoff is not None:
+                    await connection.execute(
+                        text(_EXPIRE_SENSOR_LATEST), {"metric_type": metric_type.value, "cutoff": cutoff}
+                    )
+
+    async def _drop_table(self, name: str) -> tuple[int, int]:
+        async with self._engine.begin() as connection:
+            rows = await connection.scalar(
+                text(f"SELECT greatest(reltuples, 0)::bigint FROM pg_class WHERE oid = '{name}'::regclass")
+            )
+            size = await connection.scalar(text(f"SELECT pg_total_relation_size('{name}')"))
+            await connection.execute(text(f"DROP TABLE {name}"))
+        return int(rows), int(size)
+
+    async def _delete_expired(self, table: str, metric_type: MetricType, cutoff: datetime) -> int:
+        # One short transaction per chunk keeps locks and WAL bursts small next to live ingest
+        parameters: dict[str, Any] = {
+            "metric_type": metric_type.value,
+            "cutoff": cutoff,
+            "batch_size": self._delete_batch_size,
+        }
+        mark_rollups = ""
+        if self._rollup_manager is not None:
+            mark_rollups = _MARK_ROLLUPS_DIRTY
+            parameters.update(grain=DIRTY_GRAIN, origin=ROLLUP_ORIGIN)
+        statement = text(_DELETE_EXPIRED_CHUNK.format(table=table, mark_rollups=mark_rollups))
+
+        deleted = 0
+        while True:
+            async with self._engine.begin() as connection:
+                chunk = int(await connection.scalar(statement, parameters))
+            deleted += chunk
+            if chunk < self._delete_batch_size:
+                return deleted
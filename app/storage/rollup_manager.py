@@ -0,0 +1,176 @@
+from datetime import datetime
+from typing import NamedTuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.storage.metric_rollups import ROLLUP_MODELS, ROLLUP_ORIGIN
+from app.storage.quantile_sketch import bin_index_sql
+
+# Serializes every process that rewrites rollups; each level is recomputed from the level below
+_ROLLUP_LOCK_KEY = 0x6D726F6C6C7570
+_LOCK = "SELECT pg_advisory_xact_lock(:key)"
+
+_CREATE_REFRESH_TABLE = """
+    CREATE TEMP TABLE IF NOT EXISTS rollup_refresh (
+        sensor_id TEXT NOT NULL,
+        metric_type metric_type_enum NOT NULL,
+        bucket TIMESTAMPTZ NOT NULL
+    ) ON COMMIT DELETE ROWS
+"""
+# Markers locked by an ingest transaction that has not committed yet are left for the next refresh
+_CLAIM_DIRTY = """
+    WITH claimed AS (
+        DELETE FROM metric_rollup_dirty WHERE (sensor_id, metric_type, bucket) IN (
+            SELECT sensor_id, metric_type, bucket FROM metric_rollup_dirty
+            LIMIT :batch_size FOR UPDATE SKIP LOCKED
+        )
+        RETURNING sensor_id, metric_type, bucket
+    )
+    INSERT INTO rollup_refresh SELECT sensor_id, metric_type, bucket FROM claimed
+"""
+_AFFECTED = "SELECT DISTINCT sensor_id, metric_type, date_bin(:grain, bucket, :origin) AS bucket FROM rollup_refresh"
+_DELETE_AFFECTED = """
+    DELETE FROM {table} AS r USING ({affected}) AS a
+    WHERE r.sensor_id = a.sensor_id AND r.metric_type = a.metric_type AND r.bucket = a.bucket
+"""
+# LATERAL turns each affected bucket into a primary-key range scan of the source, whatever the planner guesses
+# about the unanalyzed temp table
+_INSERT_AFFECTED = """
+    INSERT INTO {table} (sensor_id, metric_type, bucket, value_count, value_sum, value_min, value_max, value_sketch)
+    SELECT a.sensor_id, a.metric_type, a.bucket, s.value_count, s.value_sum, s.value_min, s.value_max, k.value_sketch
+    FROM ({affected}) AS a CROSS JOIN LATERAL (
+        SELECT {aggregates} FROM {source} AS s
+        WHERE s.sensor_id = a.sensor_id AND s.metric_type = a.metric_type
+          AND s.{time_column} >= a.bucket AND s.{time_column} < a.bucket + :grain
+    ) AS s CROSS JOIN LATERAL (
+        SELECT jsonb_object_agg(b.bin, b.value_count) AS value_sketch FROM (
+            SELECT {sketch_bins} FROM {source} AS s {sketch_entries}
+            WHERE s.sensor_id = a.sensor_id AND s.metric_type = a.metric_type
+              AND s.{time_column} >= a.bucket AND s.{time_column} < a.bucket + :grain
+            GROUP BY 1
+        ) AS b
+    ) AS k
+    WHERE s.value_count > 0
+"""
+_INSERT_ALL = """
+    INSERT INTO {table} (sensor_id, metric_type, bucket, value_count, value_sum, value_min, value_max, value_sketch)
+    SELECT a.sensor_id, a.metric_type, a.bucket, a.value_count, a.value_sum, a.value_min, a.value_max, k.value_sketch
+    FROM (
+        SELECT s.sensor_id, s.metric_type, date_bin(:grain, s.{time_column}, :origin) AS bucket, {aggregates}
+        FROM {source} AS s
+        GROUP BY 1, 2, 3
+    ) AS a JOIN (
+        SELECT b.sensor_id, b.metric_type, b.bucket, jsonb_object_agg(b.bin, b.value_count) AS value_sketch FROM (
+            SELECT s.sensor_id, s.metric_type, date_bin(:grain, s.{time_column}, :origin) AS bucket, {sketch_bins}
+            FROM {source} AS s {sketch_entries}
+            GROUP BY 1, 2, 3, 4
+        ) AS b
+        GROUP BY 1, 2, 3
+    ) AS k USING (sensor_id, metric_type, bucket)
+"""
+_RAW_AGGREGATES = (
+    "count(*) AS value_count, sum(s.value) AS value_sum, min(s.value) AS value_min, max(s.value) AS value_max"
+)
+_ROLLUP_AGGREGATES = (
+    "sum(s.value_count) AS value_count, sum(s.value_sum) AS value_sum, "
+    "min(s.value_min) AS value_min, max(s.value_max) AS value_max"
+)
+# Sketches count readings per bin; a coarser bucket adds up the bin counts of the finer ones
+_RAW_SKETCH_BINS = f"{bin_index_sql('s.value')} AS bin, count(*) AS value_count"
+_ROLLUP_SKETCH_BINS = "e.key::integer AS bin, sum(e.value::bigint) AS value_count"
+_ROLLUP_SKETCH_ENTRIES = "CROSS JOIN LATERAL jsonb_each_text(s.value_sketch) AS e"
+
+
+class _Source(NamedTuple):
+    """Placeholders of the statements recomputing one rollup level from the level below."""
+
+    source: str
+    time_column: str
+    aggregates: str
+    sketch_bins: str
+    sketch_entries: str
+
+
+_RAW_SOURCE = _Source("metrics", "timestamp", _RAW_AGGREGATES, _RAW_SKETCH_BINS, "")
+
+
+def _rollup_source(table: str) -> _Source:
+    return _Source(table, "bucket", _ROLLUP_AGGREGATES, _ROLLUP_SKETCH_BINS, _ROLLUP_SKETCH_ENTRIES)
+
+
+class MetricRollupManager:
+    """Keeps the 1-minute, 1-hour and 1-day rollup tables in line with the metrics table.
+
+    Writers mark the minute buckets they touch in `metric_rollup_dirty` inside their own transaction.
+    `refresh` claims those markers and recomputes the minute buckets from raw rows, then the enclosing hours from
+    minutes and the days from hours, so late, overwritten and deleted readings are all picked up. Until then
+    queries read dirty buckets from the raw table.
+    """
+
+    def __init__(self, engine: AsyncEngine, batch_size: int = 10_000) -> None:
+        self._engine = engine
+        self._batch_size = batch_size
+
+    async def refresh(self) -> int:
+        """Recompute every dirty bucket. Returns the number of minute buckets refreshed."""
+        refreshed = 0
+        while True:
+            claimed = await self._refresh_batch()
+            refreshed += claimed
+            if claimed < self._batch_size:
+                return refreshed
+
+    async def rebuild(self) -> dict[str, int]:
+        """Recompute all rollups from the metrics table. Returns the number of rows per rollup table."""
+        counts = {}
+        async with self._engine.begin() as connection:
+            await connection.execute(text(_LOCK), {"key": _ROLLUP_LOCK_KEY})
+            source = _RAW_SOURCE
+            # Finest first, each level is built from the one below
+            for grain, model in reversed(ROLLUP_MODELS.items()):
+                table = model.__tablename__
+                # DELETE rather than TRUNCATE, so queries keep reading the old rollups until the commit
+                await connection.execute(text(f"DELETE FROM {table}"))
+                result = await connection.execute(
+                    text(_INSERT_ALL.format(table=table, **source._asdict())),
+                    {"grain": grain, "origin": ROLLUP_ORIGIN},
+                )
+                counts[table] = result.rowcount
+                source = _rollup_source(table)
+        return counts
+
+    async def purge(self, start: datetime, end: datetime) -> int:
+        """Delete the rollups of [start, end), which must be aligned to whole days. Returns the deleted rows."""
+        deleted = 0
+        async with self._engine.begin() as connection:
+            await connection.execute(text(_LOCK), {"key": _ROLLUP_LOCK_KEY})
+            for model in ROLLUP_MODELS.values():
+                result = await connection.execute(
+                    text(f"DELETE FROM {model.__tablename__} WHERE bucket >= :start AND bucket < :end"),
+                    {"start": start, "end": end},
+                )
+                deleted += result.rowcount
+        return deleted
+
+    async def _refresh_batch(self) -> int:
+        async with self._engine.begin() as connection:
+            await connection.execute(text(_LOCK), {"key": _ROLLUP_LOCK_KEY})
+            await connection.execute(text(_CREATE_REFRESH_TABLE))
+            result = await connection.execute(text(_CLAIM_DIRTY), {"batch_size": self._batch_size})
+            if result.rowcount:
+                await self._recompute_claimed(connection)
+        return result.rowcount
+
+    async def _recompute_claimed(self, connection: AsyncConnection) -> None:
+        source = _RAW_SOURCE
+        for grain, model in reversed(ROLLUP_MODELS.items()):
+            table = model.__tablename__
+            parameters = {"grain": grain, "origin": ROLLUP_ORIGIN}
+            # Buckets left without rows, e.g. after retention, disappear from the rollup
+            await connection.execute(text(_DELETE_AFFECTED.format(table=table, affected=_AFFECTED)), parameters)
+            await connection.execute(
+                text(_INSERT_AFFECTED.format(table=table, affected=_AFFECTED, **source._asdict())),
+                parameters,
+            )
+            source = _rollup_source(table)
@@ -0,0 +1,24 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Blocks writers until the commit, so a reading committed during the rebuild cannot be lost
+_LOCK_SENSOR_LATEST = "LOCK TABLE sensor_latest IN EXCLUSIVE MODE"
+_REBUILD_SENSOR_LATEST = """
+    INSERT INTO sensor_latest (sensor_id, metric_type, timestamp, value)
+    SELECT DISTINCT ON (sensor_id, metric_type) sensor_id, metric_type, timestamp, value
+    FROM metrics
+    ORDER BY sensor_id, metric_type, timestamp DESC
+"""
+
+
+async def rebuild_sensor_latest(engine: AsyncEngine) -> int:
+    """Recompute `sensor_latest` from the metrics table. Returns the number of series.
+
+    Needed when the table has drifted, e.g. after writes made while METRIC_SENSOR_LATEST_ENABLED was off. Readers
+    keep seeing the previous contents until the rebuild commits.
+    """
+    async with engine.begin() as connection:
+        await connection.execute(text(_LOCK_SENSOR_LATEST))
+        await connection.execute(text("DELETE FROM sensor_latest"))
+        result = await connection.execute(text(_REBUILD_SENSOR_LATEST))
+    return result.rowcount
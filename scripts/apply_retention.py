@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Retention script for the metrics table.
+Drops partitions that lie entirely before the retention cutoff and deletes the remaining
+expired readings in chunks. Retention comes from METRIC_RETENTION_DAYS and
+METRIC_RETENTION_DAYS_BY_METRIC unless overridden on the command line.
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.shared.models import MetricType
+from app.shared.settings import get_settings
+from app.storage.database_config import get_db_config
+from app.storage.partition_manager import MetricPartitionManager
+from app.storage.retention_manager import MetricRetentionManager, RetentionPolicy
+from app.storage.rollup_manager import MetricRollupManager
+
+
+def parse_metric_days(value: str) -> tuple[MetricType, int]:
+    metric_type, days = value.split("=")
+    return MetricType(metric_type), int(days)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Expire metrics older than the retention policy.")
+    parser.add_argument("--days", type=int, default=None, help="Retention for every metric type")
+    parser.add_argument(
+        "--metric-days",
+        type=parse_metric_days,
+        action="append",
+        default=[],
+        help="Retention for one metric type, e.g. humidity=30 (repeatable)",
+    )
+    args = parser.parse_args()
+
+    settings = get_settings()
+    policy = RetentionPolicy(
+        default_days=args.days if args.days is not None else settings.retention_days,
+        days_by_metric={**settings.retention_days_by_metric, **dict(args.metric_days)},
+    )
+    if policy.default_days is None and not policy.days_by_metric:
+        print("No retention configured, nothing to do.")
+        return
+
+    db_config = get_db_config()
+    partition_manager = MetricPartitionManager(
+        engine=db_config.engine, interval=settings.partition_interval, premake=settings.partition_premake
+    )
+    retention_manager = MetricRetentionManager(
+        engine=db_config.engine,
+        partition_manager=partition_manager,
+        delete_batch_size=settings.retention_delete_batch_size,
+        rollup_manager=(
+            MetricRollupManager(engine=db_config.engine, batch_size=settings.rollup_refresh_batch_size)
+            if settings.rollups_enabled
+            else None
+        ),
+        sensor_latest_enabled=settings.sensor_latest_enabled,
+    )
+
+    try:
+        report = await retention_manager.apply(policy)
+        for name in report.dropped_partitions:
+            print(f"Dropped partition {name}")
+        print(f"Rows deleted: {report.rows_deleted}")
+        print(f"Rows in dropped partitions (estimated): {report.rows_dropped_estimate}")
+        print(f"Bytes reclaimed: {report.bytes_reclaimed} ({report.bytes_reclaimed / 2**20:.1f} MiB)")
+
+    except Exception as e:
+        print(f"Error applying retention: {e}")
+        sys.exit(1)
+
+    finally:
+        await db_config.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for all-sensors metric queries.
+Registers a large number of benchmark sensors with a few readings each and compares
+GET /metrics/query without sensor IDs answered the way it used to be, by listing every
+sensor and sending the list back to the database, with the all-sensors path that leaves
+the sensor predicate out. Both a range aggregation and a latest-readings query are timed.
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+
+from app.services.metrics_manager import MetricManager
+from app.shared.exceptions import DatabaseError
+from app.shared.models import MetricType, StatisticType
+from app.storage.database_config import get_db_config
+from app.storage.implementations.postgresql_metric_repository import PostgreSQLMetricRepository
+from app.storage.implementations.postgresql_sensor_repository import PostgreSQLSensorRepository
+
+SENSOR_PREFIX = "benchmark-all-sensors-"
+START = datetime(2001, 1, 1, tzinfo=timezone.utc)
+
+_INSERT_SENSORS = """
+    INSERT INTO sensors (sensor_id, sensor_type, created_at)
+    SELECT :prefix || lpad(s::text, 6, '0'), 'benchmark', now() FROM generate_series(0, :sensors - 1) s
+"""
+_INSERT_READINGS = """
+    INSERT INTO metrics (sensor_id, metric_type, timestamp, value)
+    SELECT :prefix || lpad(s::text, 6, '0'), t::metric_type_enum, :start + n * interval '1 minute', (s + n) % 100
+    FROM generate_series(0, :sensors - 1) s, generate_series(0, :readings - 1) n,
+         unnest(ARRAY['temperature', 'humidity']) t
+"""
+
+
+async def load_sensors(engine, sensors: int, readings: int) -> None:
+    async with engine.begin() as conn:
+        params = {"prefix": SENSOR_PREFIX, "sensors": sensors, "start": START, "readings": readings}
+        await conn.execute(text(_INSERT_SENSORS), params)
+        await conn.execute(text(_INSERT_READINGS), params)
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM ANALYZE sensors, metrics"))
+
+
+async def measure(db_config, listed: bool, dated: bool, repeat: int):
+    """Median latency in ms and result count of one all-sensors query, or the error that stopped it."""
+    timings = []
+    results = []
+    async with db_config.async_session_maker() as session:
+        sensor_repository = PostgreSQLSensorRepository(session=session)
+        manager = MetricManager(
+            metric_repository=PostgreSQLMetricRepository(session=session), sensor_repository=sensor_repository
+        )
+        for _ in range(repeat):
+            started = time.perf_counter()
+            try:
+                # The former path: read the whole registry, then send every ID back as a bind parameter
+                sensor_ids = [sensor.sensor_id for sensor in await sensor_repository.list_sensors()] if listed else None
+                results = await manager.query_metrics(
+                    sensor_ids=sensor_ids,
+                    metrics=list(MetricType),
+                    statistics=[StatisticType.AVG],
+                    start_date=START if dated else None,
+                    end_date=START + timedelta(days=1) if dated else None,
+                )
+            except DatabaseError as e:
+                await session.rollback()
+                return None, str(e).splitlines()[0]
+            timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, len(results)
+
+
+async def cleanup(engine) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text("DELETE FROM metrics WHERE sensor_id LIKE :pattern"), {"pattern": f"{SENSOR_PREFIX}%"})
+        await conn.execute(text("DELETE FROM sensors WHERE sensor_id LIKE :pattern"), {"pattern": f"{SENSOR_PREFIX}%"})
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark all-sensors metric queries.")
+    parser.add_argument("--sensors", type=int, default=100_000, help="Number of benchmark sensors")
+    parser.add_argument("--readings", type=int, default=3, help="Readings per sensor and metric type")
+    parser.add_argument("--repeat", type=int, default=5, help="Executions per query")
+    args = parser.parse_args()
+
+    db_config = get_db_config()
+    engine = db_config.engine
+
+    try:
+        await cleanup(engine)
+        started = time.perf_counter()
+        await load_sensors(engine, args.sensors, args.readings)
+        print(f"Registered {args.sensors} sensors with {args.sensors * args.readings * 2} readings")
+        print(f"  in {time.perf_counter() - started:.1f} s")
+
+        for label, dated in (("range avg", True), ("latest", False)):
+            listed_latency, listed_outcome = await measure(db_config, True, dated, args.repeat)
+            direct_latency, direct_outcome = await measure(db_config, False, dated, args.repeat)
+            print(f"{label} over all {args.sensors} sensors:")
+            if listed_latency is None:
+                print(f"  {'listed sensors':<16} failed: {listed_outcome}")
+            else:
+                print(f"  {'listed sensors':<16} {listed_latency:10.2f} ms ({listed_outcome} results)")
+            print(f"  {'all sensors':<16} {direct_latency:10.2f} ms ({direct_outcome} results)", end="")
+            print(f" ({listed_latency / direct_latency:.1f}x)" if listed_latency is not None else "")
+
+    finally:
+        await cleanup(engine)
+        await db_config.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for the metric write paths.
+Compares the per-row add_metric loop, the multi-row add_metrics insert and the
+COPY-based bulk_add_metrics load against the database configured via DB_* variables.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+
+from app.shared.models import Metric, MetricType
+from app.storage.database_config import get_db_config
+from app.storage.implementations.postgresql_metric_repository import PostgreSQLMetricRepository
+
+BENCHMARK_SENSOR_ID = "benchmark-bulk-load"
+
+
+def generate_metrics(count: int, offset: int) -> list[Metric]:
+    start = datetime(2000, 1, 1, tzinfo=timezone.utc) + timedelta(days=offset)
+    return [
+        Metric(
+            sensor_id=BENCHMARK_SENSOR_ID,
+            metric_type=MetricType.TEMPERATURE,
+            timestamp=start + timedelta(seconds=i),
+            value=(i % 400) / 10,
+        )
+        for i in range(count)
+    ]
+
+
+async def run_add_metric_loop(repository, metrics):
+    for metric in metrics:
+        await repository.add_metric(metric=metric)
+
+
+async def run_add_metrics(repository, metrics):
+    await repository.add_metrics(metrics=metrics)
+
+
+async def run_bulk_add_metrics(repository, metrics):
+    await repository.bulk_add_metrics(metrics=metrics)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark metric write paths.")
+    parser.add_argument("--rows", type=int, default=20000, help="Rows written by each method")
+    args = parser.parse_args()
+
+    db_config = get_db_config()
+    methods = [
+        ("add_metric loop", run_add_metric_loop),
+        ("add_metrics", run_add_metrics),
+        ("bulk_add_metrics", run_bulk_add_metrics),
+    ]
+
+    try:
+        async with db_config.engine.begin() as conn:
+            await conn.execute(
+                text(
+                    "INSERT INTO sensors (sensor_id, sensor_type, created_at) "
+                    "VALUES (:sensor_id, 'benchmark', now()) ON CONFLICT DO NOTHING"
+                ),
+                {"sensor_id": BENCHMARK_SENSOR_ID},
+            )
+
+        baseline = None
+        for offset, (name, method) in enumerate(methods):
+            metrics = generate_metrics(args.rows, offset * 1000)
+            async with db_config.async_session_maker() as session:
+                repository = PostgreSQLMetricRepository(session=session)
+                started = time.perf_counter()
+                await method(repository, metrics)
+                elapsed = time.perf_counter() - started
+
+            rows_per_second = args.rows / elapsed
+            baseline = baseline or rows_per_second
+            print(f"{name:<20} {elapsed:8.2f}s {rows_per_second:12.0f} rows/s {rows_per_second / baseline:6.1f}x")
+
+    finally:
+        async with db_config.engine.begin() as conn:
+            await conn.execute(text("DELETE FROM metrics WHERE sensor_id = :sensor_id"), {"sensor_id": BENCHMARK_SENSOR_ID})
+            await conn.execute(text("DELETE FROM sensors WHERE sensor_id = :sensor_id"), {"sensor_id": BENCHMARK_SENSOR_ID})
+        await db_config.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for the metrics index profiles.
+Builds scratch copies of the metrics table with the legacy index set and with the slim
+profile (covering primary key + BRIN on timestamp), then reports insert throughput,
+index size and query latency for each against the database configured via DB_* variables.
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+
+from app.storage.database_config import get_db_config
+from app.storage.metric_indexes import LEGACY_METRIC_INDEXES
+
+PROFILES = {
+    "legacy": ["PRIMARY KEY (sensor_id, metric_type, timestamp)"],
+    "slim": ["PRIMARY KEY (sensor_id, metric_type, timestamp) INCLUDE (value)"],
+}
+PROFILE_INDEXES = {
+    "legacy": [f"({columns[1:-1]})" for columns in LEGACY_METRIC_INDEXES.values()],
+    "slim": ["USING brin (timestamp)"],
+}
+
+# Rows are generated in time order, sensors interleaved, the way live ingest appends them
+_INSERT_BATCH = """
+    INSERT INTO {table}
+    SELECT 'sensor-' || (n % {sensors}),
+           CASE WHEN (n / {sensors}) % 2 = 0 THEN 'temperature' ELSE 'humidity' END::metric_type_enum,
+           timestamptz '2024-01-01' + (n / (2 * {sensors})) * interval '1 second',
+           (n % 400) / 10.0
+    FROM generate_series({first}::bigint, {last}::bigint) n
+"""
+
+QUERIES = {
+    "sensor aggregation (1 day)": """
+        SELECT avg(value) FROM {table}
+        WHERE sensor_id = 'sensor-1' AND metric_type = 'temperature'
+          AND timestamp >= timestamptz '2024-01-01' AND timestamp < timestamptz '2024-01-02'
+    """,
+    "sensor latest timestamp": """
+        SELECT max(timestamp) FROM {table} WHERE sensor_id = 'sensor-1' AND metric_type = 'humidity'
+    """,
+    "all sensors (1 hour)": """
+        SELECT sensor_id, metric_type, avg(value) FROM {table}
+        WHERE timestamp >= timestamptz '2024-01-01 01:00' AND timestamp < timestamptz '2024-01-01 02:00'
+        GROUP BY sensor_id, metric_type
+    """,
+}
+
+
+async def create_table(engine, profile: str, table: str) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        await conn.execute(
+            text(f"CREATE TABLE {table} (LIKE metrics INCLUDING DEFAULTS, {', '.join(PROFILES[profile])})")
+        )
+        for i, index in enumerate(PROFILE_INDEXES[profile]):
+            await conn.execute(text(f"CREATE INDEX {table}_idx_{i} ON {table} {index}"))
+
+
+async def insert_rows(engine, table: str, rows: int, sensors: int, batch_size: int) -> float:
+    started = time.perf_counter()
+    for first in range(0, rows, batch_size):
+        async with engine.begin() as conn:
+            statement = _INSERT_BATCH.format(
+                table=table, sensors=sensors, first=first, last=min(first + batch_size, rows) - 1
+            )
+            await conn.execute(text(statement))
+    return time.perf_counter() - started
+
+
+async def measure_query(engine, query: str, repeat: int) -> float:
+    timings = []
+    async with engine.connect() as conn:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await conn.execute(text(query))
+            timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark metrics index profiles.")
+    parser.add_argument("--rows", type=int, default=500000, help="Rows inserted into each profile")
+    parser.add_argument("--sensors", type=int, default=100, help="Number of distinct sensors")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per insert transaction")
+    parser.add_argument("--repeat", type=int, default=20, help="Executions per query")
+    args = parser.parse_args()
+
+    db_config = get_db_config()
+    engine = db_config.engine
+
+    try:
+        for profile in PROFILES:
+            table = f"metrics_benchmark_{profile}"
+            await create_table(engine, profile, table)
+
+            elapsed = await insert_rows(engine, table, args.rows, args.sensors, args.batch_size)
+            async with engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                # Sets the visibility map, as autovacuum would, so index-only scans can skip the heap
+                await conn.execute(text(f"VACUUM ANALYZE {table}"))
+                index_bytes = await conn.scalar(text(f"SELECT pg_indexes_size('{table}')"))
+                table_bytes = await conn.scalar(text(f"SELECT pg_table_size('{table}')"))
+
+            print(f"{profile}:")
+            print(f"  {'insert':<28} {args.rows / elapsed:10.0f} rows/s")
+            print(f"  {'index size':<28} {index_bytes / 2**20:10.1f} MiB (table {table_bytes / 2**20:.1f} MiB)")
+            for name, query in QUERIES.items():
+                latency = await measure_query(engine, query.format(table=table), args.repeat)
+                print(f"  {name:<28} {latency:10.2f} ms")
+
+    finally:
+        async with engine.begin() as conn:
+            for profile in PROFILES:
+                await conn.execute(text(f"DROP TABLE IF EXISTS metrics_benchmark_{profile}"))
+        await db_config.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
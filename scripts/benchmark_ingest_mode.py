@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for the sensor validation modes of single-metric ingest.
+Records metrics through MetricManager.record_metric with the sensor pre-check and
+with foreign-key-only validation, reporting throughput and SQL statements per request.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import event, text
+
+from app.api.models.metric_models import MetricCreateRequest
+from app.services.metrics_manager import MetricManager
+from app.shared.models import IngestMode, MetricType
+from app.storage.database_config import get_db_config
+from app.storage.implementations.postgresql_metric_repository import PostgreSQLMetricRepository
+from app.storage.implementations.postgresql_sensor_repository import PostgreSQLSensorRepository
+
+BENCHMARK_SENSOR_ID = "benchmark-ingest-mode"
+
+
+class StatementCounter:
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, *args) -> None:
+        self.count += 1
+
+
+async def run_mode(db_config, ingest_mode: IngestMode, requests: int, concurrency: int, offset: int) -> float:
+    start = datetime(2000, 1, 1, tzinfo=timezone.utc) + timedelta(days=offset)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def record(i: int) -> None:
+        async with semaphore, db_config.async_session_maker() as session:
+            # One manager per request, like the FastAPI dependencies build it
+            manager = MetricManager(
+                metric_repository=PostgreSQLMetricRepository(session=session),
+                sensor_repository=PostgreSQLSensorRepository(session=session),
+                ingest_mode=ingest_mode,
+            )
+            await manager.record_metric(
+                sensor_id=BENCHMARK_SENSOR_ID,
+                metric_request=MetricCreateRequest(
+                    metric_type=MetricType.TEMPERATURE, timestamp=start + timedelta(seconds=i), value=i % 100
+                ),
+            )
+
+    started = time.perf_counter()
+    await asyncio.gather(*(record(i) for i in range(requests)))
+    return time.perf_counter() - started
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark sensor validation modes of single-metric ingest.")
+    parser.add_argument("--requests", type=int, default=5000, help="Metrics recorded by each mode")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent requests")
+    args = parser.parse_args()
+
+    db_config = get_db_config()
+    counter = StatementCounter()
+    event.listen(db_config.engine.sync_engine, "before_cursor_execute", counter)
+
+    try:
+        async with db_config.engine.begin() as conn:
+            await conn.execute(
+                text(
+                    "INSERT INTO sensors (sensor_id, sensor_type, created_at) "
+                    "VALUES (:sensor_id, 'benchmark', now()) ON CONFLICT DO NOTHING"
+                ),
+                {"sensor_id": BENCHMARK_SENSOR_ID},
+            )
+
+        baseline = None
+        for offset, ingest_mode in enumerate(IngestMode):
+            counter.count = 0
+            elapsed = await run_mode(db_config, ingest_mode, args.requests, args.concurrency, offset * 1000)
+
+            requests_per_second = args.requests / elapsed
+            baseline = baseline or requests_per_second
+            print(
+                f"{ingest_mode.value:<12} {elapsed:8.2f}s {requests_per_second:10.0f} req/s "
+                f"{counter.count / args.requests:6.2f} statements/req {requests_per_second / baseline:6.2f}x"
+            )
+
+    finally:
+        event.remove(db_config.engine.sync_engine, "before_cursor_execute", counter)
+        async with db_config.engine.begin() as conn:
+            await conn.execute(text("DELETE FROM metrics WHERE sensor_id = :sensor_id"), {"sensor_id": BENCHMARK_SENSOR_ID})
+            await conn.execute(text("DELETE FROM sensors WHERE sensor_id = :sensor_id"), {"sensor_id": BENCHMARK_SENSOR_ID})
+        await db_config.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
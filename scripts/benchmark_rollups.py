@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for rollup-routed range aggregations.
+Loads readings for a set of benchmark sensors, refreshes their rollups and compares the
+latency of a 31-day GET /metrics/query style aggregation answered from raw rows with the
+same query answered from the rollup tables, checking that both return the same results.
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+
+from app.shared.models import MetricType, StatisticType
+from app.storage.database_config import get_db_config
+from app.storage.implementations.postgresql_metric_repository import PostgreSQLMetricRepository
+from app.storage.metric_rollups import ROLLUP_ORIGIN
+from app.storage.rollup_manager import MetricRollupManager
+
+SENSOR_PREFIX = "benchmark-rollup-"
+START = datetime(2001, 1, 1, tzinfo=timezone.utc)
+
+_INSERT_SENSORS = """
+    INSERT INTO sensors (sensor_id, sensor_type, created_at)
+    SELECT :prefix || s, 'benchmark', now() FROM generate_series(0, :sensors - 1) s
+"""
+# One reading per metric type every interval; quarters keep the sums exact
+_INSERT_READINGS = """
+    INSERT INTO metrics (sensor_id, metric_type, timestamp, value)
+    SELECT :prefix || :sensor, t::metric_type_enum, :start + n * :interval, ((n * 7 + :sensor * 13) % 400) / 4.0
+    FROM generate_series(0, :readings - 1) n, unnest(ARRAY['temperature', 'humidity']) t
+"""
+_MARK_READINGS_DIRTY = """
+    INSERT INTO metric_rollup_dirty (sensor_id, metric_type, bucket)
+    SELECT DISTINCT sensor_id, metric_type, date_bin('1 minute', timestamp, :origin)
+    FROM metrics WHERE sensor_id LIKE :pattern
+    ON CONFLICT DO NOTHING
+"""
+# The refresh leaves every claimed marker behind as a dead row, vacuum it like autovacuum would between refreshes
+_VACUUM = "VACUUM ANALYZE metrics, metric_rollup_dirty, metric_rollups_1m, metric_rollups_1h, metric_rollups_1d"
+
+
+async def load_readings(engine, sensors: int, days: int, interval: timedelta) -> int:
+    readings = int(timedelta(days=days) / interval)
+    async with engine.begin() as conn:
+        await conn.execute(text(_INSERT_SENSORS), {"prefix": SENSOR_PREFIX, "sensors": sensors})
+        for sensor in range(sensors):
+            await conn.execute(
+                text(_INSERT_READINGS),
+                {"prefix": SENSOR_PREFIX, "start": START, "interval": interval, "readings": readings, "sensor": sensor},
+            )
+        await conn.execute(text(_MARK_READINGS_DIRTY), {"origin": ROLLUP_ORIGIN, "pattern": f"{SENSOR_PREFIX}%"})
+    return sensors * readings * 2
+
+
+async def measure(db_config, rollups_enabled: bool, sensor_ids: list[str], start, end, repeat: int):
+    timings = []
+    results = None
+    async with db_config.async_session_maker() as session:
+        repository = PostgreSQLMetricRepository(session=session, rollups_enabled=rollups_enabled)
+        for _ in range(repeat):
+            started = time.perf_counter()
+            results = await repository.query_metrics(
+                statistics=[StatisticType.AVG],
+                sensor_ids=sensor_ids,
+                metrics=list(MetricType),
+                start_date=start,
+                end_date=end,
+            )
+            timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, sorted((r.sensor_id, r.metric_type, r.value) for r in results)
+
+
+async def cleanup(engine) -> None:
+    async with engine.begin() as conn:
+        for table in ("metric_rollups_1m", "metric_rollups_1h", "metric_rollups_1d", "metric_rollup_dirty", "metrics"):
+            await conn.execute(
+                text(f"DELETE FROM {table} WHERE sensor_id LIKE :pattern"), {"pattern": f"{SENSOR_PREFIX}%"}
+            )
+        await conn.execute(text("DELETE FROM sensors WHERE sensor_id LIKE :pattern"), {"pattern": f"{SENSOR_PREFIX}%"})
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark rollup-routed range aggregations.")
+    parser.add_argument("--sensors", type=int, default=10, help="Number of benchmark sensors")
+    parser.add_argument("--days", type=int, default=33, help="Days of readings per sensor")
+    parser.add_argument("--interval-seconds", type=int, default=60, help="Seconds between readings")
+    parser.add_argument("--repeat", type=int, default=10, help="Executions per query")
+    args = parser.parse_args()
+
+    db_config = get_db_config()
+    engine = db_config.engine
+    sensor_ids = [f"{SENSOR_PREFIX}{i}" for i in range(args.sensors)]
+    # 31 days, unaligned at both ends like a typical dashboard window
+    start = START + timedelta(days=1, hours=3, minutes=17, seconds=29)
+    end = start + timedelta(days=31)
+
+    try:
+        await cleanup(engine)
+        started = time.perf_counter()
+        rows = await load_readings(engine, args.sensors, args.days, timedelta(seconds=args.interval_seconds))
+        print(f"Loaded {rows} readings in {time.perf_counter() - started:.1f} s")
+
+        started = time.perf_counter()
+        buckets = await MetricRollupManager(engine=engine).refresh()
+        print(f"Refreshed {buckets} minute buckets in {time.perf_counter() - started:.1f} s")
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text(_VACUUM))
+
+        raw_latency, raw_results = await measure(db_config, False, sensor_ids, start, end, args.repeat)
+        rollup_latency, rollup_results = await measure(db_config, True, sensor_ids, start, end, args.repeat)
+
+        print(f"31-day avg over {args.sensors} sensors:")
+        print(f"  {'raw metrics':<16} {raw_latency:10.2f} ms")
+        print(f"  {'rollups':<16} {rollup_latency:10.2f} ms ({raw_latency / rollup_latency:.1f}x)")
+        print(f"  results identical: {raw_results == rollup_results}")
+
+    finally:
+        await cleanup(engine)
+        await db_config.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Bulk import script for historical metrics.
+Reads newline-delimited JSON records ({sensor_id, metric_type, timestamp, value})
+from a file or stdin and loads them through the COPY-based bulk load path.
+"""
+
+import argparse
+import asyncio
+import sys
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import BinaryIO
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.metrics_manager import MetricManager
+from app.storage.database_config import get_db_config
+from app.storage.implementations.postgresql_metric_repository import PostgreSQLMetricRepository
+from app.storage.implementations.postgresql_sensor_repository import PostgreSQLSensorRepository
+
+READ_SIZE = 1024 * 1024
+
+
+async def read_chunks(source: BinaryIO) -> AsyncIterator[bytes]:
+    """Read the source in fixed-size chunks without blocking the event loop."""
+    while chunk := await asyncio.to_thread(source.read, READ_SIZE):
+        yield chunk
+
+
+async def import_metrics(source: BinaryIO, flush_size: int) -> None:
+    db_config = get_db_config()
+
+    try:
+        async with db_config.async_session_maker() as session:
+            manager = MetricManager(
+                metric_repository=PostgreSQLMetricRepository(session=session),
+                sensor_repository=PostgreSQLSensorRepository(session=session),
+            )
+            summary = await manager.ingest_stream(chunks=read_chunks(source), flush_size=flush_size)
+
+        print(f"Lines read: {summary.lines}")
+        print(f"Accepted: {summary.accepted}")
+        print(f"Duplicates: {summary.duplicates}")
+        print(f"Rejected: {summary.rejected}")
+        for rejection in summary.rejections:
+            print(f"  line {rejection.line}: {rejection.reason}")
+
+    finally:
+        await db_config.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import NDJSON metric records.")
+    parser.add_argument("path", nargs="?", help="NDJSON file to import (defaults to stdin)")
+    parser.add_argument("--flush-size", type=int, default=50000, help="Rows loaded per COPY transaction")
+    args = parser.parse_args()
+
+    if args.path:
+        with open(args.path, "rb") as source:
+            asyncio.run(import_metrics(source, args.flush_size))
+    else:
+        asyncio.run(import_metrics(sys.stdin.buffer, args.flush_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -15,7 +15,9 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import create_async_engine
 
+from app.shared.settings import get_settings
 from app.storage.database_config import get_db_config
+from app.storage.partition_manager import MetricPartitionManager
 
 
 async def create_enum_types(engine):
@@ -43,6 +45,20 @@ async def create_tables(engine):
             );
         """))
 
+        # Validator of GET /sensors, bumped by every sensor registration; seeded from an existing sensors table
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS sensor_registry_version (
+                singleton SMALLINT PRIMARY KEY CONSTRAINT sensor_registry_version_single_row CHECK (singleton = 1),
+                sensor_count BIGINT NOT NULL,
+                last_created_at TIMESTAMPTZ
+            );
+        """))
+        await conn.execute(text("""
+            INSERT INTO sensor_registry_version (singleton, sensor_count, last_created_at)
+            SELECT 1, count(*), max(created_at) FROM sensors
+            ON CONFLICT (singleton) DO NOTHING;
+        """))
+
         # Create metrics table with composite primary key
         await conn.execute(text("""
             CREATE TABLE IF NOT EXISTS metrics (
@@ -50,7 +66,59 @@ async def create_tables(engine):
                 metric_type metric_type_enum NOT NULL,
                 timestamp TIMESTAMPTZ NOT NULL,
                 value DOUBLE PRECISION NOT NULL,
-                PRIMARY KEY (sensor_id, metric_type, timestamp)
+                PRIMARY KEY (sensor_id, metric_type, timestamp) INCLUDE (value)
+            ) PARTITION BY RANGE (timestamp);
+        """))
+
+        # Catches rows outside the pre-created time ranges, e.g. late backfills.
+        # A metrics table created before partitioning keeps working unpartitioned.
+        await conn.execute(text("""
+            DO $$ BEGIN
+                IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'metrics'::regclass) THEN
+                    CREATE TABLE IF NOT EXISTS metrics_default PARTITION OF metrics DEFAULT;
+                END IF;
+            END $$;
+        """))
+
+        # Rollups of the metrics table at 1-minute, 1-hour and 1-day grain, see MetricRollupManager
+        for grain in ("1m", "1h", "1d"):
+            await conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS metric_rollups_{grain} (
+                    sensor_id VARCHAR NOT NULL,
+                    metric_type metric_type_enum NOT NULL,
+                    bucket TIMESTAMPTZ NOT NULL,
+                    value_count BIGINT NOT NULL,
+                    value_sum DOUBLE PRECISION NOT NULL,
+                    value_min DOUBLE PRECISION NOT NULL,
+                    value_max DOUBLE PRECISION NOT NULL,
+                    value_sketch JSONB NOT NULL DEFAULT '{{}}',
+                    PRIMARY KEY (sensor_id, metric_type, bucket)
+                );
+            """))
+            # Rollups created before quantile sketches; run scripts/refresh_rollups.py --rebuild to fill them
+            await conn.execute(text(f"""
+                ALTER TABLE metric_rollups_{grain}
+                ADD COLUMN IF NOT EXISTS value_sketch JSONB NOT NULL DEFAULT '{{}}';
+            """))
+
+        # Minute buckets written since their rollups were last refreshed
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS metric_rollup_dirty (
+                sensor_id VARCHAR NOT NULL,
+                metric_type metric_type_enum NOT NULL,
+                bucket TIMESTAMPTZ NOT NULL,
+                PRIMARY KEY (sensor_id, metric_type, bucket)
+            );
+        """))
+
+        # Newest reading of each series, maintained by metric writes
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS sensor_latest (
+                sensor_id VARCHAR NOT NULL,
+                metric_type metric_type_enum NOT NULL,
+                timestamp TIMESTAMPTZ NOT NULL,
+                value DOUBLE PRECISION NOT NULL,
+                PRIMARY KEY (sensor_id, metric_type)
             );
         """))
 
@@ -58,18 +126,34 @@ async def create_tables(engine):
 async def create_indexes(engine):
     """Create database indexes for performance."""
     async with engine.begin() as conn:
-        # Create composite index for fast range scans
+        # The covering primary key serves per-sensor queries, BRIN serves cross-sensor time ranges
         await conn.execute(text("""
-            CREATE INDEX IF NOT EXISTS idx_metrics_sensor_type_time 
-            ON metrics(sensor_id, metric_type, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_metrics_timestamp_brin
+            ON metrics USING brin (timestamp);
         """))
 
-        # Create index on timestamp for time-based queries
+        # Keyset pages of GET /sensors filtered by type
         await conn.execute(text("""
-            CREATE INDEX IF NOT EXISTS idx_metrics_timestamp 
-            ON metrics(timestamp);
+            CREATE INDEX IF NOT EXISTS idx_sensors_type_id
+            ON sensors (sensor_type, sensor_id);
         """))
 
+        for grain in ("1m", "1h", "1d"):
+            await conn.execute(text(f"""
+                CREATE INDEX IF NOT EXISTS idx_metric_rollups_{grain}_bucket_brin
+                ON metric_rollups_{grain} USING brin (bucket);
+            """))
+
+
+async def create_partitions(engine):
+    """Create the metrics partitions of the current and upcoming periods."""
+    settings = get_settings()
+    partition_manager = MetricPartitionManager(
+        engine=engine, interval=settings.partition_interval, premake=settings.partition_premake
+    )
+    for partition in await partition_manager.ensure_partitions():
+        print(f"Created partition {partition.name}")
+
 
 async def main():
     """Initialize the database."""
@@ -89,6 +173,10 @@ async def main():
         # Create indexes
         print("Creating indexes...")
         await create_indexes(db_config.engine)
+
+        # Create partitions
+        print("Creating partitions...")
+        await create_partitions(db_config.engine)
         
         print("Database initialization completed successfully!")
         
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Partition management script for the metrics table.
+Lists partitions, pre-creates upcoming ones and detaches or re-attaches old ones.
+The partition interval and look-ahead come from METRIC_PARTITION_INTERVAL and METRIC_PARTITION_PREMAKE.
+"""
+
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.shared.settings import get_settings
+from app.storage.database_config import get_db_config
+from app.storage.partition_manager import MetricPartitionManager
+
+
+def parse_date(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+async def run(args, partition_manager: MetricPartitionManager) -> None:
+    if not await partition_manager.is_partitioned():
+        print("The metrics table is not partitioned, nothing to do.")
+        return
+
+    match args.command:
+        case "list":
+            for partition in await partition_manager.list_partitions():
+                print(f"{partition.name:<20} {partition.start.isoformat()} .. {partition.end.isoformat()}")
+        case "ensure":
+            for partition in await partition_manager.ensure_partitions(now=args.now):
+                print(f"Created partition {partition.name}")
+        case "detach":
+            for partition in await partition_manager.detach_partitions_before(args.before):
+                print(f"Detached partition {partition.name}")
+        case "attach":
+            partition = await partition_manager.attach_partition(args.start)
+            print(f"Attached partition {partition.name}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Manage the time-range partitions of the metrics table.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="List attached partitions")
+    ensure = subparsers.add_parser("ensure", help="Create the current and upcoming partitions")
+    ensure.add_argument("--now", type=parse_date, default=None, help="Reference date (default: now)")
+    detach = subparsers.add_parser("detach", help="Detach partitions ending at or before a date")
+    detach.add_argument("--before", type=parse_date, required=True, help="Cutoff date (ISO 8601)")
+    attach = subparsers.add_parser("attach", help="Re-attach a detached partition")
+    attach.add_argument("start", type=parse_date, help="Any date inside the partition (ISO 8601)")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    db_config = get_db_config()
+    partition_manager = MetricPartitionManager(
+        engine=db_config.engine, interval=settings.partition_interval, premake=settings.partition_premake
+    )
+
+    try:
+        await run(args, partition_manager)
+
+    except Exception as e:
+        print(f"Error managing partitions: {e}")
+        sys.exit(1)
+
+    finally:
+        await db_config.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Index migration script for the metrics table.
+Drops the secondary indexes of earlier schema versions, makes the primary key cover the
+metric value and adds the BRIN index on timestamp. Safe to run repeatedly.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.storage.database_config import get_db_config
+from app.storage.metric_indexes import migrate_metric_indexes
+
+
+async def main():
+    print("Migrating metric indexes...")
+
+    db_config = get_db_config()
+
+    try:
+        for statement in await migrate_metric_indexes(db_config.engine):
+            print(f"  {statement}")
+        print("Index migration completed successfully!")
+
+    except Exception as e:
+        print(f"Error migrating indexes: {e}")
+        sys.exit(1)
+
+    finally:
+        await db_config.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Rebuild script for the sensor_latest table.
+Recomputes the newest reading of every series from the metrics table, e.g. before enabling
+METRIC_SENSOR_LATEST_ENABLED or after writes made while it was off.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.storage.database_config import get_db_config
+from app.storage.sensor_latest import rebuild_sensor_latest
+
+
+async def main():
+    print("Rebuilding sensor_latest...")
+
+    db_config = get_db_config()
+
+    try:
+        series = await rebuild_sensor_latest(db_config.engine)
+        print(f"Rebuilt sensor_latest: {series} series")
+
+    except Exception as e:
+        print(f"Error rebuilding sensor_latest: {e}")
+        sys.exit(1)
+
+    finally:
+        await db_config.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Rollup refresh script for the metrics table.
+Recomputes the rollup buckets marked dirty by writes, or with --rebuild recomputes every
+rollup from the metrics table, e.g. after writes made while METRIC_ROLLUPS_ENABLED was off.
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.shared.settings import get_settings
+from app.storage.database_config import get_db_config
+from app.storage.rollup_manager import MetricRollupManager
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Refresh the rollup tables of the metrics table.")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute all rollups from the metrics table")
+    args = parser.parse_args()
+
+    db_config = get_db_config()
+    rollup_manager = MetricRollupManager(engine=db_config.engine, batch_size=get_settings().rollup_refresh_batch_size)
+
+    try:
+        if args.rebuild:
+            for table, rows in (await rollup_manager.rebuild()).items():
+                print(f"Rebuilt {table}: {rows} rows")
+        else:
+            print(f"Refreshed {await rollup_manager.refresh()} dirty minute buckets")
+
+    except Exception as e:
+        print(f"Error refreshing rollups: {e}")
+        sys.exit(1)
+
+    finally:
+        await db_config.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
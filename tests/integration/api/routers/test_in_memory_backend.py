@@ -0,0 +1,91 @@
+from collections.abc import Iterator
+
+import pytest
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from app.api import dependencies
+from app.services.query_result_cache import MetricWriteVersionsManager
+from app.shared.settings import reset_settings
+from app.storage.in_memory_store import InMemoryStore
+
+
+@pytest.fixture(autouse=True)
+def memory_backend(monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    monkeypatch.setenv("STORAGE_BACKEND", "memory")
+    monkeypatch.setattr(dependencies, "_in_memory_store", InMemoryStore())
+    reset_settings()
+    yield
+    reset_settings()
+
+
+def test_health_reports_the_in_memory_backend(client: TestClient):
+    response = client.get("/health")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["status"] == "ok"
+    assert response.json()["database"] == "in-memory"
+
+
+def test_metrics_round_trip_without_a_database(client: TestClient):
+    assert client.post("/sensors", json={"sensor_id": "sensor-001", "sensor_type": "weather"}).status_code == 201
+    for timestamp, value in (("2024-01-01T12:00:00Z", 20.0), ("2024-01-01T11:00:00Z", 10.0)):
+        response = client.post(
+            "/metrics/sensor-001/metrics", json={"metric_type": "temperature", "timestamp": timestamp, "value": value}
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+
+    unknown = client.post(
+        "/metrics/sensor-404/metrics",
+        json={"metric_type": "temperature", "timestamp": "2024-01-01T12:00:00Z", "value": 1.0},
+    )
+    assert unknown.status_code == status.HTTP_404_NOT_FOUND
+
+    response = client.get(
+        "/metrics/query",
+        params={
+            "sensor_ids": ["sensor-001"],
+            "metrics": ["temperature"],
+            "statistic": ["avg", "first"],
+            "start_date": "2024-01-01T00:00:00Z",
+            "end_date": "2024-01-02T00:00:00Z",
+        },
+    )
+    assert response.status_code == status.HTTP_200_OK
+    [result] = response.json()["results"]
+    assert [(stat["statistic_type"], stat["value"]) for stat in result["stats"]] == [("avg", 15.0), ("first", 10.0)]
+
+
+def test_query_etag_follows_write_versions_into_the_range(client: TestClient, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv("METRIC_QUERY_VERSIONS_ENABLED", "true")
+    monkeypatch.setattr(dependencies, "_write_versions_manager", MetricWriteVersionsManager())
+    reset_settings()
+    assert client.post("/sensors", json={"sensor_id": "sensor-001", "sensor_type": "weather"}).status_code == 201
+    params = {
+        "sensor_ids": ["sensor-001"],
+        "metrics": ["temperature"],
+        "statistic": ["avg"],
+        "start_date": "2024-01-01T00:00:00Z",
+        "end_date": "2024-01-02T00:00:00Z",
+    }
+
+    def write(timestamp: str) -> None:
+        response = client.post(
+            "/metrics/sensor-001/metrics", json={"metric_type": "temperature", "timestamp": timestamp, "value": 1.0}
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+
+    write("2024-01-01T12:00:00Z")
+    first = client.get("/metrics/query", params=params)
+    assert first.status_code == status.HTTP_200_OK
+    assert "last-modified" in first.headers
+
+    # Live data after the range leaves the result unchanged
+    write("2024-03-01T12:00:00Z")
+    response = client.get("/metrics/query", params=params, headers={"If-None-Match": first.headers["etag"]})
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    write("2024-01-01T13:00:00Z")
+    response = client.get("/metrics/query", params=params, headers={"If-None-Match": first.headers["etag"]})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] != first.headers["etag"]
@@ -1,11 +1,23 @@
+import io
+from datetime import datetime, timedelta, timezone
+
+import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
 
+from app.api import columnar_export
 from app.api.dependencies import get_metric_manager
+from app.api.models.metric_models import (
+    ExportFormat,
+    MetricQueryResponse,
+    MetricQueryVersion,
+    MetricSeriesBucket,
+    StatisticResult,
+)
 from app.main import app
 from app.services.metrics_manager import MetricManager
-from app.shared.exceptions import SensorNotFoundError, ValidationError
-from app.shared.models import MetricType, StatisticType
+from app.shared.exceptions import DuplicateMetricError, InvalidQueryError, SensorNotFoundError, ValidationError
+from app.shared.models import BucketWidth, Metric, MetricType, RawMetricColumns, StatisticType
 
 
 def test_add_sensor_metrics_success(
@@ -14,7 +26,12 @@ def test_add_sensor_metrics_success(
     metric_create_request_data: dict,
     mock_metric_manager: MetricManager,
 ):
-    metric_response = {"sensor_id": sensor_id, "status": "data_recorded", "timestamp": "2023-01-01T12:00:00Z"}
+    metric_response = {
+        "sensor_id": sensor_id,
+        "status": "data_recorded",
+        "timestamp": "2023-01-01T12:00:00Z",
+        "write_status": "inserted",
+    }
     mock_metric_manager.record_metric.return_value = metric_response
 
     app.dependency_overrides[get_metric_manager] = lambda: mock_metric_manager
@@ -41,6 +58,22 @@ def test_add_sensor_metrics_sensor_not_found(
     assert f"Sensor with ID '{sensor_id}' not found" in response.json()["detail"]
 
 
+def test_add_sensor_metrics_duplicate_rejected(
+    client: TestClient,
+    sensor_id: str,
+    metric_create_request_data: dict,
+    mock_metric_manager: MetricManager,
+):
+    mock_metric_manager.record_metric.side_effect = DuplicateMetricError("Metric already exists")
+
+    app.dependency_overrides[get_metric_manager] = lambda: mock_metric_manager
+
+    response = client.post(f"/metrics/{sensor_id}/metrics", json=metric_create_request_data)
+
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert "already exists" in response.json()["detail"]
+
+
 def test_add_sensor_metrics_validation_error(
     client: TestClient,
     sensor_id: str,
@@ -89,22 +122,25 @@ def test_query_metrics_success(
         "query": {
             "sensor_ids": [sensor_id],
             "metrics": [metric_type],
-            "statistic": statistic_type,
+            "statistics": [statistic_type],
             "start_date": None,
             "end_date": None,
         },
         "results": [
             MetricQueryResult(
-                sensor_id=sensor_id, metric=metric_type, stat=StatisticResult(statistic_type=statistic_type, value=25.5)
+                sensor_id=sensor_id,
+                metric=metric_type,
+                stats=[StatisticResult(statistic_type=statistic_type, value=25.5)],
             ).model_dump(),
             MetricQueryResult(
                 sensor_id="sensor-002",
                 metric=MetricType.HUMIDITY,
-                stat=StatisticResult(statistic_type=statistic_type, value=60.0),
+                stats=[StatisticResult(statistic_type=statistic_type, value=60.0)],
             ).model_dump(),
         ],
     }
-    mock_metric_manager.query_metrics_api.return_value = query_response
+    mock_metric_manager.get_query_version.return_value = MetricQueryVersion()
+    mock_metric_manager.query_metrics_api.return_value = MetricQueryResponse.model_validate(query_response)
 
     app.dependency_overrides[get_metric_manager] = lambda: mock_metric_manager
 
@@ -119,6 +155,99 @@ def test_query_metrics_success(
 
     assert response.status_code == status.HTTP_200_OK
     assert response.json() == query_response
+    assert response.headers["cache-control"] == "no-cache"
+
+    # The same result again
+    response = client.get(
+        "/metrics/query",
+        params={
+            "sensor_ids": [sensor_id],
+            "metrics": [metric_type.value],
+            "statistic": statistic_type.value,
+        },
+        headers={"If-None-Match": response.headers["etag"]},
+    )
+
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.content == b""
+
+
+def test_query_metrics_not_modified_without_running_query(
+    client: TestClient,
+    sensor_id: str,
+    metric_type: MetricType,
+    statistic_type: StatisticType,
+    mock_metric_manager: MetricManager,
+):
+    end_date = datetime(2024, 1, 31, tzinfo=timezone.utc)
+    mock_metric_manager.get_query_version.return_value = MetricQueryVersion(
+        end_date=end_date, etag='"cached"', last_modified=datetime(2024, 2, 1, 8, 30, tzinfo=timezone.utc)
+    )
+
+    app.dependency_overrides[get_metric_manager] = lambda: mock_metric_manager
+
+    response = client.get(
+        "/metrics/query",
+        params={
+            "sensor_ids": [sensor_id],
+            "metrics": [metric_type.value],
+            "statistic": statistic_type.value,
+            "end_date": end_date.isoformat(),
+        },
+        headers={"If-None-Match": '"cached"'},
+    )
+
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers["etag"] == '"cached"'
+    assert response.headers["last-modified"] == "Thu, 01 Feb 2024 08:30:00 GMT"
+    # A range that ended long ago does not change any more
+    assert response.headers["cache-control"] == "public, max-age=86400"
+    mock_metric_manager.query_metrics_api.assert_not_called()
+
+
+def test_query_metrics_recent_range_must_be_revalidated(
+    client: TestClient,
+    sensor_id: str,
+    metric_type: MetricType,
+    statistic_type: StatisticType,
+    mock_metric_manager: MetricManager,
+):
+    end_date = datetime.now(timezone.utc) - timedelta(minutes=5)
+    mock_metric_manager.get_query_version.return_value = MetricQueryVersion(end_date=end_date, etag='"cached"')
+    mock_metric_manager.query_metrics_api.return_value = MetricQueryResponse.model_validate(
+        {"query": {"metrics": [metric_type], "statistics": [statistic_type]}, "results": []}
+    )
+
+    app.dependency_overrides[get_metric_manager] = lambda: mock_metric_manager
+
+    response = client.get(
+        "/metrics/query",
+        params={"metrics": [metric_type.value], "statistic": statistic_type.value, "end_date": end_date.isoformat()},
+        headers={"If-None-Match": '"stale"'},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["cache-control"] == "no-cache"
+    assert response.headers["etag"] != '"cached"'
+
+
+def test_query_metrics_computes_repeated_statistics_together(
+    client: TestClient,
+    metric_type: MetricType,
+    mock_metric_manager: MetricManager,
+):
+    mock_metric_manager.get_query_version.return_value = MetricQueryVersion()
+    mock_metric_manager.query_metrics_api.return_value = MetricQueryResponse.model_validate(
+        {"query": {"metrics": [metric_type], "statistics": ["avg", "stddev"]}, "results": []}
+    )
+
+    app.dependency_overrides[get_metric_manager] = lambda: mock_metric_manager
+
+    response = client.get("/metrics/query", params={"metrics": [metric_type.value], "statistic": ["avg", "stddev"]})
+
+    assert response.status_code == status.HTTP_200_OK
+    query_request = mock_metric_manager.query_metrics_api.call_args.kwargs["query_request"]
+    assert query_request.statistics == [StatisticType.AVG, StatisticType.STDDEV]
 
 
 def test_query_metrics_invalid_date_format(
@@ -151,6 +280,7 @@ def test_query_metrics_general_error(
     statistic_type: StatisticType,
     mock_metric_manager: MetricManager,
 ):
+    mock_metric_manager.get_query_version.return_value = MetricQueryVersion()
     mock_metric_manager.query_metrics_api.side_effect = Exception("Unexpected error")
 
     app.dependency_overrides[get_metric_manager] = lambda: mock_metric_manager
@@ -166,3 +296,326 @@ def test_query_metrics_general_error(
 
     assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
     assert "Failed to query metrics" in response.json()["detail"]
+
+
+def test_add_sensor_metrics_batch_success(
+    client: TestClient,
+    sensor_id: str,
+    metric_create_request_data: dict,
+    mock_metric_manager: MetricManager,
+):
+    batch_response = {"sensor_id": sensor_id, "status": "data_recorded", "accepted": 2, "duplicates": 0}
+    mock_metric_manager.record_metrics.return_value = batch_response
+
+    app.dependency_overrides[get_metric_manager] = lambda: mock_metric_manager
+
+    second_metric = {**metric_create_request_data, "timestamp": "2023-01-01T12:01:00Z"}
+    response = client.post(
+        f"/metrics/{sensor_id}/metrics/batch", json={"metrics": [metric_create_request_data, second_metric]}
+    )
+
+    assert response.status_code == status.HTTP_201_CREATED
+    assert response.json() == batch_response
+    assert len(mock_metric_manager.record_metrics.call_args.kwargs["metric_requests"]) == 2
+
+
+def test_add_sensor_metrics_batch_sensor_not_found(
+    client: TestClient,
+    sensor_id: str,
+    metric_create_request_data: dict,
+    mock_metric_manager: MetricManager,
+):
+    mock_metric_manager.record_metrics.side_effect = SensorNotFoundError(f"Sensor with ID '{sensor_id}' not found")
+
+    app.dependency_overrides[get_metric_manager] = lambda: mock_metric_manager
+
+    response = client.post(f"/metrics/{sensor_id}/metrics/batch", json={"metrics": [metric_create_request_data]})
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert f"Sensor with ID '{sensor_id}' not found" in response.json()["detail"]
+
+
+def test_add_sensor_metrics_batch_empty(
+    client: TestClient,
+    sensor_id: str,
+    mock_metric_manager: MetricManager,
+):
+    app.dependency_overrides[get_metric_manager] = lambda: mock_metric_manager
+
+    response = client.post(f"/metrics/{sensor_id}/metrics/batch", json={"metrics": []})
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+    mock_metric_manager.record_metrics.assert_not_called()
+
+
+def test_ingest_metrics_stream_success(
+    client: TestClient,
+    mock_metric_manager: MetricManager,
+):
+    summary = {"lines": 2, "accepted": 1, "duplicates": 0, "rejected": 1, "rejections": [{"line": 2, "reason": "x"}]}
+    received: list[bytes] = []
+
+    async def ingest_stream(chunks):
+        async for chunk in chunks:
+            received.append(chunk)
+        return summary
+
+    mock_metric_manager.ingest_stream.side_effect = ingest_stream
+
+    app.dependency_overrides[get_metric_manager] = lambda: mock_metric_manager
+
+    body = b'{"sensor_id": "sensor-001"}\n{"sensor_id": "sensor-002"}\n'
+    response = client.post("/metrics/ingest", content=body, headers={"Content-Type": "application/x-ndjson"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == summary
+    assert b"".join(received) == body
+
+
+def test_ingest_metrics_stream_general_error(
+    client: TestClient,
+    mock_metric_manager: MetricManager,
+):
+    mock_metric_manager.ingest_stream.side_effect = Exception("Unexpected error")
+
+    app.dependency_overrides[get_metric_manager] = lambda: mock_metric_manager
+
+    response = client.post("/metrics/ingest", content=b"{}\n")
+
+    assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR
+    assert "Failed to ingest metrics" in response.json()["detail"]
+
+
+def test_downsample_metrics_streams_ndjson(
+    client: TestClient,
+    sensor_id: str,
+    metric_type: MetricType,
+    mock_metric_manager: MetricManager,
+):
+    start_date = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    series = [
+        MetricSeriesBucket(
+            sensor_id=sensor_id,
+            metric=metric_type,
+            bucket=start_date + timedelta(minutes=5 * index),
+            stats=[StatisticResult(statistic_type=StatisticType.AVG, value=float(index))],
+        )
+        for index in range(3)
+    ]
+
+    async def buckets():
+        for bucket in series:
+            yield bucket
+
+    mock_metric_manager.downsample_metrics_api.return_value = buckets()
+
+    app.dependency_overrides[get_metric_manager] = lambda: mock_metric_manager
+
+    response = client.get(
+        "/metrics/series",
+        params={"metrics": [metric_type.value], "statistic": "avg", "bucket": "5m", "time_zone": "Europe/Berlin"},
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [MetricSeriesBucket.model_validate_json(line) for line in response.text.splitlines()] == series
+    downsample_request = mock_metric_manager.downsample_metrics_api.call_args.kwargs["downsample_request"]
+    assert (downsample_request.bucket, downsample_request.time_zone) == (BucketWidth.FIVE_MINUTES, "Europe/Berlin")
+
+
+def test_downsample_metrics_rejects_too_many_buckets(
+    client: TestClient,
+    metric_type: MetricType,
+    mock_metric_manager: MetricManager,
+):
+    mock_metric_manager.downsample_metrics_api.side_effect = InvalidQueryError("The range spans 44641 buckets")
+
+    app.dependency_overrides[get_metric_manager] = lambda: mock_metric_manager
+
+    response = client.get(
+        "/metrics/series", params={"metrics": [metric_type.value], "statistic": "avg", "bucket": "1m"}
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "44641 buckets" in response.json()["detail"]
+
+
+def _exported_readings(sensor_id: str, metric_type: MetricType, count: int):
+    start_date = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    readings = [
+        Metric(sensor_id=sensor_id, metric_type=metric_type, timestamp=start_date + timedelta(seconds=i), value=i / 8)
+        for i in range(count)
+    ]
+
+    async def iterate():
+        for reading in readings:
+            yield reading
+
+    return readings, iterate()
+
+
+def test_export_metrics_streams_ndjson(
+    client: TestClient,
+    sensor_id: str,
+    metric_type: MetricType,
+    mock_metric_manager: MetricManager,
+):
+    # More readings than fit one chunk
+    readings, iterator = _exported_readings(sensor_id, metric_type, 2500)
+    mock_metric_manager.export_metrics_api.return_value = iterator
+
+    app.dependency_overrides[get_metric_manager] = lambda: mock_metric_manager
+
+    response = client.get("/metrics/raw", params={"sensor_ids": [sensor_id], "start_date": "2024-01-01T00:00:00Z"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [Metric.model_validate_json(line) for line in response.text.splitlines()] == readings
+    export_request = mock_metric_manager.export_metrics_api.call_args.kwargs["export_request"]
+    assert (export_request.sensor_ids, export_request.metrics) == ([sensor_id], None)
+
+
+def test_export_metrics_streams_csv(
+    client: TestClient,
+    sensor_id: str,
+    metric_type: MetricType,
+    mock_metric_manager: MetricManager,
+):
+    readings, iterator = _exported_readings(sensor_id, metric_type, 3)
+    mock_metric_manager.export_metrics_api.return_value = iterator
+
+    app.dependency_overrides[get_metric_manager] = lambda: mock_metric_manager
+
+    response = client.get("/metrics/raw", params={"metrics": [metric_type.value], "format": "csv"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines() == [
+        "sensor_id,metric_type,timestamp,value",
+        f"{sensor_id},{metric_type.value},2024-01-01T00:00:00+00:00,0.0",
+        f"{sensor_id},{metric_type.value},2024-01-01T00:00:01+00:00,0.125",
+        f"{sensor_id},{metric_type.value},2024-01-01T00:00:02+00:00,0.25",
+    ]
+    assert mock_metric_manager.export_metrics_api.call_args.kwargs["export_request"].export_format is ExportFormat.CSV
+
+
+def test_export_metrics_rejects_unknown_format(client: TestClient, mock_metric_manager: MetricManager):
+    app.dependency_overrides[get_metric_manager] = lambda: mock_metric_manager
+
+    response = client.get("/metrics/raw", params={"format": "xml"})
+
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_CONTENT
+    mock_metric_manager.export_metrics_api.assert_not_called()
+
+
+def _column_batches(sensor_id: str, metric_type: MetricType):
+    batches = [
+        RawMetricColumns(
+            sensor_ids=[sensor_id] * 2,
+            metric_types=[metric_type.value] * 2,
+            timestamps=[first, first + 1],
+            values=[0.25, 1.5],
+        )
+        for first in (1_704_067_200_000_000, 1_704_067_260_000_000)
+    ]
+
+    async def iterate():
+        for batch in batches:
+            yield batch
+
+    return iterate()
+
+
+@pytest.mark.parametrize("export_format", [ExportFormat.ARROW, ExportFormat.PARQUET])
+def test_export_metrics_streams_columnar_formats(
+    client: TestClient,
+    sensor_id: str,
+    metric_type: MetricType,
+    mock_metric_manager: MetricManager,
+    export_format: ExportFormat,
+):
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.parquet
+
+    mock_metric_manager.export_metric_columns_api.return_value = _column_batches(sensor_id, metric_type)
+
+    app.dependency_overrides[get_metric_manager] = lambda: mock_metric_manager
+
+    response = client.get("/metrics/raw", params={"sensor_ids": [sensor_id], "format": export_format.value})
+
+    assert response.status_code == status.HTTP_200_OK
+    if export_format is ExportFormat.ARROW:
+        assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+        table = pyarrow.ipc.open_stream(response.content).read_all()
+    else:
+        assert response.headers["content-type"] == "application/vnd.apache.parquet"
+        table = pyarrow.parquet.read_table(io.BytesIO(response.content))
+    assert table.column("sensor_id").to_pylist() == [sensor_id] * 4
+    assert table.column("metric_type").to_pylist() == [metric_type.value] * 4
+    assert table.column("timestamp").to_pylist()[1:3] == [
+        datetime(2024, 1, 1, 0, 0, 0, 1, tzinfo=timezone.utc),
+        datetime(2024, 1, 1, 0, 1, tzinfo=timezone.utc),
+    ]
+    assert table.column("value").to_pylist() == [0.25, 1.5, 0.25, 1.5]
+    mock_metric_manager.export_metrics_api.assert_not_called()
+
+
+def test_export_metrics_requires_pyarrow_for_columnar_formats(
+    client: TestClient, mock_metric_manager: MetricManager, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(columnar_export, "ARROW_AVAILABLE", False)
+
+    app.dependency_overrides[get_metric_manager] = lambda: mock_metric_manager
+
+    response = client.get("/metrics/raw", params={"format": "parquet"})
+
+    assert response.status_code == status.HTTP_501_NOT_IMPLEMENTED
+    assert "arrow" in response.json()["detail"]
+    mock_metric_manager.export_metric_columns_api.assert_not_called()
+
+
+@pytest.mark.parametrize("export_format", [ExportFormat.NDJSON, ExportFormat.ARROW])
+def test_export_metrics_pages_with_link_cursor(
+    client: TestClient,
+    sensor_id: str,
+    metric_type: MetricType,
+    mock_metric_manager: MetricManager,
+    export_format: ExportFormat,
+):
+    if export_format is ExportFormat.ARROW:
+        pytest.importorskip("pyarrow")
+    readings, iterator = _exported_readings(sensor_id, metric_type, 4)
+    mock_metric_manager.export_metrics_api.return_value = iterator
+    mock_metric_manager.export_metric_columns_api.return_value = _column_batches(sensor_id, metric_type)
+
+    app.dependency_overrides[get_metric_manager] = lambda: mock_metric_manager
+
+    first = client.get("/metrics/raw", params={"format": export_format.value, "limit": 4})
+    mock_metric_manager.export_metrics_api.return_value = _exported_readings(sensor_id, metric_type, 0)[1]
+    mock_metric_manager.export_metric_columns_api.return_value = _exported_readings(sensor_id, metric_type, 0)[1]
+    last = client.get(first.links["next"]["url"])
+
+    assert first.status_code == last.status_code == status.HTTP_200_OK
+    # The next page starts after the last reading of the first one, in either representation
+    export_request = (
+        mock_metric_manager.export_metric_columns_api
+        if export_format is ExportFormat.ARROW
+        else mock_metric_manager.export_metrics_api
+    ).call_args.kwargs["export_request"]
+    expected_last = (
+        (sensor_id, metric_type, datetime(2024, 1, 1, 0, 1, 0, 1, tzinfo=timezone.utc))
+        if export_format is ExportFormat.ARROW
+        else (sensor_id, metric_type, readings[-1].timestamp)
+    )
+    assert tuple(export_request.after) == expected_last
+    assert "link" not in last.headers
+
+
+def test_export_metrics_rejects_malformed_cursor(client: TestClient, mock_metric_manager: MetricManager):
+    app.dependency_overrides[get_metric_manager] = lambda: mock_metric_manager
+
+    # base64 of a key with an unknown metric type
+    response = client.get("/metrics/raw", params={"after": "WzAsInNlbnNvci0xIiwicHJlc3N1cmUiXQ"})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    mock_metric_manager.export_metrics_api.assert_not_called()
@@ -1,3 +1,6 @@
+from datetime import datetime, timezone
+
+import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
 
@@ -5,7 +8,10 @@ from app.api.dependencies import get_sensor_manager
 from app.main import app
 from app.services.sensors_manager import SensorManager
 from app.shared.exceptions import DatabaseError, ValidationError
-from app.shared.models import Sensor
+from app.shared.models import Sensor, SensorRegistryVersion
+
+SENSORS_VERSION = SensorRegistryVersion(sensor_count=2, last_created_at=datetime(2024, 1, 1, tzinfo=timezone.utc))
+SENSORS_ETAG = '"sensors-2-2024-01-01T00:00:00+00:00-5a37cbecbc88d9f4"'
 
 
 def test_create_sensor_success(
@@ -76,6 +82,7 @@ def test_list_sensors_success(
     multiple_sensors: list[Sensor],
     mock_sensor_manager: SensorManager,
 ):
+    mock_sensor_manager.get_sensors_version.return_value = SENSORS_VERSION
     mock_sensor_manager.list_sensors.return_value = multiple_sensors
 
     app.dependency_overrides[get_sensor_manager] = lambda: mock_sensor_manager
@@ -85,12 +92,95 @@ def test_list_sensors_success(
     assert response.status_code == status.HTTP_200_OK
     expected_responses = [sensor.model_dump(mode="json") for sensor in multiple_sensors]
     assert response.json() == expected_responses
+    assert response.headers["etag"] == SENSORS_ETAG
+    assert response.headers["last-modified"] == "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+def test_list_sensors_pages_with_link_cursor(
+    client: TestClient, multiple_sensors: list[Sensor], mock_sensor_manager: SensorManager
+):
+    mock_sensor_manager.get_sensors_version.return_value = SENSORS_VERSION
+    mock_sensor_manager.list_sensors.return_value = multiple_sensors
+
+    app.dependency_overrides[get_sensor_manager] = lambda: mock_sensor_manager
+
+    # A full page links to the next one, keeping the other parameters
+    first = client.get("/sensors/", params={"sensor_type": "thermometer", "limit": 2})
+    next_url = first.links["next"]["url"]
+    mock_sensor_manager.list_sensors.return_value = multiple_sensors[:1]
+    last = client.get(next_url)
+
+    assert first.status_code == last.status_code == status.HTTP_200_OK
+    assert "sensor_type=thermometer" in next_url and "limit=2" in next_url
+    assert mock_sensor_manager.list_sensors.call_args.kwargs == {
+        "sensor_type": "thermometer",
+        "after": multiple_sensors[-1].sensor_id,
+        "limit": 2,
+    }
+    assert "link" not in last.headers
+
+
+def test_list_sensors_rejects_malformed_cursor(client: TestClient, mock_sensor_manager: SensorManager):
+    app.dependency_overrides[get_sensor_manager] = lambda: mock_sensor_manager
+
+    response = client.get("/sensors/", params={"after": "not-a-cursor"})
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    mock_sensor_manager.list_sensors.assert_not_called()
+
+
+@pytest.mark.parametrize("if_none_match", [SENSORS_ETAG, f'"stale", W/{SENSORS_ETAG}', "*"])
+def test_list_sensors_not_modified(client: TestClient, mock_sensor_manager: SensorManager, if_none_match: str):
+    mock_sensor_manager.get_sensors_version.return_value = SENSORS_VERSION
+
+    app.dependency_overrides[get_sensor_manager] = lambda: mock_sensor_manager
+
+    response = client.get("/sensors/", headers={"If-None-Match": if_none_match})
+
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert response.headers["etag"] == SENSORS_ETAG
+    mock_sensor_manager.list_sensors.assert_not_called()
+
+
+def test_list_sensors_with_stale_etag(
+    client: TestClient, multiple_sensors: list[Sensor], mock_sensor_manager: SensorManager
+):
+    mock_sensor_manager.get_sensors_version.return_value = SENSORS_VERSION
+    mock_sensor_manager.list_sensors.return_value = multiple_sensors
+
+    app.dependency_overrides[get_sensor_manager] = lambda: mock_sensor_manager
+
+    response = client.get(
+        "/sensors/", headers={"If-None-Match": '"sensors-1-2023-12-31T00:00:00+00:00-5a37cbecbc88d9f4"'}
+    )
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()) == len(multiple_sensors)
+
+
+@pytest.mark.parametrize("params", [{"sensor_type": "thermometer"}, {"limit": 2}])
+def test_list_sensors_etag_covers_query_parameters(
+    client: TestClient, multiple_sensors: list[Sensor], mock_sensor_manager: SensorManager, params: dict
+):
+    mock_sensor_manager.get_sensors_version.return_value = SENSORS_VERSION
+    mock_sensor_manager.list_sensors.return_value = multiple_sensors
+
+    app.dependency_overrides[get_sensor_manager] = lambda: mock_sensor_manager
+
+    # The tag of the unfiltered list does not validate a filtered page
+    response = client.get("/sensors/", params=params, headers={"If-None-Match": SENSORS_ETAG})
+    repeated = client.get("/sensors/", params=params, headers={"If-None-Match": response.headers["etag"]})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["etag"] != SENSORS_ETAG
+    assert repeated.status_code == status.HTTP_304_NOT_MODIFIED
 
 
 def test_list_sensors_database_error(
     client: TestClient,
     mock_sensor_manager: SensorManager,
 ):
+    mock_sensor_manager.get_sensors_version.return_value = SENSORS_VERSION
     mock_sensor_manager.list_sensors.side_effect = DatabaseError("Database query failed")
 
     app.dependency_overrides[get_sensor_manager] = lambda: mock_sensor_manager
@@ -105,6 +195,7 @@ def test_list_sensors_general_error(
     client: TestClient,
     mock_sensor_manager: SensorManager,
 ):
+    mock_sensor_manager.get_sensors_version.return_value = SENSORS_VERSION
     mock_sensor_manager.list_sensors.side_effect = Exception("Unexpected error")
 
     app.dependency_overrides[get_sensor_manager] = lambda: mock_sensor_manager
@@ -0,0 +1,155 @@
+from datetime import datetime, timezone
+from unittest.mock import Mock
+
+from fastapi import status
+from fastapi.testclient import TestClient
+
+from app.api.dependencies import (
+    get_group_commit_writer,
+    get_hot_tier,
+    get_metric_maintenance,
+    get_query_cache,
+    get_rollup_refresher,
+    get_sensor_cache,
+)
+from app.api.models.stats_models import GroupCommitStats, MaintenanceStats
+from app.main import app
+from app.services.group_commit_writer import GroupCommitMetricWriter
+from app.services.hot_tier import HotTier
+from app.services.metric_maintenance import MetricMaintenanceTask
+from app.services.sensor_registry_cache import SensorRegistryCache
+
+
+def test_get_stats_without_optional_components(client: TestClient):
+    app.dependency_overrides[get_group_commit_writer] = lambda: None
+    app.dependency_overrides[get_sensor_cache] = lambda: None
+    app.dependency_overrides[get_metric_maintenance] = lambda: None
+    app.dependency_overrides[get_rollup_refresher] = lambda: None
+    app.dependency_overrides[get_hot_tier] = lambda: None
+    app.dependency_overrides[get_query_cache] = lambda: None
+
+    response = client.get("/stats")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {
+        "group_commit": None,
+        "sensor_cache": None,
+        "maintenance": None,
+        "rollups": None,
+        "hot_tier": None,
+        "query_cache": None,
+    }
+
+
+def test_get_stats_with_group_commit_writer(client: TestClient):
+    group_commit_stats = GroupCommitStats(
+        flushes=2,
+        failed_flushes=0,
+        rows=30,
+        queue_depth=0,
+        average_batch_size=15.0,
+        max_batch_size=20,
+        average_flush_latency_ms=1.5,
+        max_flush_latency_ms=2.0,
+    )
+    metric_writer = Mock(spec=GroupCommitMetricWriter)
+    metric_writer.get_stats.return_value = group_commit_stats
+
+    app.dependency_overrides[get_group_commit_writer] = lambda: metric_writer
+    app.dependency_overrides[get_sensor_cache] = lambda: None
+    app.dependency_overrides[get_metric_maintenance] = lambda: None
+    app.dependency_overrides[get_rollup_refresher] = lambda: None
+    app.dependency_overrides[get_hot_tier] = lambda: None
+    app.dependency_overrides[get_query_cache] = lambda: None
+
+    response = client.get("/stats")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {
+        "group_commit": group_commit_stats.model_dump(),
+        "sensor_cache": None,
+        "maintenance": None,
+        "rollups": None,
+        "hot_tier": None,
+        "query_cache": None,
+    }
+
+
+def test_get_stats_with_sensor_cache(client: TestClient):
+    sensor_cache = SensorRegistryCache()
+    sensor_cache.store({"sensor-001"}, exists=True)
+    sensor_cache.lookup("sensor-001")
+    sensor_cache.lookup("sensor-002")
+
+    app.dependency_overrides[get_group_commit_writer] = lambda: None
+    app.dependency_overrides[get_sensor_cache] = lambda: sensor_cache
+    app.dependency_overrides[get_metric_maintenance] = lambda: None
+    app.dependency_overrides[get_rollup_refresher] = lambda: None
+    app.dependency_overrides[get_hot_tier] = lambda: None
+    app.dependency_overrides[get_query_cache] = lambda: None
+
+    response = client.get("/stats")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["sensor_cache"] == {
+        "hits": 1,
+        "negative_hits": 0,
+        "misses": 1,
+        "evictions": 0,
+        "size": 1,
+        "negative_size": 0,
+        "hit_rate": 0.5,
+    }
+
+
+def test_get_stats_with_maintenance_task(client: TestClient):
+    maintenance_stats = MaintenanceStats(
+        runs=3,
+        failed_runs=1,
+        partitions_created=2,
+        partitions_dropped=1,
+        rows_deleted=1200,
+        rows_dropped_estimate=50000,
+        bytes_reclaimed=65536,
+        last_run_at=datetime(2024, 4, 15, tzinfo=timezone.utc),
+        last_error=None,
+    )
+    maintenance = Mock(spec=MetricMaintenanceTask)
+    maintenance.get_stats.return_value = maintenance_stats
+
+    app.dependency_overrides[get_group_commit_writer] = lambda: None
+    app.dependency_overrides[get_sensor_cache] = lambda: None
+    app.dependency_overrides[get_metric_maintenance] = lambda: maintenance
+    app.dependency_overrides[get_rollup_refresher] = lambda: None
+    app.dependency_overrides[get_hot_tier] = lambda: None
+    app.dependency_overrides[get_query_cache] = lambda: None
+
+    response = client.get("/stats")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["maintenance"] == maintenance_stats.model_dump(mode="json")
+
+
+def test_get_stats_with_hot_tier(client: TestClient):
+    hot_tier = HotTier(clock=lambda: datetime(2024, 4, 15, 6, tzinfo=timezone.utc))
+
+    app.dependency_overrides[get_group_commit_writer] = lambda: None
+    app.dependency_overrides[get_sensor_cache] = lambda: None
+    app.dependency_overrides[get_metric_maintenance] = lambda: None
+    app.dependency_overrides[get_rollup_refresher] = lambda: None
+    app.dependency_overrides[get_hot_tier] = lambda: hot_tier
+    app.dependency_overrides[get_query_cache] = lambda: None
+
+    response = client.get("/stats")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["hot_tier"] == {
+        "series": 0,
+        "points": 0,
+        "hits": 0,
+        "partial_hits": 0,
+        "misses": 0,
+        "evicted_points": 0,
+        "hit_rate": 0.0,
+        "window_start": None,
+    }
@@ -0,0 +1,101 @@
+import os
+from collections.abc import AsyncGenerator
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.shared.models import PartitionInterval
+from app.storage.database_config import Base
+from app.storage.database_models import SensorModel
+from app.storage.partition_manager import MetricPartitionManager
+
+
+def _database_url(database: str) -> str:
+    host = os.getenv("DB_HOST", "localhost")
+    port = os.getenv("DB_PORT", "5432")
+    user = os.getenv("DB_USER", "postgres")
+    password = os.getenv("DB_PASSWORD", "postgres")
+    return f"postgresql+psycopg://{user}:{password}@{host}:{port}/{database}"
+
+
+async def _ensure_database(database: str) -> None:
+    engine = create_async_engine(_database_url("postgres"), poolclass=NullPool, isolation_level="AUTOCOMMIT")
+    try:
+        async with engine.connect() as connection:
+            exists = await connection.scalar(
+                text("SELECT 1 FROM pg_database WHERE datname = :name"), {"name": database}
+            )
+            if not exists:
+                await connection.execute(text(f'CREATE DATABASE "{database}"'))
+    finally:
+        await engine.dispose()
+
+
+_schema_created = False
+
+
+@pytest.fixture
+async def db_engine() -> AsyncGenerator[AsyncEngine, None]:
+    """Engine for a scratch PostgreSQL database; tests using it are skipped when no server is reachable."""
+    database = os.getenv("TEST_DB_NAME", "sensor_metrics_test")
+    try:
+        await _ensure_database(database)
+    except (OperationalError, OSError) as e:
+        pytest.skip(f"PostgreSQL is not available: {e}")
+
+    global _schema_created
+    engine = create_async_engine(_database_url(database), poolclass=NullPool)
+    async with engine.begin() as connection:
+        if not _schema_created:
+            # Rebuilt once per run, so the scratch database always matches the current models
+            await connection.execute(text("DROP SCHEMA public CASCADE"))
+            await connection.execute(text("CREATE SCHEMA public"))
+            await connection.run_sync(Base.metadata.create_all)
+            _schema_created = True
+        await connection.execute(
+            text(
+                "TRUNCATE metrics, sensors, sensor_latest, metric_rollup_dirty, "
+                "metric_rollups_1m, metric_rollups_1h, metric_rollups_1d"
+            )
+        )
+        await connection.execute(text("UPDATE sensor_registry_version SET sensor_count = 0, last_created_at = NULL"))
+
+    yield engine
+
+    await engine.dispose()
+
+
+@pytest.fixture
+def session_maker(db_engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(bind=db_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@pytest.fixture
+async def db_session(session_maker: async_sessionmaker[AsyncSession]) -> AsyncGenerator[AsyncSession, None]:
+    async with session_maker() as session:
+        yield session
+
+
+@pytest.fixture
+async def stored_sensor_id(db_session: AsyncSession, sensor_id: str, sensor_type: str) -> str:
+    db_session.add(SensorModel(sensor_id=sensor_id, sensor_type=sensor_type, created_at=datetime.now(timezone.utc)))
+    await db_session.commit()
+    return sensor_id
+
+
+async def _drop_range_partitions(engine: AsyncEngine) -> None:
+    async with engine.begin() as connection:
+        result = await connection.execute(text(r"SELECT tablename FROM pg_tables WHERE tablename LIKE 'metrics\_p%'"))
+        for name in result.scalars().all():
+            await connection.execute(text(f"DROP TABLE {name}"))
+
+
+@pytest.fixture
+async def partition_manager(db_engine: AsyncEngine) -> AsyncGenerator[MetricPartitionManager, None]:
+    await _drop_range_partitions(db_engine)
+    yield MetricPartitionManager(engine=db_engine, interval=PartitionInterval.MONTH, premake=2)
+    await _drop_range_partitions(db_engine)
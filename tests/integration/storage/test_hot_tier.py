@@ -0,0 +1,64 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.hot_tier import HotTier, HotTierMetricRepository
+from app.shared.models import SUMMARY_STATISTICS, Metric, MetricType
+from app.storage.database_models import SensorModel
+from app.storage.implementations.postgresql_metric_repository import PostgreSQLMetricRepository
+
+NOW = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+
+
+def _readings(sensor_ids: list[str], count: int, seed: int) -> list[Metric]:
+    rng = random.Random(seed)
+    return [
+        Metric(
+            sensor_id=rng.choice(sensor_ids),
+            metric_type=rng.choice(list(MetricType)),
+            timestamp=NOW - timedelta(microseconds=rng.randrange(3 * 3600 * 10**6)),
+            # Quarters add up exactly in floating point, so sums in any order can be compared for equality
+            value=rng.randint(-400, 400) / 4,
+        )
+        for _ in range(count)
+    ]
+
+
+@pytest.mark.parametrize("rollups_enabled", [False, True])
+async def test_hot_tier_results_match_the_database(
+    db_session: AsyncSession, stored_sensor_id: str, rollups_enabled: bool
+):
+    db_session.add(SensorModel(sensor_id="sensor-hot", sensor_type="thermometer", created_at=NOW))
+    await db_session.commit()
+    sensor_ids = [stored_sensor_id, "sensor-hot"]
+    database = PostgreSQLMetricRepository(session=db_session, rollups_enabled=rollups_enabled)
+    stored = _readings(sensor_ids, 1500, seed=3)
+    await database.add_metrics(metrics=stored)
+
+    hot_tier = HotTier(window_seconds=3600, max_points_per_series=80, clock=lambda: NOW)
+    await hot_tier.warm(database)
+    repository = HotTierMetricRepository(metric_repository=database, hot_tier=hot_tier)
+    # Written through the tier after warm-up, including duplicates of stored readings
+    duplicates = [metric.model_copy(update={"value": 100.0}) for metric in stored[:100]]
+    await repository.add_metrics(metrics=_readings(sensor_ids, 300, seed=5) + duplicates)
+
+    ranges = [
+        (NOW - timedelta(minutes=40), NOW),
+        (NOW - timedelta(hours=2, minutes=13), NOW - timedelta(minutes=7)),
+        (NOW - timedelta(minutes=20, seconds=1), NOW - timedelta(minutes=19)),
+    ]
+    statistics = sorted(SUMMARY_STATISTICS)
+    for start, end in ranges:
+        expected = await database.query_metrics(
+            statistics=statistics, sensor_ids=sensor_ids, metrics=list(MetricType), start_date=start, end_date=end
+        )
+        actual = await repository.query_metrics(
+            statistics=statistics, sensor_ids=sensor_ids, metrics=list(MetricType), start_date=start, end_date=end
+        )
+        assert sorted(actual, key=str) == sorted(expected, key=str), (start, end)
+
+    stats = hot_tier.get_stats()
+    assert stats.hits > 0 and stats.partial_hits > 0 and stats.misses == 0
+    assert stats.evicted_points > 0
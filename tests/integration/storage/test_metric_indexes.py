@@ -0,0 +1,65 @@
+import re
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.storage.metric_indexes import LEGACY_METRIC_INDEXES, migrate_metric_indexes
+
+
+async def _metric_indexes(engine: AsyncEngine) -> set[str]:
+    async with engine.connect() as connection:
+        result = await connection.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = 'metrics'"))
+        return set(result.scalars().all())
+
+
+async def _restore_legacy_schema(engine: AsyncEngine) -> None:
+    async with engine.begin() as connection:
+        await connection.execute(text("DROP INDEX IF EXISTS idx_metrics_timestamp_brin"))
+        await connection.execute(
+            text(
+                "ALTER TABLE metrics DROP CONSTRAINT metrics_pkey, "
+                "ADD CONSTRAINT metrics_pkey PRIMARY KEY (sensor_id, metric_type, timestamp)"
+            )
+        )
+        for name, columns in LEGACY_METRIC_INDEXES.items():
+            await connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON metrics {columns}"))
+
+
+async def test_migrate_metric_indexes_drops_redundant_indexes(db_engine: AsyncEngine, stored_sensor_id: str):
+    await _restore_legacy_schema(db_engine)
+    async with db_engine.begin() as connection:
+        await connection.execute(
+            text(
+                "INSERT INTO metrics SELECT :sensor_id, 'temperature', "
+                "timestamptz '2023-01-01' + n * interval '1 minute', n FROM generate_series(1, 100) n"
+            ),
+            {"sensor_id": stored_sensor_id},
+        )
+
+    statements = await migrate_metric_indexes(db_engine)
+
+    assert await _metric_indexes(db_engine) == {"metrics_pkey", "idx_metrics_timestamp_brin"}
+    assert any("PRIMARY KEY" in statement for statement in statements)
+
+    async with db_engine.connect() as connection:
+        assert await connection.scalar(text("SELECT count(*) FROM metrics")) == 100
+        # Aggregations over one sensor read the value straight from the primary key
+        await connection.execute(text("SET enable_seqscan = off"))
+        result = await connection.execute(
+            text(
+                "EXPLAIN SELECT avg(value) FROM metrics WHERE sensor_id = :sensor_id "
+                "AND metric_type = 'temperature' AND timestamp >= '2023-01-01'"
+            ),
+            {"sensor_id": stored_sensor_id},
+        )
+        plan = "\n".join(result.scalars().all())
+    assert re.search(r"Index Only Scan using metrics\w*_pkey", plan)
+
+
+async def test_migrate_metric_indexes_is_idempotent(db_engine: AsyncEngine):
+    await migrate_metric_indexes(db_engine)
+
+    statements = await migrate_metric_indexes(db_engine)
+
+    assert not any("PRIMARY KEY" in statement for statement in statements)
+    assert await _metric_indexes(db_engine) == {"metrics_pkey", "idx_metrics_timestamp_brin"}
@@ -0,0 +1,327 @@
+import json
+import math
+import random
+from collections.abc import Sequence
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from app.shared.models import (
+    QUANTILE_STATISTICS,
+    SUMMARY_STATISTICS,
+    AggregatedMetricResult,
+    DuplicatePolicy,
+    Metric,
+    MetricType,
+    StatisticType,
+)
+from app.storage.database_models import SensorModel
+from app.storage.implementations.postgresql_metric_repository import PostgreSQLMetricRepository
+from app.storage.quantile_sketch import MIN_MAGNITUDE, RELATIVE_ACCURACY, bin_index
+from app.storage.rollup_manager import MetricRollupManager
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+QUERY_RANGES = [
+    # Whole days, answered from the daily rollup alone
+    (START, START + timedelta(days=3) - timedelta(microseconds=1)),
+    # Unaligned at both ends, every rollup level plus raw edges
+    (START + timedelta(hours=5, minutes=17, seconds=31), START + timedelta(days=3, hours=2, seconds=7)),
+    (START + timedelta(minutes=59, seconds=59), START + timedelta(hours=2, minutes=1)),
+    # Shorter than a minute, raw only
+    (START + timedelta(hours=7, seconds=10), START + timedelta(hours=7, seconds=50)),
+    # Other time zone
+    (
+        datetime(2024, 1, 2, 3, 30, tzinfo=timezone(timedelta(hours=5, minutes=30))),
+        datetime(2024, 1, 4, 12, 0, tzinfo=timezone(timedelta(hours=-3))),
+    ),
+]
+
+
+def _readings(sensor_ids: list[str], count: int, seed: int = 7) -> list[Metric]:
+    rng = random.Random(seed)
+    readings = {}
+    while len(readings) < count:
+        metric = Metric(
+            sensor_id=rng.choice(sensor_ids),
+            metric_type=rng.choice(list(MetricType)),
+            timestamp=START + timedelta(microseconds=rng.randrange(4 * 24 * 3600 * 10**6)),
+            # Quarters add up exactly in floating point, so partial sums can be compared for equality
+            value=rng.randint(-400, 400) / 4,
+        )
+        readings[(metric.sensor_id, metric.metric_type, metric.timestamp)] = metric
+    return list(readings.values())
+
+
+def _sorted(results: Sequence[AggregatedMetricResult]) -> list[tuple[str, MetricType, StatisticType, float | None]]:
+    return sorted((result.sensor_id, result.metric_type, result.statistic, result.value) for result in results)
+
+
+@pytest.fixture
+async def sensor_ids(db_session: AsyncSession, stored_sensor_id: str) -> list[str]:
+    db_session.add(SensorModel(sensor_id="sensor-rollup", sensor_type="thermometer", created_at=START))
+    await db_session.commit()
+    return [stored_sensor_id, "sensor-rollup"]
+
+
+@pytest.fixture
+def rollup_manager(db_engine: AsyncEngine) -> MetricRollupManager:
+    return MetricRollupManager(engine=db_engine, batch_size=500)
+
+
+async def _assert_matches_raw(session_maker: async_sessionmaker[AsyncSession], sensor_ids: list[str] | None) -> None:
+    async with session_maker() as session:
+        raw = PostgreSQLMetricRepository(session=session)
+        routed = PostgreSQLMetricRepository(session=session, rollups_enabled=True)
+        # Summary statistics are served from rollups, any other statistic sends the whole query to raw readings.
+        # Quantiles are estimated from sketches instead of computed exactly, see test_quantiles_are_within_relative_accuracy
+        for statistics in (
+            [s for s in StatisticType if s in SUMMARY_STATISTICS],
+            [s for s in StatisticType if s not in QUANTILE_STATISTICS],
+        ):
+            for start, end in QUERY_RANGES:
+                expected = await raw.query_metrics(
+                    statistics=statistics,
+                    sensor_ids=sensor_ids,
+                    metrics=list(MetricType),
+                    start_date=start,
+                    end_date=end,
+                )
+                actual = await routed.query_metrics(
+                    statistics=statistics,
+                    sensor_ids=sensor_ids,
+                    metrics=list(MetricType),
+                    start_date=start,
+                    end_date=end,
+                )
+                assert _sorted(actual) == _sorted(expected), (statistics, start, end)
+
+
+async def _dirty_buckets(engine: AsyncEngine) -> int:
+    async with engine.connect() as connection:
+        return await connection.scalar(text("SELECT count(*) FROM metric_rollup_dirty"))
+
+
+async def test_rollup_queries_match_raw_metrics(
+    session_maker: async_sessionmaker[AsyncSession],
+    db_engine: AsyncEngine,
+    db_session: AsyncSession,
+    sensor_ids: list[str],
+    rollup_manager: MetricRollupManager,
+):
+    repository = PostgreSQLMetricRepository(session=db_session, rollups_enabled=True)
+    metrics = _readings(sensor_ids, 6000)
+    await repository.add_metrics(metrics=metrics[:500])
+    await repository.bulk_add_metrics(metrics=metrics[500:])
+    assert await _dirty_buckets(db_engine) > 0
+
+    # The refresh runs in several batches
+    assert await rollup_manager.refresh() > 500
+
+    assert await _dirty_buckets(db_engine) == 0
+    async with db_engine.connect() as connection:
+        assert await connection.scalar(text("SELECT sum(value_count) FROM metric_rollups_1d")) == 6000
+        sketched = "SELECT sum(e.value::bigint) FROM metric_rollups_1h, jsonb_each_text(value_sketch) AS e"
+        assert await connection.scalar(text(sketched)) == 6000
+    await _assert_matches_raw(session_maker, sensor_ids)
+    await _assert_matches_raw(session_maker, None)
+
+
+async def test_dirty_buckets_are_answered_from_raw_metrics(
+    session_maker: async_sessionmaker[AsyncSession],
+    db_engine: AsyncEngine,
+    db_session: AsyncSession,
+    sensor_ids: list[str],
+    rollup_manager: MetricRollupManager,
+):
+    repository = PostgreSQLMetricRepository(
+        session=db_session, duplicate_policy=DuplicatePolicy.KEEP_LAST, rollups_enabled=True
+    )
+    metrics = _readings(sensor_ids, 2000)
+    await repository.add_metrics(metrics=metrics)
+    await rollup_manager.refresh()
+
+    # Late readings and overwrites, not refreshed yet
+    late = _readings(sensor_ids, 200, seed=11)
+    overwritten = [metric.model_copy(update={"value": metric.value + 1000}) for metric in metrics[:50]]
+    await repository.add_metrics(metrics=late + overwritten)
+    await repository.add_metric(metric=metrics[60].model_copy(update={"value": -1000.0}))
+
+    assert await _dirty_buckets(db_engine) > 0
+    await _assert_matches_raw(session_maker, sensor_ids)
+
+    await rollup_manager.refresh()
+    assert await _dirty_buckets(db_engine) == 0
+    await _assert_matches_raw(session_maker, sensor_ids)
+
+
+async def test_quantiles_are_within_relative_accuracy(
+    db_session: AsyncSession, stored_sensor_id: str, rollup_manager: MetricRollupManager
+):
+    rng = random.Random(13)
+    # Skewed readings of both signs, unlike the quarters of _readings
+    readings = [
+        metric.model_copy(update={"value": rng.lognormvariate(2, 1.5) * rng.choice([-1, 1, 1, 1])})
+        for metric in _readings([stored_sensor_id], 3000)
+        if metric.metric_type is MetricType.TEMPERATURE
+    ]
+    repository = PostgreSQLMetricRepository(session=db_session, rollups_enabled=True)
+    await repository.add_metrics(metrics=readings)
+    await rollup_manager.refresh()
+
+    statistics = [StatisticType.P99, StatisticType.AVG, StatisticType.P50, StatisticType.P90, StatisticType.P95]
+    for start, end in QUERY_RANGES[:3]:
+        results = await repository.query_metrics(
+            statistics=statistics,
+            sensor_ids=[stored_sensor_id],
+            metrics=[MetricType.TEMPERATURE],
+            start_date=start,
+            end_date=end,
+        )
+
+        values = sorted(metric.value for metric in readings if start <= metric.timestamp <= end)
+        assert [result.statistic for result in results] == statistics
+        for result in results:
+            if result.statistic is StatisticType.AVG:
+                continue
+            exact = values[math.floor(QUANTILE_STATISTICS[result.statistic] * (len(values) - 1))]
+            assert result.value == pytest.approx(exact, rel=RELATIVE_ACCURACY, abs=MIN_MAGNITUDE), (start, end)
+
+
+async def test_range_query_reads_the_daily_rollup(
+    db_engine: AsyncEngine, db_session: AsyncSession, stored_sensor_id: str, rollup_manager: MetricRollupManager
+):
+    repository = PostgreSQLMetricRepository(session=db_session, rollups_enabled=True)
+    await repository.add_metrics(metrics=_readings([stored_sensor_id], 100))
+    await rollup_manager.refresh()
+    async with db_engine.begin() as connection:
+        await connection.execute(
+            text("UPDATE metric_rollups_1d SET value_max = 12345 WHERE bucket = :day"), {"day": START}
+        )
+
+    results = await repository.query_metrics(
+        statistics=[StatisticType.MAX],
+        sensor_ids=[stored_sensor_id],
+        metrics=[MetricType.TEMPERATURE],
+        start_date=START,
+        end_date=START + timedelta(days=2),
+    )
+
+    assert results[0].value == 12345
+
+
+async def test_quantiles_are_read_from_rollup_sketches_only(
+    db_engine: AsyncEngine, db_session: AsyncSession, stored_sensor_id: str, rollup_manager: MetricRollupManager
+):
+    repository = PostgreSQLMetricRepository(session=db_session, rollups_enabled=True)
+    start, end = QUERY_RANGES[3]
+    readings = [metric for metric in _readings([stored_sensor_id], 400) if metric.metric_type is MetricType.TEMPERATURE]
+    readings += [
+        Metric(
+            sensor_id=stored_sensor_id,
+            metric_type=MetricType.TEMPERATURE,
+            timestamp=start + timedelta(seconds=seconds),
+            value=float(seconds),
+        )
+        for seconds in (3, 5, 8, 13)
+    ]
+    await repository.add_metrics(metrics=readings)
+    await rollup_manager.refresh()
+    async with db_engine.begin() as connection:
+        await connection.execute(
+            text("UPDATE metric_rollups_1d SET value_sketch = CAST(:sketch AS jsonb) WHERE bucket = :day"),
+            {"sketch": json.dumps({bin_index(12345.0): 1_000_000}), "day": START},
+        )
+
+    async def p50(start_date: datetime, end_date: datetime) -> float | None:
+        [result] = await repository.query_metrics(
+            statistics=[StatisticType.P50],
+            sensor_ids=[stored_sensor_id],
+            metrics=[MetricType.TEMPERATURE],
+            start_date=start_date,
+            end_date=end_date,
+        )
+        return result.value
+
+    # A range covering the day merges its sketch; one shorter than a minute is computed exactly from raw readings
+    assert await p50(START, START + timedelta(days=2)) == pytest.approx(12345.0, rel=RELATIVE_ACCURACY)
+    values = sorted(metric.value for metric in readings if start <= metric.timestamp <= end)
+    assert await p50(start, end) == pytest.approx((values[(len(values) - 1) // 2] + values[len(values) // 2]) / 2)
+
+
+async def test_series_written_between_aggregate_and_sketch_statements_is_left_out(
+    monkeypatch: pytest.MonkeyPatch,
+    session_maker: async_sessionmaker[AsyncSession],
+    db_session: AsyncSession,
+    stored_sensor_id: str,
+    rollup_manager: MetricRollupManager,
+):
+    repository = PostgreSQLMetricRepository(session=db_session, rollups_enabled=True)
+    readings = [metric for metric in _readings([stored_sensor_id], 400) if metric.metric_type is MetricType.TEMPERATURE]
+    await repository.add_metrics(metrics=readings)
+    await rollup_manager.refresh()
+    start, end = QUERY_RANGES[1]
+    execute = db_session.execute
+
+    async def execute_then_write(*args, **kwargs):
+        result = await execute(*args, **kwargs)
+        monkeypatch.setattr(db_session, "execute", execute)
+        # A new series commits after the aggregate statement, before the sketch statement
+        async with session_maker() as session:
+            await PostgreSQLMetricRepository(session=session, rollups_enabled=True).add_metrics(
+                metrics=[
+                    Metric(
+                        sensor_id=stored_sensor_id,
+                        metric_type=MetricType.HUMIDITY,
+                        timestamp=start + timedelta(days=1),
+                        value=40.0,
+                    )
+                ]
+            )
+        return result
+
+    monkeypatch.setattr(db_session, "execute", execute_then_write)
+    results = await repository.query_metrics(
+        statistics=[StatisticType.AVG, StatisticType.P95],
+        sensor_ids=[stored_sensor_id],
+        metrics=list(MetricType),
+        start_date=start,
+        end_date=end,
+    )
+
+    assert [(result.metric_type, result.statistic) for result in results] == [
+        (MetricType.TEMPERATURE, StatisticType.AVG),
+        (MetricType.TEMPERATURE, StatisticType.P95),
+    ]
+
+
+async def test_rebuild_recomputes_rollups_from_raw_metrics(
+    session_maker: async_sessionmaker[AsyncSession],
+    db_engine: AsyncEngine,
+    db_session: AsyncSession,
+    sensor_ids: list[str],
+    rollup_manager: MetricRollupManager,
+):
+    # Written without dirty markers, e.g. while rollups were disabled
+    await PostgreSQLMetricRepository(session=db_session).add_metrics(metrics=_readings(sensor_ids, 1000))
+
+    counts = await rollup_manager.rebuild()
+
+    assert counts["metric_rollups_1m"] > counts["metric_rollups_1h"] > counts["metric_rollups_1d"] > 0
+    await _assert_matches_raw(session_maker, sensor_ids)
+
+
+async def test_purge_deletes_rollups_of_a_range(
+    db_engine: AsyncEngine, db_session: AsyncSession, stored_sensor_id: str, rollup_manager: MetricRollupManager
+):
+    repository = PostgreSQLMetricRepository(session=db_session, rollups_enabled=True)
+    await repository.add_metrics(metrics=_readings([stored_sensor_id], 500))
+    await rollup_manager.refresh()
+
+    assert await rollup_manager.purge(START, START + timedelta(days=1)) > 0
+
+    async with db_engine.connect() as connection:
+        assert await connection.scalar(text("SELECT min(bucket) FROM metric_rollups_1m")) >= START + timedelta(days=1)
+        assert await connection.scalar(text("SELECT min(bucket) FROM metric_rollups_1d")) == START + timedelta(days=1)
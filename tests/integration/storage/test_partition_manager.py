@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from app.shared.models import Metric, MetricType, StatisticType
+from app.storage.implementations.postgresql_metric_repository import PostgreSQLMetricRepository
+from app.storage.partition_manager import MetricPartitionManager
+
+
+def _metrics(sensor_id: str, start: datetime, days: int) -> list[Metric]:
+    return [
+        Metric(sensor_id=sensor_id, metric_type=MetricType.TEMPERATURE, timestamp=start + timedelta(days=i), value=i)
+        for i in range(days)
+    ]
+
+
+async def _count(engine: AsyncEngine, table: str) -> int:
+    async with engine.connect() as connection:
+        return await connection.scalar(text(f"SELECT count(*) FROM {table}"))
+
+
+async def test_ensure_partitions_creates_current_and_future_ranges(partition_manager: MetricPartitionManager):
+    now = datetime(2024, 1, 15, tzinfo=timezone.utc)
+
+    created = await partition_manager.ensure_partitions(now=now)
+
+    assert [partition.name for partition in created] == ["metrics_p202401", "metrics_p202402", "metrics_p202403"]
+    assert await partition_manager.ensure_partitions(now=now) == []
+    partitions = await partition_manager.list_partitions()
+    assert partitions == created
+    assert partitions[0].end == datetime(2024, 2, 1, tzinfo=timezone.utc)
+
+
+async def test_create_partition_moves_rows_out_of_default(
+    partition_manager: MetricPartitionManager, db_engine: AsyncEngine, db_session: AsyncSession, stored_sensor_id: str
+):
+    repository = PostgreSQLMetricRepository(session=db_session)
+    await repository.add_metrics(metrics=_metrics(stored_sensor_id, datetime(2024, 5, 30, tzinfo=timezone.utc), 5))
+    assert await _count(db_engine, "metrics_default") == 5
+
+    await partition_manager.create_partition(datetime(2024, 5, 1, tzinfo=timezone.utc))
+
+    assert await _count(db_engine, "metrics_p202405") == 2
+    assert await _count(db_engine, "metrics_default") == 3
+    assert await _count(db_engine, "metrics") == 5
+
+
+async def test_detach_and_attach_partitions(
+    partition_manager: MetricPartitionManager, db_engine: AsyncEngine, db_session: AsyncSession, stored_sensor_id: str
+):
+    await partition_manager.ensure_partitions(now=datetime(2024, 1, 1, tzinfo=timezone.utc))
+    repository = PostgreSQLMetricRepository(session=db_session)
+    await repository.add_metrics(metrics=_metrics(stored_sensor_id, datetime(2024, 1, 1, tzinfo=timezone.utc), 90))
+
+    detached = await partition_manager.detach_partitions_before(datetime(2024, 3, 1, tzinfo=timezone.utc))
+
+    assert [partition.name for partition in detached] == ["metrics_p202401", "metrics_p202402"]
+    assert [partition.name for partition in await partition_manager.list_partitions()] == ["metrics_p202403"]
+    assert await _count(db_engine, "metrics") == 30
+    # Detached partitions keep their rows as standalone tables
+    assert await _count(db_engine, "metrics_p202401") == 31
+
+    await partition_manager.attach_partition(datetime(2024, 1, 1, tzinfo=timezone.utc))
+    assert await _count(db_engine, "metrics") == 61
+
+
+async def test_repository_range_query_prunes_partitions(
+    partition_manager: MetricPartitionManager, db_engine: AsyncEngine, db_session: AsyncSession, stored_sensor_id: str
+):
+    await partition_manager.ensure_partitions(now=datetime(2024, 1, 1, tzinfo=timezone.utc))
+    repository = PostgreSQLMetricRepository(session=db_session)
+    await repository.add_metrics(metrics=_metrics(stored_sensor_id, datetime(2024, 1, 1, tzinfo=timezone.utc), 90))
+
+    # Capture the statement the repository sends, then ask PostgreSQL how it executes it
+    executed = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        executed.append((statement, parameters))
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        results = await repository.query_metrics(
+            statistics=[StatisticType.AVG],
+            sensor_ids=[stored_sensor_id],
+            metrics=[MetricType.TEMPERATURE],
+            start_date=datetime(2024, 2, 3, tzinfo=timezone.utc),
+            end_date=datetime(2024, 2, 10, tzinfo=timezone.utc),
+        )
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", capture)
+
+    assert results[0].value == 36.5
+    statement, parameters = executed[-1]
+    async with db_engine.connect() as connection:
+        result = await connection.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+        plan = "\n".join(result.scalars().all())
+
+    assert "metrics_p202402" in plan
+    for pruned in ("metrics_p202401", "metrics_p202403", "metrics_default"):
+        assert pruned not in plan
@@ -0,0 +1,451 @@
+import asyncio
+import random
+import statistics
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+from sqlalchemy import event, func, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+
+from app.services.metrics_manager import MetricManager
+from app.shared.exceptions import DuplicateMetricError, SensorNotFoundError
+from app.shared.models import (
+    QUANTILE_STATISTICS,
+    BucketWidth,
+    DuplicatePolicy,
+    Metric,
+    MetricType,
+    RawMetricKey,
+    StatisticType,
+    WriteStatus,
+)
+from app.storage.database_models import MetricModel, SensorModel
+from app.storage.implementations.postgresql_metric_repository import PostgreSQLMetricRepository
+from app.storage.implementations.postgresql_sensor_repository import PostgreSQLSensorRepository
+
+
+def _metrics(sensor_id: str, count: int, metric_type: MetricType = MetricType.TEMPERATURE) -> list[Metric]:
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    return [
+        Metric(sensor_id=sensor_id, metric_type=metric_type, timestamp=start + timedelta(seconds=i), value=i % 100)
+        for i in range(count)
+    ]
+
+
+async def _count_metrics(session: AsyncSession) -> int:
+    return await session.scalar(select(func.count()).select_from(MetricModel))
+
+
+async def test_add_metrics_skips_duplicates(db_session: AsyncSession, stored_sensor_id: str):
+    repository = PostgreSQLMetricRepository(session=db_session)
+    metrics = _metrics(stored_sensor_id, 10)
+
+    assert await repository.add_metrics(metrics=metrics[:5]) == 5
+    assert await repository.add_metrics(metrics=metrics + [metrics[-1]]) == 5
+    assert await _count_metrics(db_session) == 10
+
+
+async def test_bulk_add_metrics_loads_rows_and_skips_duplicates(db_session: AsyncSession, stored_sensor_id: str):
+    repository = PostgreSQLMetricRepository(session=db_session)
+    metrics = _metrics(stored_sensor_id, 2000)
+
+    assert await repository.bulk_add_metrics(metrics=metrics[:500]) == 500
+    # Existing rows and repeated rows within the same load are both skipped
+    assert await repository.bulk_add_metrics(metrics=metrics + metrics[:10]) == 1500
+    assert await _count_metrics(db_session) == 2000
+
+    stored = await repository.get_metrics_by_sensor(sensor_id=stored_sensor_id)
+    assert sorted(stored, key=lambda metric: metric.timestamp)[:3] == metrics[:3]
+
+
+async def test_bulk_add_metrics_unknown_sensor_rolls_back(db_session: AsyncSession, stored_sensor_id: str):
+    repository = PostgreSQLMetricRepository(session=db_session)
+
+    with pytest.raises(SensorNotFoundError, match="sensor-404"):
+        await repository.bulk_add_metrics(metrics=_metrics(stored_sensor_id, 5) + _metrics("sensor-404", 1))
+
+    # The staging table is reusable after a failed load on the same session
+    assert await repository.bulk_add_metrics(metrics=_metrics(stored_sensor_id, 5)) == 5
+    assert await _count_metrics(db_session) == 5
+
+
+async def test_add_metric_reports_write_status_per_policy(db_session: AsyncSession, stored_sensor_id: str):
+    metric = _metrics(stored_sensor_id, 1)[0]
+    changed = metric.model_copy(update={"value": 42.0})
+    keep_first = PostgreSQLMetricRepository(session=db_session)
+    keep_last = PostgreSQLMetricRepository(session=db_session, duplicate_policy=DuplicatePolicy.KEEP_LAST)
+    reject = PostgreSQLMetricRepository(session=db_session, duplicate_policy=DuplicatePolicy.REJECT)
+
+    assert await keep_first.add_metric(metric=metric) == WriteStatus.INSERTED
+    assert await keep_first.add_metric(metric=changed) == WriteStatus.DEDUPLICATED
+    assert await keep_last.add_metric(metric=changed) == WriteStatus.OVERWRITTEN
+    # Re-sending the stored value is not a write
+    assert await keep_last.add_metric(metric=changed) == WriteStatus.DEDUPLICATED
+    with pytest.raises(DuplicateMetricError):
+        await reject.add_metric(metric=metric)
+
+    assert await db_session.scalar(select(MetricModel.value)) == 42.0
+
+
+@pytest.mark.parametrize("policy", list(DuplicatePolicy))
+async def test_add_metric_unknown_sensor_is_not_a_duplicate(
+    db_session: AsyncSession, stored_sensor_id: str, policy: DuplicatePolicy
+):
+    repository = PostgreSQLMetricRepository(session=db_session, duplicate_policy=policy)
+
+    with pytest.raises(SensorNotFoundError, match="sensor-404"):
+        await repository.add_metric(metric=_metrics("sensor-404", 1)[0])
+    with pytest.raises(SensorNotFoundError):
+        await repository.add_metrics(metrics=_metrics(stored_sensor_id, 2) + _metrics("sensor-404", 1))
+
+    assert await _count_metrics(db_session) == 0
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+async def test_keep_last_overwrites_stored_and_repeated_rows(db_session: AsyncSession, stored_sensor_id: str, bulk):
+    repository = PostgreSQLMetricRepository(session=db_session, duplicate_policy=DuplicatePolicy.KEEP_LAST)
+    metrics = _metrics(stored_sensor_id, 4)
+    write = repository.bulk_add_metrics if bulk else repository.add_metrics
+
+    assert await write(metrics=metrics[:2]) == 2
+    updates = [metric.model_copy(update={"value": -1.0}) for metric in metrics]
+    # Two new keys; the last reading of the repeated key wins
+    assert await write(metrics=updates + [metrics[3].model_copy(update={"value": -2.0})]) == 2
+
+    values = (await db_session.scalars(select(MetricModel.value).order_by(MetricModel.timestamp))).all()
+    assert values == [-1.0, -1.0, -1.0, -2.0]
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+async def test_reject_policy_rolls_back_batch_with_duplicate(db_session: AsyncSession, stored_sensor_id: str, bulk):
+    repository = PostgreSQLMetricRepository(session=db_session, duplicate_policy=DuplicatePolicy.REJECT)
+    metrics = _metrics(stored_sensor_id, 5)
+    write = repository.bulk_add_metrics if bulk else repository.add_metrics
+
+    assert await write(metrics=metrics[:1]) == 1
+    with pytest.raises(DuplicateMetricError):
+        await write(metrics=metrics)
+
+    assert await _count_metrics(db_session) == 1
+
+
+@pytest.mark.parametrize("policy", [DuplicatePolicy.KEEP_FIRST, DuplicatePolicy.REJECT])
+async def test_concurrent_writes_of_one_key_leave_pool_clean(
+    db_engine: AsyncEngine, stored_sensor_id: str, policy: DuplicatePolicy
+):
+    # A real pool, so connections that saw a conflict are handed out again
+    engine = create_async_engine(db_engine.url, pool_size=4, max_overflow=0)
+    session_maker = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    metric = _metrics(stored_sensor_id, 1)[0]
+
+    async def write_once() -> WriteStatus | Exception:
+        async with session_maker() as session:
+            repository = PostgreSQLMetricRepository(session=session, duplicate_policy=policy)
+            try:
+                return await repository.add_metric(metric=metric)
+            except DuplicateMetricError as e:
+                return e
+
+    try:
+        results = await asyncio.gather(*(write_once() for _ in range(40)))
+
+        assert results.count(WriteStatus.INSERTED) == 1
+        if policy is DuplicatePolicy.KEEP_FIRST:
+            assert results.count(WriteStatus.DEDUPLICATED) == 39
+        else:
+            assert sum(isinstance(result, DuplicateMetricError) for result in results) == 39
+
+        # Every pooled connection is still usable and none is stuck in an aborted transaction
+        async with session_maker() as session:
+            aborted = await session.scalar(
+                text("SELECT count(*) FROM pg_stat_activity WHERE state = 'idle in transaction (aborted)'")
+            )
+        assert aborted == 0
+        for _ in range(8):
+            async with session_maker() as session:
+                assert await session.scalar(select(func.count()).select_from(MetricModel)) == 1
+    finally:
+        await engine.dispose()
+
+
+async def test_get_latest_metrics_returns_newest_reading_per_series(db_session: AsyncSession, stored_sensor_id: str):
+    db_session.add(
+        SensorModel(sensor_id="sensor-idle", sensor_type="thermometer", created_at=datetime.now(timezone.utc))
+    )
+    await db_session.commit()
+    repository = PostgreSQLMetricRepository(session=db_session)
+    temperatures = _metrics(stored_sensor_id, 5)
+    humidities = _metrics(stored_sensor_id, 3, metric_type=MetricType.HUMIDITY)
+    await repository.add_metrics(metrics=temperatures + humidities)
+
+    latest = await repository.get_latest_metrics(
+        sensor_ids=[stored_sensor_id, "sensor-idle", "sensor-404"], metrics=list(MetricType)
+    )
+
+    assert sorted(latest, key=lambda metric: metric.metric_type) == sorted(
+        [temperatures[-1], humidities[-1]], key=lambda metric: metric.metric_type
+    )
+    assert await repository.get_latest_metrics(sensor_ids=[], metrics=list(MetricType)) == []
+    assert sorted(
+        await repository.get_latest_metrics(sensor_ids=None, metrics=list(MetricType)),
+        key=lambda metric: metric.metric_type,
+    ) == sorted([temperatures[-1], humidities[-1]], key=lambda metric: metric.metric_type)
+
+
+@pytest.mark.parametrize("all_sensors", [False, True])
+async def test_latest_metrics_query_issues_one_statement(
+    db_engine: AsyncEngine, db_session: AsyncSession, all_sensors: bool
+):
+    sensor_ids = [f"sensor-{i:03d}" for i in range(50)]
+    db_session.add_all(
+        SensorModel(sensor_id=sensor_id, sensor_type="thermometer", created_at=datetime.now(timezone.utc))
+        for sensor_id in sensor_ids
+    )
+    await db_session.commit()
+    repository = PostgreSQLMetricRepository(session=db_session)
+    await repository.add_metrics(metrics=[metric for sensor_id in sensor_ids for metric in _metrics(sensor_id, 3)])
+    manager = MetricManager(
+        metric_repository=repository, sensor_repository=PostgreSQLSensorRepository(session=db_session)
+    )
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        results = await manager.query_metrics(
+            sensor_ids=None if all_sensors else sensor_ids,
+            metrics=list(MetricType),
+            statistics=[StatisticType.AVG],
+        )
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", capture)
+
+    # Previously one statement per sensor and metric type, 101 here, and all sensors were listed first
+    assert len(statements) == 1
+    assert [(result.sensor_id, result.value) for result in results] == [(sensor_id, 2.0) for sensor_id in sensor_ids]
+
+
+async def test_query_metrics_computes_every_statistic_in_one_statement(
+    db_engine: AsyncEngine, db_session: AsyncSession, stored_sensor_id: str
+):
+    rng = random.Random(5)
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    # Shuffled insert order and microsecond timestamps, so first and last depend on the timestamp alone
+    readings = [
+        Metric(
+            sensor_id=stored_sensor_id,
+            metric_type=MetricType.TEMPERATURE,
+            timestamp=start + timedelta(microseconds=i * 1_000_003 + 1),
+            value=rng.uniform(-50, 50),
+        )
+        for i in range(500)
+    ]
+    single = Metric(sensor_id=stored_sensor_id, metric_type=MetricType.HUMIDITY, timestamp=start, value=40.0)
+    repository = PostgreSQLMetricRepository(session=db_session)
+    await repository.add_metrics(metrics=rng.sample(readings, len(readings)) + [single])
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    # Without rollups, percentiles are computed exactly in the same statement
+    aggregates = list(StatisticType)
+    event.listen(db_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        results = await repository.query_metrics(
+            statistics=aggregates,
+            sensor_ids=[stored_sensor_id],
+            metrics=list(MetricType),
+            start_date=start,
+            end_date=start + timedelta(days=1),
+        )
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", capture)
+
+    assert len(statements) == 1
+    values = [metric.value for metric in readings]
+    expected = {
+        StatisticType.MIN: min(values),
+        StatisticType.MAX: max(values),
+        StatisticType.SUM: sum(values),
+        StatisticType.AVG: statistics.mean(values),
+        StatisticType.COUNT: len(values),
+        StatisticType.STDDEV: statistics.stdev(values),
+        StatisticType.VARIANCE: statistics.variance(values),
+        StatisticType.FIRST: readings[0].value,
+        StatisticType.LAST: readings[-1].value,
+    }
+    # Interpolated between the closest ranks, like percentile_cont
+    percentiles = statistics.quantiles(values, n=100, method="inclusive")
+    expected.update({statistic: percentiles[round(q * 100) - 1] for statistic, q in QUANTILE_STATISTICS.items()})
+    temperature = {result.statistic: result.value for result in results if result.metric_type is MetricType.TEMPERATURE}
+    assert list(temperature) == aggregates
+    assert temperature == pytest.approx(expected)
+    # The spread of a single reading is undefined
+    humidity = {result.statistic: result.value for result in results if result.metric_type is MetricType.HUMIDITY}
+    assert humidity[StatisticType.STDDEV] is None and humidity[StatisticType.VARIANCE] is None
+    assert humidity[StatisticType.FIRST] == humidity[StatisticType.LAST] == 40.0
+
+
+@pytest.mark.parametrize(
+    "bucket_width, time_zone, bucket_start",
+    [
+        (
+            BucketWidth.FIVE_MINUTES,
+            "UTC",
+            lambda ts: ts.replace(minute=ts.minute - ts.minute % 5, second=0, microsecond=0),
+        ),
+        (BucketWidth.ONE_HOUR, "Asia/Kolkata", lambda ts: ts.replace(minute=0, second=0, microsecond=0)),
+        # Spans the switch to daylight saving time on 2024-03-31, a 23 hour day
+        (BucketWidth.ONE_DAY, "Europe/Berlin", lambda ts: ts.replace(hour=0, minute=0, second=0, microsecond=0)),
+    ],
+)
+async def test_iter_bucketed_metrics_aligns_buckets_to_local_time(
+    db_session: AsyncSession, stored_sensor_id: str, bucket_width: BucketWidth, time_zone: str, bucket_start
+):
+    rng = random.Random(9)
+    start = datetime(2024, 3, 29, tzinfo=timezone.utc)
+    readings = [
+        Metric(
+            sensor_id=stored_sensor_id,
+            metric_type=MetricType.TEMPERATURE,
+            timestamp=start + timedelta(seconds=rng.randrange(4 * 24 * 3600)),
+            value=rng.randint(-400, 400) / 4,
+        )
+        for _ in range(2000)
+    ]
+    readings = list({metric.timestamp: metric for metric in readings}.values())
+    repository = PostgreSQLMetricRepository(session=db_session)
+    await repository.add_metrics(metrics=readings)
+
+    buckets = [
+        bucket
+        async for bucket in repository.iter_bucketed_metrics(
+            statistics=[StatisticType.SUM, StatisticType.COUNT],
+            bucket_width=bucket_width,
+            time_zone=time_zone,
+            sensor_ids=[stored_sensor_id],
+            metrics=[MetricType.TEMPERATURE],
+            start_date=start,
+            end_date=start + timedelta(days=5),
+        )
+    ]
+
+    expected = defaultdict(list)
+    for metric in readings:
+        expected[bucket_start(metric.timestamp.astimezone(ZoneInfo(time_zone)))].append(metric.value)
+    assert [bucket.bucket for bucket in buckets] == sorted(expected)
+    assert {str(bucket.bucket.tzinfo) for bucket in buckets} == {time_zone}
+    assert [(bucket.values[StatisticType.SUM], bucket.values[StatisticType.COUNT]) for bucket in buckets] == [
+        (sum(values), len(values)) for _, values in sorted(expected.items())
+    ]
+
+
+async def test_iter_raw_metrics_streams_in_fetch_size_batches(
+    db_engine: AsyncEngine, db_session: AsyncSession, stored_sensor_id: str
+):
+    metrics = _metrics(stored_sensor_id, 1200) + _metrics(stored_sensor_id, 300, metric_type=MetricType.HUMIDITY)
+    await PostgreSQLMetricRepository(session=db_session).add_metrics(metrics=metrics[::-1])
+    repository = PostgreSQLMetricRepository(session=db_session, stream_fetch_size=250)
+
+    fetches = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        fetches.append(context.execution_options.get("yield_per"))
+
+    start = datetime(2023, 1, 1, 0, 1, tzinfo=timezone.utc)
+    event.listen(db_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        streamed = [metric async for metric in repository.iter_raw_metrics(start_date=start)]
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", capture)
+
+    # Ordered by series, in the declaration order of the metric type enum, then by time
+    assert streamed == [metric for metric in metrics if metric.timestamp >= start]
+    assert fetches == [250]
+
+
+async def test_iter_raw_metric_columns_matches_iter_raw_metrics(db_session: AsyncSession, stored_sensor_id: str):
+    metrics = _metrics(stored_sensor_id, 1000) + _metrics(stored_sensor_id, 50, metric_type=MetricType.HUMIDITY)
+    repository = PostgreSQLMetricRepository(session=db_session, stream_fetch_size=300)
+    await repository.add_metrics(metrics=metrics)
+
+    batches = [batch async for batch in repository.iter_raw_metric_columns(batch_size=400)]
+
+    assert [len(batch.values) for batch in batches] == [400, 400, 250]
+    expected = [metric async for metric in repository.iter_raw_metrics()]
+    columns = [
+        (sensor_id, metric_type, timestamp, value)
+        for batch in batches
+        for sensor_id, metric_type, timestamp, value in zip(*batch, strict=True)
+    ]
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    assert columns == [
+        (
+            metric.sensor_id,
+            metric.metric_type.value,
+            (metric.timestamp - epoch) // timedelta(microseconds=1),
+            metric.value,
+        )
+        for metric in expected
+    ]
+
+
+async def test_get_metric_batch_aggregates_like_query_metrics(db_session: AsyncSession):
+    sensor_ids = ["sensor-a", "sensor-b"]
+    db_session.add_all(
+        SensorModel(sensor_id=sensor_id, sensor_type="thermometer", created_at=datetime.now(timezone.utc))
+        for sensor_id in sensor_ids
+    )
+    await db_session.commit()
+    rng = random.Random(11)
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    metrics = [
+        Metric(sensor_id=sensor_id, metric_type=metric_type, timestamp=start + timedelta(seconds=i), value=value)
+        for sensor_id in sensor_ids
+        for metric_type in MetricType
+        for i, value in enumerate(rng.uniform(-100, 100) for _ in range(rng.randint(1, 400)))
+    ]
+    repository = PostgreSQLMetricRepository(session=db_session, stream_fetch_size=128)
+    await repository.add_metrics(metrics=metrics)
+    statistics = list(StatisticType)
+
+    batch = await repository.get_metric_batch(metrics=list(MetricType), start_date=start)
+    queried = await repository.query_metrics(statistics=statistics, metrics=list(MetricType), start_date=start)
+
+    assert len(batch) == len(metrics)
+    assert sorted(batch.to_metrics(), key=lambda metric: (metric.sensor_id, metric.metric_type, metric.timestamp)) == (
+        sorted(metrics, key=lambda metric: (metric.sensor_id, metric.metric_type, metric.timestamp))
+    )
+    expected = {(result.sensor_id, result.metric_type, result.statistic): result.value for result in queried}
+    for result in batch.aggregate(statistics):
+        assert result.value == pytest.approx(expected[(result.sensor_id, result.metric_type, result.statistic)])
+
+
+async def test_iter_raw_metrics_pages_resume_after_cursor_key(db_session: AsyncSession, stored_sensor_id: str):
+    metrics = _metrics(stored_sensor_id, 95) + _metrics(stored_sensor_id, 40, metric_type=MetricType.HUMIDITY)
+    repository = PostgreSQLMetricRepository(session=db_session)
+    await repository.add_metrics(metrics=metrics)
+
+    pages: list[list[Metric]] = []
+    after = None
+    while not pages or len(pages[-1]) == 30:
+        pages.append([metric async for metric in repository.iter_raw_metrics(after=after, limit=30)])
+        last = pages[-1][-1]
+        after = RawMetricKey(sensor_id=last.sensor_id, metric_type=last.metric_type, timestamp=last.timestamp)
+    column_pages = [
+        [batch async for batch in repository.iter_raw_metric_columns(batch_size=20, after=after, limit=30)]
+        for after in [None, RawMetricKey(stored_sensor_id, MetricType.TEMPERATURE, metrics[94].timestamp)]
+    ]
+
+    # A page can end on the last reading of one series and the next one start the following series
+    assert [len(page) for page in pages] == [30, 30, 30, 30, 15]
+    assert [metric for page in pages for metric in page] == metrics
+    assert [[len(batch.values) for batch in page] for page in column_pages] == [[20, 10], [20, 10]]
+    assert column_pages[1][0].metric_types[0] == MetricType.HUMIDITY.value
@@ -0,0 +1,68 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from app.shared.models import Sensor
+from app.storage.implementations.postgresql_sensor_repository import PostgreSQLSensorRepository
+
+
+async def test_list_sensors_pages_by_sensor_id(db_engine: AsyncEngine, db_session: AsyncSession):
+    repository = PostgreSQLSensorRepository(session=db_session)
+    created_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    sensors = [
+        Sensor(
+            sensor_id=f"sensor-{index:03}", sensor_type=("hygrometer", "thermometer")[index % 2], created_at=created_at
+        )
+        for index in range(25)
+    ]
+    for sensor in reversed(sensors):
+        await repository.add_sensor(sensor=sensor)
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    pages: list[list[Sensor]] = []
+    after = None
+    event.listen(db_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        while not pages or len(pages[-1]) == 7:
+            pages.append(await repository.list_sensors(sensor_type="thermometer", after=after, limit=7))
+            after = pages[-1][-1].sensor_id if pages[-1] else None
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", capture)
+
+    assert [len(page) for page in pages] == [7, 5]
+    assert [sensor for page in pages for sensor in page] == [s for s in sensors if s.sensor_type == "thermometer"]
+    assert all("LIMIT" in statement for statement in statements)
+    assert await repository.list_sensors() == sensors
+
+
+async def test_sensors_version_is_read_from_the_version_row(db_engine: AsyncEngine, db_session: AsyncSession):
+    repository = PostgreSQLSensorRepository(session=db_session)
+    created_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for index in range(3):
+        await repository.add_sensor(
+            sensor=Sensor(sensor_id=f"sensor-{index}", sensor_type="thermometer", created_at=created_at)
+        )
+    # Bypasses the repository, so the version row does not see it
+    async with db_engine.begin() as connection:
+        await connection.execute(
+            text("INSERT INTO sensors (sensor_id, sensor_type, created_at) VALUES ('sensor-x', 'thermometer', now())")
+        )
+
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        version = await repository.get_sensors_version()
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", capture)
+
+    assert (version.sensor_count, version.last_created_at) == (3, created_at)
+    assert len(statements) == 1 and "FROM sensors" not in statements[0]
@@ -0,0 +1,344 @@
+from collections.abc import Callable
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from app.shared.exceptions import DatabaseError, DuplicateMetricError, SensorNotFoundError
+from app.shared.models import (
+    BucketWidth,
+    DuplicatePolicy,
+    Metric,
+    MetricType,
+    RawMetricKey,
+    Sensor,
+    StatisticType,
+    StorageBackend,
+    WriteStatus,
+)
+from app.storage.implementations.in_memory_metric_repository import InMemoryMetricRepository
+from app.storage.implementations.in_memory_sensor_repository import InMemorySensorRepository
+from app.storage.implementations.postgresql_metric_repository import PostgreSQLMetricRepository
+from app.storage.implementations.postgresql_sensor_repository import PostgreSQLSensorRepository
+from app.storage.in_memory_store import InMemoryStore
+from app.storage.interfaces.metric_repository import MetricRepository
+from app.storage.interfaces.sensor_repository import SensorRepository
+
+# Every test runs against each storage backend, which must behave the same through the repository interfaces
+
+START = datetime(2024, 3, 30, 22, 0, tzinfo=timezone.utc)
+
+MetricRepositoryFactory = Callable[..., MetricRepository]
+
+
+@pytest.fixture(params=list(StorageBackend), ids=lambda backend: backend.value)
+def backend(request: pytest.FixtureRequest) -> tuple[MetricRepositoryFactory, SensorRepository]:
+    if request.param is StorageBackend.MEMORY:
+        store = InMemoryStore()
+        return (
+            lambda duplicate_policy=DuplicatePolicy.KEEP_FIRST: InMemoryMetricRepository(
+                store=store, duplicate_policy=duplicate_policy
+            ),
+            InMemorySensorRepository(store=store),
+        )
+    session = request.getfixturevalue("db_session")
+    return (
+        lambda duplicate_policy=DuplicatePolicy.KEEP_FIRST: PostgreSQLMetricRepository(
+            session=session, duplicate_policy=duplicate_policy
+        ),
+        PostgreSQLSensorRepository(session=session),
+    )
+
+
+@pytest.fixture
+def sensor_repository(backend: tuple[MetricRepositoryFactory, SensorRepository]) -> SensorRepository:
+    return backend[1]
+
+
+@pytest.fixture
+async def metric_repository_factory(
+    backend: tuple[MetricRepositoryFactory, SensorRepository],
+) -> MetricRepositoryFactory:
+    factory, sensor_repository = backend
+    for index, sensor_id in enumerate(("sensor-b", "sensor-a")):
+        await sensor_repository.add_sensor(
+            Sensor(sensor_id=sensor_id, sensor_type="weather", created_at=START + timedelta(minutes=index))
+        )
+    return factory
+
+
+@pytest.fixture
+def metric_repository(metric_repository_factory: MetricRepositoryFactory) -> MetricRepository:
+    return metric_repository_factory()
+
+
+def _metric(sensor_id: str, minutes: int, value: float, metric_type: MetricType = MetricType.TEMPERATURE) -> Metric:
+    return Metric(
+        sensor_id=sensor_id, metric_type=metric_type, timestamp=START + timedelta(minutes=minutes), value=value
+    )
+
+
+def _readings(metrics: list[Metric]) -> list[tuple[str, MetricType, datetime, float]]:
+    return [(metric.sensor_id, metric.metric_type, metric.timestamp, metric.value) for metric in metrics]
+
+
+async def _stored(metric_repository: MetricRepository) -> list[tuple[str, MetricType, datetime, float]]:
+    return _readings([metric async for metric in metric_repository.iter_raw_metrics()])
+
+
+async def test_sensor_registry(sensor_repository: SensorRepository):
+    sensors = [
+        Sensor(sensor_id=f"sensor-{index}", sensor_type=sensor_type, created_at=START + timedelta(hours=index))
+        for index, sensor_type in zip((3, 1, 2), ("wind", "weather", "weather"))
+    ]
+    for sensor in sensors:
+        assert await sensor_repository.add_sensor(sensor) == sensor
+
+    with pytest.raises(DatabaseError, match="may already exist"):
+        await sensor_repository.add_sensor(sensors[0])
+
+    assert [sensor.sensor_id for sensor in await sensor_repository.list_sensors()] == [
+        "sensor-1",
+        "sensor-2",
+        "sensor-3",
+    ]
+    assert [sensor.sensor_id for sensor in await sensor_repository.list_sensors(after="sensor-1", limit=1)] == [
+        "sensor-2"
+    ]
+    assert [sensor.sensor_id for sensor in await sensor_repository.list_sensors(sensor_type="weather")] == [
+        "sensor-1",
+        "sensor-2",
+    ]
+    assert await sensor_repository.sensor_exists("sensor-2")
+    assert not await sensor_repository.sensor_exists("sensor-404")
+    assert await sensor_repository.get_sensor("sensor-3") == sensors[0]
+    assert await sensor_repository.get_sensor("sensor-404") is None
+    assert await sensor_repository.get_existing_sensor_ids(["sensor-1", "sensor-404"]) == {"sensor-1"}
+
+    version = await sensor_repository.get_sensors_version()
+    assert version.sensor_count == 3
+    assert version.last_created_at == START + timedelta(hours=3)
+
+
+async def test_add_metric_resolves_duplicates_per_policy(metric_repository_factory: MetricRepositoryFactory):
+    keep_first = metric_repository_factory()
+    keep_last = metric_repository_factory(DuplicatePolicy.KEEP_LAST)
+    reject = metric_repository_factory(DuplicatePolicy.REJECT)
+
+    assert await keep_first.add_metric(_metric("sensor-a", 0, 1.0)) is WriteStatus.INSERTED
+    assert await keep_first.add_metric(_metric("sensor-a", 0, 2.0)) is WriteStatus.DEDUPLICATED
+    assert await _stored(keep_first) == _readings([_metric("sensor-a", 0, 1.0)])
+
+    assert await keep_last.add_metric(_metric("sensor-a", 0, 1.0)) is WriteStatus.DEDUPLICATED
+    assert await keep_last.add_metric(_metric("sensor-a", 0, 2.0)) is WriteStatus.OVERWRITTEN
+    assert await _stored(keep_last) == _readings([_metric("sensor-a", 0, 2.0)])
+
+    with pytest.raises(DuplicateMetricError, match="already exists"):
+        await reject.add_metric(_metric("sensor-a", 0, 3.0))
+    with pytest.raises(SensorNotFoundError, match="sensor-404"):
+        await reject.add_metric(_metric("sensor-404", 0, 3.0))
+    assert await _stored(reject) == _readings([_metric("sensor-a", 0, 2.0)])
+
+
+@pytest.mark.parametrize("bulk", [False, True], ids=["add", "bulk_add"])
+@pytest.mark.parametrize(
+    "duplicate_policy, kept_value",
+    [(DuplicatePolicy.KEEP_FIRST, 1.0), (DuplicatePolicy.KEEP_LAST, 3.0)],
+)
+async def test_add_metrics_resolves_duplicates_within_a_batch(
+    metric_repository_factory: MetricRepositoryFactory, duplicate_policy: DuplicatePolicy, kept_value: float, bulk: bool
+):
+    repository = metric_repository_factory(duplicate_policy)
+    batch = [_metric("sensor-a", 0, 1.0), _metric("sensor-a", 1, 2.0), _metric("sensor-a", 0, 3.0)]
+
+    add = repository.bulk_add_metrics if bulk else repository.add_metrics
+    assert await add(batch) == 2
+    assert await add(batch) == 0
+    assert await _stored(repository) == _readings([_metric("sensor-a", 0, kept_value), _metric("sensor-a", 1, 2.0)])
+
+
+@pytest.mark.parametrize("bulk", [False, True], ids=["add", "bulk_add"])
+async def test_failed_batches_write_nothing(metric_repository_factory: MetricRepositoryFactory, bulk: bool):
+    repository = metric_repository_factory(DuplicatePolicy.REJECT)
+    add = repository.bulk_add_metrics if bulk else repository.add_metrics
+    assert await add([_metric("sensor-a", 0, 1.0)]) == 1
+
+    with pytest.raises(DuplicateMetricError):
+        await add([_metric("sensor-a", 1, 1.0), _metric("sensor-a", 0, 2.0)])
+    with pytest.raises(DuplicateMetricError):
+        await add([_metric("sensor-a", 2, 1.0), _metric("sensor-a", 2, 2.0)])
+    with pytest.raises(SensorNotFoundError, match="sensor-404"):
+        await add([_metric("sensor-a", 3, 1.0), _metric("sensor-404", 3, 1.0)])
+
+    assert await _stored(repository) == _readings([_metric("sensor-a", 0, 1.0)])
+
+
+async def test_out_of_order_readings_are_listed_in_key_order(metric_repository: MetricRepository):
+    # Appends, then a backfill between and before stored readings, across sensors and metric types
+    await metric_repository.add_metrics([_metric("sensor-b", minutes, minutes) for minutes in (10, 20, 30)])
+    await metric_repository.add_metrics([_metric("sensor-b", minutes, minutes) for minutes in (25, 5, 15)])
+    await metric_repository.add_metric(_metric("sensor-a", 1, 1.0, MetricType.HUMIDITY))
+    await metric_repository.add_metric(_metric("sensor-a", 2, 2.0))
+
+    expected = [
+        _metric("sensor-a", 2, 2.0),
+        _metric("sensor-a", 1, 1.0, MetricType.HUMIDITY),
+        *(_metric("sensor-b", minutes, minutes) for minutes in (5, 10, 15, 20, 25, 30)),
+    ]
+    assert await _stored(metric_repository) == _readings(expected)
+    assert sorted(_readings(await metric_repository.get_raw_metrics(sensor_ids=[]))) == sorted(_readings(expected))
+
+    # Both ends of the range are included
+    in_range = await metric_repository.get_raw_metrics(
+        sensor_ids=["sensor-b"], start_date=START + timedelta(minutes=10), end_date=START + timedelta(minutes=25)
+    )
+    assert sorted(metric.value for metric in in_range) == [10, 15, 20, 25]
+
+    by_sensor = await metric_repository.get_metrics_by_sensor("sensor-a")
+    assert sorted(_readings(by_sensor)) == sorted(_readings(expected[:2]))
+    by_type = await metric_repository.get_metrics_by_type(MetricType.HUMIDITY)
+    assert _readings(by_type) == _readings(expected[1:2])
+
+
+async def test_raw_metrics_page_by_key(metric_repository: MetricRepository):
+    metrics = [
+        _metric(sensor_id, minutes, minutes, metric_type)
+        for sensor_id in ("sensor-a", "sensor-b")
+        for metric_type in MetricType
+        for minutes in range(3)
+    ]
+    await metric_repository.add_metrics(metrics[::-1])
+
+    pages = []
+    after = None
+    while True:
+        page = [metric async for metric in metric_repository.iter_raw_metrics(after=after, limit=5)]
+        if not page:
+            break
+        pages.append(page)
+        after = RawMetricKey(page[-1].sensor_id, page[-1].metric_type, page[-1].timestamp)
+    assert [len(page) for page in pages] == [5, 5, 2]
+    assert _readings([metric for page in pages for metric in page]) == _readings(metrics)
+
+    batches = [
+        batch
+        async for batch in metric_repository.iter_raw_metric_columns(
+            batch_size=4, metrics=[MetricType.HUMIDITY], after=RawMetricKey("sensor-a", MetricType.HUMIDITY, START)
+        )
+    ]
+    assert [len(batch.values) for batch in batches] == [4, 1]
+    assert [sensor_id for batch in batches for sensor_id in batch.sensor_ids] == ["sensor-a"] * 2 + ["sensor-b"] * 3
+    assert {metric_type for batch in batches for metric_type in batch.metric_types} == {"humidity"}
+    assert batches[0].timestamps[0] == (START + timedelta(minutes=1) - datetime(1970, 1, 1, tzinfo=timezone.utc)) // (
+        timedelta(microseconds=1)
+    )
+
+
+async def test_query_and_summarize_metrics(metric_repository: MetricRepository):
+    values = [float(value) for value in range(1, 101)]
+    await metric_repository.add_metrics([_metric("sensor-a", index, value) for index, value in enumerate(values)])
+    await metric_repository.add_metrics([_metric("sensor-b", 0, 7.0, MetricType.HUMIDITY)])
+
+    statistics = [
+        StatisticType.MIN,
+        StatisticType.MAX,
+        StatisticType.SUM,
+        StatisticType.COUNT,
+        StatisticType.AVG,
+        StatisticType.STDDEV,
+        StatisticType.FIRST,
+        StatisticType.LAST,
+        StatisticType.P50,
+        StatisticType.P90,
+    ]
+    results = await metric_repository.query_metrics(
+        statistics=statistics, metrics=list(MetricType), end_date=START + timedelta(minutes=49)
+    )
+    by_key = {(result.sensor_id, result.metric_type, result.statistic): result.value for result in results}
+    # The order of the results is not part of the contract
+    assert len(results) == len(by_key) == 2 * len(statistics)
+    assert {(sensor_id, metric_type) for sensor_id, metric_type, _ in by_key} == {
+        ("sensor-a", MetricType.TEMPERATURE),
+        ("sensor-b", MetricType.HUMIDITY),
+    }
+    temperature = {statistic: by_key[("sensor-a", MetricType.TEMPERATURE, statistic)] for statistic in statistics}
+    assert temperature == pytest.approx(
+        {
+            StatisticType.MIN: 1.0,
+            StatisticType.MAX: 50.0,
+            StatisticType.SUM: 1275.0,
+            StatisticType.COUNT: 50.0,
+            StatisticType.AVG: 25.5,
+            StatisticType.STDDEV: 14.577379737,
+            StatisticType.FIRST: 1.0,
+            StatisticType.LAST: 50.0,
+            # Interpolated between the closest ranks, like percentile_cont
+            StatisticType.P50: 25.5,
+            StatisticType.P90: 45.1,
+        }
+    )
+    assert by_key[("sensor-b", MetricType.HUMIDITY, StatisticType.STDDEV)] is None
+
+    summaries = await metric_repository.summarize_metrics(sensor_ids=["sensor-a"])
+    assert [
+        (summary.value_count, summary.value_sum, summary.value_min, summary.value_max) for summary in summaries
+    ] == [(100, 5050.0, 1.0, 100.0)]
+
+    batch = await metric_repository.get_metric_batch(metrics=[MetricType.HUMIDITY])
+    assert batch.series_keys == [("sensor-b", MetricType.HUMIDITY)]
+    assert batch.values.tolist() == [7.0]
+
+
+@pytest.mark.parametrize(
+    "bucket_width, expected",
+    [
+        # Europe/Paris moves to summer time at 02:00 on 2024-03-31, so that day is 23 hours long
+        (
+            BucketWidth.ONE_DAY,
+            [(datetime(2024, 3, 30), 1, 0.0), (datetime(2024, 3, 31), 23, 12.0), (datetime(2024, 4, 1), 1, 24.0)],
+        ),
+        (
+            BucketWidth.ONE_HOUR,
+            [(datetime(2024, 3, 30, 23), 1, 0.0), (datetime(2024, 3, 31), 1, 1.0), (datetime(2024, 3, 31, 1), 1, 2.0)],
+        ),
+    ],
+)
+async def test_iter_bucketed_metrics_in_local_time(
+    metric_repository: MetricRepository, bucket_width: BucketWidth, expected: list[tuple[datetime, int, float]]
+):
+    zone = ZoneInfo("Europe/Paris")
+    # Hourly readings from 23:00 on the 30th, local time, to midnight on April 1st
+    await metric_repository.add_metrics([_metric("sensor-a", hours * 60, hours) for hours in range(25)])
+
+    buckets = [
+        bucket
+        async for bucket in metric_repository.iter_bucketed_metrics(
+            statistics=[StatisticType.COUNT, StatisticType.AVG],
+            bucket_width=bucket_width,
+            time_zone="Europe/Paris",
+            sensor_ids=["sensor-a"],
+        )
+    ]
+    assert [
+        (bucket.bucket, bucket.values[StatisticType.COUNT], bucket.values[StatisticType.AVG])
+        for bucket in buckets[: len(expected)]
+    ] == [(local.replace(tzinfo=zone), count, average) for local, count, average in expected]
+
+
+async def test_get_latest_metrics(metric_repository: MetricRepository):
+    await metric_repository.add_metrics(
+        [
+            _metric("sensor-a", 5, 5.0),
+            _metric("sensor-a", 3, 3.0),
+            _metric("sensor-a", 4, 4.0, MetricType.HUMIDITY),
+            _metric("sensor-b", 1, 1.0),
+        ]
+    )
+
+    latest = await metric_repository.get_latest_metrics(sensor_ids=None, metrics=[MetricType.TEMPERATURE])
+    assert sorted(_readings(latest)) == _readings([_metric("sensor-a", 5, 5.0), _metric("sensor-b", 1, 1.0)])
+    latest = await metric_repository.get_latest_metrics(sensor_ids=["sensor-a"], metrics=list(MetricType))
+    assert sorted(_readings(latest)) == sorted(
+        _readings([_metric("sensor-a", 5, 5.0), _metric("sensor-a", 4, 4.0, MetricType.HUMIDITY)])
+    )
+    assert await metric_repository.get_latest_metrics(sensor_ids=[], metrics=list(MetricType)) == []
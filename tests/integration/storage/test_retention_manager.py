@@ -0,0 +1,162 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from app.shared.models import Metric, MetricType, StatisticType
+from app.storage.database_models import SensorModel
+from app.storage.implementations.postgresql_metric_repository import PostgreSQLMetricRepository
+from app.storage.partition_manager import MetricPartitionManager
+from app.storage.retention_manager import MetricRetentionManager, RetentionPolicy
+from app.storage.rollup_manager import MetricRollupManager
+
+
+def _daily_metrics(sensor_id: str, start: datetime, end: datetime) -> list[Metric]:
+    days = (end - start).days
+    return [
+        Metric(sensor_id=sensor_id, metric_type=metric_type, timestamp=start + timedelta(days=i), value=i)
+        for i in range(days)
+        for metric_type in MetricType
+    ]
+
+
+async def _count(engine: AsyncEngine, where: str = "true") -> int:
+    async with engine.connect() as connection:
+        return await connection.scalar(text(f"SELECT count(*) FROM metrics WHERE {where}"))
+
+
+async def _store_readings(partition_manager: MetricPartitionManager, db_session: AsyncSession, sensor_id: str) -> None:
+    # Range partitions for January to March, December readings land in the default partition
+    await partition_manager.ensure_partitions(now=datetime(2024, 1, 1, tzinfo=timezone.utc))
+    repository = PostgreSQLMetricRepository(session=db_session)
+    await repository.add_metrics(
+        metrics=_daily_metrics(
+            sensor_id, datetime(2023, 12, 20, tzinfo=timezone.utc), datetime(2024, 4, 1, tzinfo=timezone.utc)
+        )
+    )
+
+
+async def test_apply_drops_expired_partitions_and_deletes_per_metric_type(
+    partition_manager: MetricPartitionManager, db_engine: AsyncEngine, db_session: AsyncSession, stored_sensor_id: str
+):
+    await _store_readings(partition_manager, db_session, stored_sensor_id)
+    retention_manager = MetricRetentionManager(
+        engine=db_engine, partition_manager=partition_manager, delete_batch_size=7
+    )
+    policy = RetentionPolicy(default_days=45, days_by_metric={MetricType.HUMIDITY: 20})
+    # Dropped partitions report the row estimate of the planner statistics
+    async with db_engine.begin() as connection:
+        await connection.execute(text("ANALYZE metrics"))
+
+    report = await retention_manager.apply(policy, now=datetime(2024, 3, 31, tzinfo=timezone.utc))
+
+    # Temperature expires before Feb 15: January is dropped whole, February keeps its readings from Feb 15 on
+    assert report.dropped_partitions == ["metrics_p202401"]
+    assert [partition.name for partition in await partition_manager.list_partitions()] == [
+        "metrics_p202402",
+        "metrics_p202403",
+    ]
+    assert report.bytes_reclaimed > 0
+    # 62 January rows dropped; 12 December and 14 February temperature rows, humidity before Mar 11 (12 + 29 + 10)
+    assert report.rows_dropped_estimate == 62
+    assert report.rows_deleted == 12 + 14 + 51
+    assert await _count(db_engine, "metric_type = 'temperature'") == 15 + 31
+    assert await _count(db_engine, "timestamp < '2024-02-15'") == 0
+    assert await _count(db_engine, "metric_type = 'humidity'") == 21
+    assert await _count(db_engine, "metric_type = 'humidity' AND timestamp < '2024-03-11'") == 0
+    async with db_engine.connect() as connection:
+        assert not await connection.scalar(text("SELECT to_regclass('metrics_p202401') IS NOT NULL"))
+
+
+async def test_apply_keeps_partitions_while_a_metric_type_is_retained_forever(
+    partition_manager: MetricPartitionManager, db_engine: AsyncEngine, db_session: AsyncSession, stored_sensor_id: str
+):
+    await _store_readings(partition_manager, db_session, stored_sensor_id)
+    retention_manager = MetricRetentionManager(engine=db_engine, partition_manager=partition_manager)
+    policy = RetentionPolicy(days_by_metric={MetricType.TEMPERATURE: 31})
+
+    report = await retention_manager.apply(policy, now=datetime(2024, 3, 31, tzinfo=timezone.utc))
+
+    assert report.dropped_partitions == []
+    assert report.bytes_reclaimed == 0
+    # Temperature readings before Feb 29
+    assert report.rows_deleted == 12 + 31 + 28
+    assert await _count(db_engine, "metric_type = 'humidity'") == 103
+    assert await retention_manager.apply(policy, now=datetime(2024, 3, 31, tzinfo=timezone.utc)) == report.model_copy(
+        update={"rows_deleted": 0}
+    )
+
+
+async def test_apply_keeps_rollups_consistent_with_raw_metrics(
+    partition_manager: MetricPartitionManager,
+    db_engine: AsyncEngine,
+    db_session: AsyncSession,
+    session_maker: async_sessionmaker[AsyncSession],
+    stored_sensor_id: str,
+):
+    await partition_manager.ensure_partitions(now=datetime(2024, 1, 1, tzinfo=timezone.utc))
+    await PostgreSQLMetricRepository(session=db_session, rollups_enabled=True).add_metrics(
+        metrics=_daily_metrics(
+            stored_sensor_id, datetime(2023, 12, 20, tzinfo=timezone.utc), datetime(2024, 4, 1, tzinfo=timezone.utc)
+        )
+    )
+    rollup_manager = MetricRollupManager(engine=db_engine)
+    await rollup_manager.refresh()
+    retention_manager = MetricRetentionManager(
+        engine=db_engine, partition_manager=partition_manager, rollup_manager=rollup_manager
+    )
+    policy = RetentionPolicy(default_days=45, days_by_metric={MetricType.HUMIDITY: 20})
+
+    await retention_manager.apply(policy, now=datetime(2024, 3, 31, tzinfo=timezone.utc))
+    await rollup_manager.refresh()
+
+    async with session_maker() as session:
+        start, end = datetime(2023, 12, 1, tzinfo=timezone.utc), datetime(2024, 4, 1, tzinfo=timezone.utc)
+        for repository in (
+            PostgreSQLMetricRepository(session=session),
+            PostgreSQLMetricRepository(session=session, rollups_enabled=True),
+        ):
+            results = await repository.query_metrics(
+                statistics=[StatisticType.SUM],
+                sensor_ids=[stored_sensor_id],
+                metrics=list(MetricType),
+                start_date=start,
+                end_date=end,
+            )
+            # Temperature from Feb 15 (days 57..102), humidity from Mar 11 (days 82..102)
+            assert {result.metric_type: result.value for result in results} == {
+                MetricType.TEMPERATURE: sum(range(57, 103)),
+                MetricType.HUMIDITY: sum(range(82, 103)),
+            }
+
+
+async def test_apply_removes_expired_series_from_sensor_latest(
+    partition_manager: MetricPartitionManager, db_engine: AsyncEngine, db_session: AsyncSession, stored_sensor_id: str
+):
+    await partition_manager.ensure_partitions(now=datetime(2024, 1, 1, tzinfo=timezone.utc))
+    db_session.add(
+        SensorModel(
+            sensor_id="sensor-idle", sensor_type="thermometer", created_at=datetime(2023, 1, 1, tzinfo=timezone.utc)
+        )
+    )
+    await db_session.commit()
+    repository = PostgreSQLMetricRepository(session=db_session, sensor_latest_enabled=True)
+    await repository.add_metrics(
+        metrics=_daily_metrics(
+            stored_sensor_id, datetime(2024, 3, 1, tzinfo=timezone.utc), datetime(2024, 4, 1, tzinfo=timezone.utc)
+        )
+        # Stopped reporting in December
+        + _daily_metrics(
+            "sensor-idle", datetime(2023, 12, 1, tzinfo=timezone.utc), datetime(2024, 1, 1, tzinfo=timezone.utc)
+        )
+    )
+    retention_manager = MetricRetentionManager(
+        engine=db_engine, partition_manager=partition_manager, sensor_latest_enabled=True
+    )
+
+    await retention_manager.apply(RetentionPolicy(default_days=45), now=datetime(2024, 3, 31, tzinfo=timezone.utc))
+
+    latest = await repository.get_latest_metrics(sensor_ids=[stored_sensor_id, "sensor-idle"], metrics=list(MetricType))
+    assert {(metric.sensor_id, metric.timestamp) for metric in latest} == {
+        (stored_sensor_id, datetime(2024, 3, 31, tzinfo=timezone.utc))
+    }
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from app.shared.models import DuplicatePolicy, Metric, MetricType
+from app.storage.database_models import SensorModel
+from app.storage.implementations.postgresql_metric_repository import PostgreSQLMetricRepository
+from app.storage.sensor_latest import rebuild_sensor_latest
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _reading(sensor_id: str, minutes: int, value: float, metric_type: MetricType = MetricType.TEMPERATURE) -> Metric:
+    return Metric(
+        sensor_id=sensor_id, metric_type=metric_type, timestamp=START + timedelta(minutes=minutes), value=value
+    )
+
+
+async def _write(repository: PostgreSQLMetricRepository, path: str, metrics: list[Metric]) -> None:
+    match path:
+        case "single":
+            for metric in metrics:
+                await repository.add_metric(metric=metric)
+        case "batch":
+            await repository.add_metrics(metrics=metrics)
+        case "bulk":
+            await repository.bulk_add_metrics(metrics=metrics)
+
+
+async def _stored_latest(engine: AsyncEngine) -> list[tuple[str, str, datetime, float]]:
+    async with engine.connect() as connection:
+        result = await connection.execute(
+            text("SELECT sensor_id, metric_type::text, timestamp, value FROM sensor_latest ORDER BY 1, 2")
+        )
+        return [tuple(row) for row in result.all()]
+
+
+@pytest.mark.parametrize("path", ["single", "batch", "bulk"])
+async def test_out_of_order_readings_never_replace_a_newer_one(
+    db_engine: AsyncEngine, db_session: AsyncSession, stored_sensor_id: str, path: str
+):
+    repository = PostgreSQLMetricRepository(session=db_session, sensor_latest_enabled=True)
+
+    await _write(repository, path, [_reading(stored_sensor_id, 10, 1.0), _reading(stored_sensor_id, 5, 2.0)])
+    await _write(repository, path, [_reading(stored_sensor_id, 3, 3.0, MetricType.HUMIDITY)])
+    await _write(repository, path, [_reading(stored_sensor_id, 7, 4.0)])
+    assert await _stored_latest(db_engine) == [
+        (stored_sensor_id, "humidity", START + timedelta(minutes=3), 3.0),
+        (stored_sensor_id, "temperature", START + timedelta(minutes=10), 1.0),
+    ]
+
+    await _write(repository, path, [_reading(stored_sensor_id, 11, 5.0)])
+    assert (stored_sensor_id, "temperature", START + timedelta(minutes=11), 5.0) in await _stored_latest(db_engine)
+
+
+@pytest.mark.parametrize("path", ["single", "batch", "bulk"])
+@pytest.mark.parametrize(
+    "policy, expected", [(DuplicatePolicy.KEEP_FIRST, 1.0), (DuplicatePolicy.KEEP_LAST, 9.0)], ids=["first", "last"]
+)
+async def test_duplicates_of_the_latest_reading_follow_the_duplicate_policy(
+    db_engine: AsyncEngine,
+    db_session: AsyncSession,
+    stored_sensor_id: str,
+    path: str,
+    policy: DuplicatePolicy,
+    expected: float,
+):
+    repository = PostgreSQLMetricRepository(session=db_session, duplicate_policy=policy, sensor_latest_enabled=True)
+
+    await _write(repository, path, [_reading(stored_sensor_id, 10, 1.0)])
+    await _write(repository, path, [_reading(stored_sensor_id, 10, 9.0)])
+
+    assert await _stored_latest(db_engine) == [
+        (stored_sensor_id, "temperature", START + timedelta(minutes=10), expected)
+    ]
+
+
+async def test_get_latest_metrics_reads_the_sensor_latest_table(
+    db_engine: AsyncEngine, db_session: AsyncSession, stored_sensor_id: str
+):
+    repository = PostgreSQLMetricRepository(session=db_session, sensor_latest_enabled=True)
+    await repository.add_metrics(metrics=[_reading(stored_sensor_id, minutes, minutes) for minutes in range(5)])
+    # Only the table is read, not the metrics behind it
+    async with db_engine.begin() as connection:
+        await connection.execute(text("UPDATE sensor_latest SET value = 42"))
+
+    latest = await repository.get_latest_metrics(sensor_ids=[stored_sensor_id, "sensor-404"], metrics=list(MetricType))
+
+    assert latest == [_reading(stored_sensor_id, 4, 42.0)]
+    assert await repository.get_latest_metrics(sensor_ids=None, metrics=list(MetricType)) == latest
+
+
+async def test_rebuild_recomputes_drifted_series(
+    db_engine: AsyncEngine, db_session: AsyncSession, stored_sensor_id: str
+):
+    db_session.add(SensorModel(sensor_id="sensor-idle", sensor_type="thermometer", created_at=START))
+    await db_session.commit()
+    # Written while the table was not maintained
+    metrics = [
+        _reading(stored_sensor_id, minutes, minutes, metric_type) for minutes in range(5) for metric_type in MetricType
+    ]
+    await PostgreSQLMetricRepository(session=db_session).add_metrics(metrics=metrics)
+    async with db_engine.begin() as connection:
+        await connection.execute(
+            text("INSERT INTO sensor_latest VALUES ('sensor-idle', 'temperature', :timestamp, 1)"), {"timestamp": START}
+        )
+
+    assert await rebuild_sensor_latest(db_engine) == 2
+
+    assert await _stored_latest(db_engine) == [
+        (stored_sensor_id, "humidity", START + timedelta(minutes=4), 4.0),
+        (stored_sensor_id, "temperature", START + timedelta(minutes=4), 4.0),
+    ]
@@ -84,7 +84,7 @@ def metric_query_request_data(sensor_id: str, metric_type: MetricType, statistic
     return {
         "sensor_ids": [sensor_id],
         "metrics": [metric_type],
-        "statistic": statistic_type,
+        "statistics": [statistic_type],
         "start_date": None,
         "end_date": None,
     }
@@ -0,0 +1,196 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock
+
+import pytest
+
+from app.services.group_commit_writer import GroupCommitMetricWriter
+from app.shared.exceptions import DatabaseError, DuplicateMetricError, SensorNotFoundError
+from app.shared.models import IngestMode, Metric, MetricType
+from app.storage.interfaces.metric_repository import MetricRepository
+from app.storage.interfaces.sensor_repository import SensorRepository
+
+
+@pytest.fixture
+def repository_scope(mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository):
+    scope = Mock()
+
+    @asynccontextmanager
+    async def open_scope():
+        scope()
+        yield mock_metric_repository, mock_sensor_repository
+
+    open_scope.calls = scope
+    return open_scope
+
+
+def _metrics(sensor_id: str, count: int) -> list[Metric]:
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    return [
+        Metric(sensor_id=sensor_id, metric_type=MetricType.TEMPERATURE, timestamp=start + timedelta(seconds=i), value=i)
+        for i in range(count)
+    ]
+
+
+async def test_group_commit_writer_batches_concurrent_submissions(
+    repository_scope, mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository, sensor_id
+):
+    # Setup
+    mock_sensor_repository.get_existing_sensor_ids.return_value = {sensor_id}
+    mock_metric_repository.add_metrics.return_value = 10
+    writer = GroupCommitMetricWriter(repository_scope=repository_scope, max_batch_size=100, max_delay_ms=50)
+    writer.start()
+
+    # Execute
+    await asyncio.gather(*(writer.submit(metric=metric) for metric in _metrics(sensor_id, 10)))
+    await writer.stop()
+
+    # Verify a single transaction wrote every metric
+    assert repository_scope.calls.call_count == 1
+    mock_sensor_repository.get_existing_sensor_ids.assert_called_once_with(sensor_ids=[sensor_id])
+    assert len(mock_metric_repository.add_metrics.call_args.kwargs["metrics"]) == 10
+
+    stats = writer.get_stats()
+    assert stats.flushes == 1
+    assert stats.rows == 10
+    assert stats.max_batch_size == 10
+    assert stats.average_batch_size == 10.0
+
+
+async def test_group_commit_writer_respects_max_batch_size(
+    repository_scope, mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository, sensor_id
+):
+    # Setup
+    mock_sensor_repository.get_existing_sensor_ids.return_value = {sensor_id}
+    writer = GroupCommitMetricWriter(repository_scope=repository_scope, max_batch_size=4, max_delay_ms=50)
+    writer.start()
+
+    # Execute
+    await asyncio.gather(*(writer.submit(metric=metric) for metric in _metrics(sensor_id, 10)))
+    await writer.stop()
+
+    # Verify
+    batch_sizes = [len(call.kwargs["metrics"]) for call in mock_metric_repository.add_metrics.call_args_list]
+    assert batch_sizes == [4, 4, 2]
+    assert writer.get_stats().max_batch_size == 4
+
+
+async def test_group_commit_writer_rejects_unknown_sensors_only(
+    repository_scope, mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository, sensor_id
+):
+    # Setup
+    mock_sensor_repository.get_existing_sensor_ids.return_value = {sensor_id}
+    writer = GroupCommitMetricWriter(repository_scope=repository_scope, max_batch_size=10, max_delay_ms=50)
+    writer.start()
+    known, unknown = _metrics(sensor_id, 1)[0], _metrics("sensor-404", 1)[0]
+
+    # Execute
+    results = await asyncio.gather(writer.submit(metric=known), writer.submit(metric=unknown), return_exceptions=True)
+    await writer.stop()
+
+    # Verify
+    assert results[0] is None
+    assert isinstance(results[1], SensorNotFoundError)
+    mock_metric_repository.add_metrics.assert_called_once_with(metrics=[known])
+
+
+async def test_group_commit_writer_propagates_flush_failure_to_every_waiter(
+    repository_scope, mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository, sensor_id
+):
+    # Setup
+    mock_sensor_repository.get_existing_sensor_ids.return_value = {sensor_id}
+    mock_metric_repository.add_metrics.side_effect = DatabaseError("Connection lost")
+    writer = GroupCommitMetricWriter(repository_scope=repository_scope, max_batch_size=10, max_delay_ms=50)
+    writer.start()
+
+    # Execute
+    results = await asyncio.gather(
+        *(writer.submit(metric=metric) for metric in _metrics(sensor_id, 3)), return_exceptions=True
+    )
+    await writer.stop()
+
+    # Verify
+    assert all(isinstance(result, DatabaseError) for result in results)
+    assert writer.get_stats().failed_flushes == 1
+    assert writer.get_stats().flushes == 0
+
+
+async def test_group_commit_writer_isolates_rejected_duplicates(
+    repository_scope, mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository, sensor_id
+):
+    # Setup: the batch insert is rejected, then only the second metric conflicts on its own
+    mock_sensor_repository.get_existing_sensor_ids.return_value = {sensor_id}
+    mock_metric_repository.add_metrics.side_effect = DuplicateMetricError("A metric of the batch already exists")
+    mock_metric_repository.add_metric.side_effect = [None, DuplicateMetricError("Metric already exists"), None]
+    writer = GroupCommitMetricWriter(repository_scope=repository_scope, max_batch_size=10, max_delay_ms=50)
+    writer.start()
+
+    # Execute
+    results = await asyncio.gather(
+        *(writer.submit(metric=metric) for metric in _metrics(sensor_id, 3)), return_exceptions=True
+    )
+    await writer.stop()
+
+    # Verify
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], DuplicateMetricError)
+    assert mock_metric_repository.add_metric.call_count == 3
+    assert writer.get_stats().flushes == 1
+
+
+async def test_group_commit_writer_fails_only_unwritten_metrics(
+    repository_scope, mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository, sensor_id
+):
+    # Setup: after the batch is rejected, the connection is lost while writing the metrics one by one
+    mock_sensor_repository.get_existing_sensor_ids.return_value = {sensor_id}
+    mock_metric_repository.add_metrics.side_effect = DuplicateMetricError("A metric of the batch already exists")
+    mock_metric_repository.add_metric.side_effect = [
+        None,
+        DuplicateMetricError("Metric already exists"),
+        DatabaseError("Connection lost"),
+    ]
+    writer = GroupCommitMetricWriter(repository_scope=repository_scope, max_batch_size=10, max_delay_ms=50)
+    writer.start()
+
+    # Execute
+    results = await asyncio.gather(
+        *(writer.submit(metric=metric) for metric in _metrics(sensor_id, 4)), return_exceptions=True
+    )
+    await writer.stop()
+
+    # Verify the committed metric is reported as written
+    assert results[0] is None
+    assert isinstance(results[1], DuplicateMetricError)
+    assert isinstance(results[2], DatabaseError) and isinstance(results[3], DatabaseError)
+    assert writer.get_stats().failed_flushes == 1
+
+
+async def test_group_commit_writer_relies_on_foreign_key_in_foreign_key_mode(
+    repository_scope, mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository, sensor_id
+):
+    # Setup: the batch insert fails on the unknown sensor, then only that metric fails on its own
+    mock_metric_repository.add_metrics.side_effect = SensorNotFoundError("A metric of the batch references an unknown")
+    mock_metric_repository.add_metric.side_effect = [None, SensorNotFoundError("Sensor with ID 'sensor-404' not found")]
+    writer = GroupCommitMetricWriter(
+        repository_scope=repository_scope, max_batch_size=10, max_delay_ms=50, ingest_mode=IngestMode.FOREIGN_KEY
+    )
+    writer.start()
+    known, unknown = _metrics(sensor_id, 1)[0], _metrics("sensor-404", 1)[0]
+
+    # Execute
+    results = await asyncio.gather(writer.submit(metric=known), writer.submit(metric=unknown), return_exceptions=True)
+    await writer.stop()
+
+    # Verify
+    assert results[0] is None
+    assert isinstance(results[1], SensorNotFoundError)
+    mock_sensor_repository.get_existing_sensor_ids.assert_not_called()
+    mock_metric_repository.add_metrics.assert_called_once_with(metrics=[known, unknown])
+
+
+async def test_group_commit_writer_submit_requires_running_writer(repository_scope, sensor_id):
+    writer = GroupCommitMetricWriter(repository_scope=repository_scope)
+
+    with pytest.raises(RuntimeError):
+        await writer.submit(metric=_metrics(sensor_id, 1)[0])
@@ -0,0 +1,282 @@
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services.hot_tier import HotTier, HotTierMetricRepository
+from app.shared.models import (
+    AggregatedMetricResult,
+    DuplicatePolicy,
+    Metric,
+    MetricSummary,
+    MetricType,
+    StatisticType,
+    WriteStatus,
+)
+from app.storage.interfaces.metric_repository import MetricRepository
+
+NOW = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+TEMPERATURE = MetricType.TEMPERATURE
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = NOW
+
+    def __call__(self) -> datetime:
+        return self.now
+
+
+def _reading(sensor_id: str, minutes_ago: float, value: float) -> Metric:
+    return Metric(
+        sensor_id=sensor_id, metric_type=TEMPERATURE, timestamp=NOW - timedelta(minutes=minutes_ago), value=value
+    )
+
+
+def _stored(mock_metric_repository: MetricRepository, metrics: list[Metric]) -> None:
+    async def iter_raw_metrics(**kwargs) -> AsyncIterator[Metric]:
+        for metric in metrics:
+            yield metric
+
+    mock_metric_repository.iter_raw_metrics.side_effect = iter_raw_metrics
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def hot_tier(clock: FakeClock) -> HotTier:
+    return HotTier(window_seconds=3600, max_series=3, max_points_per_series=5, clock=clock)
+
+
+@pytest.fixture
+def repository(mock_metric_repository: MetricRepository, hot_tier: HotTier) -> HotTierMetricRepository:
+    return HotTierMetricRepository(metric_repository=mock_metric_repository, hot_tier=hot_tier)
+
+
+async def test_hot_tier_answers_ranges_inside_the_window_from_memory(
+    repository: HotTierMetricRepository, mock_metric_repository: MetricRepository, hot_tier: HotTier
+):
+    # Setup
+    _stored(mock_metric_repository, [_reading("sensor-1", 30, 1.0), _reading("sensor-1", 20, 3.0)])
+    assert await hot_tier.warm(mock_metric_repository) == 2
+    mock_metric_repository.add_metric.return_value = WriteStatus.INSERTED
+    await repository.add_metric(metric=_reading("sensor-1", 10, 8.0))
+
+    # Execute: sensor-2 has no readings in the window
+    results = await repository.query_metrics(
+        statistics=[StatisticType.AVG],
+        sensor_ids=["sensor-1", "sensor-2"],
+        metrics=[TEMPERATURE],
+        start_date=NOW - timedelta(minutes=45),
+        end_date=NOW,
+    )
+
+    # Verify
+    assert results == [
+        AggregatedMetricResult(sensor_id="sensor-1", metric_type=TEMPERATURE, statistic=StatisticType.AVG, value=4.0)
+    ]
+    mock_metric_repository.query_metrics.assert_not_called()
+    mock_metric_repository.summarize_metrics.assert_not_called()
+    assert hot_tier.get_stats().hits == 1
+
+
+async def test_hot_tier_answers_repeated_sensor_ids_once(
+    repository: HotTierMetricRepository, mock_metric_repository: MetricRepository, hot_tier: HotTier
+):
+    # Setup
+    _stored(mock_metric_repository, [_reading("sensor-1", 30, 1.0), _reading("sensor-1", 20, 3.0)])
+    assert await hot_tier.warm(mock_metric_repository) == 2
+
+    # Execute
+    results = await repository.query_metrics(
+        statistics=[StatisticType.AVG],
+        sensor_ids=["sensor-1", "sensor-1"],
+        metrics=[TEMPERATURE, TEMPERATURE],
+        start_date=NOW - timedelta(minutes=45),
+        end_date=NOW,
+    )
+
+    # Verify
+    assert results == [
+        AggregatedMetricResult(sensor_id="sensor-1", metric_type=TEMPERATURE, statistic=StatisticType.AVG, value=2.0)
+    ]
+    mock_metric_repository.query_metrics.assert_not_called()
+
+
+async def test_hot_tier_merges_older_part_of_straddling_range_from_repository(
+    repository: HotTierMetricRepository, mock_metric_repository: MetricRepository, hot_tier: HotTier
+):
+    # Setup
+    _stored(mock_metric_repository, [_reading("sensor-1", 30, 5.0)])
+    await hot_tier.warm(mock_metric_repository)
+    mock_metric_repository.summarize_metrics.return_value = [
+        MetricSummary(
+            sensor_id="sensor-1", metric_type=TEMPERATURE, value_count=3, value_sum=3.0, value_min=0.0, value_max=2.0
+        )
+    ]
+
+    # Execute
+    results = await repository.query_metrics(
+        statistics=[StatisticType.MAX],
+        sensor_ids=["sensor-1"],
+        metrics=[TEMPERATURE],
+        start_date=NOW - timedelta(hours=3),
+        end_date=NOW,
+    )
+
+    # Verify the repository was asked for the part before the window only
+    assert [result.value for result in results] == [5.0]
+    summarized = mock_metric_repository.summarize_metrics.call_args.kwargs
+    assert summarized["start_date"] == NOW - timedelta(hours=3)
+    assert summarized["end_date"] == NOW - timedelta(hours=1, microseconds=1)
+    assert hot_tier.get_stats().partial_hits == 1
+
+
+async def test_hot_tier_sends_unresolvable_queries_to_repository(
+    repository: HotTierMetricRepository, mock_metric_repository: MetricRepository, hot_tier: HotTier
+):
+    # Setup
+    _stored(mock_metric_repository, [])
+    await hot_tier.warm(mock_metric_repository)
+    mock_metric_repository.query_metrics.return_value = []
+
+    # Execute: all sensors, a naive date, and a range ending before the window
+    await repository.query_metrics(statistics=[StatisticType.SUM], start_date=NOW - timedelta(minutes=5), end_date=NOW)
+    await repository.query_metrics(
+        statistics=[StatisticType.SUM],
+        sensor_ids=["sensor-1"],
+        start_date=datetime(2024, 1, 1, 11, 55),
+        end_date=NOW,
+    )
+    await repository.query_metrics(
+        statistics=[StatisticType.SUM],
+        sensor_ids=["sensor-1"],
+        start_date=NOW - timedelta(hours=5),
+        end_date=NOW - timedelta(hours=2),
+    )
+
+    # Verify
+    assert mock_metric_repository.query_metrics.call_count == 3
+    assert hot_tier.get_stats().misses == 1
+
+
+async def test_hot_tier_sends_statistics_it_cannot_merge_to_repository(
+    repository: HotTierMetricRepository, mock_metric_repository: MetricRepository, hot_tier: HotTier
+):
+    # Setup
+    _stored(mock_metric_repository, [_reading("sensor-1", 30, 1.0), _reading("sensor-1", 20, 3.0)])
+    await hot_tier.warm(mock_metric_repository)
+    mock_metric_repository.query_metrics.return_value = []
+    statistics = [StatisticType.COUNT, StatisticType.STDDEV]
+
+    # Execute
+    await repository.query_metrics(
+        statistics=statistics, sensor_ids=["sensor-1"], start_date=NOW - timedelta(minutes=45), end_date=NOW
+    )
+    counted = await repository.query_metrics(
+        statistics=[StatisticType.COUNT, StatisticType.AVG],
+        sensor_ids=["sensor-1"],
+        metrics=[TEMPERATURE],
+        start_date=NOW - timedelta(minutes=45),
+        end_date=NOW,
+    )
+
+    # Verify
+    assert mock_metric_repository.query_metrics.call_args.kwargs["statistics"] == statistics
+    assert [(result.statistic, result.value) for result in counted] == [
+        (StatisticType.COUNT, 2),
+        (StatisticType.AVG, 2.0),
+    ]
+    assert hot_tier.get_stats().hits == 1
+
+
+async def test_hot_tier_bounds_points_per_series(
+    repository: HotTierMetricRepository, mock_metric_repository: MetricRepository, hot_tier: HotTier
+):
+    # Setup
+    _stored(mock_metric_repository, [])
+    await hot_tier.warm(mock_metric_repository)
+    mock_metric_repository.add_metrics.return_value = 8
+
+    # Execute
+    await repository.add_metrics(metrics=[_reading("sensor-1", minutes, minutes) for minutes in range(8, 0, -1)])
+
+    # Verify the evicted readings are no longer claimed as held
+    stats = hot_tier.get_stats()
+    assert (stats.points, stats.evicted_points) == (5, 3)
+    keys = [("sensor-1", TEMPERATURE)]
+    assert hot_tier.plan(keys, NOW - timedelta(minutes=5), NOW) == NOW - timedelta(minutes=5)
+    assert hot_tier.plan(keys, NOW - timedelta(minutes=6), NOW) == NOW - timedelta(minutes=6, microseconds=-1)
+
+
+async def test_hot_tier_expires_readings_as_the_window_moves(
+    mock_metric_repository: MetricRepository, hot_tier: HotTier, clock: FakeClock
+):
+    # Setup
+    _stored(mock_metric_repository, [_reading("sensor-1", 50, 1.0), _reading("sensor-1", 5, 2.0)])
+    await hot_tier.warm(mock_metric_repository)
+
+    # Execute
+    clock.now = NOW + timedelta(minutes=30)
+
+    # Verify
+    keys = [("sensor-1", TEMPERATURE)]
+    assert hot_tier.plan(keys, NOW - timedelta(minutes=50), NOW) is not None
+    assert hot_tier.get_stats().points == 1
+    # A reading older than the window is not held
+    hot_tier.record(_reading("sensor-1", 40, 9.0), overwrite=True)
+    assert hot_tier.get_stats().points == 1
+
+
+async def test_hot_tier_applies_duplicates_by_policy(mock_metric_repository: MetricRepository, clock: FakeClock):
+    # Setup
+    _stored(mock_metric_repository, [])
+    keep_first = HotTier(window_seconds=3600, clock=clock)
+    keep_last = HotTier(window_seconds=3600, duplicate_policy=DuplicatePolicy.KEEP_LAST, clock=clock)
+
+    for hot_tier in (keep_first, keep_last):
+        await hot_tier.warm(mock_metric_repository)
+        # Execute
+        hot_tier.record_batch([_reading("sensor-1", 5, 1.0), _reading("sensor-1", 5, 2.0)])
+
+    # Verify
+    keys = [("sensor-1", TEMPERATURE)]
+    start = NOW - timedelta(minutes=10)
+    assert keep_first.summarize(keys, start, NOW)[keys[0]].value_sum == 1.0
+    assert keep_last.summarize(keys, start, NOW)[keys[0]].value_sum == 2.0
+
+
+async def test_hot_tier_stops_vouching_for_unseen_series_after_dropping_one(
+    mock_metric_repository: MetricRepository, hot_tier: HotTier
+):
+    # Setup
+    _stored(mock_metric_repository, [])
+    await hot_tier.warm(mock_metric_repository)
+    start = NOW - timedelta(minutes=30)
+    assert hot_tier.plan([("sensor-9", TEMPERATURE)], start, NOW) == start
+
+    # Execute: the fourth series exceeds max_series
+    for sensor_id in ("sensor-1", "sensor-2", "sensor-3", "sensor-4"):
+        hot_tier.record(_reading(sensor_id, 10, 1.0), overwrite=True)
+
+    # Verify held series still answer, from their first reading on
+    assert hot_tier.plan([("sensor-9", TEMPERATURE)], start, NOW) is None
+    assert hot_tier.plan([("sensor-4", TEMPERATURE)], start, NOW) is None
+    assert hot_tier.plan([("sensor-1", TEMPERATURE)], start, NOW) == start
+
+
+async def test_hot_tier_ignores_writes_before_it_is_warmed(
+    repository: HotTierMetricRepository, mock_metric_repository: MetricRepository, hot_tier: HotTier
+):
+    # Setup
+    mock_metric_repository.add_metric.return_value = WriteStatus.INSERTED
+
+    # Execute
+    await repository.add_metric(metric=_reading("sensor-1", 10, 1.0))
+
+    # Verify
+    assert hot_tier.plan([("sensor-1", TEMPERATURE)], NOW - timedelta(minutes=30), NOW) is None
+    assert hot_tier.get_stats().series == 0
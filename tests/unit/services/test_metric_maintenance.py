@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.services.metric_maintenance import MetricMaintenanceTask
+from app.services.query_result_cache import MetricWriteVersions, QueryResultCache, query_key
+from app.shared.models import MetricType, StatisticType
+from app.storage.partition_manager import MetricPartition, MetricPartitionManager
+from app.storage.retention_manager import MetricRetentionManager, RetentionPolicy, RetentionReport
+
+
+@pytest.fixture
+def mock_partition_manager() -> MetricPartitionManager:
+    return AsyncMock(spec=MetricPartitionManager)
+
+
+@pytest.fixture
+def mock_retention_manager() -> MetricRetentionManager:
+    return AsyncMock(spec=MetricRetentionManager)
+
+
+@pytest.fixture
+def retention_policy() -> RetentionPolicy:
+    return RetentionPolicy(default_days=90)
+
+
+async def test_run_once_creates_partitions_and_applies_retention(
+    mock_partition_manager, mock_retention_manager, retention_policy
+):
+    # Setup mocks
+    mock_partition_manager.ensure_partitions.return_value = [
+        MetricPartition(
+            name="metrics_p202405",
+            start=datetime(2024, 5, 1, tzinfo=timezone.utc),
+            end=datetime(2024, 6, 1, tzinfo=timezone.utc),
+        )
+    ]
+    report = RetentionReport(
+        dropped_partitions=["metrics_p202401"], rows_deleted=120, rows_dropped_estimate=5000, bytes_reclaimed=8192
+    )
+    mock_retention_manager.apply.return_value = report
+    task = MetricMaintenanceTask(
+        partition_manager=mock_partition_manager,
+        retention_manager=mock_retention_manager,
+        retention_policy=retention_policy,
+    )
+
+    # Execute
+    result = await task.run_once()
+
+    # Verify
+    assert result == report
+    mock_retention_manager.apply.assert_called_once_with(retention_policy)
+    stats = task.get_stats()
+    assert stats.runs == 1
+    assert stats.partitions_created == 1
+    assert stats.partitions_dropped == 1
+    assert stats.rows_deleted == 120
+    assert stats.rows_dropped_estimate == 5000
+    assert stats.bytes_reclaimed == 8192
+    assert stats.last_run_at is not None
+
+
+async def test_failed_run_is_recorded_and_retried(mock_partition_manager, mock_retention_manager, retention_policy):
+    # Setup mocks
+    mock_partition_manager.ensure_partitions.return_value = []
+    mock_retention_manager.apply.side_effect = [RuntimeError("lock timeout"), RetentionReport(rows_deleted=5)]
+    task = MetricMaintenanceTask(
+        partition_manager=mock_partition_manager,
+        retention_manager=mock_retention_manager,
+        retention_policy=retention_policy,
+        interval_seconds=0.01,
+    )
+
+    # Execute
+    task.start()
+    while task.get_stats().runs == 0:
+        await asyncio.sleep(0.01)
+    await task.stop()
+
+    # Verify the loop survived the failure and the next run cleared the error
+    stats = task.get_stats()
+    assert stats.failed_runs == 1
+    assert stats.runs >= 1
+    assert stats.rows_deleted >= 5
+    assert stats.last_error is None
+    assert not task.running
+
+
+@pytest.mark.parametrize(
+    "report, cached",
+    [
+        (RetentionReport(), True),
+        (RetentionReport(rows_deleted=7), False),
+        # A partition never analyzed is estimated to hold no rows
+        (RetentionReport(dropped_partitions=["metrics_p202401"]), False),
+    ],
+)
+async def test_run_that_expires_readings_clears_query_cache_and_etags(
+    mock_partition_manager, mock_retention_manager, retention_policy, report: RetentionReport, cached: bool
+):
+    # Setup mocks
+    mock_partition_manager.ensure_partitions.return_value = []
+    mock_retention_manager.apply.return_value = report
+    query_cache = QueryResultCache()
+    key = query_key(["sensor-1"], [MetricType.TEMPERATURE], StatisticType.MAX, None, None)
+    query_cache.store(key, [], query_cache.snapshot(["sensor-1"]))
+    write_versions = MetricWriteVersions()
+    etag, _ = write_versions.validators(key)
+    task = MetricMaintenanceTask(
+        partition_manager=mock_partition_manager,
+        retention_manager=mock_retention_manager,
+        retention_policy=retention_policy,
+        query_cache=query_cache,
+        write_versions=write_versions,
+    )
+
+    # Execute
+    await task.run_once()
+
+    # Verify
+    assert (query_cache.lookup(key) is not None) is cached
+    assert (write_versions.validators(key)[0] == etag) is cached
@@ -1,11 +1,27 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock
 
 import pytest
 
-from app.api.models.metric_models import MetricCreateRequest, MetricQueryRequest
+from app.api.models.metric_models import (
+    MetricCreateRequest,
+    MetricDownsampleRequest,
+    MetricExportRequest,
+    MetricQueryRequest,
+)
+from app.services.group_commit_writer import GroupCommitMetricWriter
 from app.services.metrics_manager import MetricManager
-from app.shared.exceptions import SensorNotFoundError
-from app.shared.models import AggregatedMetricResult, Metric, MetricType, Sensor, StatisticType
+from app.shared.exceptions import DuplicateMetricError, InvalidQueryError, SensorNotFoundError
+from app.shared.models import (
+    AggregatedMetricResult,
+    BucketWidth,
+    IngestMode,
+    Metric,
+    MetricBucket,
+    MetricType,
+    StatisticType,
+    WriteStatus,
+)
 from app.storage.interfaces.metric_repository import MetricRepository
 from app.storage.interfaces.sensor_repository import SensorRepository
 
@@ -19,7 +35,7 @@ async def test_metric_manager_record_metric_success(
 ):
     # Setup mocks
     mock_sensor_repository.sensor_exists.return_value = True
-    mock_metric_repository.add_metric.return_value = sample_metric
+    mock_metric_repository.add_metric.return_value = WriteStatus.INSERTED
 
     manager = MetricManager(metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository)
 
@@ -46,6 +62,7 @@ async def test_metric_manager_record_metric_success(
         "sensor_id": sensor_id,
         "status": "data_recorded",
         "timestamp": expected_timestamp,
+        "write_status": WriteStatus.INSERTED,
     }
     assert result.model_dump() == expected_response
 
@@ -69,6 +86,52 @@ async def test_metric_manager_record_metric_sensor_not_found(
     mock_metric_repository.add_metric.assert_not_called()
 
 
+async def test_metric_manager_record_metric_foreign_key_mode_skips_precheck(
+    mock_metric_repository: MetricRepository,
+    mock_sensor_repository: SensorRepository,
+    sensor_id: str,
+    metric_create_request: MetricCreateRequest,
+):
+    # Setup mocks
+    mock_metric_repository.add_metric.return_value = WriteStatus.INSERTED
+
+    manager = MetricManager(
+        metric_repository=mock_metric_repository,
+        sensor_repository=mock_sensor_repository,
+        ingest_mode=IngestMode.FOREIGN_KEY,
+    )
+
+    # Execute
+    result = await manager.record_metric(sensor_id=sensor_id, metric_request=metric_create_request)
+
+    # Verify the insert is the only storage call
+    assert result.write_status == WriteStatus.INSERTED
+    mock_sensor_repository.sensor_exists.assert_not_called()
+    mock_metric_repository.add_metric.assert_called_once()
+
+
+async def test_metric_manager_record_metric_foreign_key_mode_unknown_sensor(
+    mock_metric_repository: MetricRepository,
+    mock_sensor_repository: SensorRepository,
+    sensor_id: str,
+    metric_create_request: MetricCreateRequest,
+):
+    # Setup mocks: the repository reports the foreign key violation
+    mock_metric_repository.add_metric.side_effect = SensorNotFoundError(f"Sensor with ID '{sensor_id}' not found")
+
+    manager = MetricManager(
+        metric_repository=mock_metric_repository,
+        sensor_repository=mock_sensor_repository,
+        ingest_mode=IngestMode.FOREIGN_KEY,
+    )
+
+    # Execute and verify exception
+    with pytest.raises(SensorNotFoundError):
+        await manager.record_metric(sensor_id=sensor_id, metric_request=metric_create_request)
+
+    mock_sensor_repository.sensor_exists.assert_not_called()
+
+
 async def test_metric_manager_query_metrics_api_success(
     mock_metric_repository: MetricRepository,
     mock_sensor_repository: SensorRepository,
@@ -77,6 +140,12 @@ async def test_metric_manager_query_metrics_api_success(
 ):
     # Setup mocks
     mock_metric_repository.query_metrics.return_value = multiple_aggregated_metrics
+    metric_query_request = metric_query_request.model_copy(
+        update={
+            "start_date": datetime(2023, 1, 1, tzinfo=timezone.utc),
+            "end_date": datetime(2023, 1, 2, tzinfo=timezone.utc),
+        }
+    )
 
     manager = MetricManager(metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository)
 
@@ -95,24 +164,199 @@ async def test_metric_manager_query_metrics_api_success(
             {
                 "sensor_id": multiple_aggregated_metrics[0].sensor_id,
                 "metric": multiple_aggregated_metrics[0].metric_type,
-                "stat": {
-                    "statistic_type": metric_query_request.statistic,
-                    "value": multiple_aggregated_metrics[0].value,
-                },
+                "stats": [
+                    {
+                        "statistic_type": multiple_aggregated_metrics[0].statistic,
+                        "value": multiple_aggregated_metrics[0].value,
+                    }
+                ],
             },
             {
                 "sensor_id": multiple_aggregated_metrics[1].sensor_id,
                 "metric": multiple_aggregated_metrics[1].metric_type,
-                "stat": {
-                    "statistic_type": metric_query_request.statistic,
-                    "value": multiple_aggregated_metrics[1].value,
-                },
+                "stats": [
+                    {
+                        "statistic_type": multiple_aggregated_metrics[1].statistic,
+                        "value": multiple_aggregated_metrics[1].value,
+                    }
+                ],
             },
         ],
     }
     assert result.model_dump() == expected_response
 
 
+async def test_metric_manager_query_metrics_api_groups_statistics_per_series(
+    mock_metric_repository: MetricRepository,
+    mock_sensor_repository: SensorRepository,
+    metric_query_request: MetricQueryRequest,
+):
+    # Setup mocks
+    statistics = [StatisticType.STDDEV, StatisticType.COUNT]
+    mock_metric_repository.query_metrics.return_value = [
+        AggregatedMetricResult(
+            sensor_id=sensor_id, metric_type=MetricType.TEMPERATURE, statistic=statistic, value=value
+        )
+        for sensor_id, stddev in (("sensor-002", None), ("sensor-001", 1.5))
+        for statistic, value in zip(statistics, (stddev, 2.0))
+    ]
+    metric_query_request = metric_query_request.model_copy(
+        update={
+            "statistics": statistics + [StatisticType.STDDEV],
+            "start_date": datetime(2023, 1, 1, tzinfo=timezone.utc),
+            "end_date": datetime(2023, 1, 2, tzinfo=timezone.utc),
+        }
+    )
+
+    manager = MetricManager(metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository)
+
+    # Execute
+    result = await manager.query_metrics_api(query_request=metric_query_request)
+
+    # Verify repeated statistics are computed once, results keep the repository's series order
+    assert mock_metric_repository.query_metrics.call_args.kwargs["statistics"] == statistics
+    assert result.query.statistics == statistics
+    assert [
+        (entry.sensor_id, [(stat.statistic_type, stat.value) for stat in entry.stats]) for entry in result.results
+    ] == [
+        ("sensor-002", [(StatisticType.STDDEV, None), (StatisticType.COUNT, 2.0)]),
+        ("sensor-001", [(StatisticType.STDDEV, 1.5), (StatisticType.COUNT, 2.0)]),
+    ]
+
+
+async def test_metric_manager_query_latest_metrics_treats_reading_as_sample_of_one(
+    mock_metric_repository: MetricRepository,
+    mock_sensor_repository: SensorRepository,
+    sensor_id: str,
+    metric_type: MetricType,
+    sample_metric: Metric,
+):
+    # Setup mocks
+    mock_metric_repository.get_latest_metrics.return_value = [sample_metric]
+
+    manager = MetricManager(metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository)
+
+    # Execute
+    result = await manager._query_latest_metrics(
+        sensor_ids=[sensor_id],
+        metrics=[metric_type],
+        statistics=[StatisticType.COUNT, StatisticType.VARIANCE, StatisticType.LAST],
+    )
+
+    # Verify
+    assert [(r.statistic, r.value) for r in result] == [
+        (StatisticType.COUNT, 1.0),
+        (StatisticType.VARIANCE, None),
+        (StatisticType.LAST, sample_metric.value),
+    ]
+
+
+async def test_metric_manager_downsample_metrics_api_streams_buckets(
+    mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository, sensor_id: str
+):
+    # Setup mocks
+    start_date = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    statistics = [StatisticType.MAX, StatisticType.MIN]
+
+    async def iter_bucketed_metrics(**kwargs):
+        for hour in range(2):
+            yield MetricBucket(
+                sensor_id=sensor_id,
+                metric_type=MetricType.TEMPERATURE,
+                bucket=start_date + timedelta(hours=hour),
+                values={StatisticType.MIN: float(hour), StatisticType.MAX: hour + 1.0},
+            )
+
+    mock_metric_repository.iter_bucketed_metrics.side_effect = iter_bucketed_metrics
+    manager = MetricManager(metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository)
+    downsample_request = MetricDownsampleRequest(
+        metrics=[MetricType.TEMPERATURE], statistics=statistics, bucket=BucketWidth.ONE_HOUR, start_date=start_date
+    )
+
+    # Execute
+    buckets = await manager.downsample_metrics_api(downsample_request=downsample_request)
+    mock_metric_repository.iter_bucketed_metrics.assert_not_called()
+    result = [bucket async for bucket in buckets]
+
+    # Verify the range is completed and stats keep the requested order
+    assert mock_metric_repository.iter_bucketed_metrics.call_args.kwargs["end_date"] == start_date + timedelta(days=31)
+    assert [[(stat.statistic_type, stat.value) for stat in bucket.stats] for bucket in result] == [
+        [(StatisticType.MAX, 1.0), (StatisticType.MIN, 0.0)],
+        [(StatisticType.MAX, 2.0), (StatisticType.MIN, 1.0)],
+    ]
+
+
+@pytest.mark.parametrize(
+    "update",
+    [
+        # 31 days of one minute buckets
+        {"bucket": BucketWidth.ONE_MINUTE},
+        {"time_zone": "Mars/Olympus_Mons"},
+    ],
+)
+async def test_metric_manager_downsample_metrics_api_rejects_invalid_requests(
+    mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository, update: dict
+):
+    # Setup
+    manager = MetricManager(
+        metric_repository=mock_metric_repository,
+        sensor_repository=mock_sensor_repository,
+        max_buckets_per_series=1000,
+    )
+    downsample_request = MetricDownsampleRequest(
+        metrics=[MetricType.TEMPERATURE],
+        statistics=[StatisticType.AVG],
+        bucket=BucketWidth.ONE_HOUR,
+        end_date=datetime(2024, 1, 1, tzinfo=timezone.utc),
+    ).model_copy(update=update)
+
+    # Execute and verify exception
+    with pytest.raises(InvalidQueryError):
+        await manager.downsample_metrics_api(downsample_request=downsample_request)
+
+    mock_metric_repository.iter_bucketed_metrics.assert_not_called()
+
+
+async def test_metric_manager_export_metrics_api_streams_whole_history_without_dates(
+    mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository, sample_metric: Metric
+):
+    # Setup mocks
+    async def iter_raw_metrics(**kwargs):
+        yield sample_metric
+
+    mock_metric_repository.iter_raw_metrics.side_effect = iter_raw_metrics
+    manager = MetricManager(metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository)
+
+    # Execute
+    readings = await manager.export_metrics_api(export_request=MetricExportRequest(metrics=[MetricType.HUMIDITY]))
+
+    # Verify
+    assert [reading async for reading in readings] == [sample_metric]
+    mock_metric_repository.iter_raw_metrics.assert_called_once_with(
+        sensor_ids=None, metrics=[MetricType.HUMIDITY], start_date=None, end_date=None, after=None, limit=None
+    )
+
+
+async def test_metric_manager_export_metric_columns_api_uses_configured_batch_size(
+    mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository
+):
+    # Setup
+    manager = MetricManager(
+        metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository, export_batch_size=100
+    )
+    start_date = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    # Execute
+    await manager.export_metric_columns_api(
+        export_request=MetricExportRequest(sensor_ids=["s1"], start_date=start_date)
+    )
+
+    # Verify
+    mock_metric_repository.iter_raw_metric_columns.assert_called_once_with(
+        batch_size=100, sensor_ids=["s1"], metrics=None, start_date=start_date, end_date=None, after=None, limit=None
+    )
+
+
 async def test_metric_manager_query_metrics_success(
     mock_metric_repository: MetricRepository,
     mock_sensor_repository: SensorRepository,
@@ -128,7 +372,11 @@ async def test_metric_manager_query_metrics_success(
 
     # Execute
     result = await manager.query_metrics(
-        sensor_ids=[sensor_id], metrics=[metric_type], statistic=statistic_type, start_date=None, end_date=None
+        sensor_ids=[sensor_id],
+        metrics=[metric_type],
+        statistics=[statistic_type],
+        start_date=datetime(2023, 1, 1, tzinfo=timezone.utc),
+        end_date=datetime(2023, 1, 2, tzinfo=timezone.utc),
     )
 
     # Verify
@@ -144,60 +392,110 @@ async def test_metric_manager_query_latest_metrics_success(
     sensor_id: str,
     metric_type: MetricType,
     statistic_type: StatisticType,
-    timestamp: datetime,
+    sample_metric: Metric,
     sample_aggregated_metric: AggregatedMetricResult,
 ):
     # Setup mocks
-    mock_metric_repository.get_latest_timestamps.return_value = {(sensor_id, metric_type): timestamp}
-    mock_metric_repository.query_metrics.return_value = [sample_aggregated_metric]
+    mock_metric_repository.get_latest_metrics.return_value = [sample_metric]
 
     manager = MetricManager(metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository)
 
     # Execute
     result = await manager._query_latest_metrics(
-        sensor_ids=[sensor_id], metrics=[metric_type], statistic=statistic_type
+        sensor_ids=[sensor_id], metrics=[metric_type], statistics=[statistic_type]
     )
 
     # Verify
-    mock_metric_repository.get_latest_timestamps.assert_called_once_with(sensor_ids=[sensor_id], metrics=[metric_type])
-    mock_metric_repository.query_metrics.assert_called_once_with(
-        sensor_ids=[sensor_id],
-        metrics=[metric_type],
-        statistic=statistic_type,
-        start_date=timestamp,
-        end_date=timestamp,
-    )
+    mock_metric_repository.get_latest_metrics.assert_called_once_with(sensor_ids=[sensor_id], metrics=[metric_type])
+    mock_metric_repository.query_metrics.assert_not_called()
     assert result == [sample_aggregated_metric]
 
 
-async def test_metric_manager_get_target_sensor_ids_with_specific_ids(
-    mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository, sensor_id: str
+async def test_metric_manager_query_latest_metrics_keeps_request_order(
+    mock_metric_repository: MetricRepository,
+    mock_sensor_repository: SensorRepository,
+    timestamp: datetime,
 ):
+    # Setup mocks, sensor-002 has no humidity readings
+    mock_metric_repository.get_latest_metrics.return_value = [
+        Metric(sensor_id="sensor-001", metric_type=MetricType.HUMIDITY, timestamp=timestamp, value=40.0),
+        Metric(sensor_id="sensor-002", metric_type=MetricType.TEMPERATURE, timestamp=timestamp, value=21.0),
+        Metric(sensor_id="sensor-001", metric_type=MetricType.TEMPERATURE, timestamp=timestamp, value=20.0),
+    ]
+
     manager = MetricManager(metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository)
 
     # Execute
-    result = await manager._get_target_sensor_ids(sensor_ids=[sensor_id])
+    result = await manager._query_latest_metrics(
+        sensor_ids=["sensor-002", "sensor-001"],
+        metrics=[MetricType.TEMPERATURE, MetricType.HUMIDITY],
+        statistics=[StatisticType.MAX],
+    )
 
     # Verify
-    assert result == [sensor_id]
+    assert [(r.sensor_id, r.metric_type, r.statistic, r.value) for r in result] == [
+        ("sensor-002", MetricType.TEMPERATURE, StatisticType.MAX, 21.0),
+        ("sensor-001", MetricType.TEMPERATURE, StatisticType.MAX, 20.0),
+        ("sensor-001", MetricType.HUMIDITY, StatisticType.MAX, 40.0),
+    ]
+
+
+async def test_metric_manager_query_metrics_for_all_sensors_omits_sensor_list(
+    mock_metric_repository: MetricRepository,
+    mock_sensor_repository: SensorRepository,
+    multiple_aggregated_metrics: list[AggregatedMetricResult],
+):
+    # Setup mocks
+    mock_metric_repository.query_metrics.return_value = multiple_aggregated_metrics
+    start_date = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    end_date = datetime(2023, 1, 2, tzinfo=timezone.utc)
+
+    manager = MetricManager(metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository)
+
+    # Execute
+    result = await manager.query_metrics(
+        metrics=[MetricType.TEMPERATURE], statistics=[StatisticType.AVG], start_date=start_date, end_date=end_date
+    )
+
+    # Verify the registry is never read into the application
+    assert result == multiple_aggregated_metrics
+    mock_metric_repository.query_metrics.assert_called_once_with(
+        statistics=[StatisticType.AVG],
+        sensor_ids=None,
+        metrics=[MetricType.TEMPERATURE],
+        start_date=start_date,
+        end_date=end_date,
+    )
     mock_sensor_repository.list_sensors.assert_not_called()
 
 
-async def test_metric_manager_get_target_sensor_ids_with_none(
-    mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository, multiple_sensors: list[Sensor]
+async def test_metric_manager_query_latest_metrics_for_all_sensors_orders_by_sensor_id(
+    mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository, timestamp: datetime
 ):
     # Setup mocks
-    mock_sensor_repository.list_sensors.return_value = multiple_sensors
+    mock_metric_repository.get_latest_metrics.return_value = [
+        Metric(sensor_id="sensor-002", metric_type=MetricType.TEMPERATURE, timestamp=timestamp, value=21.0),
+        Metric(sensor_id="sensor-001", metric_type=MetricType.HUMIDITY, timestamp=timestamp, value=40.0),
+        Metric(sensor_id="sensor-001", metric_type=MetricType.TEMPERATURE, timestamp=timestamp, value=20.0),
+    ]
 
     manager = MetricManager(metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository)
 
     # Execute
-    result = await manager._get_target_sensor_ids(sensor_ids=None)
+    result = await manager.query_metrics(
+        metrics=[MetricType.TEMPERATURE, MetricType.HUMIDITY], statistics=[StatisticType.MAX]
+    )
 
     # Verify
-    mock_sensor_repository.list_sensors.assert_called_once()
-    expected_ids = [sensor.sensor_id for sensor in multiple_sensors]
-    assert result == expected_ids
+    mock_metric_repository.get_latest_metrics.assert_called_once_with(
+        sensor_ids=None, metrics=[MetricType.TEMPERATURE, MetricType.HUMIDITY]
+    )
+    mock_sensor_repository.list_sensors.assert_not_called()
+    assert [(r.sensor_id, r.metric_type, r.value) for r in result] == [
+        ("sensor-001", MetricType.TEMPERATURE, 20.0),
+        ("sensor-001", MetricType.HUMIDITY, 40.0),
+        ("sensor-002", MetricType.TEMPERATURE, 21.0),
+    ]
 
 
 async def test_metric_manager_query_metrics_with_latest_when_no_dates(
@@ -206,22 +504,21 @@ async def test_metric_manager_query_metrics_with_latest_when_no_dates(
     sensor_id: str,
     metric_type: MetricType,
     statistic_type: StatisticType,
-    timestamp: datetime,
+    sample_metric: Metric,
     sample_aggregated_metric: AggregatedMetricResult,
 ):
     # Setup mocks
-    mock_metric_repository.get_latest_timestamps.return_value = {(sensor_id, metric_type): timestamp}
-    mock_metric_repository.query_metrics.return_value = [sample_aggregated_metric]
+    mock_metric_repository.get_latest_metrics.return_value = [sample_metric]
 
     manager = MetricManager(metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository)
 
     # Execute
     result = await manager.query_metrics(
-        sensor_ids=[sensor_id], metrics=[metric_type], statistic=statistic_type, start_date=None, end_date=None
+        sensor_ids=[sensor_id], metrics=[metric_type], statistics=[statistic_type], start_date=None, end_date=None
     )
 
     # Verify latest metrics was called
-    mock_metric_repository.get_latest_timestamps.assert_called_once_with(sensor_ids=[sensor_id], metrics=[metric_type])
+    mock_metric_repository.get_latest_metrics.assert_called_once_with(sensor_ids=[sensor_id], metrics=[metric_type])
     assert result == [sample_aggregated_metric]
 
 
@@ -249,7 +546,7 @@ async def test_metric_manager_query_metrics_api_auto_completes_start_date(
 
     # Create request with only start_date
     query_request = MetricQueryRequest(
-        sensor_ids=[sensor_id], metrics=[metric_type], statistic=statistic_type, start_date=start_date, end_date=None
+        sensor_ids=[sensor_id], metrics=[metric_type], statistics=[statistic_type], start_date=start_date, end_date=None
     )
 
     # Execute
@@ -263,7 +560,7 @@ async def test_metric_manager_query_metrics_api_auto_completes_start_date(
     mock_metric_repository.query_metrics.assert_called_once_with(
         sensor_ids=[sensor_id],
         metrics=[metric_type],
-        statistic=statistic_type,
+        statistics=[statistic_type],
         start_date=start_date,
         end_date=expected_end_date,
     )
@@ -292,7 +589,7 @@ async def test_metric_manager_query_metrics_api_auto_completes_end_date(
 
     # Create request with only end_date
     query_request = MetricQueryRequest(
-        sensor_ids=[sensor_id], metrics=[metric_type], statistic=statistic_type, start_date=None, end_date=end_date
+        sensor_ids=[sensor_id], metrics=[metric_type], statistics=[statistic_type], start_date=None, end_date=end_date
     )
 
     # Execute
@@ -306,7 +603,7 @@ async def test_metric_manager_query_metrics_api_auto_completes_end_date(
     mock_metric_repository.query_metrics.assert_called_once_with(
         sensor_ids=[sensor_id],
         metrics=[metric_type],
-        statistic=statistic_type,
+        statistics=[statistic_type],
         start_date=expected_start_date,
         end_date=end_date,
     )
@@ -337,7 +634,7 @@ async def test_metric_manager_query_metrics_api_no_auto_completion_when_both_dat
     query_request = MetricQueryRequest(
         sensor_ids=[sensor_id],
         metrics=[metric_type],
-        statistic=statistic_type,
+        statistics=[statistic_type],
         start_date=start_date,
         end_date=end_date,
     )
@@ -353,7 +650,251 @@ async def test_metric_manager_query_metrics_api_no_auto_completion_when_both_dat
     mock_metric_repository.query_metrics.assert_called_once_with(
         sensor_ids=[sensor_id],
         metrics=[metric_type],
-        statistic=statistic_type,
+        statistics=[statistic_type],
         start_date=start_date,
         end_date=end_date,
     )
+
+
+async def test_metric_manager_record_metrics_success(
+    mock_metric_repository: MetricRepository,
+    mock_sensor_repository: SensorRepository,
+    sensor_id: str,
+    metric_create_request: MetricCreateRequest,
+):
+    # Setup mocks: two readings, one of them already stored
+    duplicate_request = metric_create_request.model_copy(update={"value": 30.0})
+    mock_sensor_repository.sensor_exists.return_value = True
+    mock_metric_repository.add_metrics.return_value = 1
+
+    manager = MetricManager(metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository)
+
+    # Execute
+    result = await manager.record_metrics(
+        sensor_id=sensor_id, metric_requests=[metric_create_request, duplicate_request]
+    )
+
+    # Verify the sensor is checked once for the whole batch
+    mock_sensor_repository.sensor_exists.assert_called_once_with(sensor_id=sensor_id)
+    expected_metrics = [
+        Metric(
+            sensor_id=sensor_id,
+            metric_type=request.metric_type,
+            timestamp=request.timestamp,
+            value=request.value,
+        )
+        for request in [metric_create_request, duplicate_request]
+    ]
+    mock_metric_repository.add_metrics.assert_called_once_with(metrics=expected_metrics)
+
+    expected_response = {"sensor_id": sensor_id, "status": "data_recorded", "accepted": 1, "duplicates": 1}
+    assert result.model_dump() == expected_response
+
+
+async def test_metric_manager_record_metrics_sensor_not_found(
+    mock_metric_repository: MetricRepository,
+    mock_sensor_repository: SensorRepository,
+    sensor_id: str,
+    metric_create_request: MetricCreateRequest,
+):
+    # Setup mocks
+    mock_sensor_repository.sensor_exists.return_value = False
+
+    manager = MetricManager(metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository)
+
+    # Execute and verify exception
+    with pytest.raises(SensorNotFoundError):
+        await manager.record_metrics(sensor_id=sensor_id, metric_requests=[metric_create_request])
+
+    mock_metric_repository.add_metrics.assert_not_called()
+
+
+async def _stream(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+async def test_metric_manager_ingest_stream_success(
+    mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository
+):
+    # Setup mocks: records of two sensors, one line split across chunks
+    mock_sensor_repository.get_existing_sensor_ids.return_value = {"sensor-001", "sensor-002"}
+    mock_metric_repository.add_metrics.return_value = 2
+
+    manager = MetricManager(metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository)
+
+    # Execute
+    summary = await manager.ingest_stream(
+        chunks=_stream(
+            b'{"sensor_id": "sensor-001", "metric_type": "temperature", "timestamp": "2023-01-01T12:00:00Z", "val',
+            b'ue": 21.5}\n{"sensor_id": "sensor-002", "metric_type": "humidity", ',
+            b'"timestamp": "2023-01-01T12:00:00Z", "value": 60.0}\n\n',
+        )
+    )
+
+    # Verify both records were written in one chunk
+    mock_sensor_repository.get_existing_sensor_ids.assert_called_once_with(sensor_ids=["sensor-001", "sensor-002"])
+    written = mock_metric_repository.add_metrics.call_args.kwargs["metrics"]
+    assert [(metric.sensor_id, metric.value) for metric in written] == [("sensor-001", 21.5), ("sensor-002", 60.0)]
+    assert summary.model_dump() == {"lines": 3, "accepted": 2, "duplicates": 0, "rejected": 0, "rejections": []}
+
+
+async def test_metric_manager_ingest_stream_rejects_invalid_lines_and_unknown_sensors(
+    mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository
+):
+    # Setup mocks
+    mock_sensor_repository.get_existing_sensor_ids.return_value = {"sensor-001"}
+    mock_metric_repository.add_metrics.return_value = 0
+
+    manager = MetricManager(metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository)
+
+    # Execute
+    summary = await manager.ingest_stream(
+        chunks=_stream(
+            b"not json\n",
+            b'{"sensor_id": "sensor-001", "metric_type": "pressure", "timestamp": "2023-01-01T12:00:00Z", "value": 1}\n',
+            b'{"sensor_id": "unknown", "metric_type": "humidity", "timestamp": "2023-01-01T12:00:00Z", "value": 1}\n',
+            b'{"sensor_id": "sensor-001", "metric_type": "humidity", "timestamp": "2023-01-01T12:00:00Z", "value": 1}',
+        )
+    )
+
+    # Verify
+    assert summary.lines == 4
+    assert summary.accepted == 0
+    assert summary.duplicates == 1
+    assert summary.rejected == 3
+    assert [rejection.line for rejection in summary.rejections] == [1, 2, 3]
+    assert "metric_type" in summary.rejections[1].reason
+    assert summary.rejections[2].reason == "Sensor with ID 'unknown' not found"
+    assert len(mock_metric_repository.add_metrics.call_args.kwargs["metrics"]) == 1
+
+
+async def test_metric_manager_ingest_stream_flushes_in_bounded_chunks(
+    mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository, monkeypatch
+):
+    # Setup mocks
+    monkeypatch.setattr("app.services.metrics_manager.INGEST_FLUSH_SIZE", 2)
+    mock_sensor_repository.get_existing_sensor_ids.return_value = {"sensor-001"}
+    mock_metric_repository.add_metrics.side_effect = lambda metrics: len(metrics)
+
+    manager = MetricManager(metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository)
+    lines = [
+        f'{{"sensor_id": "sensor-001", "metric_type": "humidity", "timestamp": "2023-01-01T12:0{i}:00Z", "value": 1}}\n'
+        for i in range(5)
+    ]
+
+    # Execute
+    summary = await manager.ingest_stream(chunks=_stream("".join(lines).encode()))
+
+    # Verify
+    batch_sizes = [len(call.kwargs["metrics"]) for call in mock_metric_repository.add_metrics.call_args_list]
+    assert batch_sizes == [2, 2, 1]
+    assert summary.accepted == 5
+
+
+async def test_metric_manager_ingest_stream_rejects_chunk_with_rejected_duplicate(
+    mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository, monkeypatch
+):
+    # Setup mocks: the first chunk conflicts under the reject policy, the second one is written
+    monkeypatch.setattr("app.services.metrics_manager.INGEST_FLUSH_SIZE", 2)
+    mock_sensor_repository.get_existing_sensor_ids.return_value = {"sensor-001"}
+    mock_metric_repository.add_metrics.side_effect = [DuplicateMetricError("A metric of the batch already exists"), 1]
+
+    manager = MetricManager(metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository)
+    lines = [
+        f'{{"sensor_id": "sensor-001", "metric_type": "humidity", "timestamp": "2023-01-01T12:0{i}:00Z", "value": 1}}\n'
+        for i in range(3)
+    ]
+
+    # Execute
+    summary = await manager.ingest_stream(chunks=_stream("".join(lines).encode()))
+
+    # Verify
+    assert summary.accepted == 1
+    assert summary.rejected == 2
+    assert [rejection.line for rejection in summary.rejections] == [1, 2]
+
+
+async def test_metric_manager_ingest_stream_rejects_oversized_lines(
+    mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository, monkeypatch
+):
+    # Setup
+    monkeypatch.setattr("app.services.metrics_manager.MAX_INGEST_LINE_BYTES", 16)
+    manager = MetricManager(metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository)
+
+    # Execute
+    summary = await manager.ingest_stream(chunks=_stream(b"x" * 10, b"x" * 10, b"x" * 10, b"\n"))
+
+    # Verify
+    assert summary.rejected == 1
+    assert summary.rejections[0].line == 1
+    mock_metric_repository.add_metrics.assert_not_called()
+
+
+async def test_metric_manager_ingest_stream_rejects_oversized_lines_within_one_chunk(
+    mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository, monkeypatch
+):
+    # Setup
+    monkeypatch.setattr("app.services.metrics_manager.MAX_INGEST_LINE_BYTES", 16)
+    manager = MetricManager(metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository)
+
+    # Execute: the whole oversized line and the one after it arrive in a single chunk
+    summary = await manager.ingest_stream(chunks=_stream(b"x" * 30 + b"\nnot json\n"))
+
+    # Verify
+    assert summary.rejected == 2
+    assert summary.rejections[0].line == 1
+    assert "exceeds 16 bytes" in summary.rejections[0].reason
+    assert "exceeds" not in summary.rejections[1].reason
+    mock_metric_repository.add_metrics.assert_not_called()
+
+
+async def test_metric_manager_record_metric_uses_group_commit_writer(
+    mock_metric_repository: MetricRepository,
+    mock_sensor_repository: SensorRepository,
+    sensor_id: str,
+    metric_create_request: MetricCreateRequest,
+):
+    # Setup mocks
+    metric_writer = AsyncMock(spec=GroupCommitMetricWriter)
+    metric_writer.running = True
+
+    manager = MetricManager(
+        metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository, metric_writer=metric_writer
+    )
+
+    # Execute
+    result = await manager.record_metric(sensor_id=sensor_id, metric_request=metric_create_request)
+
+    # Verify the writer handles the sensor check and the insert
+    metric_writer.submit.assert_called_once()
+    assert metric_writer.submit.call_args.kwargs["metric"].sensor_id == sensor_id
+    mock_sensor_repository.sensor_exists.assert_not_called()
+    mock_metric_repository.add_metric.assert_not_called()
+    assert result.status == "data_recorded"
+
+
+async def test_metric_manager_record_metrics_uses_bulk_load_for_large_batches(
+    mock_metric_repository: MetricRepository,
+    mock_sensor_repository: SensorRepository,
+    sensor_id: str,
+    metric_create_request: MetricCreateRequest,
+    monkeypatch,
+):
+    # Setup mocks
+    monkeypatch.setattr("app.services.metrics_manager.BULK_LOAD_THRESHOLD", 2)
+    mock_sensor_repository.sensor_exists.return_value = True
+    mock_metric_repository.bulk_add_metrics.return_value = 2
+
+    manager = MetricManager(metric_repository=mock_metric_repository, sensor_repository=mock_sensor_repository)
+    later_request = metric_create_request.model_copy(
+        update={"timestamp": metric_create_request.timestamp + timedelta(seconds=1)}
+    )
+
+    # Execute
+    result = await manager.record_metrics(sensor_id=sensor_id, metric_requests=[metric_create_request, later_request])
+
+    # Verify
+    assert len(mock_metric_repository.bulk_add_metrics.call_args.kwargs["metrics"]) == 2
+    mock_metric_repository.add_metrics.assert_not_called()
+    assert result.accepted == 2
@@ -0,0 +1,245 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.api.models.metric_models import MetricCreateRequest, MetricQueryRequest
+from app.services.metrics_manager import MetricManager
+from app.services.query_result_cache import MetricWriteVersions, QueryResultCache, query_key, results_etag
+from app.shared.models import AggregatedMetricResult, Metric, MetricType, StatisticType, WriteStatus
+from app.storage.interfaces.metric_repository import MetricRepository
+from app.storage.interfaces.sensor_repository import SensorRepository
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+END = datetime(2024, 1, 2, tzinfo=timezone.utc)
+TEMPERATURE = MetricType.TEMPERATURE
+
+
+def _result(sensor_id: str, value: float) -> AggregatedMetricResult:
+    return AggregatedMetricResult(
+        sensor_id=sensor_id, metric_type=TEMPERATURE, statistic=StatisticType.AVG, value=value
+    )
+
+
+def _write(sensor_id: str, timestamp: datetime) -> Metric:
+    return Metric(sensor_id=sensor_id, metric_type=TEMPERATURE, timestamp=timestamp, value=1.0)
+
+
+def _key(sensor_ids: list[str] | None, start: datetime | None = START, end: datetime | None = END):
+    return query_key(sensor_ids, [TEMPERATURE], [StatisticType.AVG], start, end)
+
+
+@pytest.fixture
+def cache() -> QueryResultCache:
+    return QueryResultCache(max_entries=2)
+
+
+def test_query_result_cache_keeps_historical_ranges_across_newer_writes(cache: QueryResultCache):
+    # Setup
+    key = _key(["sensor-1"])
+    cache.store(key, [_result("sensor-1", 2.0)], cache.snapshot(["sensor-1"]))
+
+    # Execute: live data after the range, then a late reading inside it
+    cache.record_writes([_write("sensor-1", END + timedelta(days=5))])
+    assert cache.lookup(key) == [_result("sensor-1", 2.0)]
+    cache.record_writes([_write("sensor-1", END - timedelta(hours=1)), _write("sensor-1", END + timedelta(days=6))])
+
+    # Verify
+    assert cache.lookup(key) is None
+    stats = cache.get_stats()
+    assert (stats.hits, stats.misses, stats.invalidations, stats.size) == (1, 1, 1, 0)
+
+
+def test_query_result_cache_invalidates_only_queries_of_written_sensors(cache: QueryResultCache):
+    # Setup
+    cache.store(_key(["sensor-1"]), [_result("sensor-1", 1.0)], cache.snapshot(["sensor-1"]))
+    cache.store(_key(["sensor-2"]), [_result("sensor-2", 2.0)], cache.snapshot(["sensor-2"]))
+
+    # Execute
+    cache.record_writes([_write("sensor-2", START)])
+
+    # Verify
+    assert cache.lookup(_key(["sensor-1"])) is not None
+    assert cache.lookup(_key(["sensor-2"])) is None
+
+
+def test_query_result_cache_invalidates_all_sensor_and_latest_queries_on_any_write(cache: QueryResultCache):
+    # Setup
+    all_sensors, latest = _key(None), _key(["sensor-1"], start=None, end=None)
+    cache.store(all_sensors, [_result("sensor-1", 1.0)], cache.snapshot(None))
+    cache.store(latest, [_result("sensor-1", 1.0)], cache.snapshot(["sensor-1"]))
+
+    # Execute
+    cache.record_writes([_write("sensor-1", START - timedelta(days=30))])
+
+    # Verify
+    assert cache.lookup(all_sensors) is None
+    assert cache.lookup(latest) is None
+
+
+def test_query_result_cache_rejects_results_computed_across_a_write(cache: QueryResultCache):
+    # Setup: the snapshot is taken before the query, the write commits while it runs
+    key = _key(["sensor-1"])
+    versions = cache.snapshot(["sensor-1"])
+    cache.record_writes([_write("sensor-1", START)])
+
+    # Execute
+    cache.store(key, [_result("sensor-1", 1.0)], versions)
+
+    # Verify
+    assert cache.lookup(key) is None
+
+
+def test_query_result_cache_evicts_least_recently_used(cache: QueryResultCache):
+    # Setup
+    for sensor_id in ("sensor-1", "sensor-2"):
+        cache.store(_key([sensor_id]), [_result(sensor_id, 1.0)], cache.snapshot([sensor_id]))
+    assert cache.get_stats().estimated_bytes > 0
+
+    # Execute: touch sensor-1 so sensor-2 is the oldest entry
+    cache.lookup(_key(["sensor-1"]))
+    cache.store(_key(["sensor-3"]), [], cache.snapshot(["sensor-3"]))
+
+    # Verify
+    assert cache.lookup(_key(["sensor-2"])) is None
+    assert cache.lookup(_key(["sensor-1"])) is not None
+    assert cache.get_stats().evictions == 1
+
+
+def test_write_versions_change_query_etag_only_for_writes_into_its_range():
+    # Setup
+    versions = MetricWriteVersions()
+    key = _key(["sensor-1"])
+    etag, last_modified = versions.validators(key)
+
+    # Execute: live data after the range, a write to another sensor, then a late reading inside the range
+    versions.record_writes([_write("sensor-1", END + timedelta(days=5)), _write("sensor-2", START)])
+    unchanged = versions.validators(key)
+    versions.record_writes([_write("sensor-1", END - timedelta(hours=1))])
+    changed_etag, changed_at = versions.validators(key)
+
+    # Verify
+    assert unchanged == (etag, last_modified)
+    assert changed_etag != etag
+    assert changed_at >= last_modified
+    assert versions.validators(_key(None))[0] != versions.validators(_key(None, end=START))[0]
+
+
+def test_write_versions_change_query_etag_after_the_write_left_the_history():
+    # Setup
+    versions = MetricWriteVersions()
+    key = _key(["sensor-1"])
+    versions.record_writes([_write("sensor-1", START)])
+    etag, _ = versions.validators(key)
+
+    # Execute: enough writes after the range to push the one inside it out of the history
+    for day in range(20):
+        versions.record_writes([_write("sensor-1", END + timedelta(days=day + 1))])
+    trailing = versions.validators(key)[0]
+    versions.record_writes([_write("sensor-1", START)])
+
+    # Verify
+    assert trailing != etag
+    assert versions.validators(key)[0] != trailing
+
+
+def test_write_versions_tags_differ_per_process_and_after_expiry():
+    # Setup
+    versions = MetricWriteVersions()
+    key = _key(["sensor-1"])
+    etag, _ = versions.validators(key)
+
+    # Execute
+    versions.expire()
+
+    # Verify
+    assert versions.validators(key)[0] != etag
+    assert MetricWriteVersions().validators(key)[0] != etag
+
+
+def test_query_key_normalizes_time_zones():
+    offset = timezone(timedelta(hours=2))
+
+    assert _key(["sensor-1"], START.astimezone(offset), END.astimezone(offset)) == _key(["sensor-1"])
+
+
+async def test_metric_manager_serves_repeated_queries_from_cache(
+    mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository
+):
+    # Setup mocks
+    mock_metric_repository.query_metrics.return_value = [_result("sensor-1", 3.0)]
+    mock_sensor_repository.sensor_exists.return_value = True
+    mock_metric_repository.add_metric.return_value = WriteStatus.INSERTED
+    manager = MetricManager(
+        metric_repository=mock_metric_repository,
+        sensor_repository=mock_sensor_repository,
+        query_cache=QueryResultCache(),
+    )
+    query_request = MetricQueryRequest(
+        sensor_ids=["sensor-1"], metrics=[TEMPERATURE], statistics=[StatisticType.AVG], start_date=START
+    )
+
+    # Execute
+    first = await manager.query_metrics_api(query_request=query_request)
+    second = await manager.query_metrics_api(query_request=query_request)
+    await manager.record_metric(
+        sensor_id="sensor-1", metric_request=MetricCreateRequest(timestamp=START, metric_type=TEMPERATURE, value=1.0)
+    )
+    await manager.query_metrics_api(query_request=query_request)
+
+    # Verify
+    assert first == second
+    assert mock_metric_repository.query_metrics.call_count == 2
+
+
+async def test_metric_manager_reports_etag_of_cached_query(
+    mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository
+):
+    # Setup mocks
+    mock_metric_repository.query_metrics.return_value = [_result("sensor-1", 3.0)]
+    manager = MetricManager(
+        metric_repository=mock_metric_repository,
+        sensor_repository=mock_sensor_repository,
+        query_cache=QueryResultCache(),
+    )
+    query_request = MetricQueryRequest(
+        sensor_ids=["sensor-1"], metrics=[TEMPERATURE], statistics=[StatisticType.AVG], start_date=START
+    )
+
+    # Execute
+    before = await manager.get_query_version(query_request=query_request)
+    await manager.query_metrics_api(query_request=query_request)
+    after = await manager.get_query_version(query_request=query_request)
+
+    # Verify
+    assert before.etag is None
+    assert after.etag == results_etag([("sensor-1", TEMPERATURE, StatisticType.AVG, 3.0)])
+    assert after.end_date == START + timedelta(days=31)
+
+
+async def test_metric_manager_reports_etag_from_write_versions_without_running_the_query(
+    mock_metric_repository: MetricRepository, mock_sensor_repository: SensorRepository
+):
+    # Setup mocks
+    mock_sensor_repository.sensor_exists.return_value = True
+    mock_metric_repository.add_metric.return_value = WriteStatus.INSERTED
+    manager = MetricManager(
+        metric_repository=mock_metric_repository,
+        sensor_repository=mock_sensor_repository,
+        write_versions=MetricWriteVersions(),
+    )
+    query_request = MetricQueryRequest(
+        sensor_ids=["sensor-1"], metrics=[TEMPERATURE], statistics=[StatisticType.AVG], start_date=START
+    )
+
+    # Execute
+    before = await manager.get_query_version(query_request=query_request)
+    await manager.record_metric(
+        sensor_id="sensor-1", metric_request=MetricCreateRequest(timestamp=START, metric_type=TEMPERATURE, value=1.0)
+    )
+    after = await manager.get_query_version(query_request=query_request)
+
+    # Verify
+    assert before.etag is not None and before.last_modified is not None
+    assert after.etag != before.etag
+    assert after.last_modified is not None and after.last_modified >= before.last_modified
+    mock_metric_repository.query_metrics.assert_not_called()
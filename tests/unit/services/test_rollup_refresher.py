@@ -0,0 +1,44 @@
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.services.rollup_refresher import RollupRefreshTask
+from app.storage.rollup_manager import MetricRollupManager
+
+
+@pytest.fixture
+def mock_rollup_manager() -> MetricRollupManager:
+    return AsyncMock(spec=MetricRollupManager)
+
+
+async def test_run_once_counts_refreshed_buckets(mock_rollup_manager):
+    # Setup mocks
+    mock_rollup_manager.refresh.return_value = 42
+    task = RollupRefreshTask(rollup_manager=mock_rollup_manager)
+
+    # Execute
+    refreshed = await task.run_once()
+    await task.run_once()
+
+    # Verify
+    assert refreshed == 42
+    stats = task.get_stats()
+    assert stats.runs == 2
+    assert stats.buckets_refreshed == 84
+    assert stats.last_error is None
+
+
+async def test_failed_refresh_is_recorded(mock_rollup_manager):
+    # Setup mocks
+    mock_rollup_manager.refresh.side_effect = RuntimeError("connection lost")
+    task = RollupRefreshTask(rollup_manager=mock_rollup_manager)
+
+    # Execute
+    with pytest.raises(RuntimeError):
+        await task.run_once()
+
+    # Verify
+    stats = task.get_stats()
+    assert stats.runs == 0
+    assert stats.failed_runs == 1
+    assert stats.last_error == "connection lost"
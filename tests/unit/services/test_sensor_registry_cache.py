@@ -0,0 +1,143 @@
+import pytest
+
+from app.services.sensor_registry_cache import CachedSensorRepository, SensorRegistryCache
+from app.shared.exceptions import DatabaseError
+from app.shared.models import Sensor
+from app.storage.interfaces.sensor_repository import SensorRepository
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(clock: FakeClock) -> SensorRegistryCache:
+    return SensorRegistryCache(max_entries=3, ttl_seconds=60, negative_ttl_seconds=5, clock=clock)
+
+
+@pytest.fixture
+def repository(mock_sensor_repository: SensorRepository, cache: SensorRegistryCache) -> CachedSensorRepository:
+    return CachedSensorRepository(sensor_repository=mock_sensor_repository, cache=cache)
+
+
+def test_sensor_registry_cache_expires_entries(cache: SensorRegistryCache, clock: FakeClock):
+    # Setup
+    cache.store({"sensor-001"}, exists=True)
+    cache.store({"sensor-404"}, exists=False)
+
+    # Verify negative entries expire well before positive ones
+    clock.now = 10
+    assert cache.lookup("sensor-001") is True
+    assert cache.lookup("sensor-404") is None
+    clock.now = 61
+    assert cache.lookup("sensor-001") is None
+
+    stats = cache.get_stats()
+    assert (stats.hits, stats.negative_hits, stats.misses) == (1, 0, 2)
+    assert stats.size == 0
+
+
+def test_sensor_registry_cache_evicts_least_recently_used(cache: SensorRegistryCache):
+    # Setup
+    cache.store({"sensor-1"}, exists=True)
+    cache.store({"sensor-2"}, exists=True)
+    cache.store({"sensor-3"}, exists=True)
+
+    # Execute: touch sensor-1 so sensor-2 is the oldest entry
+    cache.lookup("sensor-1")
+    cache.store({"sensor-4"}, exists=True)
+
+    # Verify
+    assert cache.lookup("sensor-2") is None
+    assert cache.lookup("sensor-1") is True
+    assert cache.get_stats().evictions == 1
+
+
+async def test_cached_sensor_repository_sensor_exists_queries_once(
+    repository: CachedSensorRepository, mock_sensor_repository: SensorRepository, cache: SensorRegistryCache, sensor_id
+):
+    # Setup mocks
+    mock_sensor_repository.sensor_exists.return_value = True
+
+    # Execute
+    results = [await repository.sensor_exists(sensor_id=sensor_id) for _ in range(5)]
+
+    # Verify
+    assert results == [True] * 5
+    mock_sensor_repository.sensor_exists.assert_called_once_with(sensor_id=sensor_id)
+    assert cache.get_stats().hit_rate == 0.8
+
+
+async def test_cached_sensor_repository_negative_cache(
+    repository: CachedSensorRepository, mock_sensor_repository: SensorRepository, clock: FakeClock
+):
+    # Setup mocks
+    mock_sensor_repository.sensor_exists.return_value = False
+
+    # Execute
+    assert await repository.sensor_exists(sensor_id="sensor-404") is False
+    assert await repository.sensor_exists(sensor_id="sensor-404") is False
+    clock.now = 6
+    assert await repository.sensor_exists(sensor_id="sensor-404") is False
+
+    # Verify the unknown ID was looked up again once its negative entry expired
+    assert mock_sensor_repository.sensor_exists.call_count == 2
+
+
+async def test_cached_sensor_repository_add_sensor_invalidates_negative_entry(
+    repository: CachedSensorRepository, mock_sensor_repository: SensorRepository, sample_sensor: Sensor
+):
+    # Setup mocks: the sensor is unknown, then registered
+    mock_sensor_repository.sensor_exists.return_value = False
+    mock_sensor_repository.add_sensor.return_value = sample_sensor
+    assert await repository.sensor_exists(sensor_id=sample_sensor.sensor_id) is False
+
+    # Execute
+    await repository.add_sensor(sensor=sample_sensor)
+
+    # Verify
+    assert await repository.sensor_exists(sensor_id=sample_sensor.sensor_id) is True
+    mock_sensor_repository.sensor_exists.assert_called_once()
+
+
+async def test_cached_sensor_repository_add_sensor_failure_keeps_cache_cold(
+    repository: CachedSensorRepository,
+    mock_sensor_repository: SensorRepository,
+    cache: SensorRegistryCache,
+    sample_sensor: Sensor,
+):
+    # Setup mocks
+    cache.store({sample_sensor.sensor_id}, exists=False)
+    mock_sensor_repository.add_sensor.side_effect = DatabaseError("Connection lost")
+
+    # Execute and verify exception
+    with pytest.raises(DatabaseError):
+        await repository.add_sensor(sensor=sample_sensor)
+
+    assert cache.lookup(sample_sensor.sensor_id) is None
+
+
+async def test_cached_sensor_repository_get_existing_sensor_ids_only_queries_unresolved(
+    repository: CachedSensorRepository, mock_sensor_repository: SensorRepository, cache: SensorRegistryCache
+):
+    # Setup
+    cache.store({"sensor-1"}, exists=True)
+    cache.store({"sensor-404"}, exists=False)
+    mock_sensor_repository.get_existing_sensor_ids.return_value = {"sensor-2"}
+
+    # Execute
+    result = await repository.get_existing_sensor_ids(sensor_ids=["sensor-1", "sensor-2", "sensor-3", "sensor-404"])
+
+    # Verify
+    assert result == {"sensor-1", "sensor-2"}
+    mock_sensor_repository.get_existing_sensor_ids.assert_called_once_with(sensor_ids=["sensor-2", "sensor-3"])
+    assert cache.lookup("sensor-3") is False
@@ -0,0 +1,182 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock
+
+import pytest
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from app.shared.exceptions import DatabaseError, DuplicateMetricError, SensorNotFoundError
+from app.shared.models import DuplicatePolicy, Metric, MetricType, WriteStatus
+from app.storage.implementations.postgresql_metric_repository import PostgreSQLMetricRepository
+
+
+@pytest.fixture
+def repository(mock_session: Mock) -> PostgreSQLMetricRepository:
+    return PostgreSQLMetricRepository(session=mock_session)
+
+
+@pytest.fixture
+def metrics(sensor_id: str) -> list[Metric]:
+    start = datetime(2023, 1, 1, 12, 0, 0, tzinfo=timezone.utc)
+    return [
+        Metric(
+            sensor_id=sensor_id,
+            metric_type=MetricType.TEMPERATURE,
+            timestamp=start + timedelta(minutes=minute),
+            value=20.0 + minute,
+        )
+        for minute in range(3)
+    ]
+
+
+async def test_postgresql_metric_repository_add_metrics_success(
+    repository: PostgreSQLMetricRepository, mock_session: Mock, metrics: list[Metric]
+):
+    # Setup mock result: one of the three rows hit the primary key
+    mock_result = Mock()
+    mock_result.all.return_value = [Mock(inserted=True), Mock(inserted=True)]
+    mock_session.execute.return_value = mock_result
+
+    # Execute
+    result = await repository.add_metrics(metrics=metrics)
+
+    # Verify a single execution and a single commit for the whole batch
+    assert result == 2
+    mock_session.execute.assert_called_once()
+    mock_session.commit.assert_called_once()
+    mock_session.add.assert_not_called()
+
+    statement, rows = mock_session.execute.call_args[0]
+    assert "ON CONFLICT (sensor_id, metric_type, timestamp) DO NOTHING" in str(statement.compile())
+    assert rows == [
+        {
+            "sensor_id": metric.sensor_id,
+            "metric_type": metric.metric_type.value,
+            "timestamp": metric.timestamp,
+            "value": metric.value,
+        }
+        for metric in metrics
+    ]
+
+
+async def test_postgresql_metric_repository_add_metrics_empty(
+    repository: PostgreSQLMetricRepository, mock_session: Mock
+):
+    # Execute
+    result = await repository.add_metrics(metrics=[])
+
+    # Verify
+    assert result == 0
+    mock_session.execute.assert_not_called()
+    mock_session.commit.assert_not_called()
+
+
+async def test_postgresql_metric_repository_add_metrics_sqlalchemy_error(
+    repository: PostgreSQLMetricRepository, mock_session: Mock, metrics: list[Metric]
+):
+    # Setup mock to raise SQLAlchemyError
+    mock_session.execute.side_effect = SQLAlchemyError("Connection lost")
+
+    # Execute and verify exception
+    with pytest.raises(DatabaseError):
+        await repository.add_metrics(metrics=metrics)
+
+    # Verify rollback was called
+    mock_session.rollback.assert_called_once()
+    mock_session.commit.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "row, expected_status",
+    [
+        (Mock(inserted=True), WriteStatus.INSERTED),
+        (Mock(inserted=False), WriteStatus.OVERWRITTEN),
+        (None, WriteStatus.DEDUPLICATED),
+    ],
+)
+async def test_postgresql_metric_repository_add_metric_write_status(
+    repository: PostgreSQLMetricRepository, mock_session: Mock, metrics: list[Metric], row, expected_status
+):
+    # Setup mock result of the single INSERT ... RETURNING statement
+    mock_result = Mock()
+    mock_result.first.return_value = row
+    mock_session.execute.return_value = mock_result
+
+    # Execute
+    result = await repository.add_metric(metric=metrics[0])
+
+    # Verify one round trip without a pre-check or a follow-up select
+    assert result == expected_status
+    mock_session.execute.assert_called_once()
+    mock_session.commit.assert_called_once()
+
+
+@pytest.mark.parametrize(
+    "policy, expected_clause",
+    [
+        (DuplicatePolicy.KEEP_FIRST, "ON CONFLICT (sensor_id, metric_type, timestamp) DO NOTHING"),
+        (DuplicatePolicy.KEEP_LAST, "ON CONFLICT (sensor_id, metric_type, timestamp) DO UPDATE SET value"),
+        (DuplicatePolicy.REJECT, None),
+    ],
+)
+async def test_postgresql_metric_repository_add_metric_conflict_clause(
+    mock_session: Mock, metrics: list[Metric], policy: DuplicatePolicy, expected_clause: str | None
+):
+    # Setup
+    repository = PostgreSQLMetricRepository(session=mock_session, duplicate_policy=policy)
+    mock_session.execute.return_value = Mock()
+
+    # Execute
+    await repository.add_metric(metric=metrics[0])
+
+    # Verify
+    sql = str(mock_session.execute.call_args[0][0].compile())
+    if expected_clause is None:
+        assert "ON CONFLICT" not in sql
+    else:
+        assert expected_clause in sql
+
+
+async def test_postgresql_metric_repository_add_metric_unique_violation(mock_session: Mock, metrics: list[Metric]):
+    # Setup mock to raise a unique violation
+    orig = Mock(sqlstate="23505")
+    mock_session.execute.side_effect = IntegrityError("INSERT", {}, orig)
+    repository = PostgreSQLMetricRepository(session=mock_session, duplicate_policy=DuplicatePolicy.REJECT)
+
+    # Execute and verify exception
+    with pytest.raises(DuplicateMetricError):
+        await repository.add_metric(metric=metrics[0])
+
+    mock_session.rollback.assert_called_once()
+    mock_session.commit.assert_not_called()
+
+
+async def test_postgresql_metric_repository_add_metric_foreign_key_violation(
+    repository: PostgreSQLMetricRepository, mock_session: Mock, metrics: list[Metric]
+):
+    # Setup mock to raise a foreign key violation
+    mock_session.execute.side_effect = IntegrityError("INSERT", {}, Mock(sqlstate="23503"))
+
+    # Execute and verify the missing sensor is reported as such
+    with pytest.raises(SensorNotFoundError, match=metrics[0].sensor_id):
+        await repository.add_metric(metric=metrics[0])
+
+    mock_session.rollback.assert_called_once()
+
+
+async def test_postgresql_metric_repository_add_metrics_keep_last_collapses_batch(
+    mock_session: Mock, metrics: list[Metric]
+):
+    # Setup: the same key twice in one batch, the later reading must win
+    repository = PostgreSQLMetricRepository(session=mock_session, duplicate_policy=DuplicatePolicy.KEEP_LAST)
+    mock_result = Mock()
+    mock_result.all.return_value = [Mock(inserted=True), Mock(inserted=False)]
+    mock_session.execute.return_value = mock_result
+    overwrite = metrics[0].model_copy(update={"value": 99.0})
+
+    # Execute
+    result = await repository.add_metrics(metrics=[metrics[0], metrics[1], overwrite])
+
+    # Verify only new rows are counted and each key is sent once
+    assert result == 1
+    _, rows = mock_session.execute.call_args[0]
+    assert [row["value"] for row in rows] == [99.0, metrics[1].value]
@@ -1,10 +1,11 @@
+from datetime import datetime, timezone
 from unittest.mock import Mock
 
 import pytest
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
 from app.shared.exceptions import DatabaseError
-from app.shared.models import Sensor
+from app.shared.models import Sensor, SensorRegistryVersion
 from app.storage.database_models import SensorModel
 from app.storage.implementations.postgresql_sensor_repository import PostgreSQLSensorRepository
 
@@ -22,6 +23,7 @@ async def test_postgresql_sensor_repository_add_sensor_success(
 
     # Verify
     mock_session.add.assert_called_once()
+    mock_session.execute.assert_called_once()  # bumps the registry version in the same transaction
     mock_session.commit.assert_called_once()
     mock_session.rollback.assert_not_called()
 
@@ -73,10 +75,8 @@ async def test_postgresql_sensor_repository_add_sensor_sqlalchemy_error(
 async def test_postgresql_sensor_repository_list_sensors_success(
     repository: PostgreSQLSensorRepository, mock_session: Mock, multiple_sensor_models: list[SensorModel]
 ):
-    # Setup mock result
-    mock_result = Mock()
-    mock_result.scalars.return_value.all.return_value = multiple_sensor_models
-    mock_session.execute.return_value = mock_result
+    # Setup mock result; rows carry the same attributes as the models
+    mock_session.execute.return_value = multiple_sensor_models
 
     # Execute
     result = await repository.list_sensors()
@@ -201,3 +201,87 @@ async def test_postgresql_sensor_repository_get_sensor_sqlalchemy_error(
     # Execute and verify exception
     with pytest.raises(DatabaseError):
         await repository.get_sensor(sensor_id=sensor_id)
+
+
+async def test_postgresql_sensor_repository_get_existing_sensor_ids_success(
+    repository: PostgreSQLSensorRepository, mock_session: Mock
+):
+    # Setup mock result
+    mock_result = Mock()
+    mock_result.scalars.return_value.all.return_value = ["sensor-001"]
+    mock_session.execute.return_value = mock_result
+
+    # Execute
+    result = await repository.get_existing_sensor_ids(sensor_ids=["sensor-001", "sensor-404"])
+
+    # Verify
+    mock_session.execute.assert_called_once()
+    assert result == {"sensor-001"}
+
+
+async def test_postgresql_sensor_repository_get_existing_sensor_ids_empty(
+    repository: PostgreSQLSensorRepository, mock_session: Mock
+):
+    # Execute
+    result = await repository.get_existing_sensor_ids(sensor_ids=[])
+
+    # Verify
+    assert result == set()
+    mock_session.execute.assert_not_called()
+
+
+async def test_postgresql_sensor_repository_get_existing_sensor_ids_sqlalchemy_error(
+    repository: PostgreSQLSensorRepository, mock_session: Mock
+):
+    # Setup mock to raise SQLAlchemyError
+    mock_session.execute.side_effect = SQLAlchemyError("Query failed")
+
+    # Execute and verify exception
+    with pytest.raises(DatabaseError):
+        await repository.get_existing_sensor_ids(sensor_ids=["sensor-001"])
+
+
+async def test_postgresql_sensor_repository_get_sensors_version(
+    repository: PostgreSQLSensorRepository, mock_session: Mock
+):
+    # Setup mock result
+    last_created_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    mock_result = Mock()
+    mock_result.one_or_none.return_value = (3, last_created_at)
+    mock_session.execute.return_value = mock_result
+
+    # Execute
+    result = await repository.get_sensors_version()
+
+    # Verify
+    mock_session.execute.assert_called_once()
+    assert result == SensorRegistryVersion(sensor_count=3, last_created_at=last_created_at)
+
+
+async def test_postgresql_sensor_repository_get_sensors_version_without_version_row(
+    repository: PostgreSQLSensorRepository, mock_session: Mock
+):
+    # Setup mock results: no version row, then the aggregate over the sensors table
+    last_created_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    missing, counted = Mock(), Mock()
+    missing.one_or_none.return_value = None
+    counted.one.return_value = (3, last_created_at)
+    mock_session.execute.side_effect = [missing, counted]
+
+    # Execute
+    result = await repository.get_sensors_version()
+
+    # Verify
+    assert mock_session.execute.call_count == 2
+    assert result == SensorRegistryVersion(sensor_count=3, last_created_at=last_created_at)
+
+
+async def test_postgresql_sensor_repository_get_sensors_version_sqlalchemy_error(
+    repository: PostgreSQLSensorRepository, mock_session: Mock
+):
+    # Setup mock to raise SQLAlchemyError
+    mock_session.execute.side_effect = SQLAlchemyError("Query failed")
+
+    # Execute and verify exception
+    with pytest.raises(DatabaseError):
+        await repository.get_sensors_version()
@@ -0,0 +1,114 @@
+import random
+import statistics
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from app.shared.models import QUANTILE_STATISTICS, Metric, MetricType, StatisticType
+from app.storage.metric_batch import MetricBatch, MetricBatchBuilder
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def _readings(count: int, seed: int = 1) -> list[Metric]:
+    rng = random.Random(seed)
+    readings = [
+        Metric(
+            sensor_id=f"sensor-{rng.randrange(5)}",
+            metric_type=rng.choice(list(MetricType)),
+            timestamp=START + timedelta(microseconds=i * 1_000_003),
+            value=round(rng.uniform(-100, 100), 2),
+        )
+        for i in range(count)
+    ]
+    rng.shuffle(readings)
+    return readings
+
+
+def _expected(readings: list[Metric], statistic: StatisticType) -> float | None:
+    values = [reading.value for reading in readings]
+    by_time = [reading.value for reading in sorted(readings, key=lambda reading: reading.timestamp)]
+    match statistic:
+        case StatisticType.MIN:
+            return min(values)
+        case StatisticType.MAX:
+            return max(values)
+        case StatisticType.AVG:
+            return statistics.fmean(values)
+        case StatisticType.SUM:
+            return sum(values)
+        case StatisticType.COUNT:
+            return len(values)
+        case StatisticType.STDDEV:
+            return statistics.stdev(values) if len(values) > 1 else None
+        case StatisticType.VARIANCE:
+            return statistics.variance(values) if len(values) > 1 else None
+        case StatisticType.FIRST:
+            return by_time[0]
+        case StatisticType.LAST:
+            return by_time[-1]
+
+    return float(np.percentile(values, QUANTILE_STATISTICS[statistic] * 100))
+
+
+@pytest.mark.parametrize("count", [1, 7, 2000])
+def test_aggregate_computes_every_statistic_per_series(count: int):
+    readings = _readings(count)
+    batch = MetricBatch.from_metrics(readings)
+
+    results = batch.aggregate(list(StatisticType))
+
+    assert len(results) == len(batch.series_keys) * len(StatisticType)
+    for result in results:
+        series = [r for r in readings if (r.sensor_id, r.metric_type) == (result.sensor_id, result.metric_type)]
+        expected = _expected(series, result.statistic)
+        assert result.value == (None if expected is None else pytest.approx(expected))
+
+
+def test_builder_encodes_ids_across_chunks():
+    builder = MetricBatchBuilder()
+    builder.append(["sensor-b", "sensor-a"], ["humidity", "temperature"], [2, 1], [2.0, 1.0])
+    builder.append(["sensor-a", "sensor-b"], ["temperature", "temperature"], [3, 4], [3.0, 4.0])
+
+    batch = builder.build()
+
+    assert batch.sensor_ids == ["sensor-b", "sensor-a"]
+    assert batch.metric_types == [MetricType.HUMIDITY, MetricType.TEMPERATURE]
+    assert batch.sensor_codes.tolist() == [0, 1, 1, 0]
+    assert batch.metric_codes.tolist() == [0, 1, 1, 1]
+    assert batch.series_keys == [
+        ("sensor-b", MetricType.HUMIDITY),
+        ("sensor-b", MetricType.TEMPERATURE),
+        ("sensor-a", MetricType.TEMPERATURE),
+    ]
+    assert batch.sums().tolist() == [2.0, 4.0, 4.0]
+    assert batch.statistic_values(StatisticType.FIRST).tolist() == [2.0, 4.0, 1.0]
+
+
+def test_to_metrics_round_trips_readings():
+    readings = _readings(100)
+
+    assert MetricBatch.from_metrics(readings).to_metrics() == readings
+
+
+def test_empty_batch_has_no_series():
+    batch = MetricBatchBuilder().build()
+
+    assert len(batch) == 0
+    assert batch.aggregate(list(StatisticType)) == []
+
+
+def test_batch_takes_a_tenth_of_the_memory_of_models():
+    tracemalloc.start()
+    try:
+        readings = _readings(10_000)
+        model_bytes = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    batch = MetricBatch.from_metrics(readings)
+
+    assert batch.nbytes / len(batch) == 24
+    assert batch.nbytes * 10 < model_bytes
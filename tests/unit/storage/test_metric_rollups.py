@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta, timezone
+
+from app.storage.metric_rollups import RollupSegment, plan_rollup_segments
+
+DAY, HOUR, MINUTE = timedelta(days=1), timedelta(hours=1), timedelta(minutes=1)
+
+
+def _utc(*args: int) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_plan_rollup_segments_uses_coarsest_buckets_and_raw_edges():
+    segments = plan_rollup_segments(_utc(2024, 1, 1, 22, 58, 30), _utc(2024, 1, 4, 1, 2, 15))
+
+    assert segments == [
+        RollupSegment(grain=None, start=_utc(2024, 1, 1, 22, 58, 30), end=_utc(2024, 1, 1, 22, 59)),
+        RollupSegment(grain=MINUTE, start=_utc(2024, 1, 1, 22, 59), end=_utc(2024, 1, 1, 23)),
+        RollupSegment(grain=HOUR, start=_utc(2024, 1, 1, 23), end=_utc(2024, 1, 2)),
+        RollupSegment(grain=DAY, start=_utc(2024, 1, 2), end=_utc(2024, 1, 4)),
+        RollupSegment(grain=HOUR, start=_utc(2024, 1, 4), end=_utc(2024, 1, 4, 1)),
+        RollupSegment(grain=MINUTE, start=_utc(2024, 1, 4, 1), end=_utc(2024, 1, 4, 1, 2)),
+        RollupSegment(grain=None, start=_utc(2024, 1, 4, 1, 2), end=_utc(2024, 1, 4, 1, 2, 15)),
+    ]
+
+
+def test_plan_rollup_segments_aligns_buckets_to_utc():
+    # Midnight in UTC+2 is 22:00 UTC on the previous day
+    start = datetime(2024, 1, 2, tzinfo=timezone(timedelta(hours=2)))
+
+    segments = plan_rollup_segments(start, start + 2 * DAY)
+
+    assert [(segment.grain, segment.start) for segment in segments] == [
+        (HOUR, _utc(2024, 1, 1, 22)),
+        (DAY, _utc(2024, 1, 2)),
+        (HOUR, _utc(2024, 1, 3)),
+    ]
+
+
+def test_plan_rollup_segments_below_a_minute_reads_raw_rows_only():
+    segments = plan_rollup_segments(_utc(2024, 1, 1, 0, 0, 10), _utc(2024, 1, 1, 0, 0, 50))
+
+    assert segments == [RollupSegment(grain=None, start=_utc(2024, 1, 1, 0, 0, 10), end=_utc(2024, 1, 1, 0, 0, 50))]
@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock
+
+from app.shared.models import PartitionInterval
+from app.storage.partition_manager import MetricPartitionManager
+
+
+def test_partition_for_month_rolls_over_year():
+    manager = MetricPartitionManager(engine=Mock(), interval=PartitionInterval.MONTH)
+
+    partition = manager.partition_for(datetime(2024, 12, 31, 23, 59, tzinfo=timezone.utc))
+
+    assert partition.name == "metrics_p202412"
+    assert partition.start == datetime(2024, 12, 1, tzinfo=timezone.utc)
+    assert partition.end == datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def test_partition_for_day_uses_utc_boundaries():
+    manager = MetricPartitionManager(engine=Mock(), interval=PartitionInterval.DAY)
+
+    # 01:30 in UTC+2 is still the previous day in UTC
+    partition = manager.partition_for(datetime(2024, 3, 10, 1, 30, tzinfo=timezone(timedelta(hours=2))))
+
+    assert partition.name == "metrics_p20240309"
+    assert partition.start == datetime(2024, 3, 9, tzinfo=timezone.utc)
+    assert partition.end == datetime(2024, 3, 10, tzinfo=timezone.utc)
@@ -0,0 +1,57 @@
+import math
+import random
+from collections import Counter
+
+import pytest
+
+from app.storage.quantile_sketch import (
+    MIN_MAGNITUDE,
+    RELATIVE_ACCURACY,
+    bin_index,
+    bin_value,
+    sketch_quantile,
+)
+
+
+def _sketch(values: list[float]) -> list[tuple[int, int]]:
+    return sorted(Counter(bin_index(value) for value in values).items())
+
+
+def test_bins_are_ordered_like_readings():
+    values = sorted([-250.0, -1.5, -0.002, -0.0005, 0.0, 0.0009, 0.002, 1.0, 1.01, 1.03, 1e6])
+
+    indexes = [bin_index(value) for value in values]
+
+    assert indexes == sorted(indexes)
+    assert bin_index(-0.0005) == bin_index(0.0) == bin_index(0.0009) == 0
+
+
+def test_bin_value_is_within_relative_accuracy_of_every_reading_of_its_bin():
+    rng = random.Random(1)
+    for value in [rng.uniform(-1e4, 1e4) for _ in range(5000)] + [MIN_MAGNITUDE * 1.0001, -1e9]:
+        assert bin_value(bin_index(value)) == pytest.approx(value, rel=RELATIVE_ACCURACY)
+
+
+def test_sketch_quantile_estimates_reading_at_rank():
+    rng = random.Random(2)
+    values = [rng.expovariate(0.1) - 5 for _ in range(10_000)]
+    ordered = sorted(values)
+
+    for quantile in (0.0, 0.5, 0.9, 0.99, 1.0):
+        exact = ordered[math.floor(quantile * (len(ordered) - 1))]
+        estimate = sketch_quantile(_sketch(values), quantile)
+        assert estimate == pytest.approx(exact, rel=RELATIVE_ACCURACY, abs=MIN_MAGNITUDE)
+
+
+def test_merged_sketches_equal_sketch_of_all_readings():
+    rng = random.Random(3)
+    first, second = [rng.gauss(20, 5) for _ in range(300)], [rng.gauss(40, 1) for _ in range(700)]
+
+    merged = sorted((Counter(dict(_sketch(first))) + Counter(dict(_sketch(second)))).items())
+
+    assert merged == _sketch(first + second)
+    assert sketch_quantile(merged, 0.95) == sketch_quantile(_sketch(first + second), 0.95)
+
+
+def test_sketch_quantile_of_empty_sketch_is_none():
+    assert sketch_quantile([], 0.5) is None
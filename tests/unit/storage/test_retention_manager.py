@@ -0,0 +1,24 @@
+from datetime import datetime, timezone
+
+from app.shared.models import MetricType
+from app.storage.retention_manager import RetentionPolicy
+
+
+def test_retention_policy_applies_overrides_per_metric_type():
+    policy = RetentionPolicy(default_days=90, days_by_metric={MetricType.HUMIDITY: 30})
+
+    cutoffs = policy.cutoffs(datetime(2024, 4, 30, tzinfo=timezone.utc))
+
+    assert cutoffs == {
+        MetricType.TEMPERATURE: datetime(2024, 1, 31, tzinfo=timezone.utc),
+        MetricType.HUMIDITY: datetime(2024, 3, 31, tzinfo=timezone.utc),
+    }
+
+
+def test_retention_policy_without_default_keeps_other_types_forever():
+    policy = RetentionPolicy(days_by_metric={MetricType.TEMPERATURE: 7})
+
+    cutoffs = policy.cutoffs(datetime(2024, 4, 30, tzinfo=timezone.utc))
+
+    assert cutoffs[MetricType.TEMPERATURE] == datetime(2024, 4, 23, tzinfo=timezone.utc)
+    assert cutoffs[MetricType.HUMIDITY] is None